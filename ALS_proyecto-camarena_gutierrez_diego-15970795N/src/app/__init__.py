@@ -37,6 +37,16 @@ def create_app(config_name=None):
     # Registrar manejadores de errores
     register_error_handlers(app)
     
+    # Completar los índices de los datos guardados antes de existir
+    if app.config.get('INDEX_REBUILD_ON_STARTUP'):
+        reindex_pending(app)
+    
+    # Con preload_app de gunicorn, cargar el catálogo antes del fork para que
+    # los workers lo compartan
+    if app.config.get('CATALOG_PRELOAD'):
+        from app.services.catalog import catalog
+        catalog.preload(app)
+    
     # Inicializar datos demo en producción (solo si no existen)
     if config_name == 'production':
         init_demo_data_if_needed(app)
@@ -66,6 +76,10 @@ def init_extensions(app):
         from flask_wtf.csrf import generate_csrf
         return dict(csrf_token=generate_csrf)
     
+    # Mantener al día las vistas desnormalizadas de los pedidos
+    from app.services import order_view
+    order_view.init_app(app)
+    
     # Configurar Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -110,6 +124,19 @@ def init_extensions(app):
             return None
 
 
+def reindex_pending(app):
+    """Reindexar las clases cuyo índice no está completo (no impide arrancar)."""
+    from app.services.storage_service import StorageService
+    
+    try:
+        with app.app_context():
+            indexados = StorageService().reindex_pending()
+        for clase, total in indexados.items():
+            app.logger.info(f"Índices de {clase} completados: {total} objetos")
+    except Exception as e:
+        app.logger.warning(f"No se pudieron completar los índices al arrancar: {e}")
+
+
 def register_blueprints(app):
     """Registrar todos los blueprints de la aplicación."""
     
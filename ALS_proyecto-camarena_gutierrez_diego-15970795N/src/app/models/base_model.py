@@ -15,6 +15,18 @@ class BaseModel:
     Proporciona funcionalidad común como ID, timestamps y validación.
     """
     
+    # Campos con índice secundario en el almacenamiento. Cada modelo declara
+    # los campos por los que se consulta con igualdad (ver app.services.query).
+    INDEXED_FIELDS = ('is_active',)
+    
+    # Campo cuyo valor decide el nodo Redis del objeto (ver app.services.sharding).
+    # Los objetos con el mismo valor se guardan juntos en el mismo nodo.
+    SHARD_KEY_FIELD = 'id'
+    
+    # Si los objetos se guardan en el espacio de claves del tenant del usuario
+    # (ver app.services.tenancy). Las clases globales lo ponen a False.
+    TENANT_SCOPED = True
+    
     def __init__(self):
         """Inicializar modelo base."""
         self.id = str(uuid.uuid4())
@@ -87,11 +99,29 @@ class BaseModel:
                     result[key] = value
         return result
     
+    def serialize(self) -> Dict[str, Any]:
+        """
+        Atributos a guardar, sin modificar el objeto: una copia de ``__dict__``
+        con los enums convertidos a sus valores. A diferencia de
+        ``prepare_for_serialization`` puede usarse con el objeto compartido
+        entre hilos.
+        
+        Returns:
+            Dict[str, Any]: Atributos listos para codificar en JSON
+        """
+        # La copia del diccionario es atómica; recorrerlo directamente fallaría
+        # si otro hilo añade un atributo mientras tanto
+        datos = dict(self.__dict__)
+        return {key: value.value if isinstance(value, Enum) else value for key, value in datos.items()}
+    
     def prepare_for_serialization(self):
         """
         Prepara el objeto para serialización de Sirope.
         Convierte los enums a sus valores para evitar errores de JSON.
         Retorna un diccionario con los valores originales para restaurar después.
+        
+        Modifica el objeto mientras dura la serialización: el almacenamiento
+        usa ``serialize``.
         """
         original_values = {}
         for key, value in self.__dict__.items():
@@ -32,6 +32,9 @@ class Personalizacion(BaseModel):
     Representa una personalización específica en una prenda.
     """
     
+    INDEXED_FIELDS = ('is_active', 'item_pedido_id', 'proceso_id')
+    SHARD_KEY_FIELD = 'pedido_id'  # Junto a su pedido
+    
     def __init__(self, proceso_id: str, precio_proceso: float, cantidad: int = 1):
         """
         Inicializar personalización.
@@ -61,6 +64,9 @@ class ItemPedido(BaseModel):
     Representa una prenda específica con sus personalizaciones en un pedido.
     """
     
+    INDEXED_FIELDS = ('is_active', 'pedido_id', 'producto_id')
+    SHARD_KEY_FIELD = 'pedido_id'  # Junto a su pedido
+    
     def __init__(self, producto_id: str, talla: str, color: str, cantidad: int,
                  precio_prenda: float):
         """
@@ -104,6 +110,8 @@ class Pedido(BaseModel):
     Gestiona toda la información de un pedido de personalización textil.
     """
     
+    INDEXED_FIELDS = ('is_active', 'estado', 'cliente_id', 'prioridad')
+    
     def __init__(self, cliente_id: str, descripcion: str = "",
                  fecha_entrega_estimada: datetime = None,
                  estado: EstadoPedido = EstadoPedido.PENDIENTE,
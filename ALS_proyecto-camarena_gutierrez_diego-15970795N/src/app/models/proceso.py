@@ -29,6 +29,8 @@ class Proceso(BaseModel):
     Cada proceso tiene características y cálculos de precio específicos.
     """
     
+    INDEXED_FIELDS = ('is_active', 'tipo')
+    
     def __init__(self, tipo: TipoProceso, nombre: str, descripcion: str = ""):
         """
         Inicializar proceso.
@@ -44,6 +46,10 @@ class Proceso(BaseModel):
         self.nombre = nombre
         self.descripcion = descripcion
         
+        # Versión de la configuración de precios (sube en configurar_precios);
+        # identifica la tarifa compilada del proceso (ver services.pricing)
+        self.config_version = 0
+        
         # Configuración específica por tipo de proceso
         self._configurar_proceso()
     
@@ -181,13 +187,18 @@ class Proceso(BaseModel):
         elif tipo_enum == TipoProceso.BORDADO:
             self.precio_setup = kwargs.get('precio_setup', 0.0)
             if 'precios_tamaños' in kwargs:
-                self.precios_por_tamaño.update(kwargs['precios_tamaños'])
+                # Claves como texto (se aceptan los valores del enum)
+                self.precios_por_tamaño.update({
+                    (tamaño.value if isinstance(tamaño, TamañoBordado) else tamaño): precio
+                    for tamaño, precio in kwargs['precios_tamaños'].items()
+                })
                 
         elif tipo_enum == TipoProceso.VINIL:
             self.precio_por_cm2 = kwargs.get('precio_por_cm2', 0.0)
             if 'tipos_vinil' in kwargs:
                 self.tipos_vinil.update(kwargs['tipos_vinil'])
         
+        self.config_version = getattr(self, 'config_version', 0) + 1
         self.update_timestamp()
     
     def __str__(self) -> str:
@@ -12,6 +12,8 @@ class Producto(BaseModel):
     Representa las prendas disponibles en el catálogo.
     """
     
+    INDEXED_FIELDS = ('is_active', 'categoria')
+    
     def __init__(self, nombre: str, categoria: str, precio_base: float, 
                  descripcion: str = "", tallas_disponibles: List[str] = None,
                  colores_disponibles: List[str] = None):
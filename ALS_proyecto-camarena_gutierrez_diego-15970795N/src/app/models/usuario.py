@@ -13,8 +13,13 @@ class Usuario(BaseModel, UserMixin):
     Extiende BaseModel y UserMixin para integración con Flask-Login.
     """
     
+    INDEXED_FIELDS = ('username', 'email')
+    
+    # Los usuarios se cargan antes de saber su tenant: viven en el espacio global
+    TENANT_SCOPED = False
+    
     def __init__(self, username: str, email: str, password: str, 
-                 nombre: str = "", apellidos: str = ""):
+                 nombre: str = "", apellidos: str = "", tenant_id: str = None):
         """
         Inicializar usuario.
         
@@ -24,6 +29,7 @@ class Usuario(BaseModel, UserMixin):
             password: Contraseña en texto plano (se hasheará)
             nombre: Nombre del usuario
             apellidos: Apellidos del usuario
+            tenant_id: Tienda cuyos datos ve el usuario (None: DEFAULT_TENANT)
         """        # Inicializar BaseModel primero
         super().__init__()
         
@@ -34,6 +40,7 @@ class Usuario(BaseModel, UserMixin):
         self.apellidos = apellidos
         self.password_hash = generate_password_hash(password)
         self.is_admin = False
+        self.tenant_id = tenant_id
     
     def update_timestamp(self):
         """Actualizar timestamp de modificación."""
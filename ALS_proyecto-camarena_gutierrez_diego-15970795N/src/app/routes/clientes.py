@@ -2,12 +2,15 @@
 Rutas para gestión de clientes.
 """
 
+import asyncio
+
 from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app, jsonify
 from flask_login import login_required
 from app.forms.cliente_forms import ClienteForm, BuscarClienteForm
 from app.models.cliente import Cliente
 from app.models.pedido import Pedido
 from app.services.storage_service import StorageService
+from app.services.async_storage import AsyncStorageService
 
 clientes_bp = Blueprint('clientes', __name__)
 
@@ -17,7 +20,8 @@ clientes_bp = Blueprint('clientes', __name__)
 def listar():
     """Listar todos los clientes con búsqueda."""
     form = BuscarClienteForm()
-    storage = StorageService()
+    # El listado tolera cierto desfase y puede leerse de una réplica
+    storage = StorageService(stale_ok=True)
     
     # No necesitamos volver a mostrar el mensaje de éxito
     # ya que ahora se muestra correctamente al redirigir
@@ -111,31 +115,19 @@ def nuevo():
 
 @clientes_bp.route('/ajax/<id>')
 @login_required
-def ver_ajax(id):
+async def ver_ajax(id):
     """Obtener detalles de un cliente específico vía AJAX."""
-    storage = StorageService()
-    
     try:
-        # Intentamos cargar el cliente directamente
-        cliente = storage.load(id)
-        
-        # Si no lo encontramos, intentamos buscarlo en todos los clientes
-        if not cliente:
-            clientes = storage.find_all(Cliente)
-            for c in clientes:
-                if c.id == id:
-                    cliente = c
-                    break
+        # El cliente y sus pedidos se leen a la vez
+        async with AsyncStorageService() as storage:
+            cliente, pedidos = await asyncio.gather(
+                storage.get(Cliente, id),
+                storage.find_by(Pedido, cliente_id=id, is_active=True)
+            )
         
         if not cliente or not cliente.is_active or not isinstance(cliente, Cliente):
             return jsonify({'error': 'Cliente no encontrado'}), 404
         
-        # Obtener pedidos del cliente
-        pedidos = storage.find_by_condition(
-            Pedido,
-            lambda p: p.cliente_id == id and p.is_active
-        )
-        
         # Ordenar pedidos por fecha de creación (más recientes primero)
         pedidos.sort(key=lambda x: x.created_at, reverse=True)
           # Convertir a diccionario para JSON
@@ -2,7 +2,7 @@
 Rutas principales de la aplicación.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash
+from flask import Blueprint, render_template, redirect, url_for, flash, jsonify, abort, request, current_app
 from flask_login import login_required, current_user
 
 # Crear el blueprint
@@ -27,104 +27,132 @@ def index():
         return redirect(url_for('main.dashboard'))
     return redirect(url_for('auth.login'))
 
+def _calcular_dashboard():
+    """
+    Calcular las estadísticas del dashboard, poniendo al día los totales de
+    los pedidos recientes y del mes.
+    
+    Returns:
+        dict: Estadísticas e ids de los pedidos recientes y atrasados (todo
+        serializable a JSON)
+    """
+    from app.services.storage_service import StorageService
+    from app.models.cliente import Cliente
+    from app.models.pedido import Pedido, EstadoPedido
+    from app.models.producto import Producto
+    from app.models.proceso import Proceso
+    # Las estadísticas toleran cierto desfase: se leen de una réplica si hay
+    storage = StorageService(stale_ok=True)
+    primario = StorageService()
+    
+    # Obtener estadísticas generales - solo registros activos
+    total_clientes = len(storage.get_by_criteria(Cliente, lambda x: x.is_active))
+    total_productos = len(storage.get_by_criteria(Producto, lambda x: x.is_active))
+    total_procesos = len(storage.find_all(Proceso))  # Procesos no tienen soft delete
+    
+    # Obtener pedidos recientes - solo activos
+    pedidos = storage.get_by_criteria(Pedido, lambda x: x.is_active)
+    pedidos_activos = [p for p in pedidos if p.estado != EstadoPedido.ENTREGADO and p.is_active]
+    pedidos_recientes = sorted(pedidos, key=lambda x: x.created_at, reverse=True)[:5]
+    
+    # Pedidos por estado
+    pedidos_pendientes = len([p for p in pedidos if p.estado == EstadoPedido.PENDIENTE and p.is_active])
+    pedidos_proceso = len([p for p in pedidos if p.estado == EstadoPedido.EN_PROCESO and p.is_active])
+    pedidos_completados = len([p for p in pedidos if p.estado == EstadoPedido.COMPLETADO and p.is_active])
+    
+    # Pedidos atrasados
+    pedidos_atrasados = [p for p in pedidos_activos if p.is_atrasado()]
+    
+    # Ingresos del mes actual
+    import datetime
+    inicio_mes = datetime.datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    pedidos_mes = [p for p in pedidos if p.created_at >= inicio_mes and p.is_active]
+    
+    # Asegurar que los totales están actualizados
+    from app.routes.pedidos import calcular_totales_pedido
+    
+    # Recalcular totales para los pedidos recientes y del mes actual
+    pedidos_para_actualizar = []
+    for p in pedidos_recientes + pedidos_mes:
+        if p not in pedidos_para_actualizar:  # Evitar duplicados si un pedido está en ambas listas
+            pedidos_para_actualizar.append(p)
+    
+    for p in pedidos_para_actualizar:
+        try:
+            # Recalcular sobre la copia del primario: guardar la de la réplica
+            # podría pisar cambios que aún no se han replicado
+            actual = primario.get(Pedido, p.id) or p
+            antes = (actual.subtotal, actual.iva, actual.total, actual.utilidad)
+            calcular_totales_pedido(actual, actual.id)
+            # Si después de calcular, el total sigue siendo 0, establecemos un valor mínimo
+            if actual.total == 0:
+                actual.subtotal = 100.0  # Valor mínimo para pruebas
+                actual.calcular_totales()
+            if (actual.subtotal, actual.iva, actual.total, actual.utilidad) != antes:
+                primario.save(actual)
+            if actual is not p:
+                p.__dict__.update(actual.__dict__)
+        except Exception as e:
+            print(f"Error al recalcular totales para pedido {p.id}: {str(e)}")
+          # Calcular ingresos del mes con los totales actualizados
+    ingresos_mes = sum(p.total for p in pedidos_mes)
+    
+    estadisticas = {
+        'total_clientes': total_clientes,
+        'total_productos': total_productos,
+        'total_procesos': total_procesos,
+        'pedidos_pendientes': pedidos_pendientes,
+        'pedidos_proceso': pedidos_proceso,
+        'pedidos_completados': pedidos_completados,
+        'pedidos_atrasados': len(pedidos_atrasados),
+        'ingresos_mes': ingresos_mes
+    }
+    
+    return {
+        'estadisticas': estadisticas,
+        'pedidos_recientes': [p.id for p in pedidos_recientes],
+        'pedidos_atrasados': [p.id for p in pedidos_atrasados]
+    }
+
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
     """Panel principal del usuario."""
     try:
         from app.services.storage_service import StorageService
+        from app.services.lookups import lookups
         from app.models.cliente import Cliente
-        from app.models.pedido import Pedido, EstadoPedido
+        from app.models.pedido import Pedido, ItemPedido, Personalizacion
         from app.models.producto import Producto
         from app.models.proceso import Proceso
-        storage = StorageService()
-        
-        # Obtener estadísticas generales - solo registros activos
-        total_clientes = len(storage.get_by_criteria(Cliente, lambda x: x.is_active))
-        total_productos = len(storage.get_by_criteria(Producto, lambda x: x.is_active))
-        total_procesos = len(storage.find_all(Proceso))  # Procesos no tienen soft delete
-        
-        # Obtener pedidos recientes - solo activos
-        pedidos = storage.get_by_criteria(Pedido, lambda x: x.is_active)
-        pedidos_activos = [p for p in pedidos if p.estado != EstadoPedido.ENTREGADO and p.is_active]
-        pedidos_recientes = sorted(pedidos, key=lambda x: x.created_at, reverse=True)[:5]
-        
-        # Pedidos por estado
-        pedidos_pendientes = len([p for p in pedidos if p.estado == EstadoPedido.PENDIENTE and p.is_active])
-        pedidos_proceso = len([p for p in pedidos if p.estado == EstadoPedido.EN_PROCESO and p.is_active])
-        pedidos_completados = len([p for p in pedidos if p.estado == EstadoPedido.COMPLETADO and p.is_active])
-        
-        # Pedidos atrasados
-        pedidos_atrasados = [p for p in pedidos_activos if p.is_atrasado()]
+        primario = StorageService()
         
-        # Ingresos del mes actual
-        import datetime
-        inicio_mes = datetime.datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        pedidos_mes = [p for p in pedidos if p.created_at >= inicio_mes and p.is_active]
+        # Un solo cálculo aunque muchos usuarios abran el dashboard a la vez
+        # (en este worker y en el resto); cualquier cambio en estas clases
+        # obliga a recalcular
+        datos = primario.coalesce('dashboard', _calcular_dashboard, depende_de=(
+            Cliente, Pedido, ItemPedido, Personalizacion, Producto, Proceso
+        ))
         
-        # Asegurar que los totales están actualizados
-        from app.routes.pedidos import calcular_totales_pedido
+        # Los pedidos a mostrar se cargan del primario, con los totales al día
+        pedidos = primario.load_many(datos['pedidos_recientes'] + datos['pedidos_atrasados'], Pedido)
+        pedidos_recientes = [pedidos[i] for i in datos['pedidos_recientes'] if i in pedidos]
+        pedidos_atrasados = [pedidos[i] for i in datos['pedidos_atrasados'] if i in pedidos]
         
-        # Recalcular totales para los pedidos recientes y del mes actual
-        pedidos_para_actualizar = []
-        for p in pedidos_recientes + pedidos_mes:
-            if p not in pedidos_para_actualizar:  # Evitar duplicados si un pedido está en ambas listas
-                pedidos_para_actualizar.append(p)
-        
-        for p in pedidos_para_actualizar:
-            try:
-                calcular_totales_pedido(p, p.id)
-                # Si después de calcular, el total sigue siendo 0, establecemos un valor mínimo
-                if p.total == 0:
-                    p.subtotal = 100.0  # Valor mínimo para pruebas
-                    p.calcular_totales()
-                storage.save(p)
-            except Exception as e:
-                print(f"Error al recalcular totales para pedido {p.id}: {str(e)}")
-              # Calcular ingresos del mes con los totales actualizados
-        ingresos_mes = sum(p.total for p in pedidos_mes)
-        
-        estadisticas = {
-            'total_clientes': total_clientes,
-            'total_productos': total_productos,
-            'total_procesos': total_procesos,
-            'pedidos_pendientes': pedidos_pendientes,
-            'pedidos_proceso': pedidos_proceso,
-            'pedidos_completados': pedidos_completados,
-            'pedidos_atrasados': len(pedidos_atrasados),
-            'ingresos_mes': ingresos_mes
-        }
-        
-        # Obtener datos de clientes para mostrar en la interfaz - solo activos
-        clientes_objs = storage.get_by_criteria(Cliente, lambda x: x.is_active)
-        clientes = {}
-        
-        # Creamos un diccionario con los nombres completos de los clientes
-        for cliente in clientes_objs:
-            try:
-                # Verificamos si el cliente tiene el método get_nombre_completo
-                if hasattr(cliente, 'get_nombre_completo') and callable(getattr(cliente, 'get_nombre_completo')):
-                    clientes[cliente.id] = cliente.get_nombre_completo()
-                # Si no tiene el método, construimos el nombre manualmente
-                elif hasattr(cliente, 'nombre'):
-                    nombre_completo = cliente.nombre
-                    if hasattr(cliente, 'apellido') and cliente.apellido:
-                        nombre_completo += f" {cliente.apellido}"
-                    if hasattr(cliente, 'empresa') and cliente.empresa and cliente.empresa.strip():
-                        nombre_completo += f" ({cliente.empresa})"
-                    clientes[cliente.id] = nombre_completo
-                else:
-                    clientes[cliente.id] = f"Cliente {cliente.id[:8]}"
-            except Exception as e:
-                # Si hay algún error, usamos un nombre genérico
-                print(f"Error al obtener nombre de cliente {cliente.id}: {str(e)}")
-                clientes[cliente.id] = f"Cliente {cliente.id[:8]}"
+        # La demanda de material ya está sumada: no entra en el cálculo coalescido
+        try:
+            from app.services import material_demand
+            demanda = material_demand.get(primario)
+        except Exception as e:
+            current_app.logger.error(f"Error leyendo la demanda de material: {e}")
+            demanda = None
         
         return render_template('main/dashboard.html',
-                             estadisticas=estadisticas,
+                             estadisticas=datos['estadisticas'],
                              pedidos_recientes=pedidos_recientes,
                              pedidos_atrasados=pedidos_atrasados,
-                             clientes=clientes)
+                             clientes=lookups.names(Cliente),
+                             demanda=demanda)
         
     except Exception as e:
         flash(f'Error al cargar el dashboard: {str(e)}', 'error')
@@ -143,7 +171,86 @@ def dashboard():
                              estadisticas=estadisticas_vacias,
                              pedidos_recientes=[],
                              pedidos_atrasados=[],
-                             clientes={})
+                             clientes={},
+                             demanda=None)
+
+@main_bp.route('/api/demanda-material')
+@login_required
+def api_demanda_material():
+    """
+    Material que necesitan los pedidos pendientes y en proceso, por tipo de
+    proceso (metros de rollo, cm² impresos, piezas y personalizaciones).
+    Un administrador puede pedir ``?reconstruir=1`` para recalcularla desde
+    todos los pedidos.
+    """
+    from app.services.storage_service import StorageService
+    from app.services import material_demand
+    reconstruir = request.args.get('reconstruir') == '1'
+    if reconstruir and not current_user.is_admin:
+        abort(403)
+    try:
+        storage = StorageService()
+        if reconstruir:
+            demanda = material_demand.rebuild(storage)
+        else:
+            demanda = material_demand.get(storage)
+        return jsonify({'demanda': demanda})
+    except Exception as e:
+        current_app.logger.error(f"Error leyendo la demanda de material: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/repreciados')
+@main_bp.route('/api/repreciados/<trabajo_id>')
+@login_required
+def api_repreciados(trabajo_id=None):
+    """
+    Avance de los repreciados de pedidos abiertos: uno concreto o los últimos
+    del tenant.
+    """
+    from app.services.storage_service import StorageService
+    from app.services import repricing
+    try:
+        storage = StorageService()
+        if trabajo_id is None:
+            return jsonify({'trabajos': repricing.recientes(storage)})
+        trabajo = repricing.estado(storage, trabajo_id)
+        if trabajo is None:
+            return jsonify({'error': 'Trabajo no encontrado'}), 404
+        return jsonify(trabajo)
+    except Exception as e:
+        current_app.logger.error(f"Error leyendo el repreciado {trabajo_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/metricas')
+@login_required
+def api_metricas():
+    """Métricas internas de almacenamiento del proceso (solo administradores)."""
+    if not current_user.is_admin:
+        abort(403)
+    
+    from app.services.storage_service import StorageService
+    from app.services.invalidation import current_bus
+    from app.services import circuit_breaker, replicas, tenancy
+    from app.services.catalog import catalog
+    from app.services.lookups import lookups
+    from app.services.pricing import tarifas
+    bus = current_bus()
+    # El administrador de un tenant solo ve el uso del suyo; el de la plataforma
+    # (sin tenant), el de todos
+    tenant = tenancy.current_tenant() if getattr(current_user, 'tenant_id', None) else None
+    return jsonify({
+        'cache_objetos': StorageService.cache().stats(),
+        'cache_consultas': StorageService.results_cache().stats(),
+        'single_flight': StorageService.single_flight().stats(),
+        'cotizaciones': StorageService().quote_stats(),
+        'catalogo': catalog.get_stats(),
+        'lookups': lookups.get_stats(),
+        'tarifas': tarifas.get_stats(),
+        'invalidacion': bus.get_stats() if bus else None,
+        'redis_breakers': circuit_breaker.all_stats(),
+        'replicas': replicas.router.get_stats(),
+        'tenants': StorageService().tenant_usage(tenant)
+    })
 
 @main_bp.route('/about')
 def about():
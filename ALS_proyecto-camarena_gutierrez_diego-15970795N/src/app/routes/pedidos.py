@@ -2,7 +2,7 @@
 Rutas para la gestión de pedidos - Versión corregida.
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session, current_app
 from flask_login import login_required, current_user
 from werkzeug.exceptions import NotFound
 from datetime import datetime
@@ -19,9 +19,96 @@ from app.models.producto import Producto
 from app.models.proceso import Proceso, TipoProceso, TamañoBordado
 from app.forms.pedido_forms import PedidoForm, ItemPedidoForm, PersonalizacionForm
 from app.services.storage_service import StorageService
+from app.services.async_storage import AsyncStorageService
+from app.services import order_view, work_queue
+from app.services.catalog import catalog
+from app.services.lookups import lookups
+from app.services import pricing
 
 pedidos_bp = Blueprint('pedidos', __name__, url_prefix='/pedidos')
 storage = StorageService()
+# Lecturas de las APIs JSON: toleran cierto desfase y pueden ir a una réplica
+storage_lectura = StorageService(stale_ok=True)
+
+
+def cotizar_personalizaciones(personalizaciones):
+    """
+    Poner precio, en un solo lote, a las personalizaciones que no lo tienen
+    pero traen medidas (o tamaño de bordado / tipo de vinil) y proceso.
+    
+    Args:
+        personalizaciones: Personalizaciones a revisar (se modifican)
+    
+    Returns:
+        int: Personalizaciones a las que se puso precio
+    """
+    lote = []
+    for pers in personalizaciones:
+        if pers.precio_proceso or not pers.cantidad:
+            continue
+        opcion = getattr(pers, 'tamaño_bordado', None) or getattr(pers, 'tipo_vinil', None)
+        if not ((getattr(pers, 'ancho', 0) and getattr(pers, 'alto', 0)) or opcion):
+            continue
+        tarifa = catalog.tarifa(pers.proceso_id)
+        if tarifa is not None:
+            lote.append((pers, tarifa, opcion))
+    if not lote:
+        return 0
+    
+    cotizado = pricing.cotizar_lote(
+        [tarifa for _, tarifa, _ in lote],
+        [float(getattr(pers, 'ancho', 0) or 0) for pers, _, _ in lote],
+        [float(getattr(pers, 'alto', 0) or 0) for pers, _, _ in lote],
+        [int(pers.cantidad) for pers, _, _ in lote],
+        [opcion for _, _, opcion in lote]
+    )
+    cotizadas = 0
+    for (pers, _, _), precio in zip(lote, cotizado.precios):
+        if precio > 0:
+            # El precio del lote es el total de las piezas; se guarda por pieza
+            pers.precio_proceso = float(precio) / pers.cantidad
+            cotizadas += 1
+    return cotizadas
+
+
+def personalizacion_cotizada(proceso_id, cantidad, ancho=None, alto=None, opcion=None):
+    """
+    Crear una personalización con el precio calculado en el servidor.
+    
+    Los formularios cotizan en el navegador con las reglas publicadas en
+    /procesos/api/reglas-precios, pero solo como referencia: al guardar, el
+    precio se vuelve a calcular aquí con las tarifas vigentes.
+    
+    Args:
+        proceso_id: ID del proceso
+        cantidad: Piezas a personalizar
+        ancho: Ancho del diseño en cm
+        alto: Alto del diseño en cm
+        opcion: Tamaño de bordado o tipo de vinil
+    
+    Returns:
+        Personalizacion: Personalización sin guardar (precio por pieza), o
+        None si el proceso no existe
+    """
+    tarifa = catalog.tarifa(proceso_id)
+    if tarifa is None:
+        return None
+    
+    cantidad = max(int(cantidad or 1), 1)
+    ancho = float(ancho or 0)
+    alto = float(alto or 0)
+    if tarifa.tipo == TipoProceso.BORDADO and opcion:
+        opcion = str(opcion).upper()
+    
+    precio = tarifa.precio(ancho, alto, cantidad, opcion)
+    personalizacion = Personalizacion(proceso_id, precio / cantidad, cantidad)
+    personalizacion.ancho = ancho
+    personalizacion.alto = alto
+    if tarifa.tipo == TipoProceso.BORDADO:
+        personalizacion.tamaño_bordado = opcion
+    elif tarifa.tipo == TipoProceso.VINIL:
+        personalizacion.tipo_vinil = opcion
+    return personalizacion
 
 
 def calcular_totales_pedido(pedido, pedido_id):
@@ -34,32 +121,45 @@ def calcular_totales_pedido(pedido, pedido_id):
     """
     try:
         # Buscar los items del pedido que estén activos (no eliminados)
-        items = storage.get_by_criteria(ItemPedido, lambda x: x.pedido_id == pedido_id and x.is_active)
+        items = storage.query(ItemPedido).where(pedido_id=pedido_id, is_active=True).all()
         
         # Actualizar el contador de items
         pedido.num_items = len(items)
         
         if items:
+            # Las personalizaciones de todos los items, en una consulta, y las
+            # que aún no tienen precio se cotizan juntas
+            por_item = {item.id: [] for item in items}
+            for pers in storage.query(Personalizacion).where(
+                item_pedido_id__in=list(por_item), is_active=True
+            ).all():
+                por_item[pers.item_pedido_id].append(pers)
+            cotizar_personalizaciones([p for lista in por_item.values() for p in lista])
+                
             # Recorremos cada item para asegurarnos de que sus subtotales estén actualizados
             for item in items:
                 # Recalculamos el subtotal del item (precio unitario * cantidad)
-                item.subtotal = item.precio_prenda * item.cantidad
+                subtotal_item = item.precio_prenda * item.cantidad
+                item_modificado = item.subtotal != subtotal_item
+                item.subtotal = subtotal_item
                 
-                # Obtener y recalcular personalizaciones del item
-                personalizaciones = storage.get_by_criteria(
-                    Personalizacion, lambda x: x.item_pedido_id == item.id and x.is_active
-                )
+                personalizaciones = por_item[item.id]
                 
                 # Recalcular subtotales de personalizaciones
+                # Solo se guarda lo que cambia: una consulta de totales no debe
+                # contar como escritura (ni sacar a la sesión de las réplicas)
                 for pers in personalizaciones:
-                    pers.subtotal = pers.precio_proceso * pers.cantidad
-                    storage.save(pers)
+                    subtotal = pers.precio_proceso * pers.cantidad
+                    if pers.subtotal != subtotal:
+                        pers.subtotal = subtotal
+                        storage.save(pers)
                 
                 # Actualizar el subtotal de personalizaciones del item
-                item.subtotal_personalizaciones = sum(p.subtotal for p in personalizaciones)
-                
-                # Guardar el item actualizado
-                storage.save(item)
+                subtotal_personalizaciones = sum(p.subtotal for p in personalizaciones)
+                if item.subtotal_personalizaciones != subtotal_personalizaciones or item_modificado:
+                    item.subtotal_personalizaciones = subtotal_personalizaciones
+                    # Guardar el item actualizado
+                    storage.save(item)
             
             # Calcular los subtotales del pedido completo
             subtotal_items = sum(item.subtotal for item in items)
@@ -92,48 +192,42 @@ def calcular_totales_pedido(pedido, pedido_id):
 def index():
     """Lista todos los pedidos activos (no eliminados)."""
     try:
-        print("=== DEBUG PEDIDOS INDEX ===")
-        # Filtrar solo pedidos activos (no eliminados con soft delete)
-        pedidos = storage.get_by_criteria(Pedido, lambda x: x.is_active)
-        print(f"Total pedidos activos encontrados: {len(pedidos)}")
+        # Filtrar solo pedidos activos (no eliminados con soft delete). El
+        # resultado se cachea por filtros hasta que cambie algún pedido
+        consulta = storage.query(Pedido).where(is_active=True).cached()
         
         # Filtros opcionales
         estado = request.args.get('estado')
         cliente_id = request.args.get('cliente_id')
         prioridad = request.args.get('prioridad')
-        print(f"Filtros aplicados - Estado: {estado}, Cliente: {cliente_id}, Prioridad: {prioridad}")
+        current_app.logger.debug(f"Filtros de pedidos - Estado: {estado}, Cliente: {cliente_id}, Prioridad: {prioridad}")
         
+        # Los filtros se resuelven con los índices de Pedido (el enum se
+        # normaliza a su valor, así que vale tanto el string como el enum)
         if estado:
-            # Manejar correctamente la comparación del enum
-            pedidos = [p for p in pedidos if (
-                (isinstance(p.estado, str) and p.estado == estado) or 
-                (hasattr(p.estado, 'value') and p.estado.value == estado)
-            )]
+            consulta = consulta.where(estado=estado)
         
         if cliente_id:
-            pedidos = [p for p in pedidos if p.cliente_id == cliente_id]
+            consulta = consulta.where(cliente_id=cliente_id)
         
         if prioridad:
-            # Manejar correctamente la comparación del enum de prioridad
-            pedidos = [p for p in pedidos if (
-                (isinstance(p.prioridad, str) and p.prioridad == prioridad) or 
-                (hasattr(p.prioridad, 'value') and p.prioridad.value == prioridad)
-            )]
-                # Obtener clientes activos para el filtro
-        clientes = storage.get_by_criteria(Cliente, lambda x: x.is_active)
-        print(f"Total clientes activos encontrados: {len(clientes)}")
+            consulta = consulta.where(prioridad=prioridad)
+        
+        pedidos = consulta.all()
+        
+        # Obtener clientes activos para el filtro
+        clientes = storage.query(Cliente).where(is_active=True).cached().all()
+        current_app.logger.debug(f"Listado de pedidos: {len(pedidos)} pedidos, {len(clientes)} clientes")
         
         # Incluir fecha actual para comparaciones en el template
         now = datetime.now()
         
-        print(f"Enviando a template: {len(pedidos)} pedidos, {len(clientes)} clientes")
         return render_template('pedidos/index.html', 
                              pedidos=pedidos, 
                              clientes=clientes,
                              now=now)
     except Exception as e:
-        print(f"ERROR en pedidos.index: {e}")
-        traceback.print_exc()
+        current_app.logger.error(f"Error cargando pedidos: {e}")
         flash(f'Error al cargar pedidos: {str(e)}', 'error')
         return render_template('pedidos/index.html', 
                              pedidos=[], 
@@ -153,8 +247,7 @@ def crear_paso1():
     """Paso 1: Información básica del pedido."""
     storage = StorageService()
     form = PedidoForm()
-    clientes = storage.get_by_criteria(Cliente, lambda x: x.is_active)
-    form.cliente_id.choices = [(c.id, c.get_nombre_completo()) for c in clientes]
+    form.cliente_id.choices = lookups.choices(Cliente)
     
     if form.validate_on_submit():
         # VALIDACIÓN DE INTEGRIDAD REFERENCIAL: Verificar que el cliente existe
@@ -230,15 +323,22 @@ def crear_paso2():
                 )
                 item.pedido_id = pedido_id
                 item.subtotal = item.precio_prenda * item.cantidad
+                item_id = storage.save(item)
                 
-                # Calcular costo de diseños
-                designs_cost = 0
+                # Los diseños se guardan como personalizaciones con el precio
+                # recalculado en el servidor (el del navegador es orientativo)
                 for design in prod.get('designs', []):
-                    designs_cost += design.get('precio', 0)
-                
-                item.subtotal_personalizaciones = designs_cost * item.cantidad
-                
-                storage.save(item)
+                    personalizacion = personalizacion_cotizada(
+                        design.get('proceso_id'), item.cantidad,
+                        design.get('ancho'), design.get('alto'), design.get('opcion')
+                    )
+                    if personalizacion is None:
+                        continue
+                    personalizacion.item_pedido_id = item_id
+                    personalizacion.pedido_id = pedido_id
+                    personalizacion.posicion = design.get('area_id')
+                    personalizacion.descripcion = design.get('descripcion', '')
+                    storage.save(personalizacion)
             
             # Recalcular totales
             calcular_totales_pedido(pedido, pedido_id)
@@ -268,27 +368,16 @@ def crear_paso2():
 def detalle(id):
     """Ver detalles de un pedido."""
     try:
-        pedido = storage.get(Pedido, id)
-        if not pedido or not pedido.is_active:
+        # Pedido, cliente, items, productos, personalizaciones y procesos en
+        # una sola lectura de la vista desnormalizada
+        vista = order_view.get(storage, id)
+        if not vista:
             raise NotFound("Pedido no encontrado")
         
-        # Obtener datos relacionados
-        cliente = storage.get(Cliente, pedido.cliente_id)
-        items = storage.get_by_criteria(ItemPedido, lambda x: x.pedido_id == id and x.is_active)
-          # Cargar productos y procesos para cada item
-        for item in items:
-            item.producto = storage.get(Producto, item.producto_id)
-            item.personalizaciones = storage.get_by_criteria(
-                Personalizacion, 
-                lambda x: x.item_pedido_id == item.id and x.is_active
-            )
-            for pers in item.personalizaciones:
-                pers.proceso = storage.get(Proceso, pers.proceso_id)
-        
         return render_template('pedidos/detalle.html',
-                             pedido=pedido,
-                             cliente=cliente,
-                             items=items,
+                             pedido=vista['pedido'],
+                             cliente=vista['cliente'],
+                             items=vista['items'],
                              fecha_actual=datetime.now().date())
                              
     except NotFound:
@@ -299,6 +388,29 @@ def detalle(id):
         return redirect(url_for('pedidos.index'))
 
 
+@pedidos_bp.route('/<string:id>/imprimir')
+@login_required
+def imprimir(id):
+    """Versión para imprimir de un pedido."""
+    try:
+        vista = order_view.get(storage, id)
+        if not vista:
+            raise NotFound("Pedido no encontrado")
+        
+        return render_template('pedidos/imprimir.html',
+                             pedido=vista['pedido'],
+                             cliente=vista['cliente'],
+                             items=vista['items'],
+                             fecha_actual=datetime.now())
+    
+    except NotFound:
+        flash('Pedido no encontrado', 'error')
+        return redirect(url_for('pedidos.index'))
+    except Exception as e:
+        flash(f'Error al cargar pedido: {str(e)}', 'error')
+        return redirect(url_for('pedidos.index'))
+
+
 @pedidos_bp.route('/<string:id>/editar', methods=['GET', 'POST'])
 @login_required
 def editar(id):
@@ -310,8 +422,7 @@ def editar(id):
         
         form = PedidoForm(obj=pedido)        
         # Cargar opciones para el formulario
-        clientes = storage.get_by_criteria(Cliente, lambda x: x.is_active)
-        form.cliente_id.choices = [(c.id, c.get_nombre_completo()) for c in clientes]
+        form.cliente_id.choices = lookups.choices(Cliente)
         
         if form.validate_on_submit():
             # VALIDACIÓN DE INTEGRIDAD REFERENCIAL: Verificar que el cliente existe
@@ -388,21 +499,28 @@ def eliminar(id):
 
 @pedidos_bp.route('/api/productos')
 @login_required
-def api_productos():
+async def api_productos():
     """API endpoint para obtener todos los productos activos."""
     try:
-        productos = storage.get_by_criteria(Producto, lambda x: x.is_active)
-        productos_data = []
-        
-        for producto in productos:
-            productos_data.append({
-                'id': producto.id,
-                'nombre': producto.nombre,
-                'categoria': producto.categoria,
-                'precio_base': float(producto.precio_base),
-                'descripcion': producto.descripcion or ''
-            })
-        
+        async def listar():
+            async with AsyncStorageService(stale_ok=True) as storage_async:
+                productos = await storage_async.find_by(Producto, is_active=True)
+            productos_data = []
+        
+            for producto in productos:
+                productos_data.append({
+                    'id': producto.id,
+                    'nombre': producto.nombre,
+                    'categoria': producto.categoria,
+                    'precio_base': float(producto.precio_base),
+                    'descripcion': producto.descripcion or ''
+                })
+            return productos_data
+        
+        # Un solo listado aunque lo pidan muchos formularios a la vez
+        productos_data = await storage_lectura.coalesce_async(
+            'catalogo:productos', listar, depende_de=(Producto,)
+        )
         return jsonify(productos_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -410,10 +528,11 @@ def api_productos():
 
 @pedidos_bp.route('/api/producto/<string:producto_id>')
 @login_required
-def api_producto_detalle(producto_id):
+async def api_producto_detalle(producto_id):
     """API endpoint para obtener detalles de un producto específico."""
     try:
-        producto = storage.get(Producto, producto_id)
+        async with AsyncStorageService(stale_ok=True) as storage_async:
+            producto = await storage_async.get(Producto, producto_id)
         if not producto:
             return jsonify({'error': 'Producto no encontrado'}), 404
         
@@ -432,30 +551,37 @@ def api_producto_detalle(producto_id):
 
 @pedidos_bp.route('/api/procesos')
 @login_required
-def api_procesos():
+async def api_procesos():
     """API endpoint para obtener todos los procesos disponibles."""
     try:
-        procesos = storage.find_all(Proceso)
-        procesos_data = []
-        
-        for proceso in procesos:
-            # Get base price depending on process type
-            precio_base = 0.0
-            if hasattr(proceso, 'precio_por_metro'):
-                precio_base = float(proceso.precio_por_metro)
-            elif hasattr(proceso, 'precio_setup'):
-                precio_base = float(proceso.precio_setup)
-            elif hasattr(proceso, 'precio_por_cm2'):
-                precio_base = float(proceso.precio_por_cm2)
-            
-            procesos_data.append({
-                'id': proceso.id,
-                'nombre': proceso.nombre,
-                'tipo': proceso.tipo.value if hasattr(proceso.tipo, 'value') else str(proceso.tipo),
-                'precio_base': precio_base,
-                'descripcion': proceso.descripcion or ''
-            })
-        
+        async def listar():
+            async with AsyncStorageService(stale_ok=True) as storage_async:
+                procesos = await storage_async.find_all(Proceso)
+            procesos_data = []
+        
+            for proceso in procesos:
+                # Get base price depending on process type
+                precio_base = 0.0
+                if hasattr(proceso, 'precio_por_metro'):
+                    precio_base = float(proceso.precio_por_metro)
+                elif hasattr(proceso, 'precio_setup'):
+                    precio_base = float(proceso.precio_setup)
+                elif hasattr(proceso, 'precio_por_cm2'):
+                    precio_base = float(proceso.precio_por_cm2)
+            
+                procesos_data.append({
+                    'id': proceso.id,
+                    'nombre': proceso.nombre,
+                    'tipo': proceso.tipo.value if hasattr(proceso.tipo, 'value') else str(proceso.tipo),
+                    'precio_base': precio_base,
+                    'descripcion': proceso.descripcion or ''
+                })
+            return procesos_data
+        
+        # Un solo listado aunque lo pidan muchos formularios a la vez
+        procesos_data = await storage_lectura.coalesce_async(
+            'catalogo:procesos', listar, depende_de=(Proceso,)
+        )
         return jsonify(procesos_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -466,7 +592,7 @@ def api_procesos():
 def api_proceso_detalle(proceso_id):
     """API endpoint para obtener detalles de un proceso específico."""
     try:
-        proceso = storage.get(Proceso, proceso_id)
+        proceso = storage_lectura.get(Proceso, proceso_id)
         if not proceso:
             return jsonify({'error': 'Proceso no encontrado'}), 404
         
@@ -502,8 +628,7 @@ def agregar_item(pedido_id):
         form = ItemPedidoForm()
         
         # Cargar opciones para el formulario
-        productos = storage.get_by_criteria(Producto, lambda x: x.is_active)
-        form.producto_id.choices = [(p.id, p.nombre) for p in productos]
+        form.producto_id.choices = lookups.choices(Producto)
           # Valores predeterminados para talla y color (se actualizarán por AJAX)
         form.talla.choices = [('', 'Seleccione un producto primero')]
         form.color.choices = [('', 'Seleccione un producto primero')]
@@ -530,20 +655,17 @@ def agregar_item(pedido_id):
                     designs = json.loads(designs_data)
                     for design_id, design_info in designs.items():
                         if design_info.get('proceso_id') and design_info.get('posicion'):
-                            personalizacion = Personalizacion(
-                                proceso_id=design_info['proceso_id'],
-                                posicion=int(design_info['posicion']),
-                                descripcion=design_info.get('descripcion', ''),
-                                ancho=float(design_info.get('ancho', 0)) if design_info.get('ancho') else None,
-                                alto=float(design_info.get('alto', 0)) if design_info.get('alto') else None
+                            # Precio recalculado en el servidor con las tarifas vigentes
+                            personalizacion = personalizacion_cotizada(
+                                design_info['proceso_id'], item.cantidad,
+                                design_info.get('ancho'), design_info.get('alto'), design_info.get('opcion')
                             )
-                            personalizacion.item_id = item_id
-                            
-                            # Calcular costo de la personalización
-                            proceso = storage.get(Proceso, design_info['proceso_id'])
-                            if proceso:
-                                personalizacion.costo_personalizacion = proceso.precio * item.cantidad
-                                personalizacion.costo_unitario = proceso.precio
+                            if personalizacion is None:
+                                continue
+                            personalizacion.item_pedido_id = item_id
+                            personalizacion.pedido_id = pedido_id
+                            personalizacion.posicion = int(design_info['posicion'])
+                            personalizacion.descripcion = design_info.get('descripcion', '')
                             
                             storage.save(personalizacion)
                 except Exception as e:
@@ -588,8 +710,7 @@ def agregar_personalizacion(item_id):
         form = PersonalizacionForm()
         
         # Cargar opciones para el formulario
-        procesos = storage.find_all(Proceso)
-        form.proceso_id.choices = [(p.id, f"{p.nombre} ({p.tipo})") for p in procesos]
+        form.proceso_id.choices = lookups.choices(Proceso)
         
         if form.validate_on_submit():
             # Crear nueva personalización
@@ -599,6 +720,7 @@ def agregar_personalizacion(item_id):
                 cantidad=form.cantidad.data or 1
             )
             personalizacion.item_pedido_id = item_id
+            personalizacion.pedido_id = item.pedido_id
             personalizacion.descripcion = form.descripcion.data or ""
             personalizacion.ancho = form.ancho.data or 0
             personalizacion.alto = form.alto.data or 0
@@ -606,6 +728,19 @@ def agregar_personalizacion(item_id):
             personalizacion.cantidad_colores = form.cantidad_colores.data or 1
             personalizacion.notas = form.notas.data or ""
             
+            # El precio del formulario se estima en el navegador: si el proceso
+            # cotiza por medidas, manda el recalculado con las tarifas vigentes
+            tarifa = catalog.tarifa(personalizacion.proceso_id)
+            if (tarifa is not None and tarifa.tipo != TipoProceso.BORDADO
+                    and personalizacion.ancho and personalizacion.alto):
+                cotizada = personalizacion_cotizada(
+                    personalizacion.proceso_id, personalizacion.cantidad,
+                    personalizacion.ancho, personalizacion.alto
+                )
+                if cotizada.precio_proceso > 0:
+                    personalizacion.precio_proceso = cotizada.precio_proceso
+                    personalizacion.subtotal = cotizada.subtotal
+            
             # Guardar la personalización
             pers_id = storage.save(personalizacion)
             
@@ -625,7 +760,7 @@ def agregar_personalizacion(item_id):
             return redirect(url_for('pedidos.detalle', id=pedido.id))
         
         # Obtener el producto asociado al item para mostrar información
-        producto = storage.get(Producto, item.producto_id)
+        producto = catalog.producto(item.producto_id)
         
         return render_template('pedidos/personalizacion_form.html',
                               form=form,
@@ -660,13 +795,12 @@ def editar_item(item_id):
         form = ItemPedidoForm(obj=item)
         
         # Cargar opciones para el formulario
-        productos = storage.get_by_criteria(Producto, lambda x: x.is_active)
-        form.producto_id.choices = [(p.id, p.nombre) for p in productos]
+        form.producto_id.choices = lookups.choices(Producto)
         
         # Obtener el producto actual para las opciones de talla y color
-        producto_actual = next((p for p in productos if p.id == item.producto_id), None)
+        producto_actual = catalog.producto(item.producto_id)
         
-        if producto_actual:
+        if producto_actual and producto_actual.is_active:
             # Cargar tallas disponibles
             form.talla.choices = [(t, t) for t in producto_actual.tallas_disponibles or ['Única']]
             
@@ -850,8 +984,7 @@ def editar_personalizacion(personalizacion_id):
         form = PersonalizacionForm(obj=personalizacion)
         
         # Cargar opciones para el formulario
-        procesos = storage.find_all(Proceso)
-        form.proceso_id.choices = [(p.id, f"{p.nombre} ({p.tipo})") for p in procesos]
+        form.proceso_id.choices = lookups.choices(Proceso)
         
         if form.validate_on_submit():
             # Guardar los valores anteriores para comparación
@@ -892,10 +1025,10 @@ def editar_personalizacion(personalizacion_id):
             return redirect(url_for('pedidos.detalle', id=pedido_id))
         
         # Obtener el producto asociado al item para mostrar información
-        producto = storage.get(Producto, item.producto_id)
+        producto = catalog.producto(item.producto_id)
         
         # Obtener el proceso actual
-        proceso = storage.get(Proceso, personalizacion.proceso_id)
+        proceso = catalog.proceso(personalizacion.proceso_id)
         
         return render_template('pedidos/personalizacion_form.html',
                               form=form,
@@ -917,17 +1050,17 @@ def editar_personalizacion(personalizacion_id):
 
 @pedidos_bp.route('/api/pedido/<string:pedido_id>/totales')
 @login_required
-def api_pedido_totales(pedido_id):
+async def api_pedido_totales(pedido_id):
     """API endpoint para obtener los totales actualizados de un pedido."""
     try:
-        pedido = storage.get(Pedido, pedido_id)
-        if not pedido:
+        async with AsyncStorageService() as storage_async:
+            vista = await order_view.get_async(storage_async, pedido_id)
+        if not vista:
             return jsonify({'error': 'Pedido no encontrado'}), 404
         
-        # Asegurar que los totales están actualizados
-        calcular_totales_pedido(pedido, pedido_id)
-        
-        # No guardamos el pedido aquí, solo devolvemos los totales calculados
+        # Cada ruta que cambia el pedido o sus filas recalcula y guarda los
+        # totales, así que los de la vista ya están al día
+        pedido = vista['pedido']
         
         return jsonify({
             'subtotal': float(pedido.subtotal),
@@ -940,6 +1073,84 @@ def api_pedido_totales(pedido_id):
         return jsonify({'error': str(e)}), 500
 
 
+def _estacion():
+    """Estación que hace la petición: la indicada o el usuario actual."""
+    datos = request.get_json(silent=True) or request.form
+    return datos.get('estacion') or current_user.username
+
+
+def _con_numero(entradas):
+    """Añadir el número de pedido a las entradas de la cola."""
+    pedidos = storage.load_many([e['pedido_id'] for e in entradas], Pedido)
+    for entrada in entradas:
+        pedido = pedidos.get(entrada['pedido_id'])
+        entrada['numero_pedido'] = pedido.numero_pedido if pedido else None
+    return entradas
+
+
+@pedidos_bp.route('/api/cola')
+@login_required
+def api_cola():
+    """
+    Los siguientes pedidos que conviene hacer (por prioridad y fecha de
+    entrega) y los que ya tiene reclamados alguna estación.
+    
+    Parámetros opcionales: ``n`` (pedidos, por defecto 10).
+    """
+    try:
+        n = int(request.args.get('n', 10))
+    except ValueError:
+        return jsonify({'error': 'n debe ser un número entero'}), 400
+    try:
+        return jsonify({
+            'siguientes': _con_numero(work_queue.siguientes(storage, min(max(n, 0), 500))),
+            'reclamados': _con_numero(work_queue.reclamados(storage))
+        })
+    except Exception as e:
+        current_app.logger.error(f"Error leyendo la cola de trabajo: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@pedidos_bp.route('/api/cola/siguiente', methods=['POST'])
+@login_required
+def api_cola_siguiente():
+    """Reclamar para la estación el primer pedido disponible de la cola."""
+    try:
+        reclamo = work_queue.reclamar_siguiente(storage, _estacion())
+        return jsonify({'pedido': _con_numero([reclamo])[0] if reclamo else None})
+    except Exception as e:
+        current_app.logger.error(f"Error reclamando el siguiente pedido: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@pedidos_bp.route('/api/cola/<string:pedido_id>/reclamar', methods=['POST'])
+@login_required
+def api_cola_reclamar(pedido_id):
+    """Reclamar (o renovar) un pedido concreto para la estación."""
+    try:
+        reclamo = work_queue.reclamar(storage, pedido_id, _estacion())
+        if reclamo is None:
+            return jsonify({'error': 'El pedido no está disponible'}), 409
+        return jsonify({'pedido': _con_numero([reclamo])[0]})
+    except Exception as e:
+        current_app.logger.error(f"Error reclamando el pedido {pedido_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@pedidos_bp.route('/api/cola/<string:pedido_id>/liberar', methods=['POST'])
+@login_required
+def api_cola_liberar(pedido_id):
+    """Devolver a la cola un pedido reclamado (un administrador puede liberar cualquiera)."""
+    try:
+        estacion = None if request.args.get('forzar') == '1' and current_user.is_admin else _estacion()
+        if not work_queue.liberar(storage, pedido_id, estacion):
+            return jsonify({'error': 'El pedido no está reclamado por esta estación'}), 409
+        return jsonify({'liberado': pedido_id})
+    except Exception as e:
+        current_app.logger.error(f"Error liberando el pedido {pedido_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 # Temporary test endpoint for debugging product selection
 @pedidos_bp.route('/test/productos')
 def test_productos():
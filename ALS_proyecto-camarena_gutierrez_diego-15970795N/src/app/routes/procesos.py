@@ -5,7 +5,9 @@ Este módulo contiene todas las rutas relacionadas con la gestión de procesos d
 personalización textil como DTF, sublimación, bordado y vinil.
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+import zlib
+
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required
 
 from app.forms.proceso_forms import (
@@ -13,11 +15,36 @@ from app.forms.proceso_forms import (
     ConfiguracionBordadoForm, ConfiguracionVinilForm, CalculadoraProcesoForm
 )
 from app.models.proceso import Proceso, TipoProceso, TamañoBordado
+from app.services import nesting, pricing, production_batches, repricing
+from app.services.catalog import catalog
 from app.services.storage_service import StorageService
 
 # Definir el Blueprint
 procesos_bp = Blueprint('procesos', __name__)
 
+# Procesos fijos de la calculadora con precios actualizados
+PROCESOS_FIJOS = {
+    'dtf': {
+        'nombre_proceso': 'DTF - Transferencia Digital',
+        'tipo_proceso': 'DTF',
+        'ancho_disponible': 27.5,  # cm - ancho fijo para DTF
+        'precio_por_metro': 120.0,  # MXN por metro
+    },
+    'sublimacion': {
+        'nombre_proceso': 'Sublimación - Impresión Térmica',
+        'tipo_proceso': 'SUBLIMACION',
+        'ancho_disponible': 60.0,  # cm - ancho fijo para Sublimación
+        'precio_por_metro': 90.0,  # MXN por metro
+    },
+}
+
+# Versión de la configuración de los procesos fijos: cambia con cualquier
+# precio o medida de arriba y deja sin uso las cotizaciones memorizadas
+VERSION_PROCESOS_FIJOS = zlib.crc32(repr(sorted(PROCESOS_FIJOS.items())).encode())
+
+# Diseños máximos por petición a la API de cotización
+MAX_DISEÑOS_COTIZACION = 500
+
 
 @procesos_bp.route('/')
 @login_required
@@ -144,9 +171,15 @@ def configurar(id):
         
         # Si el formulario se envió y es válido, actualizar configuración
         if form.validate_on_submit():
+            tarifa_anterior = pricing.compilar(proceso)._replace(version=0)
             _actualizar_configuracion_proceso(proceso, form)
             storage.save(proceso)
-            flash(f'Configuración de {proceso.tipo.value} actualizada exitosamente.', 'success')
+            flash(f'Configuración de {proceso.get_tipo_enum().value} actualizada exitosamente.', 'success')
+            # Los pedidos abiertos se reprecian en segundo plano
+            if (current_app.config.get('REPRICING_ENABLED', True)
+                    and pricing.compilar(proceso)._replace(version=0) != tarifa_anterior):
+                trabajo_id = repricing.encolar(storage, repricing.PROCESO, proceso.id)
+                flash(f'Los pedidos abiertos se están repreciando (trabajo {trabajo_id[:8]}).', 'info')
             return redirect(url_for('procesos.ver', id=id))
         
         return render_template('procesos/configurar.html',
@@ -193,6 +226,201 @@ def calculadora():
                               resultado=None)
 
 
+@procesos_bp.route('/api/cotizar', methods=['GET', 'POST'])
+@login_required
+def api_cotizar():
+    """
+    Cotiza uno o varios diseños con cualquier proceso activo, en JSON.
+    
+    GET cotiza un diseño descrito en la query string; POST recibe un diseño
+    en JSON o ``{"diseños": [...]}`` (con el token CSRF en la cabecera
+    X-CSRFToken). Cada diseño indica ``proceso_id`` o ``tipo`` (el primer
+    proceso activo de ese tipo), ``cantidad`` y, según el tipo, ``ancho`` y
+    ``alto`` en cm, ``tamaño_bordado``, ``tipo_vinil`` e ``incluir_setup``.
+    
+    Los procesos salen del catálogo en memoria y las tarifas compiladas, y
+    todas las líneas se cotizan en un solo lote, sin consultar el almacenamiento.
+    
+    Returns:
+        Response: JSON con una línea con desglose por diseño válido, los
+        errores de los diseños inválidos (por índice) y el total
+    """
+    try:
+        if request.method == 'POST':
+            datos = request.get_json(silent=True)
+            if not isinstance(datos, dict):
+                return jsonify({'error': 'Se esperaba un objeto JSON'}), 400
+            diseños = datos['diseños'] if 'diseños' in datos else [datos]
+        else:
+            diseños = [request.args.to_dict()]
+        
+        if not isinstance(diseños, list) or not diseños:
+            return jsonify({'error': 'No hay diseños que cotizar'}), 400
+        if len(diseños) > MAX_DISEÑOS_COTIZACION:
+            return jsonify({'error': f'Máximo {MAX_DISEÑOS_COTIZACION} diseños por petición'}), 400
+        
+        # Procesos activos y el primero de cada tipo
+        procesos = {p.id: p for p in catalog.procesos() if p.is_active}
+        por_tipo = {}
+        for proceso in procesos.values():
+            por_tipo.setdefault(proceso.get_tipo_enum(), proceso)
+        
+        validos = []
+        errores = []
+        for indice, diseño in enumerate(diseños):
+            try:
+                validos.append((indice, _leer_diseño(diseño, procesos, por_tipo)))
+            except ValueError as e:
+                errores.append({'indice': indice, 'error': str(e)})
+        
+        lineas = []
+        if validos:
+            # El setup del bordado se suma por línea (puede excluirse en cada una)
+            lote = pricing.cotizar_lote(
+                [d['tarifa'] for _, d in validos],
+                [d['ancho'] for _, d in validos],
+                [d['alto'] for _, d in validos],
+                [d['cantidad'] for _, d in validos],
+                [d['opcion'] for _, d in validos],
+                incluir_setup=False
+            )
+            for (indice, diseño), metros, precio in zip(validos, lote.metros, lote.precios):
+                lineas.append(_desglose_cotizacion(indice, diseño, float(metros), float(precio)))
+        
+        return jsonify({
+            'lineas': lineas,
+            'errores': errores,
+            'total': sum(linea['total'] for linea in lineas)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@procesos_bp.route('/api/reglas-precios')
+@login_required
+def api_reglas_precios():
+    """
+    Publica las reglas de precio de los procesos activos para que los
+    formularios de pedidos coticen en el navegador sin llamar a la API en cada
+    cambio. El paquete lleva su versión como ETag: el navegador lo guarda y
+    lo revalida con If-None-Match (304 si no cambió). Los precios se vuelven a
+    calcular en el servidor al guardar.
+    
+    Returns:
+        Response: JSON con la versión, las columnas y una fila por proceso
+    """
+    try:
+        paquete = catalog.reglas_precios()
+        if request.if_none_match.contains(paquete['version']):
+            respuesta = current_app.response_class(status=304)
+        else:
+            respuesta = jsonify(paquete)
+        respuesta.set_etag(paquete['version'])
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+        return respuesta
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@procesos_bp.route('/api/lotes')
+@login_required
+def api_lotes():
+    """
+    Lotes de producción propuestos: las personalizaciones de los pedidos
+    pendientes o en proceso agrupadas por proceso, opción (tamaño de bordado
+    o tipo de vinil) y fecha de entrega, por prioridad y fecha.
+    
+    Parámetros opcionales: ``limite`` (lotes, por defecto
+    PRODUCTION_BATCHES_LIMIT) y ``proceso_id``.
+    
+    Returns:
+        Response: JSON con los lotes y el total
+    """
+    try:
+        try:
+            limite = int(request.args.get('limite', current_app.config.get('PRODUCTION_BATCHES_LIMIT', 50)))
+        except ValueError:
+            return jsonify({'error': 'limite debe ser un número entero'}), 400
+        if limite <= 0:
+            return jsonify({'error': 'limite debe ser mayor que cero'}), 400
+        
+        tablero = production_batches.tablero(StorageService(), limite, request.args.get('proceso_id') or None)
+        return jsonify(tablero)
+    
+    except Exception as e:
+        current_app.logger.error(f"Error calculando los lotes de producción: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@procesos_bp.route('/api/pliegos')
+@login_required
+def api_pliegos():
+    """
+    Acomoda en rollo las personalizaciones DTF y sublimación de los pedidos
+    pendientes o en proceso, agrupando los diseños de todos los pedidos de
+    cada proceso, y devuelve el acomodo y los metros que usa frente a imprimir
+    cada diseño por separado.
+    
+    Parámetros opcionales: ``presupuesto_ms`` (tiempo de mejora, con máximo
+    NESTING_MAX_BUDGET_MS), ``margen`` (cm entre diseños), ``rotar`` (0/1) y
+    ``detalle=0`` para omitir las colocaciones.
+    
+    Returns:
+        Response: JSON con un rollo por proceso y el total de metros
+    """
+    try:
+        config = current_app.config
+        try:
+            presupuesto = float(request.args.get('presupuesto_ms', config.get('NESTING_BUDGET_MS', 500)))
+            margen = float(request.args.get('margen', config.get('NESTING_MARGIN_CM', 0.5)))
+        except ValueError:
+            return jsonify({'error': 'presupuesto_ms y margen deben ser números'}), 400
+        if presupuesto < 0 or margen < 0:
+            return jsonify({'error': 'presupuesto_ms y margen no pueden ser negativos'}), 400
+        presupuesto = min(presupuesto, config.get('NESTING_MAX_BUDGET_MS', 5000))
+        rotar = request.args.get('rotar', '1' if config.get('NESTING_ALLOW_ROTATION', True) else '0') != '0'
+        detalle = request.args.get('detalle', '1') != '0'
+        
+        planes = nesting.planificar_pendientes(StorageService(), presupuesto, margen, rotar)
+        
+        rollos = []
+        for plan in planes:
+            acomodo = plan.pop('acomodo')
+            rollo = dict(plan)
+            rollo.update({
+                'ancho_rollo': acomodo.ancho_rollo,
+                'largo_cm': acomodo.largo_cm,
+                'metros': acomodo.metros,
+                'aprovechamiento': acomodo.aprovechamiento,
+                'heuristica': acomodo.heuristica,
+                'intentos': acomodo.intentos,
+                'ms': acomodo.ms,
+                'sin_colocar': [
+                    {'personalizacion_id': p.ref[0], 'ancho': p.ancho, 'alto': p.alto}
+                    for p in acomodo.sin_colocar
+                ],
+            })
+            if detalle:
+                rollo['colocaciones'] = [
+                    {'personalizacion_id': c.ref[0], 'copia': c.ref[1], 'x': c.x, 'y': c.y,
+                     'ancho': c.ancho, 'alto': c.alto, 'rotada': c.rotada}
+                    for c in acomodo.colocaciones
+                ]
+            rollos.append(rollo)
+        
+        return jsonify({
+            'rollos': rollos,
+            'metros': round(sum(r['metros'] for r in rollos), 4),
+            'metros_sin_agrupar': round(sum(r['metros_sin_agrupar'] for r in rollos), 4),
+        })
+    
+    except Exception as e:
+        current_app.logger.error(f"Error al acomodar pliegos: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @procesos_bp.route('/<id>/eliminar', methods=['POST'])
 @login_required
 def eliminar(id):
@@ -254,33 +482,37 @@ def _obtener_formulario_configuracion(proceso):
     Returns:
         FlaskForm: Formulario correspondiente al tipo de proceso
     """
-    if proceso.tipo == TipoProceso.DTF:
+    tipo = proceso.get_tipo_enum()
+    # Los valores guardados solo se precargan al mostrar el formulario: en un
+    # POST pisarían los enviados
+    precargar = request.method == 'GET'
+    if tipo == TipoProceso.DTF:
         form = ConfiguracionDTFForm()
-        if hasattr(proceso, 'precio_por_metro'):
+        if precargar and hasattr(proceso, 'precio_por_metro'):
             form.precio_por_metro.data = proceso.precio_por_metro
     
-    elif proceso.tipo == TipoProceso.SUBLIMACION:
+    elif tipo == TipoProceso.SUBLIMACION:
         form = ConfiguracionSublimacionForm()
-        if hasattr(proceso, 'precio_por_metro'):
+        if precargar and hasattr(proceso, 'precio_por_metro'):
             form.precio_por_metro.data = proceso.precio_por_metro
     
-    elif proceso.tipo == TipoProceso.BORDADO:
+    elif tipo == TipoProceso.BORDADO:
         form = ConfiguracionBordadoForm()
-        if hasattr(proceso, 'precio_setup'):
+        if precargar and hasattr(proceso, 'precio_setup'):
             form.precio_setup.data = proceso.precio_setup
-        if hasattr(proceso, 'precios_por_tamaño'):
-            form.precio_pequeño.data = proceso.precios_por_tamaño.get(TamañoBordado.PEQUEÑO, 0.0)
-            form.precio_mediano.data = proceso.precios_por_tamaño.get(TamañoBordado.MEDIANO, 0.0)
-            form.precio_grande.data = proceso.precios_por_tamaño.get(TamañoBordado.GRANDE, 0.0)
-            form.precio_extra_grande.data = proceso.precios_por_tamaño.get(TamañoBordado.EXTRA_GRANDE, 0.0)
+        if precargar and hasattr(proceso, 'precios_por_tamaño'):
+            form.precio_pequeño.data = proceso.precios_por_tamaño.get(TamañoBordado.PEQUEÑO.value, 0.0)
+            form.precio_mediano.data = proceso.precios_por_tamaño.get(TamañoBordado.MEDIANO.value, 0.0)
+            form.precio_grande.data = proceso.precios_por_tamaño.get(TamañoBordado.GRANDE.value, 0.0)
+            form.precio_extra_grande.data = proceso.precios_por_tamaño.get(TamañoBordado.EXTRA_GRANDE.value, 0.0)
     
-    elif proceso.tipo == TipoProceso.VINIL:
+    elif tipo == TipoProceso.VINIL:
         form = ConfiguracionVinilForm()
-        if hasattr(proceso, 'precio_por_cm2'):
+        if precargar and hasattr(proceso, 'precio_por_cm2'):
             form.precio_por_cm2_base.data = proceso.precio_por_cm2
         
         # Cargar tipos de vinil existentes
-        if hasattr(proceso, 'tipos_vinil') and proceso.tipos_vinil:
+        if precargar and hasattr(proceso, 'tipos_vinil') and proceso.tipos_vinil:
             # Limpiar formulario
             while len(form.tipos_vinil) > 0:
                 form.tipos_vinil.pop_entry()
@@ -302,10 +534,14 @@ def _actualizar_configuracion_proceso(proceso, form):
         proceso (Proceso): El proceso a actualizar
         form (FlaskForm): Formulario con los datos de configuración
     """
-    if proceso.tipo == TipoProceso.DTF or proceso.tipo == TipoProceso.SUBLIMACION:
+    # El tipo se guarda como texto: comparar con el enum. configurar_precios
+    # sube la config_version, con lo que al guardar el proceso las tarifas
+    # compiladas de la versión anterior dejan de usarse
+    tipo = proceso.get_tipo_enum()
+    if tipo == TipoProceso.DTF or tipo == TipoProceso.SUBLIMACION:
         proceso.configurar_precios(precio_por_metro=form.precio_por_metro.data)
     
-    elif proceso.tipo == TipoProceso.BORDADO:
+    elif tipo == TipoProceso.BORDADO:
         precios_tamaños = {
             TamañoBordado.PEQUEÑO: form.precio_pequeño.data,
             TamañoBordado.MEDIANO: form.precio_mediano.data,
@@ -317,7 +553,7 @@ def _actualizar_configuracion_proceso(proceso, form):
             precios_tamaños=precios_tamaños
         )
     
-    elif proceso.tipo == TipoProceso.VINIL:
+    elif tipo == TipoProceso.VINIL:
         tipos_vinil = {}
         for tipo_form in form.tipos_vinil:
             if tipo_form.nombre.data and tipo_form.precio_por_cm2.data:
@@ -425,31 +661,46 @@ def _calcular_precio_proceso_fijo(form):
     
     Returns:
         dict: Resultado del cálculo con proceso, cantidad, precios y detalles
+        (memorizado entre workers por proceso, versión y medidas)
     """
     proceso_id = form.proceso_id.data
     cantidad = form.cantidad.data
     ancho_diseño = form.ancho_diseño.data or 0.0
     alto_diseño = form.alto_diseño.data or 0.0
     
-    # Configuración de procesos fijos con precios actualizados
-    if proceso_id == 'dtf':
-        nombre_proceso = 'DTF - Transferencia Digital'
-        tipo_proceso = 'DTF'
-        ancho_disponible = 27.5  # cm - ancho fijo para DTF
-        precio_por_metro = 120.0  # MXN por metro
-        
-    elif proceso_id == 'sublimacion':
-        nombre_proceso = 'Sublimación - Impresión Térmica'
-        tipo_proceso = 'SUBLIMACION'
-        ancho_disponible = 60.0  # cm - ancho fijo para Sublimación
-        precio_por_metro = 90.0  # MXN por metro
-        
-    else:
+    configuracion = PROCESOS_FIJOS.get(proceso_id)
+    if configuracion is None:
         return None
-    
+        
     # Validar que se hayan proporcionado las dimensiones
     if not ancho_diseño or not alto_diseño:
         return None
+        
+    storage = StorageService()
+    campo = storage.quote_cache().field(VERSION_PROCESOS_FIJOS, ancho_diseño, alto_diseño, cantidad)
+    return storage.cached_quote(
+        f'fijo:{proceso_id}', campo,
+        lambda: _cotizar_proceso_fijo(configuracion, ancho_diseño, alto_diseño, cantidad)
+    )
+    
+    
+def _cotizar_proceso_fijo(configuracion, ancho_diseño, alto_diseño, cantidad):
+    """
+    Cotiza un diseño con un proceso fijo.
+    
+    Args:
+        configuracion (dict): Entrada de PROCESOS_FIJOS
+        ancho_diseño (float): Ancho del diseño en cm
+        alto_diseño (float): Alto del diseño en cm
+        cantidad (int): Piezas solicitadas
+    
+    Returns:
+        dict: Resultado del cálculo con proceso, cantidad, precios y detalles
+    """
+    nombre_proceso = configuracion['nombre_proceso']
+    tipo_proceso = configuracion['tipo_proceso']
+    ancho_disponible = configuracion['ancho_disponible']
+    precio_por_metro = configuracion['precio_por_metro']
     
     # Calcular cuántos diseños caben en el ancho disponible
     diseños_por_ancho = int(ancho_disponible // ancho_diseño)
@@ -496,3 +747,138 @@ def _calcular_precio_proceso_fijo(form):
             'piezas_solicitadas': cantidad
         }
     }
+
+
+def _numero_positivo(diseño, campo, tipo=float):
+    """Lee un número mayor que cero de un diseño (ValueError si no lo es)."""
+    try:
+        valor = tipo(diseño.get(campo))
+    except (TypeError, ValueError):
+        raise ValueError(f'{campo} debe ser un número')
+    if not valor > 0:
+        raise ValueError(f'{campo} debe ser mayor que 0')
+    return valor
+
+
+def _leer_diseño(diseño, procesos, por_tipo):
+    """
+    Valida un diseño de la API de cotización.
+    
+    Args:
+        diseño (dict): Diseño tal como llega en la petición
+        procesos (dict): Procesos activos por id
+        por_tipo (dict): Proceso activo de cada TipoProceso
+    
+    Returns:
+        dict: Proceso, tarifa, medidas, cantidad, opción e incluir_setup
+    
+    Raises:
+        ValueError: Con el motivo si el diseño no se puede cotizar
+    """
+    if not isinstance(diseño, dict):
+        raise ValueError('Cada diseño debe ser un objeto')
+    
+    if diseño.get('proceso_id'):
+        proceso = procesos.get(diseño['proceso_id'])
+        if proceso is None:
+            raise ValueError('Proceso no encontrado o inactivo')
+    else:
+        try:
+            tipo = TipoProceso(str(diseño.get('tipo', '')).upper())
+        except ValueError:
+            raise ValueError('Indica proceso_id o un tipo válido (DTF, SUBLIMACION, BORDADO, VINIL)')
+        proceso = por_tipo.get(tipo)
+        if proceso is None:
+            raise ValueError(f'No hay ningún proceso activo de tipo {tipo.value}')
+    
+    tarifa = pricing.tarifas.obtener(proceso)
+    cantidad = _numero_positivo(diseño, 'cantidad', int)
+    ancho = alto = 0.0
+    opcion = None
+    
+    if tarifa.tipo in (TipoProceso.DTF, TipoProceso.SUBLIMACION, TipoProceso.VINIL):
+        ancho = _numero_positivo(diseño, 'ancho')
+        alto = _numero_positivo(diseño, 'alto')
+    
+    if tarifa.tipo == TipoProceso.BORDADO:
+        opcion = str(diseño.get('tamaño_bordado') or '').upper()
+        if opcion not in tarifa.precios_por_tamaño:
+            tamaños = ', '.join(t.value for t in TamañoBordado)
+            raise ValueError(f'tamaño_bordado debe ser uno de: {tamaños}')
+    
+    elif tarifa.tipo == TipoProceso.VINIL:
+        opcion = diseño.get('tipo_vinil') or None
+        if opcion is not None and opcion not in tarifa.tipos_vinil:
+            raise ValueError(f'Tipo de vinil desconocido: {opcion}')
+    
+    incluir_setup = diseño.get('incluir_setup', True)
+    if isinstance(incluir_setup, str):
+        incluir_setup = incluir_setup.lower() not in ('false', '0', 'no', '')
+    
+    return {
+        'proceso': proceso,
+        'tarifa': tarifa,
+        'ancho': ancho,
+        'alto': alto,
+        'cantidad': cantidad,
+        'opcion': opcion,
+        'incluir_setup': bool(incluir_setup)
+    }
+
+
+def _desglose_cotizacion(indice, diseño, metros, precio):
+    """
+    Compone la línea de la API de cotización (mismas claves que la calculadora).
+    
+    Args:
+        indice (int): Posición del diseño en la petición
+        diseño (dict): Diseño validado por _leer_diseño
+        metros (float): Metros de material del diseño
+        precio (float): Precio del diseño sin setup
+    
+    Returns:
+        dict: Proceso, medidas, precios y detalles del cálculo
+    """
+    tarifa = diseño['tarifa']
+    cantidad = diseño['cantidad']
+    
+    if tarifa.tipo in (TipoProceso.DTF, TipoProceso.SUBLIMACION):
+        diseños_por_ancho = max(int(tarifa.ancho_disponible // diseño['ancho']), 1)
+        detalles = {
+            'metros_necesarios': metros,
+            'precio_por_metro': tarifa.precio_por_metro,
+            'ancho_disponible': tarifa.ancho_disponible,
+            'diseños_por_ancho': diseños_por_ancho,
+            'filas': -(-cantidad // diseños_por_ancho)
+        }
+    elif tarifa.tipo == TipoProceso.BORDADO:
+        detalles = {
+            'tamaño_bordado': diseño['opcion'],
+            'precio_por_tamaño': tarifa.precio_unitario(diseño['opcion']),
+            'precio_setup': tarifa.precio_setup
+        }
+    elif tarifa.tipo == TipoProceso.VINIL:
+        detalles = {
+            'area_cm2': diseño['ancho'] * diseño['alto'],
+            'tipo_vinil': diseño['opcion'],
+            'precio_por_cm2': tarifa.precio_unitario(diseño['opcion'])
+        }
+    else:
+        detalles = {}
+    
+    costo_setup = tarifa.precio_setup if tarifa.tipo == TipoProceso.BORDADO and diseño['incluir_setup'] else 0.0
+    
+    return {
+        'indice': indice,
+        'proceso_id': diseño['proceso'].id,
+        'nombre_proceso': diseño['proceso'].nombre,
+        'tipo_proceso': tarifa.tipo.value if tarifa.tipo else None,
+        'ancho': diseño['ancho'],
+        'alto': diseño['alto'],
+        'cantidad': cantidad,
+        'precio_unitario': precio / cantidad,
+        'subtotal': precio,
+        'costo_setup': costo_setup or None,
+        'total': precio + costo_setup,
+        'detalles': detalles
+    }
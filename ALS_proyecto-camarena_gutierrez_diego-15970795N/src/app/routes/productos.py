@@ -2,11 +2,12 @@
 Rutas para gestión de productos (prendas).
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required
 from app.forms.producto_forms import ProductoForm, BuscarProductoForm
 from app.models.producto import Producto
 from app.models.pedido import ItemPedido
+from app.services import repricing
 from app.services.storage_service import StorageService
 
 productos_bp = Blueprint('productos', __name__)
@@ -168,6 +169,7 @@ def editar(id):
             # Actualizar datos del producto
             producto.nombre = form.nombre.data
             producto.categoria = form.categoria.data
+            precio_anterior = producto.precio_base
             producto.precio_base = form.precio_base.data
             producto.descripcion = form.descripcion.data or ""
             producto.tallas_disponibles = form.tallas_disponibles.processed_data
@@ -176,6 +178,10 @@ def editar(id):
               # Guardar cambios
             storage.save(producto)
             flash(f'Producto "{producto.nombre}" actualizado exitosamente.', 'success')
+            # Los pedidos abiertos se reprecian en segundo plano
+            if producto.precio_base != precio_anterior and current_app.config.get('REPRICING_ENABLED', True):
+                trabajo_id = repricing.encolar(storage, repricing.PRODUCTO, producto.id)
+                flash(f'Los pedidos abiertos se están repreciando (trabajo {trabajo_id[:8]}).', 'info')
             return redirect(url_for('productos.ver', id=id))
         
         return render_template('productos/form.html',
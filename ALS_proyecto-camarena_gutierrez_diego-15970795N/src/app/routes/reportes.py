@@ -5,18 +5,28 @@ from app.services.storage_service import StorageService
 from app.models.pedido import Pedido
 
 reportes_bp = Blueprint('reportes', __name__, url_prefix='/reportes')
-storage = StorageService()
+# Los reportes solo leen y toleran cierto desfase: pueden servirse de réplicas
+storage = StorageService(stale_ok=True)
 
 @reportes_bp.route('/utilidad')
 @login_required
 def analisis_utilidad():
     """Página de análisis de utilidad"""
     
-    # Obtener estadísticas de utilidad    stats = calcular_estadisticas_utilidad()
+    # Obtener estadísticas de utilidad
+    stats = calcular_estadisticas_utilidad()
     
     return render_template('reportes/utilidad.html', stats=stats)
 
 def calcular_estadisticas_utilidad():
+    """
+    Calcula estadísticas de utilidad basadas en los pedidos existentes.
+    Se calculan una sola vez aunque las pidan a la vez varias peticiones
+    (de este worker o de otros) y hasta que cambie algún pedido.
+    """
+    return storage.coalesce('reportes:utilidad', _calcular_estadisticas_utilidad, depende_de=(Pedido,))
+
+def _calcular_estadisticas_utilidad():
     """
     Calcula estadísticas de utilidad basadas en los pedidos existentes
     """
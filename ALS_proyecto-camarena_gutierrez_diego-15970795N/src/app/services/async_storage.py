@@ -0,0 +1,412 @@
+"""
+Lecturas asíncronas del almacenamiento (redis.asyncio) para las vistas async.
+
+``AsyncStorageService`` lee los mismos datos que ``StorageService`` con la
+misma ubicación: anillo de nodos, directorio de ids, índices secundarios,
+prefijo del tenant, circuit breaker de cada endpoint y caché de objetos. Solo
+cubre lecturas; las escrituras siguen pasando por ``StorageService``.
+
+Cada operación sobre varios nodos o varias claves lanza sus comandos a la vez
+(``asyncio.gather``), y una vista puede lanzar varias operaciones
+independientes a la vez.
+
+Flask ejecuta cada vista async en su propio bucle de eventos, así que los
+clientes se crean por instancia y se cierran al salir::
+
+    async with AsyncStorageService(stale_ok=True) as storage:
+        producto, procesos = await asyncio.gather(
+            storage.get(Producto, producto_id), storage.find_all(Proceso)
+        )
+"""
+
+import asyncio
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+
+import redis.asyncio as aioredis
+from flask import current_app
+from sirope.oid import OID
+from sirope.utils import full_name_from_obj
+
+from app.services import replicas, sharding, tenancy
+from app.services.circuit_breaker import ERRORES_CONEXION, RedisUnavailableError, get_breaker
+from app.services.storage_service import StorageService, normalizar_valor_indice
+
+
+# Turno de réplicas de las lecturas asíncronas
+_turno_replicas = itertools.count()
+
+
+def _nombre(endpoint: Tuple[str, int, int]) -> str:
+    """Nombre de un endpoint, el mismo que su breaker y su nodo en el anillo."""
+    host, puerto, db = endpoint
+    return f"{host}:{puerto}/{db}"
+
+
+class AsyncStorageService:
+    """
+    Versión asíncrona de las lecturas de StorageService.
+    """
+    
+    def __init__(self, stale_ok: bool = False):
+        """
+        Inicializar el servicio.
+        
+        Args:
+            stale_ok: Si las lecturas del nodo principal pueden servirse desde
+                una réplica (como en StorageService)
+        """
+        self.stale_ok = stale_ok
+        self._clientes: Dict[str, aioredis.Redis] = {}
+        self._replica: Optional[Tuple[str, int, int]] = None
+        self._replica_elegida = False
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def close(self):
+        """Cerrar las conexiones abiertas por esta instancia."""
+        clientes, self._clientes = list(self._clientes.values()), {}
+        for cliente in clientes:
+            try:
+                await cliente.close()
+            except Exception:
+                pass
+    
+    # ------------------------------------------------------------------
+    # Nodos y comandos
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _endpoints() -> Dict[str, Tuple[str, int, int]]:
+        """Nodos en el mismo orden que ``StorageService._nodos``: nombre -> endpoint."""
+        config = current_app.config
+        if config.get('USE_REDIS', True):
+            principal = (config.get('REDIS_HOST', 'localhost'), config.get('REDIS_PORT', 6379),
+                         config.get('REDIS_DB', 0))
+        else:
+            principal = ('localhost', 6379, 0)
+        endpoints = {_nombre(principal): principal}
+        if config.get('USE_REDIS', True):
+            for endpoint in replicas.parse_endpoints(config.get('REDIS_SHARDS', ''), config.get('REDIS_DB', 0)):
+                endpoints.setdefault(_nombre(endpoint), endpoint)
+        return endpoints
+    
+    def _nodo_principal(self) -> str:
+        return next(iter(self._endpoints()))
+    
+    def _anillo(self) -> sharding.HashRing:
+        return sharding.get_ring(list(self._endpoints()))
+    
+    def _cliente(self, endpoint: Tuple[str, int, int]) -> aioredis.Redis:
+        """Cliente asíncrono de un endpoint (uno por instancia y endpoint)."""
+        nombre = _nombre(endpoint)
+        cliente = self._clientes.get(nombre)
+        if cliente is None:
+            config = current_app.config
+            host, puerto, db = endpoint
+            cliente = aioredis.Redis(
+                host=host, port=puerto, db=db,
+                socket_timeout=config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+                socket_connect_timeout=config.get('REDIS_CONNECT_TIMEOUT', 0.25)
+            )
+            self._clientes[nombre] = cliente
+        return cliente
+    
+    def _replica_lectura(self) -> Optional[Tuple[str, int, int]]:
+        """Réplica para las lecturas del nodo principal de esta instancia, o None."""
+        if not self._replica_elegida:
+            self._replica_elegida = True
+            config = current_app.config
+            endpoints = replicas.parse_endpoints(config.get('REDIS_REPLICAS', ''), config.get('REDIS_DB', 0))
+            if self.stale_ok and endpoints and config.get('USE_REDIS', True):
+                if replicas.escritura_reciente(config.get('REDIS_READ_YOUR_WRITES_WINDOW', 5.0)):
+                    replicas.router.record('read_your_writes')
+                else:
+                    self._replica = endpoints[next(_turno_replicas) % len(endpoints)]
+        return self._replica
+    
+    @staticmethod
+    async def _protegido(endpoint: Tuple[str, int, int], corrutina):
+        """Esperar una corrutina de Redis a través del breaker del endpoint."""
+        config = current_app.config
+        breaker = get_breaker(
+            _nombre(endpoint),
+            config.get('REDIS_BREAKER_FAILURE_THRESHOLD', 5),
+            config.get('REDIS_BREAKER_RESET_TIMEOUT', 10.0)
+        )
+        try:
+            sondeo = breaker.acquire()
+        except RedisUnavailableError:
+            corrutina.close()
+            raise
+        try:
+            resultado = await corrutina
+        except ERRORES_CONEXION as e:
+            breaker.record_failure(e)
+            raise
+        except Exception:
+            # Redis respondió (error de comando): el circuito puede cerrarse
+            breaker.record_success()
+            raise
+        else:
+            breaker.record_success()
+        finally:
+            # También si se cancela la tarea mientras sondea
+            if sondeo:
+                breaker.release_probe()
+        return resultado
+    
+    async def _ejecutar(self, nodo: str, tenant: Optional[str], comandos: List[tuple]) -> List[Any]:
+        """
+        Ejecutar comandos de lectura en un nodo (en un solo pipeline si son
+        varios), con las claves en el espacio del tenant. Las lecturas del nodo
+        principal pueden ir a una réplica y, si falla, se repiten en el primario.
+        
+        Args:
+            nodo: Nombre del nodo
+            tenant: Tenant cuyo espacio de claves se lee
+            comandos: Comandos como tuplas (nombre, clave, argumentos...)
+        
+        Returns:
+            List[Any]: Resultado de cada comando
+        """
+        prefijo = tenancy.prefijo(tenant)
+        comandos = [tenancy.prefijar_comando(prefijo, c) if prefijo else c for c in comandos]
+        
+        async def en(endpoint):
+            cliente = self._cliente(endpoint)
+            if len(comandos) == 1:
+                return [await self._protegido(endpoint, cliente.execute_command(*comandos[0]))]
+            pipe = cliente.pipeline(transaction=False)
+            for comando in comandos:
+                pipe.execute_command(*comando)
+            return await self._protegido(endpoint, pipe.execute())
+        
+        replica = self._replica_lectura() if nodo == self._nodo_principal() else None
+        if replica is not None:
+            try:
+                resultado = await en(replica)
+                replicas.router.record('replica_reads')
+                return resultado
+            except ERRORES_CONEXION as e:
+                replicas.router.record('fallbacks')
+                current_app.logger.warning(f"Réplica {_nombre(replica)} no disponible, leyendo del primario: {e}")
+        elif self.stale_ok:
+            replicas.router.record('primary_reads')
+        return await en(self._endpoints()[nodo])
+    
+    async def _en_todos(self, tenant: Optional[str], comandos: List[tuple]) -> List[List[Any]]:
+        """Ejecutar los mismos comandos en todos los nodos a la vez."""
+        return list(await asyncio.gather(*(self._ejecutar(nodo, tenant, comandos) for nodo in self._endpoints())))
+    
+    async def command_for(self, class_type: Type, shard_value: Any, *comando) -> Any:
+        """
+        Ejecutar un comando de lectura en el nodo de una clave de shard, en el
+        espacio del tenant de la clase (como ``StorageService.client_for``).
+        
+        Args:
+            class_type: Clase de los objetos (decide el tenant)
+            shard_value: Clave de shard (p. ej. el id del pedido)
+            *comando: Comando y argumentos (p. ej. 'HGETALL', clave)
+        
+        Returns:
+            Any: Respuesta del comando
+        """
+        nodo = self._anillo().node_for(str(shard_value))
+        return (await self._ejecutar(nodo, StorageService._tenant_de(class_type), [comando]))[0]
+    
+    # ------------------------------------------------------------------
+    # Objetos
+    # ------------------------------------------------------------------
+    
+    def _ubicacion(self, texto) -> Tuple[OID, str]:
+        """Interpretar un valor del directorio como (OID, nodo)."""
+        if isinstance(texto, bytes):
+            texto = texto.decode('utf-8')
+        texto_oid, _, nodo = texto.partition('|')
+        return OID.from_text(texto_oid), nodo or self._nodo_principal()
+    
+    @staticmethod
+    def _objeto(class_type: Type, raw) -> Any:
+        from app.models.base_model import BaseModel
+        obj = StorageService._obj_from_json(class_type, raw)
+        if isinstance(obj, BaseModel):
+            obj.restore_enums_after_loading()
+        return obj
+    
+    async def _directorio(self, ids: List[str], tenant: Optional[str]) -> Dict[str, Tuple[OID, str]]:
+        """Resolver ids a (OID, nodo): HMGET por nodo de directorio y, para los
+        que falten (rebalanceo en curso), en el resto de nodos."""
+        por_nodo: Dict[str, List[str]] = {}
+        for obj_id in ids:
+            por_nodo.setdefault(self._anillo().node_for(obj_id), []).append(obj_id)
+        nodos = list(por_nodo)
+        respuestas = await asyncio.gather(*(
+            self._ejecutar(nodo, tenant, [('HMGET', StorageService.IDS_KEY, *por_nodo[nodo])]) for nodo in nodos
+        ))
+        ubicaciones = {}
+        for nodo, (valores,) in zip(nodos, respuestas):
+            for obj_id, texto in zip(por_nodo[nodo], valores):
+                if texto:
+                    ubicaciones[obj_id] = self._ubicacion(texto)
+        
+        faltan = [obj_id for obj_id in ids if obj_id not in ubicaciones]
+        if faltan and len(self._endpoints()) > 1:
+            for (valores,) in await self._en_todos(tenant, [('HMGET', StorageService.IDS_KEY, *faltan)]):
+                for obj_id, texto in zip(faltan, valores):
+                    if texto and obj_id not in ubicaciones:
+                        ubicaciones[obj_id] = self._ubicacion(texto)
+        return ubicaciones
+    
+    async def load_many(self, ids: Iterable[str], class_type: Type) -> Dict[str, Any]:
+        """
+        Cargar varios objetos de una clase por id: caché, directorio y un
+        pipeline por nodo, con los nodos consultados a la vez.
+        
+        Args:
+            ids: Ids de los objetos
+            class_type: Clase de los objetos (los de otra clase se descartan)
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto, solo los encontrados
+        """
+        ids = list(dict.fromkeys(str(i) for i in ids if i))
+        if not ids:
+            return {}
+        tenant = StorageService._tenant_de(class_type)
+        prefijo = tenancy.prefijo(tenant)
+        cache = StorageService.cache()
+        
+        objetos = {}
+        for obj_id in ids:
+            cacheado = cache.get(prefijo + obj_id)
+            if cacheado is not None and cacheado[0] is class_type:
+                objetos[obj_id] = self._objeto(*cacheado)
+        pendientes = [obj_id for obj_id in ids if obj_id not in objetos]
+        tenancy.usage.record(tenant, 'reads', len(ids))
+        if not pendientes:
+            return objetos
+        
+        ns = full_name_from_obj(class_type)
+        por_nodo: Dict[str, List[Tuple[str, int]]] = {}
+        directorio = await self._directorio(pendientes, tenant)
+        for obj_id, (oid, nodo) in directorio.items():
+            if oid.namespace == ns:
+                por_nodo.setdefault(nodo, []).append((obj_id, oid.num))
+        
+        token = cache.token()
+        cacheable = cache.caches_class(class_type.__name__) and not self._replica_lectura()
+        nodos = list(por_nodo)
+        respuestas = await asyncio.gather(*(
+            self._ejecutar(nodo, tenant, [('HMGET', ns, *[num for _, num in por_nodo[nodo]])]) for nodo in nodos
+        ))
+        for nodo, (valores,) in zip(nodos, respuestas):
+            for (obj_id, _), raw in zip(por_nodo[nodo], valores):
+                if not raw:
+                    continue
+                objetos[obj_id] = self._objeto(class_type, raw)
+                if cacheable:
+                    cache.record_miss(class_type.__name__)
+                    cache.put(prefijo + obj_id, class_type, raw, token)
+        
+        sin_entrada = [obj_id for obj_id in pendientes if obj_id not in directorio]
+        if sin_entrada:
+            # Objetos guardados antes de existir el directorio: se buscan
+            # recorriendo la clase y se completa su entrada (con escrituras,
+            # así que lo hace StorageService, fuera del bucle de eventos)
+            objetos.update(await asyncio.to_thread(
+                StorageService()._buscar_sin_directorio, sin_entrada, tenant, class_type
+            ))
+        return objetos
+    
+    async def get(self, class_type: Type, obj_id: str) -> Any:
+        """
+        Obtener un objeto por su id.
+        
+        Args:
+            class_type: Clase del objeto
+            obj_id: Id del objeto
+        
+        Returns:
+            Any: Objeto o None si no existe (o es de otra clase)
+        """
+        if not obj_id:
+            return None
+        return (await self.load_many([obj_id], class_type)).get(str(obj_id))
+    
+    async def find_all(self, class_type: Type) -> List[Any]:
+        """
+        Todos los objetos de una clase (HVALS en todos los nodos a la vez).
+        
+        Args:
+            class_type: Clase a recorrer
+        
+        Returns:
+            List[Any]: Objetos encontrados
+        """
+        tenant = StorageService._tenant_de(class_type)
+        partes = await self._en_todos(tenant, [('HVALS', full_name_from_obj(class_type))])
+        objetos = StorageService._unir([[self._objeto(class_type, raw) for raw in valores] for (valores,) in partes])
+        tenancy.usage.record(tenant, 'scans')
+        tenancy.usage.record(tenant, 'objects_loaded', len(objetos))
+        return objetos
+    
+    async def find_by_condition(self, class_type: Type, condition) -> List[Any]:
+        """
+        Objetos de una clase que cumplen una condición (recorre la clase).
+        
+        Args:
+            class_type: Clase a recorrer
+            condition: Función de condición
+        
+        Returns:
+            List[Any]: Objetos que la cumplen
+        """
+        return [obj for obj in await self.find_all(class_type) if condition(obj)]
+    
+    async def find_by(self, class_type: Type, **criterios) -> List[Any]:
+        """
+        Objetos cuyos campos son iguales a los valores dados. Si todos los
+        campos están indexados y el índice está completo se intersecan los
+        índices en cada nodo; si no, se recorre la clase.
+        
+        Args:
+            class_type: Clase consultada
+            **criterios: Campo -> valor
+        
+        Returns:
+            List[Any]: Objetos que cumplen todos los criterios
+        """
+        tenant = StorageService._tenant_de(class_type)
+        ns = full_name_from_obj(class_type)
+        indexados = getattr(class_type, 'INDEXED_FIELDS', ())
+        almacen = StorageService()
+        
+        if criterios and all(campo in indexados for campo in criterios):
+            listos = await self._en_todos(tenant, [('EXISTS', almacen._index_ready_key(ns)), ('EXISTS', ns)])
+            # Un nodo sin objetos de la clase cuenta como indexado
+            if all(listo or not hay for (listo, hay) in listos):
+                claves = [almacen.index_key(class_type, campo, valor) for campo, valor in criterios.items()]
+                nodos = list(self._endpoints())
+                miembros = await asyncio.gather(*(self._ejecutar(nodo, tenant, [('SINTER', *claves)]) for nodo in nodos))
+                nums = {nodo: sorted(int(n) for n in conjunto) for nodo, (conjunto,) in zip(nodos, miembros)}
+                respuestas = await asyncio.gather(*(
+                    self._ejecutar(nodo, tenant, [('HMGET', ns, *nums[nodo])]) for nodo in nodos if nums[nodo]
+                ))
+                objetos = StorageService._unir([
+                    [self._objeto(class_type, raw) for raw in valores if raw] for (valores,) in respuestas
+                ])
+                tenancy.usage.record(tenant, 'index_queries')
+                tenancy.usage.record(tenant, 'objects_loaded', len(objetos))
+                return objetos
+        
+        buscados = {campo: normalizar_valor_indice(valor) for campo, valor in criterios.items()}
+        return await self.find_by_condition(
+            class_type,
+            lambda obj: all(normalizar_valor_indice(getattr(obj, campo, None)) == valor
+                            for campo, valor in buscados.items())
+        )
@@ -0,0 +1,214 @@
+"""
+Caché de objetos en memoria, compartida por todo el proceso.
+
+Guarda el JSON de los objetos de las clases configuradas (datos de referencia
+como Producto y Proceso) para servir ``load``/``get`` sin ir a Redis. Cada
+clase tiene su propio límite de entradas (LRU) y su TTL; las escrituras
+invalidan la entrada correspondiente, también en otros workers a través de
+app.services.invalidation.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class _ClaseCache:
+    """Entradas y contadores de una clase cacheada."""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entradas: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de la clase."""
+        consultas = self.hits + self.misses
+        return {
+            'size': len(self.entradas),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / consultas, 4) if consultas else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
+
+
+class ObjectCache:
+    """
+    Caché LRU con TTL configurable por clase.
+    Es segura entre hilos: todas las operaciones se hacen bajo un lock.
+    """
+    
+    def __init__(self):
+        """Inicializar caché vacía y sin configurar."""
+        self._lock = threading.RLock()
+        self._clases: Dict[str, _ClaseCache] = {}
+        self._ubicacion: Dict[str, str] = {}  # id de objeto -> nombre de clase
+        self._version = 0  # Aumenta con cada invalidación
+        self.configured = False
+        self.enabled = True
+        self.suspended = False
+    
+    def configure(self, clases: Dict[str, Dict[str, Any]], enabled: bool = True):
+        """
+        Configurar las clases cacheadas.
+        
+        Args:
+            clases: Nombre de clase -> {'ttl': segundos, 'max_entries': n}
+            enabled: Si la caché está activa
+        """
+        with self._lock:
+            self.enabled = enabled
+            self._clases = {
+                nombre: _ClaseCache(float(opciones.get('ttl', 300)), int(opciones.get('max_entries', 1000)))
+                for nombre, opciones in (clases or {}).items()
+            }
+            self._ubicacion.clear()
+            self.configured = True
+    
+    def caches_class(self, nombre_clase: str) -> bool:
+        """Indicar si una clase está configurada para cachearse."""
+        return self.enabled and nombre_clase in self._clases
+    
+    def suspend(self):
+        """Dejar de servir y de admitir entradas (p. ej. sin listener de invalidación)."""
+        self.suspended = True
+    
+    def resume(self):
+        """Volver a servir desde la caché."""
+        self.suspended = False
+    
+    def token(self) -> int:
+        """
+        Obtener una marca para detectar invalidaciones concurrentes.
+        Se toma antes de leer de Redis y se pasa a ``put``; si entre medias hubo
+        una invalidación, el valor leído puede estar obsoleto y no se cachea.
+        
+        Returns:
+            int: Versión actual de la caché
+        """
+        return self._version
+    
+    def get(self, obj_id: str) -> Optional[tuple]:
+        """
+        Obtener una entrada cacheada.
+        
+        Args:
+            obj_id: Id del objeto
+        
+        Returns:
+            Optional[tuple]: (clase, json) o None si no está o ha caducado
+        """
+        if not self.enabled or self.suspended:
+            return None
+        with self._lock:
+            nombre = self._ubicacion.get(obj_id)
+            if nombre is None:
+                return None
+            clase = self._clases[nombre]
+            entrada = clase.entradas.get(obj_id)
+            if entrada is None:
+                self._ubicacion.pop(obj_id, None)
+                return None
+            class_type, raw, expira = entrada
+            if expira < time.monotonic():
+                # El fallo se contabiliza con record_miss al leer de Redis
+                del clase.entradas[obj_id]
+                self._ubicacion.pop(obj_id, None)
+                clase.expirations += 1
+                return None
+            clase.entradas.move_to_end(obj_id)
+            clase.hits += 1
+            return class_type, raw
+    
+    def record_miss(self, nombre_clase: str):
+        """Contabilizar un fallo de una clase cacheada que hubo que leer de Redis."""
+        with self._lock:
+            clase = self._clases.get(nombre_clase)
+            if clase is not None:
+                clase.misses += 1
+    
+    def put(self, obj_id: str, class_type: type, raw: Any, token: Optional[int] = None):
+        """
+        Guardar el JSON de un objeto en la caché de su clase.
+        
+        Args:
+            obj_id: Id del objeto
+            class_type: Clase del objeto
+            raw: JSON tal como está en Redis
+            token: Marca obtenida con ``token()`` antes de leer el valor
+        """
+        nombre = class_type.__name__
+        if not self.caches_class(nombre) or not obj_id or self.suspended:
+            return
+        with self._lock:
+            if token is not None and token != self._version:
+                return
+            clase = self._clases[nombre]
+            clase.entradas[obj_id] = (class_type, raw, time.monotonic() + clase.ttl)
+            clase.entradas.move_to_end(obj_id)
+            self._ubicacion[obj_id] = nombre
+            while len(clase.entradas) > clase.max_entries:
+                expulsado, _ = clase.entradas.popitem(last=False)
+                self._ubicacion.pop(expulsado, None)
+                clase.evictions += 1
+    
+    def invalidate(self, obj_id: str):
+        """
+        Eliminar un objeto de la caché (tras save/delete).
+        
+        Args:
+            obj_id: Id del objeto
+        """
+        with self._lock:
+            self._version += 1
+            nombre = self._ubicacion.pop(obj_id, None)
+            if nombre is not None:
+                clase = self._clases[nombre]
+                if clase.entradas.pop(obj_id, None) is not None:
+                    clase.invalidations += 1
+    
+    def clear(self):
+        """Vaciar la caché completa manteniendo la configuración y los contadores."""
+        with self._lock:
+            self._version += 1
+            for clase in self._clases.values():
+                clase.invalidations += len(clase.entradas)
+                clase.entradas.clear()
+            self._ubicacion.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Obtener contadores globales y por clase.
+        
+        Returns:
+            Dict[str, Any]: Tamaño, aciertos, ratio y expulsiones
+        """
+        with self._lock:
+            por_clase = {nombre: clase.stats() for nombre, clase in self._clases.items()}
+        hits = sum(c['hits'] for c in por_clase.values())
+        misses = sum(c['misses'] for c in por_clase.values())
+        return {
+            'enabled': self.enabled,
+            'suspended': self.suspended,
+            'size': sum(c['size'] for c in por_clase.values()),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'evictions': sum(c['evictions'] for c in por_clase.values()),
+            'clases': por_clase,
+        }
+
+
+# Instancia única por proceso: las rutas crean StorageService() en cada petición
+object_cache = ObjectCache()
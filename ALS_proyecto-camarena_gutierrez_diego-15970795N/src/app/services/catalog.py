@@ -0,0 +1,265 @@
+"""
+Catálogo de referencia: productos y procesos en memoria del proceso.
+
+Los productos y procesos son pocos, casi estáticos y los necesitan todos los
+formularios de pedidos. El catálogo los guarda como el JSON de Sirope (una
+cadena por objeto) en estructuras inmutables (``MappingProxyType`` y tuplas)
+que nunca se modifican: un cambio sustituye la instantánea entera. Cada
+llamada recibe objetos propios, decodificados en ese momento.
+
+Con ``preload_app`` de gunicorn (GUNICORN_PRELOAD=true) el catálogo se carga en
+el master antes del fork y los workers comparten esas páginas en
+copy-on-write. Sin precarga, cada worker lo carga en el primer uso.
+
+La versión del catálogo es la generación de Producto y Proceso (ver
+``query_cache``), que sube con cada save/delete. Se comprueba una vez por
+petición (un HMGET) y, si cambió, el worker recarga su copia.
+"""
+
+import json
+import threading
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+from flask import g, has_request_context
+
+from app.services import query_cache, tenancy
+
+
+class _Instantanea(NamedTuple):
+    """Catálogo de un tenant en una versión concreta (inmutable)."""
+    version: Tuple[int, ...]
+    productos: Mapping[str, str]          # id -> JSON
+    procesos: Mapping[str, str]           # id -> JSON
+    productos_activos: Tuple[str, ...]    # ids, en el orden del almacenamiento
+    orden_procesos: Tuple[str, ...]
+    versiones_precio: Mapping[str, int]   # id de proceso -> config_version
+
+
+class ReferenceCatalog:
+    """
+    Catálogo de productos y procesos por tenant, versionado y de solo lectura.
+    Es seguro entre hilos.
+    """
+    
+    def __init__(self):
+        """Inicializar el catálogo vacío."""
+        self._lock = threading.Lock()
+        self._instantaneas: Dict[str, _Instantanea] = {}
+        self._reglas: Dict[str, Tuple[Tuple[int, ...], Dict[str, Any]]] = {}
+        self.stats = {'loads': 0, 'checks': 0, 'preloaded': False}
+    
+    @staticmethod
+    def _clases():
+        from app.models.producto import Producto
+        from app.models.proceso import Proceso
+        return Producto, Proceso
+    
+    @staticmethod
+    def _storage():
+        from app.services.storage_service import StorageService
+        return StorageService()
+    
+    def _cargar(self, storage, version: Tuple[int, ...]) -> _Instantanea:
+        """Leer el catálogo completo de Redis (HVALS de cada clase)."""
+        Producto, Proceso = self._clases()
+        
+        def por_id(class_type):
+            objetos = {}
+            for raw in storage.raw_all(class_type):
+                datos = json.loads(raw)
+                objetos[datos['id']] = (raw, datos)
+            return objetos
+        
+        productos = por_id(Producto)
+        procesos = por_id(Proceso)
+        instantanea = _Instantanea(
+            version=version,
+            productos=MappingProxyType({i: raw for i, (raw, _) in productos.items()}),
+            procesos=MappingProxyType({i: raw for i, (raw, _) in procesos.items()}),
+            productos_activos=tuple(i for i, (_, datos) in productos.items() if datos.get('is_active', True)),
+            orden_procesos=tuple(procesos),
+            versiones_precio=MappingProxyType({
+                i: int(datos.get('config_version', 0) or 0) for i, (_, datos) in procesos.items()
+            })
+        )
+        with self._lock:
+            self.stats['loads'] += 1
+        return instantanea
+    
+    def _version(self, storage) -> Tuple[int, ...]:
+        tenant = tenancy.current_tenant()
+        cliente = storage._cliente_nodo(storage._nodo_principal(), tenant)
+        return tuple(query_cache.generations(cliente, self._clases()))
+    
+    def _actual(self) -> _Instantanea:
+        """
+        Instantánea del tenant actual, recargada si cambió su versión. La
+        versión se comprueba una vez por petición.
+        """
+        espacio = tenancy.prefijo(tenancy.current_tenant())
+        instantanea = self._instantaneas.get(espacio)
+        comprobados = g.setdefault('_catalogo_comprobado', set()) if has_request_context() else set()
+        if instantanea is not None and espacio in comprobados:
+            return instantanea
+        
+        storage = self._storage()
+        version = self._version(storage)
+        with self._lock:
+            self.stats['checks'] += 1
+        if instantanea is None or instantanea.version != version:
+            instantanea = self._cargar(storage, version)
+            with self._lock:
+                actual = self._instantaneas.get(espacio)
+                # Otro hilo pudo cargar una versión más reciente mientras tanto
+                if actual is None or actual.version <= version:
+                    self._instantaneas = {**self._instantaneas, espacio: instantanea}
+        comprobados.add(espacio)
+        return instantanea
+    
+    def preload(self, app):
+        """
+        Cargar el catálogo del tenant por defecto (antes del fork de gunicorn).
+        
+        Args:
+            app: Aplicación Flask
+        """
+        with app.app_context():
+            try:
+                self._actual()
+                self.stats['preloaded'] = True
+                instantanea = self._instantaneas.get(tenancy.prefijo(tenancy.current_tenant()))
+                app.logger.info(
+                    f"Catálogo precargado: {len(instantanea.productos)} productos, "
+                    f"{len(instantanea.procesos)} procesos"
+                )
+            except Exception as e:
+                # Cada worker lo cargará en su primer uso
+                app.logger.warning(f"No se pudo precargar el catálogo: {e}")
+    
+    @staticmethod
+    def _decodificar(class_type, raw: str) -> Any:
+        from app.services.storage_service import StorageService
+        obj = StorageService._obj_from_json(class_type, raw)
+        obj.restore_enums_after_loading()
+        return obj
+    
+    def productos(self, solo_activos: bool = True) -> List[Any]:
+        """
+        Obtener los productos del catálogo.
+        
+        Args:
+            solo_activos: Omitir los productos desactivados
+        
+        Returns:
+            List[Producto]: Productos (objetos nuevos en cada llamada)
+        """
+        Producto, _ = self._clases()
+        instantanea = self._actual()
+        ids = instantanea.productos_activos if solo_activos else tuple(instantanea.productos)
+        return [self._decodificar(Producto, instantanea.productos[i]) for i in ids]
+    
+    def producto(self, producto_id: str) -> Optional[Any]:
+        """
+        Obtener un producto (activo o no) por id.
+        
+        Args:
+            producto_id: Id del producto
+        
+        Returns:
+            Optional[Producto]: Producto o None si no existe
+        """
+        Producto, _ = self._clases()
+        raw = self._actual().productos.get(producto_id)
+        return self._decodificar(Producto, raw) if raw is not None else None
+    
+    def procesos(self) -> List[Any]:
+        """
+        Obtener todos los procesos del catálogo.
+        
+        Returns:
+            List[Proceso]: Procesos (objetos nuevos en cada llamada)
+        """
+        _, Proceso = self._clases()
+        instantanea = self._actual()
+        return [self._decodificar(Proceso, instantanea.procesos[i]) for i in instantanea.orden_procesos]
+    
+    def proceso(self, proceso_id: str) -> Optional[Any]:
+        """
+        Obtener un proceso por id.
+        
+        Args:
+            proceso_id: Id del proceso
+        
+        Returns:
+            Optional[Proceso]: Proceso o None si no existe
+        """
+        _, Proceso = self._clases()
+        raw = self._actual().procesos.get(proceso_id)
+        return self._decodificar(Proceso, raw) if raw is not None else None
+    
+    def tarifa(self, proceso_id: str) -> Optional[Any]:
+        """
+        Obtener la tarifa compilada de un proceso. Si la versión de su
+        configuración ya está compilada no se decodifica el proceso.
+        
+        Args:
+            proceso_id: Id del proceso
+        
+        Returns:
+            Optional[TarifaProceso]: Tarifa o None si el proceso no existe
+        """
+        from app.services.pricing import tarifas
+        _, Proceso = self._clases()
+        instantanea = self._actual()
+        raw = instantanea.procesos.get(proceso_id)
+        if raw is None:
+            return None
+        tarifa = tarifas.buscar(proceso_id, instantanea.versiones_precio[proceso_id])
+        if tarifa is None:
+            tarifa = tarifas.obtener(self._decodificar(Proceso, raw))
+        return tarifa
+    
+    def reglas_precios(self) -> Dict[str, Any]:
+        """
+        Obtener el paquete de reglas de precio de los procesos activos para
+        el navegador, construido una vez por versión del catálogo.
+        
+        Returns:
+            Dict[str, Any]: Paquete de ``pricing.paquete_reglas`` (compartido: no modificar)
+        """
+        from app.services.pricing import paquete_reglas
+        espacio = tenancy.prefijo(tenancy.current_tenant())
+        instantanea = self._actual()
+        actual = self._reglas.get(espacio)
+        if actual is not None and actual[0] == instantanea.version:
+            return actual[1]
+        
+        procesos = [p for p in self.procesos() if getattr(p, 'is_active', True)]
+        paquete = paquete_reglas(procesos)
+        with self._lock:
+            self._reglas = {**self._reglas, espacio: (instantanea.version, paquete)}
+        return paquete
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener las estadísticas del catálogo.
+        
+        Returns:
+            Dict[str, Any]: Cargas, comprobaciones de versión y tamaño por tenant
+        """
+        with self._lock:
+            estadisticas = dict(self.stats)
+        estadisticas['tenants'] = {
+            espacio or '-': {
+                'version': list(instantanea.version),
+                'productos': len(instantanea.productos),
+                'procesos': len(instantanea.procesos)
+            }
+            for espacio, instantanea in self._instantaneas.items()
+        }
+        return estadisticas
+
+
+# Instancia única por proceso (compartida en copy-on-write tras el fork)
+catalog = ReferenceCatalog()
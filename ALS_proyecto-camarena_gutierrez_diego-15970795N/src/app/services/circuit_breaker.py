@@ -0,0 +1,222 @@
+"""
+Circuit breaker para la conexión con Redis.
+
+Cuando Redis no responde, cada comando esperaría a que venza el timeout del
+socket. El breaker cuenta los fallos de conexión consecutivos y, al superar el
+umbral, abre el circuito: durante ``reset_timeout`` segundos los comandos
+fallan al instante con ``RedisUnavailableError``. Pasado ese tiempo deja pasar
+una única petición de prueba (semiabierto); si Redis responde (aunque sea con
+un error de comando) cierra el circuito y si falla la conexión lo vuelve a abrir.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+import redis
+from redis.client import Pipeline
+
+
+# Estados del circuito
+CERRADO = 'CLOSED'
+ABIERTO = 'OPEN'
+SEMIABIERTO = 'HALF_OPEN'
+
+# Errores que indican que Redis no está disponible (no errores de comando)
+ERRORES_CONEXION = (redis.ConnectionError, redis.TimeoutError, ConnectionRefusedError, OSError)
+
+
+class RedisUnavailableError(redis.ConnectionError):
+    """El circuito está abierto y el comando se rechaza sin contactar a Redis."""
+
+
+class CircuitBreaker:
+    """
+    Breaker seguro entre hilos con umbral de fallos y sondeo semiabierto.
+    """
+    
+    def __init__(self, nombre: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """
+        Inicializar el breaker.
+        
+        Args:
+            nombre: Identificador (normalmente host:puerto/db)
+            failure_threshold: Fallos consecutivos que abren el circuito
+            reset_timeout: Segundos en abierto antes de sondear
+        """
+        self.nombre = nombre
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+        self._lock = threading.Lock()
+        self._estado = CERRADO
+        self._fallos = 0
+        self._abierto_en = 0.0
+        self._sondeo_en_curso = False
+        self.stats = {
+            'opened': 0,
+            'rejected': 0,
+            'failures': 0,
+            'successes': 0,
+            'last_error': None,
+        }
+    
+    @property
+    def state(self) -> str:
+        """Estado actual, pasando a semiabierto si venció el tiempo en abierto."""
+        with self._lock:
+            return self._estado_actual()
+    
+    def _estado_actual(self) -> str:
+        if self._estado == ABIERTO and time.monotonic() - self._abierto_en >= self.reset_timeout:
+            self._estado = SEMIABIERTO
+            self._sondeo_en_curso = False
+        return self._estado
+    
+    def acquire(self) -> bool:
+        """
+        Admitir un comando o rechazarlo si el circuito está abierto o ya hay un
+        sondeo en curso.
+        
+        Returns:
+            bool: True si el comando es el sondeo del circuito semiabierto; quien
+            lo ejecuta debe llamar a ``release_probe`` al terminar, pase lo que pase
+        
+        Raises:
+            RedisUnavailableError: Si el comando se rechaza
+        """
+        with self._lock:
+            estado = self._estado_actual()
+            if estado == CERRADO:
+                return False
+            if estado == SEMIABIERTO and not self._sondeo_en_curso:
+                self._sondeo_en_curso = True
+                return True
+            self.stats['rejected'] += 1
+        raise RedisUnavailableError(f"Circuito de Redis abierto ({self.nombre})")
+    
+    def release_probe(self):
+        """Terminar el sondeo en curso, aunque no haya llegado a registrar su resultado."""
+        with self._lock:
+            self._sondeo_en_curso = False
+    
+    def record_success(self):
+        """Registrar un comando correcto; cierra el circuito si estaba sondeando."""
+        with self._lock:
+            self.stats['successes'] += 1
+            self._fallos = 0
+            self._estado = CERRADO
+            self._sondeo_en_curso = False
+    
+    def record_failure(self, error: Exception = None):
+        """
+        Registrar un fallo de conexión.
+        
+        Args:
+            error: Excepción producida
+        """
+        with self._lock:
+            self.stats['failures'] += 1
+            self.stats['last_error'] = str(error) if error else None
+            self._fallos += 1
+            if self._estado == SEMIABIERTO or self._fallos >= self.failure_threshold:
+                if self._estado != ABIERTO:
+                    self.stats['opened'] += 1
+                self._estado = ABIERTO
+                self._abierto_en = time.monotonic()
+                self._sondeo_en_curso = False
+    
+    def call(self, funcion, *args, **kwargs):
+        """
+        Ejecutar una función protegida por el breaker.
+        
+        Raises:
+            RedisUnavailableError: Si el circuito está abierto
+        """
+        sondeo = self.acquire()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except ERRORES_CONEXION as e:
+            self.record_failure(e)
+            raise
+        except Exception:
+            # Redis respondió (error de comando, WATCH que no se cumplió...)
+            self.record_success()
+            raise
+        else:
+            self.record_success()
+        finally:
+            if sondeo:
+                self.release_probe()
+        return resultado
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado y contadores para monitorización."""
+        with self._lock:
+            estado = self._estado_actual()
+            restante = max(0.0, self.reset_timeout - (time.monotonic() - self._abierto_en)) if estado == ABIERTO else 0.0
+            return dict(
+                self.stats,
+                name=self.nombre,
+                state=estado,
+                consecutive_failures=self._fallos,
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+                retry_in=round(restante, 3),
+            )
+
+
+class BreakerPipeline(Pipeline):
+    """Pipeline cuya ejecución pasa por el breaker del cliente."""
+    
+    breaker: CircuitBreaker = None
+    
+    def execute(self, raise_on_error=True):
+        return self.breaker.call(super().execute, raise_on_error)
+
+
+class BreakerRedis(redis.Redis):
+    """
+    Cliente Redis cuyos comandos y pipelines pasan por un CircuitBreaker.
+    """
+    
+    def __init__(self, *args, breaker: CircuitBreaker = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = breaker or CircuitBreaker('redis')
+    
+    def execute_command(self, *args, **options):
+        return self.breaker.call(super().execute_command, *args, **options)
+    
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = BreakerPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        return pipe
+
+
+# Breakers del proceso por endpoint, para exponer su estado
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock_breakers = threading.Lock()
+
+
+def get_breaker(nombre: str, failure_threshold: int = 5, reset_timeout: float = 10.0) -> CircuitBreaker:
+    """
+    Obtener (o crear) el breaker de un endpoint.
+    
+    Args:
+        nombre: Identificador del endpoint
+        failure_threshold: Fallos consecutivos que abren el circuito
+        reset_timeout: Segundos en abierto antes de sondear
+    
+    Returns:
+        CircuitBreaker: Breaker compartido por el proceso
+    """
+    with _lock_breakers:
+        if nombre not in _breakers:
+            _breakers[nombre] = CircuitBreaker(nombre, failure_threshold, reset_timeout)
+        return _breakers[nombre]
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Estado de todos los breakers del proceso."""
+    with _lock_breakers:
+        breakers = list(_breakers.values())
+    return {b.nombre: b.get_stats() for b in breakers}
@@ -0,0 +1,240 @@
+"""
+Invalidación de cachés entre workers mediante Redis pub/sub.
+
+Cada save/delete de una clase cacheada publica un mensaje compacto en un canal
+de Redis; un hilo en segundo plano de cada worker lo escucha y expulsa la
+entrada de su caché local. Formato del mensaje::
+
+    <origen>|<secuencia>|<clase>|<id>|<versión>
+
+La secuencia es consecutiva por origen (proceso), de modo que un salto indica
+mensajes perdidos. Ante un salto o una reconexión la caché se vacía entera, y
+mientras el listener está desconectado la caché queda suspendida.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+# Hash con la versión de escritura de cada objeto cacheable
+VERSIONS_KEY = 'cache:__versiones__'
+
+
+class InvalidationBus:
+    """
+    Publicador y listener de invalidaciones de un proceso.
+    """
+    
+    def __init__(self, cache, channel: str):
+        """
+        Inicializar el bus.
+        
+        Args:
+            cache: ObjectCache local a invalidar
+            channel: Canal de Redis
+        """
+        self.cache = cache
+        self.channel = channel
+        self.origin = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._lock = threading.Lock()
+        # Solo para asignar secuencias y publicar (sin esperar al listener)
+        self._lock_publicar = threading.Lock()
+        self._ultimas: Dict[str, int] = {}  # origen -> última secuencia vista
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.stats = {
+            'published': 0,
+            'received': 0,
+            'evicted': 0,
+            'flushes': 0,
+            'gaps': 0,
+            'reconnects': 0,
+            'connected': False,
+        }
+    
+    def publish(self, redis_client, clase: str, obj_id: str) -> int:
+        """
+        Publicar la invalidación de un objeto.
+        
+        Args:
+            redis_client: Cliente Redis con el que publicar
+            clase: Nombre de la clase del objeto
+            obj_id: Id del objeto
+        
+        Returns:
+            int: Versión de escritura asignada al objeto
+        """
+        return self.publish_many(redis_client, clase, [obj_id])[0]
+    
+    def publish_many(self, redis_client, clase: str, obj_ids: Iterable[str]) -> List[int]:
+        """
+        Publicar la invalidación de varios objetos de una clase: las versiones
+        se suben en un pipeline antes de tomar el lock, y con el lock solo se
+        asignan las secuencias y se publica (otro pipeline), para que los
+        mensajes de este proceso salgan en orden sin que un hilo espere a las
+        escrituras de otro.
+        
+        Args:
+            redis_client: Cliente Redis con el que publicar
+            clase: Nombre de la clase de los objetos
+            obj_ids: Ids de los objetos
+        
+        Returns:
+            List[int]: Versión de escritura asignada a cada objeto
+        """
+        obj_ids = list(obj_ids)
+        if not obj_ids:
+            return []
+        with redis_client.pipeline(transaction=False) as pipe:
+            for obj_id in obj_ids:
+                pipe.hincrby(VERSIONS_KEY, obj_id, 1)
+            versiones = pipe.execute()
+        
+        with self._lock_publicar:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for obj_id, version in zip(obj_ids, versiones):
+                    # Una secuencia asignada y no publicada se ve como un
+                    # salto: los demás vacían su caché, que es lo seguro
+                    self._seq += 1
+                    pipe.publish(self.channel, f"{self.origin}|{self._seq}|{clase}|{obj_id}|{version}")
+                pipe.execute()
+            self.stats['published'] += len(obj_ids)
+        return versiones
+    
+    def start(self, redis_factory: Callable[[], Any], logger=None):
+        """
+        Arrancar el listener si no está en marcha en este proceso.
+        Tras un fork (workers de gunicorn) el hilo del padre no existe y se crea otro.
+        
+        Args:
+            redis_factory: Función que crea un cliente Redis nuevo
+            logger: Logger donde registrar reconexiones
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            with self._lock_publicar:
+                self.origin = uuid.uuid4().hex[:8]
+                self._seq = 0
+            self._ultimas.clear()
+            self._stop.clear()
+            # Sin listener suscrito no es seguro servir desde la caché
+            self.cache.suspend()
+            self._thread = threading.Thread(
+                target=self._run, args=(redis_factory, logger),
+                name='cache-invalidation', daemon=True
+            )
+            self._thread.start()
+    
+    def stop(self):
+        """Detener el listener (la caché queda suspendida)."""
+        self._stop.set()
+    
+    def _flush(self):
+        """Vaciar la caché local por completo."""
+        self.cache.clear()
+        self.stats['flushes'] += 1
+    
+    def _run(self, redis_factory, logger):
+        """Bucle del listener con reconexión y backoff exponencial."""
+        espera = 0.1
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = redis_factory().pubsub()
+                pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    mensaje = pubsub.get_message(timeout=1.0)
+                    if mensaje is None:
+                        continue
+                    if mensaje['type'] == 'subscribe':
+                        # Lo cacheado antes de suscribirse pudo perder mensajes
+                        self._ultimas.clear()
+                        self._flush()
+                        self.cache.resume()
+                        self.stats['connected'] = True
+                        espera = 0.1
+                    elif mensaje['type'] == 'message':
+                        self.handle(mensaje['data'])
+            except Exception as e:
+                self.cache.suspend()
+                self._flush()
+                self.stats['connected'] = False
+                self.stats['reconnects'] += 1
+                if logger is not None:
+                    logger.warning(f"Listener de invalidación desconectado: {e}. Reintentando en {espera:.1f}s")
+                time.sleep(espera)
+                espera = min(espera * 2, 5.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+        self.cache.suspend()
+        self.stats['connected'] = False
+    
+    def handle(self, data):
+        """
+        Procesar un mensaje de invalidación.
+        
+        Args:
+            data: Contenido del mensaje
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        try:
+            origen, seq, clase, obj_id, version = data.split('|', 4)
+            seq = int(seq)
+        except ValueError:
+            return
+        self.stats['received'] += 1
+        
+        ultima = self._ultimas.get(origen)
+        self._ultimas[origen] = max(seq, ultima or 0)
+        if ultima is not None and seq > ultima + 1:
+            # Se han perdido mensajes de este origen: no sabemos qué invalidar
+            self.stats['gaps'] += 1
+            self._flush()
+            return
+        if ultima is not None and seq <= ultima:
+            return
+        
+        if origen != self.origin:
+            self.cache.invalidate(obj_id)
+            self.stats['evicted'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores del bus."""
+        return dict(self.stats, origin=self.origin, channel=self.channel)
+
+
+_bus: Optional[InvalidationBus] = None
+
+
+def get_bus(cache, channel: str) -> InvalidationBus:
+    """
+    Obtener el bus de invalidación del proceso.
+    
+    Args:
+        cache: ObjectCache local
+        channel: Canal de Redis
+    
+    Returns:
+        InvalidationBus: Instancia única del proceso
+    """
+    global _bus
+    if _bus is None:
+        _bus = InvalidationBus(cache, channel)
+    return _bus
+
+
+def current_bus() -> Optional[InvalidationBus]:
+    """Bus de invalidación del proceso, si se ha creado."""
+    return _bus
@@ -0,0 +1,158 @@
+"""
+Tablas de consulta de datos de referencia.
+
+Para cada clase (Cliente, Producto, Proceso) se mantiene en memoria del
+proceso un mapa id -> nombre para mostrar y la lista de opciones (id, nombre)
+de los objetos activos, lista para ``form.<campo>.choices``. Las tablas son
+inmutables y se reconstruyen solo cuando cambia la generación de su clase
+(ver ``query_cache``), que se comprueba una vez por petición con un HGET. Una
+ruta que antes recorría todos los clientes para llenar un select cuesta así
+una consulta a un diccionario.
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple, Type
+
+from flask import g, has_request_context
+
+from app.services import query_cache, tenancy
+
+
+# Nombre para mostrar de cada clase (por defecto, su atributo ``nombre``)
+_ETIQUETAS: Dict[str, Callable[[Any], str]] = {
+    'Cliente': lambda cliente: cliente.get_nombre_completo(),
+    'Proceso': lambda proceso: f"{proceso.nombre} ({proceso.tipo})",
+}
+
+
+class _Tabla(NamedTuple):
+    """Tabla de una clase en una generación concreta (inmutable)."""
+    version: int
+    nombres: Mapping[str, str]                # id -> nombre (todos)
+    opciones: Tuple[Tuple[str, str], ...]     # (id, nombre) de los activos
+
+
+class LookupTables:
+    """
+    Tablas id -> nombre y listas de opciones por tenant y clase, versionadas.
+    Es segura entre hilos.
+    """
+    
+    def __init__(self):
+        """Inicializar sin tablas."""
+        self._lock = threading.Lock()
+        self._tablas: Dict[Tuple[str, str], _Tabla] = {}
+        self.stats = {'builds': 0, 'checks': 0}
+    
+    @staticmethod
+    def _etiqueta(obj: Any) -> str:
+        """Nombre para mostrar de un objeto."""
+        try:
+            etiqueta = _ETIQUETAS.get(type(obj).__name__)
+            if etiqueta is not None:
+                return etiqueta(obj)
+            return str(getattr(obj, 'nombre', None) or obj.id)
+        except Exception:
+            return f"{type(obj).__name__} {str(getattr(obj, 'id', ''))[:8]}"
+    
+    def _construir(self, storage, class_type: Type, version: int) -> _Tabla:
+        """Construir la tabla de una clase a partir de todos sus objetos."""
+        from app.services.storage_service import StorageService
+        nombres = {}
+        opciones = []
+        for raw in storage.raw_all(class_type):
+            obj = StorageService._obj_from_json(class_type, raw)
+            obj.restore_enums_after_loading()
+            if obj.id in nombres:
+                continue
+            nombres[obj.id] = self._etiqueta(obj)
+            if getattr(obj, 'is_active', True):
+                opciones.append((obj.id, nombres[obj.id]))
+        with self._lock:
+            self.stats['builds'] += 1
+        return _Tabla(version, MappingProxyType(nombres), tuple(opciones))
+    
+    def _tabla(self, class_type: Type) -> _Tabla:
+        """
+        Tabla de una clase en el tenant actual, reconstruida si cambió su
+        generación. La generación se comprueba una vez por petición.
+        """
+        from app.services.storage_service import StorageService
+        tenant = StorageService._tenant_de(class_type)
+        clave = (tenancy.prefijo(tenant), class_type.__name__)
+        tabla = self._tablas.get(clave)
+        comprobadas = g.setdefault('_lookups_comprobadas', set()) if has_request_context() else set()
+        if tabla is not None and clave in comprobadas:
+            return tabla
+        
+        storage = StorageService()
+        version = query_cache.generation(storage._cliente_nodo(storage._nodo_principal(), tenant), class_type)
+        with self._lock:
+            self.stats['checks'] += 1
+        if tabla is None or tabla.version != version:
+            tabla = self._construir(storage, class_type, version)
+            with self._lock:
+                actual = self._tablas.get(clave)
+                # Otro hilo pudo construir una generación más reciente mientras tanto
+                if actual is None or actual.version <= version:
+                    self._tablas = {**self._tablas, clave: tabla}
+        comprobadas.add(clave)
+        return tabla
+    
+    def names(self, class_type: Type) -> Mapping[str, str]:
+        """
+        Obtener el mapa id -> nombre para mostrar de una clase.
+        
+        Args:
+            class_type: Clase (Cliente, Producto, Proceso...)
+        
+        Returns:
+            Mapping[str, str]: Nombres de todos los objetos, activos o no (solo lectura)
+        """
+        return self._tabla(class_type).nombres
+    
+    def name(self, class_type: Type, obj_id: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Obtener el nombre para mostrar de un objeto.
+        
+        Args:
+            class_type: Clase del objeto
+            obj_id: Id del objeto
+            default: Valor si no existe
+        
+        Returns:
+            Optional[str]: Nombre o ``default``
+        """
+        return self._tabla(class_type).nombres.get(obj_id, default)
+    
+    def choices(self, class_type: Type) -> List[Tuple[str, str]]:
+        """
+        Obtener las opciones (id, nombre) de los objetos activos de una clase.
+        
+        Args:
+            class_type: Clase (Cliente, Producto, Proceso...)
+        
+        Returns:
+            List[Tuple[str, str]]: Opciones para un SelectField (lista nueva)
+        """
+        return list(self._tabla(class_type).opciones)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener las estadísticas de las tablas.
+        
+        Returns:
+            Dict[str, Any]: Construcciones, comprobaciones y tamaño de cada tabla
+        """
+        with self._lock:
+            estadisticas = dict(self.stats)
+        estadisticas['tablas'] = {
+            f"{espacio}{clase}": {'version': tabla.version, 'entradas': len(tabla.nombres)}
+            for (espacio, clase), tabla in self._tablas.items()
+        }
+        return estadisticas
+
+
+# Instancia única por proceso
+lookups = LookupTables()
@@ -0,0 +1,373 @@
+"""
+Demanda de material de los pedidos abiertos, mantenida de forma incremental.
+
+Cuánto film DTF, papel de sublimación o vinil necesitan los pedidos
+PENDIENTE / EN_PROCESO se guarda ya sumado por tipo de proceso en un hash
+(``demanda:material``, nodo principal y espacio del tenant), así que leerlo
+es un HGETALL de tamaño fijo. Cada personalización aporta:
+
+    metros             Metros de rollo (DTF / Sublimación, ``TarifaProceso.metros``)
+    cm2                Área impresa (ancho * alto * cantidad)
+    piezas             Cantidad
+    personalizaciones  1
+
+Para poder restar lo que aportaba antes, el aporte de cada personalización se
+guarda en el hash de su pedido (``demanda:pedido:<id>``), junto con si el
+pedido está abierto. Así:
+
+- Guardar una personalización resta su aporte anterior y suma el nuevo (si
+  su pedido está abierto); desactivarla o borrarla solo resta.
+- Un pedido que se abre o se cierra (estado o baja lógica) suma o resta de
+  una vez los aportes guardados de sus personalizaciones.
+- Cambiar un proceso recalcula el aporte de sus personalizaciones.
+
+Cada cambio es una transacción (WATCH sobre el hash del pedido) y los totales
+se guardan en unidades enteras (décimas de milímetro, centésimas de cm²) para
+sumar y restar sin error de redondeo. Hasta la primera lectura no hay nada
+que actualizar: esta lo construye todo (``rebuild``), y también se puede
+reconstruir a mano.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from redis.exceptions import WatchError
+
+from app.models.proceso import TipoProceso
+
+
+# Versión del formato: al cambiarla la demanda se reconstruye
+FORMATO = 1
+CLAVE = 'demanda:material'
+MARCA_COMPLETO = '__completo__'
+ABIERTO = '__abierto__'
+UBICACION = 'demanda:ubicacion'   # personalización -> pedido (para los borrados)
+CAMBIOS = 'demanda:cambios'       # Una reconstrucción concurrente con un cambio no se guarda
+
+ESTADOS_ABIERTOS = ('PENDIENTE', 'EN_PROCESO')
+
+# Medidas del aporte y unidades enteras por unidad mostrada
+MEDIDAS = ('metros', 'cm2', 'piezas', 'personalizaciones')
+_UNIDADES = (10000, 100, 1, 1)
+
+REINTENTOS = 5
+
+
+def _clave_pedido(pedido_id: str) -> str:
+    return f'demanda:pedido:{pedido_id}'
+
+
+def _activa() -> bool:
+    return current_app.config.get('MATERIAL_DEMAND_ENABLED', True)
+
+
+def _cliente(storage):
+    """Cliente de la demanda (nodo principal, espacio del tenant de los pedidos)."""
+    from app.models.pedido import Pedido
+    return storage._cliente_nodo(storage._nodo_principal(), storage._tenant_de(Pedido))
+
+
+def _texto(valor) -> Optional[str]:
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def aporte(pers, tarifa=None) -> Optional[List[Any]]:
+    """
+    Aporte de una personalización a la demanda.
+    
+    Args:
+        pers: Personalización
+        tarifa: Tarifa de su proceso (por defecto, la del catálogo)
+    
+    Returns:
+        Optional[List[Any]]: ``[tipo, metros, cm2, piezas, 1]`` en unidades
+        enteras, o None si no aporta (inactiva o de un proceso desconocido)
+    """
+    from app.services.catalog import catalog
+    if not getattr(pers, 'is_active', True):
+        return None
+    if tarifa is None:
+        tarifa = catalog.tarifa(pers.proceso_id)
+    if tarifa is None or tarifa.tipo is None:
+        return None
+    ancho = float(getattr(pers, 'ancho', 0) or 0)
+    alto = float(getattr(pers, 'alto', 0) or 0)
+    cantidad = int(pers.cantidad or 0)
+    valores = (tarifa.metros(ancho, alto, cantidad), ancho * alto * cantidad, cantidad, 1)
+    return [tarifa.tipo.value] + [int(round(v * u)) for v, u in zip(valores, _UNIDADES)]
+
+
+def _sumar(pipe, aporte_: Optional[List[Any]], signo: int):
+    """Sumar (o restar, con signo -1) un aporte a los totales."""
+    if not aporte_:
+        return
+    tipo = aporte_[0]
+    for medida, valor in zip(MEDIDAS, aporte_[1:]):
+        if valor:
+            pipe.hincrby(CLAVE, f'{tipo}:{medida}', signo * valor)
+
+
+def _abierto(pedido) -> str:
+    """'1' si el pedido cuenta para la demanda."""
+    estado = getattr(pedido.estado, 'value', pedido.estado)
+    return '1' if getattr(pedido, 'is_active', True) and estado in ESTADOS_ABIERTOS else '0'
+
+
+def _estado_guardado(storage, pedido_id: str) -> str:
+    """Si un pedido está abierto, consultándolo (pedidos sin hash de demanda)."""
+    from app.models.pedido import Pedido
+    pedido = storage.get(Pedido, pedido_id)
+    return _abierto(pedido) if pedido else '0'
+
+
+def _transaccion(cliente, clave: str, aplicar) -> bool:
+    """
+    Ejecutar una actualización vigilando la clave de un pedido.
+    
+    ``aplicar(pipe)`` lee en modo inmediato y devuelve una función que encola
+    las escrituras (o None si no hay nada que escribir). Se reintenta si otro
+    cambio tocó el pedido entre la lectura y la escritura.
+    
+    Returns:
+        bool: False si la demanda aún no está construida o no se pudo aplicar
+    """
+    with cliente.pipeline() as pipe:
+        for _ in range(REINTENTOS):
+            try:
+                pipe.watch(clave)
+                if not pipe.hexists(CLAVE, MARCA_COMPLETO):
+                    pipe.unwatch()
+                    # Anotado para que una construcción en curso no se guarde
+                    cliente.incr(CAMBIOS)
+                    return False
+                escribir = aplicar(pipe)
+                pipe.multi()
+                pipe.incr(CAMBIOS)
+                if escribir is not None:
+                    escribir(pipe)
+                pipe.execute()
+                return True
+            except WatchError:
+                continue
+    current_app.logger.warning(f"Demanda de material: demasiados cambios concurrentes en {clave}")
+    return False
+
+
+def _fijar_aporte(storage, pers_id: str, pedido_id: str, nuevo: Optional[List[Any]]):
+    """Reemplazar el aporte de una personalización (None para quitarlo)."""
+    clave = _clave_pedido(pedido_id)
+    
+    def aplicar(pipe):
+        abierto, anterior = (_texto(v) for v in pipe.hmget(clave, ABIERTO, pers_id))
+        anterior = json.loads(anterior) if anterior else None
+        if abierto is not None and anterior == nuevo:
+            # Cambios que no tocan el material (precio, notas...)
+            return None
+        if abierto is None:
+            abierto = _estado_guardado(storage, pedido_id)
+        
+        def escribir(pipe):
+            pipe.hset(clave, ABIERTO, abierto)
+            if nuevo:
+                pipe.hset(clave, pers_id, json.dumps(nuevo))
+                pipe.hset(UBICACION, pers_id, pedido_id)
+            else:
+                pipe.hdel(clave, pers_id)
+                pipe.hdel(UBICACION, pers_id)
+            if abierto == '1':
+                _sumar(pipe, anterior, -1)
+                _sumar(pipe, nuevo, 1)
+        return escribir
+    
+    _transaccion(_cliente(storage), clave, aplicar)
+
+
+def _fijar_pedido(storage, pedido_id: str, abierto: Optional[str]):
+    """Abrir o cerrar un pedido (None si se borró) sumando o restando sus aportes."""
+    clave = _clave_pedido(pedido_id)
+    
+    def aplicar(pipe):
+        campos = {_texto(k): _texto(v) for k, v in pipe.hgetall(clave).items()}
+        antes = campos.pop(ABIERTO, None)
+        if antes == abierto:
+            return None
+        aportes = [json.loads(v) for v in campos.values()]
+        
+        def escribir(pipe):
+            if abierto is None:
+                pipe.delete(clave)
+                if campos:
+                    pipe.hdel(UBICACION, *campos)
+            else:
+                pipe.hset(clave, ABIERTO, abierto)
+            signo = 1 if abierto == '1' else -1 if antes == '1' else 0
+            for a in aportes if signo else ():
+                _sumar(pipe, a, signo)
+        return escribir
+    
+    _transaccion(_cliente(storage), clave, aplicar)
+
+
+def _pedido_de(storage, pers) -> Optional[str]:
+    """Pedido de una personalización (por su item si no lo tiene guardado)."""
+    from app.models.pedido import ItemPedido
+    if getattr(pers, 'pedido_id', None):
+        return pers.pedido_id
+    if getattr(pers, 'item_pedido_id', None):
+        item = storage.get(ItemPedido, pers.item_pedido_id)
+        return getattr(item, 'pedido_id', None) if item else None
+    return None
+
+
+def track(storage, obj):
+    """
+    Actualizar la demanda tras guardar un pedido, una personalización o un proceso.
+    
+    Args:
+        storage: StorageService con el que se guardó
+        obj: Objeto guardado
+    """
+    from app.models.pedido import Pedido, Personalizacion
+    from app.models.proceso import Proceso
+    
+    if not isinstance(obj, (Pedido, Personalizacion, Proceso)) or not _activa():
+        return
+    if isinstance(obj, Pedido):
+        _fijar_pedido(storage, obj.id, _abierto(obj))
+    elif isinstance(obj, Personalizacion):
+        pedido_id = _pedido_de(storage, obj)
+        if pedido_id:
+            _fijar_aporte(storage, obj.id, pedido_id, aporte(obj))
+    else:
+        # Otro ancho de rollo cambia los metros de sus personalizaciones (con
+        # la tarifa recién compilada: el catálogo de esta petición es anterior)
+        if not _cliente(storage).hexists(CLAVE, MARCA_COMPLETO):
+            return
+        from app.services.pricing import tarifas
+        tarifa = tarifas.obtener(obj)
+        for pers in storage.query(Personalizacion).where(proceso_id=obj.id).all():
+            pedido_id = _pedido_de(storage, pers)
+            if pedido_id:
+                _fijar_aporte(storage, pers.id, pedido_id, aporte(pers, tarifa))
+
+
+def forget(storage, class_type, obj_id: str):
+    """
+    Quitar de la demanda un pedido o una personalización borrados.
+    
+    Args:
+        storage: StorageService con el que se borró
+        class_type: Clase del objeto
+        obj_id: Id del objeto
+    """
+    from app.models.pedido import Pedido, Personalizacion
+    
+    if not _activa():
+        return
+    if class_type is Pedido:
+        _fijar_pedido(storage, obj_id, None)
+    elif class_type is Personalizacion:
+        pedido_id = _texto(_cliente(storage).hget(UBICACION, obj_id))
+        if pedido_id:
+            _fijar_aporte(storage, obj_id, pedido_id, None)
+
+
+def _calcular(storage):
+    """
+    Calcular la demanda desde todos los pedidos y personalizaciones.
+    
+    Returns:
+        tuple: Hash de cada pedido, pedido de cada personalización y totales
+    """
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    
+    pedidos = {p.id: _abierto(p) for p in storage.find_all(Pedido)}
+    items = {i.id: getattr(i, 'pedido_id', None) for i in storage.find_all(ItemPedido)}
+    por_pedido: Dict[str, Dict[str, str]] = {pid: {ABIERTO: abierto} for pid, abierto in pedidos.items()}
+    ubicacion = {}
+    totales: Dict[str, int] = {}
+    for pers in storage.find_all(Personalizacion):
+        pedido_id = getattr(pers, 'pedido_id', None) or items.get(getattr(pers, 'item_pedido_id', None))
+        aporte_ = aporte(pers)
+        if pedido_id not in pedidos or not aporte_:
+            continue
+        por_pedido[pedido_id][pers.id] = json.dumps(aporte_)
+        ubicacion[pers.id] = pedido_id
+        if pedidos[pedido_id] == '1':
+            for medida, valor in zip(MEDIDAS, aporte_[1:]):
+                campo = f'{aporte_[0]}:{medida}'
+                totales[campo] = totales.get(campo, 0) + valor
+    return por_pedido, ubicacion, totales
+
+
+def rebuild(storage) -> Dict[str, Dict[str, float]]:
+    """
+    Reconstruir la demanda desde todos los pedidos y personalizaciones.
+    
+    Si algo cambia mientras tanto, se reintenta; al final, el resultado se
+    devuelve aunque no se haya podido guardar.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        Dict[str, Dict[str, float]]: Demanda por tipo de proceso
+    """
+    cliente = _cliente(storage)
+    totales: Dict[str, int] = {}
+    for _ in range(REINTENTOS):
+        with cliente.pipeline() as pipe:
+            try:
+                pipe.watch(CAMBIOS)
+                por_pedido, ubicacion, totales = _calcular(storage)
+                
+                pipe.multi()
+                pipe.delete(CLAVE, UBICACION)
+                for pedido_id, campos in por_pedido.items():
+                    pipe.delete(_clave_pedido(pedido_id))
+                    pipe.hset(_clave_pedido(pedido_id), mapping=campos)
+                if ubicacion:
+                    pipe.hset(UBICACION, mapping=ubicacion)
+                pipe.hset(CLAVE, mapping={**totales, MARCA_COMPLETO: FORMATO})
+                pipe.execute()
+                break
+            except WatchError:
+                continue
+    else:
+        current_app.logger.warning("Demanda de material reconstruida pero no guardada: cambios concurrentes")
+    return _por_tipo(totales)
+
+
+def _por_tipo(totales: Dict[str, int]) -> Dict[str, Dict[str, float]]:
+    """Totales en unidades enteras -> demanda por tipo en unidades mostradas."""
+    demanda = {
+        tipo.value: {medida: 0 if unidad == 1 else 0.0 for medida, unidad in zip(MEDIDAS, _UNIDADES)}
+        for tipo in TipoProceso
+    }
+    for campo, valor in totales.items():
+        tipo, _, medida = campo.partition(':')
+        if tipo in demanda and medida in MEDIDAS:
+            unidad = _UNIDADES[MEDIDAS.index(medida)]
+            demanda[tipo][medida] = int(valor) // unidad if unidad == 1 else int(valor) / unidad
+    return demanda
+
+
+def get(storage) -> Dict[str, Dict[str, float]]:
+    """
+    Demanda de material actual de los pedidos abiertos.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        Dict[str, Dict[str, float]]: Por tipo de proceso: metros, cm2, piezas
+        y personalizaciones
+    """
+    if not _activa():
+        # Sin actualizaciones incrementales, lo guardado podría estar desfasado
+        return _por_tipo(_calcular(storage)[2])
+    campos = {_texto(k): _texto(v) for k, v in _cliente(storage).hgetall(CLAVE).items()}
+    if campos.pop(MARCA_COMPLETO, None) != str(FORMATO):
+        return rebuild(storage)
+    return _por_tipo(campos)
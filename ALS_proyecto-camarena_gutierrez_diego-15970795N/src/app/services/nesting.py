@@ -0,0 +1,481 @@
+"""
+Acomodo de diseños DTF y sublimación en pliegos (gang sheets).
+
+``Proceso.calcular_metros_necesarios`` supone que cada diseño se imprime solo,
+en una rejilla sobre el ancho del rollo. En producción se juntan en el mismo
+rollo los diseños de muchos pedidos. Este módulo resuelve ese acomodo como un
+problema de empaquetado en franja: rectángulos (una copia por pieza) sobre un
+rollo de ancho fijo, minimizando el largo usado.
+
+- Heurísticas constructivas: *skyline* bottom-left (cada pieza en la posición
+  con el borde superior más bajo) y *guillotina* (rectángulos libres que se
+  parten en dos con cada pieza), con varios órdenes de entrada y rotación de
+  90° opcional.
+- Mejora *anytime*: mientras quede presupuesto (milisegundos) se perturba el
+  orden del mejor acomodo y se vuelve a empaquetar; se queda el mejor. El
+  primer acomodo siempre se completa, así que siempre hay resultado.
+- El acomodo *diseño a diseño* (cada diseño en sus propias filas, uno tras
+  otro, con el mismo margen y giro; ``acomodo_por_diseño``) también es
+  candidato: agrupar nunca da un rollo más largo que no agrupar.
+
+Las medidas se trabajan en centésimas de cm (enteros), con un margen de
+separación entre diseños. ``planificar_pendientes`` toma las
+personalizaciones DTF y sublimación de los pedidos pendientes o en proceso y
+devuelve el acomodo y los metros de cada proceso (rollo).
+"""
+
+import random
+import time
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.models.proceso import TipoProceso
+
+# Centésimas de cm por cm
+_ESCALA = 100
+
+# Altura de los rectángulos libres "infinitos" de la guillotina
+_INFINITO = 1 << 60
+
+# Tipos de proceso que se imprimen en rollo
+TIPOS_ROLLO = (TipoProceso.DTF, TipoProceso.SUBLIMACION)
+
+
+class Pieza(NamedTuple):
+    """Diseño a acomodar (una copia), en cm."""
+    ref: Hashable
+    ancho: float
+    alto: float
+    diseño: Hashable = None       # Copias del mismo diseño (por defecto, las de igual medida)
+
+
+class Colocacion(NamedTuple):
+    """Posición de una pieza en el rollo, en cm (origen: esquina inicial del rollo)."""
+    ref: Hashable
+    x: float
+    y: float
+    ancho: float
+    alto: float
+    rotada: bool
+
+
+class Acomodo(NamedTuple):
+    """Resultado de acomodar piezas en un rollo."""
+    ancho_rollo: float
+    largo_cm: float
+    metros: float
+    aprovechamiento: float        # Área de diseños / área usada del rollo
+    colocaciones: Tuple[Colocacion, ...]
+    sin_colocar: Tuple[Pieza, ...]  # No caben en el ancho ni rotadas
+    heuristica: str
+    intentos: int
+    ms: float
+
+
+class _Parcial(NamedTuple):
+    """Acomodo interno (enteros) de una heurística con un orden dado."""
+    largo: int
+    orden: Tuple[int, ...]
+    posiciones: Tuple[Tuple[int, int, bool], ...]  # Por pieza: x, y, rotada
+    heuristica: str
+    rotar: bool
+
+
+def _skyline(medidas, ancho, orden, rotar, limite) -> Optional[Tuple[int, list]]:
+    """
+    Empaquetar con skyline bottom-left.
+    
+    El perfil superior ocupado se guarda como segmentos (x, y, ancho) de
+    izquierda a derecha; cada pieza va donde su borde superior quede más bajo
+    (a igualdad, más a la izquierda).
+    
+    Returns:
+        Optional[Tuple[int, list]]: Largo y posiciones, o None si se agotó el tiempo
+    """
+    xs, ys, ws = [0], [0], [ancho]
+    posiciones = [None] * len(medidas)
+    largo = 0
+    for k, i in enumerate(orden):
+        if limite is not None and not k & 127 and time.perf_counter() > limite:
+            return None
+        w, h = medidas[i]
+        mejor = None
+        for pw, ph, rotada in ((w, h, False), (h, w, True)) if rotar and w != h else ((w, h, False),):
+            if pw > ancho:
+                continue
+            n = len(xs)
+            for s in range(n):
+                x = xs[s]
+                fin = x + pw
+                if fin > ancho:
+                    break
+                y = ys[s]
+                j = s + 1
+                while j < n and xs[j] < fin:
+                    if ys[j] > y:
+                        y = ys[j]
+                    j += 1
+                tope = y + ph
+                if mejor is None or tope < mejor[0] or (tope == mejor[0] and x < mejor[1]):
+                    mejor = (tope, x, y, s, pw, rotada)
+        if mejor is None:
+            continue
+        
+        tope, x, y, s, pw, rotada = mejor
+        posiciones[i] = (x, y, rotada)
+        if tope > largo:
+            largo = tope
+        
+        # Nuevo segmento [x, x + pw) a la altura del tope; recortar los que tapa
+        fin = x + pw
+        j = s
+        while j < len(xs) and xs[j] + ws[j] <= fin:
+            j += 1
+        if j < len(xs) and xs[j] < fin:
+            ws[j] -= fin - xs[j]
+            xs[j] = fin
+        xs[s:j] = [x]
+        ys[s:j] = [tope]
+        ws[s:j] = [pw]
+        
+        # Unir con los vecinos a la misma altura
+        if s + 1 < len(xs) and ys[s + 1] == tope:
+            ws[s] += ws[s + 1]
+            del xs[s + 1], ys[s + 1], ws[s + 1]
+        if s > 0 and ys[s - 1] == tope:
+            ws[s - 1] += ws[s]
+            del xs[s], ys[s], ws[s]
+    return largo, posiciones
+
+
+def _guillotina(medidas, ancho, orden, rotar, limite) -> Optional[Tuple[int, list]]:
+    """
+    Empaquetar con guillotina.
+    
+    Se mantienen rectángulos libres (el de arriba, de altura infinita). Cada
+    pieza va en el libre donde su borde superior quede más bajo y el sobrante
+    se parte en dos por el eje más corto (el infinito, siempre en horizontal,
+    lo que forma estantes). Se descartan los libres en los que no cabe la
+    pieza más pequeña.
+    
+    Returns:
+        Optional[Tuple[int, list]]: Largo y posiciones, o None si se agotó el tiempo
+    """
+    minimo = min(min(w, h) for w, h in medidas) if rotar else min(min(w for w, _ in medidas), min(h for _, h in medidas))
+    libres = [(0, 0, ancho, _INFINITO)]
+    posiciones = [None] * len(medidas)
+    largo = 0
+    for k, i in enumerate(orden):
+        if limite is not None and not k & 127 and time.perf_counter() > limite:
+            return None
+        w, h = medidas[i]
+        mejor = None
+        for indice, (lx, ly, lw, lh) in enumerate(libres):
+            for pw, ph, rotada in ((w, h, False), (h, w, True)) if rotar and w != h else ((w, h, False),):
+                if pw <= lw and ph <= lh:
+                    tope = ly + ph
+                    if mejor is None or tope < mejor[0] or (tope == mejor[0] and lx < mejor[1]):
+                        mejor = (tope, lx, indice, pw, ph, rotada)
+        if mejor is None:
+            continue
+        
+        tope, _, indice, pw, ph, rotada = mejor
+        lx, ly, lw, lh = libres[indice]
+        posiciones[i] = (lx, ly, rotada)
+        if tope > largo:
+            largo = tope
+        
+        if lh == _INFINITO or lw - pw < lh - ph:
+            derecha = (lx + pw, ly, lw - pw, ph)
+            arriba = (lx, ly + ph, lw, lh if lh == _INFINITO else lh - ph)
+        else:
+            derecha = (lx + pw, ly, lw - pw, lh)
+            arriba = (lx, ly + ph, pw, lh - ph)
+        libres[indice] = arriba
+        if derecha[2] >= minimo and derecha[3] >= minimo:
+            libres.append(derecha)
+        if lh != _INFINITO and (arriba[2] < minimo or arriba[3] < minimo):
+            libres[indice] = libres[-1]
+            libres.pop()
+    return largo, posiciones
+
+
+_HEURISTICAS = {'skyline': _skyline, 'guillotina': _guillotina}
+
+
+def _por_diseño(medidas, diseños, ancho, rotar) -> Tuple[int, list]:
+    """
+    Acomodar cada diseño en sus propias filas (una rejilla por diseño, en la
+    orientación que ocupe menos largo), un diseño tras otro.
+    
+    Returns:
+        Tuple[int, list]: Largo y posiciones
+    """
+    grupos: Dict[Hashable, List[int]] = {}
+    for i, (diseño, medida) in enumerate(zip(diseños, medidas)):
+        grupos.setdefault((medida if diseño is None else diseño, medida), []).append(i)
+    
+    posiciones = [None] * len(medidas)
+    largo = 0
+    for (_, (w, h)), indices in grupos.items():
+        mejor = None
+        for pw, ph, rotada in ((w, h, False), (h, w, True)) if rotar and w != h else ((w, h, False),):
+            if pw > ancho:
+                continue
+            por_fila = ancho // pw
+            alto_bloque = -(-len(indices) // por_fila) * ph
+            if mejor is None or alto_bloque < mejor[0]:
+                mejor = (alto_bloque, por_fila, pw, ph, rotada)
+        alto_bloque, por_fila, pw, ph, rotada = mejor
+        for k, i in enumerate(indices):
+            posiciones[i] = ((k % por_fila) * pw, largo + (k // por_fila) * ph, rotada)
+        largo += alto_bloque
+    return largo, posiciones
+
+
+def _ordenes(medidas) -> List[Tuple[str, List[int]]]:
+    """Órdenes de entrada iniciales (de mayor a menor según distintos criterios)."""
+    indices = range(len(medidas))
+    return [
+        ('alto', sorted(indices, key=lambda i: (-max(medidas[i]), -min(medidas[i])))),
+        ('area', sorted(indices, key=lambda i: -medidas[i][0] * medidas[i][1])),
+        ('ancho', sorted(indices, key=lambda i: (-medidas[i][0], -medidas[i][1]))),
+        ('perimetro', sorted(indices, key=lambda i: -(medidas[i][0] + medidas[i][1]))),
+    ]
+
+
+def _perturbar(orden: Sequence[int], aleatorio: random.Random) -> List[int]:
+    """Vecino de un orden: intercambiar dos piezas o mover un bloque."""
+    orden = list(orden)
+    n = len(orden)
+    if aleatorio.random() < 0.5:
+        for _ in range(1 + aleatorio.randrange(3)):
+            a, b = aleatorio.randrange(n), aleatorio.randrange(n)
+            orden[a], orden[b] = orden[b], orden[a]
+    else:
+        a = aleatorio.randrange(n)
+        b = min(n, a + 1 + aleatorio.randrange(max(1, n // 20)))
+        bloque = orden[a:b]
+        del orden[a:b]
+        destino = aleatorio.randrange(len(orden) + 1)
+        orden[destino:destino] = bloque
+    return orden
+
+
+def empaquetar(piezas: Sequence[Pieza], ancho_rollo: float, presupuesto_ms: float = 200,
+               margen: float = 0.5, rotar: bool = True, semilla: int = 0) -> Acomodo:
+    """
+    Acomodar piezas en un rollo minimizando el largo usado.
+    
+    Args:
+        piezas: Piezas a acomodar (una por copia)
+        ancho_rollo: Ancho útil del rollo en cm
+        presupuesto_ms: Tiempo máximo de mejora en milisegundos (el primer
+            acomodo siempre se completa aunque lo supere)
+        margen: Separación entre diseños en cm
+        rotar: Si se permite girar los diseños 90°
+        semilla: Semilla de las perturbaciones
+    
+    Returns:
+        Acomodo: Mejor acomodo encontrado
+    """
+    inicio = time.perf_counter()
+    limite = inicio + presupuesto_ms / 1000
+    separacion, ancho, validas, sin_colocar, medidas = _preparar(piezas, ancho_rollo, margen, rotar)
+    
+    mejor = None
+    intentos = 0
+    if medidas:
+        # Cota inferior: el área de las piezas repartida en todo el ancho
+        cota = -(-sum(w * h for w, h in medidas) // ancho)
+        # Primero los skyline (rápidos); la guillotina, más lenta con muchas
+        # piezas, solo si queda tiempo
+        candidatos = [('skyline', nombre, orden, rotar) for nombre, orden in _ordenes(medidas)]
+        # Elegir siempre la orientación con el tope más bajo puede girar piezas
+        # que encajan mejor derechas: se prueba también sin girar (si todas caben)
+        if rotar and all(w <= ancho for w, _ in medidas):
+            candidatos[1:1] = [('skyline', nombre, orden, False) for _, nombre, orden, _ in candidatos]
+        candidatos.append(('guillotina', 'alto', candidatos[0][2], rotar))
+        for heuristica, nombre, orden, girar in candidatos:
+            # El primer acomodo se completa sin límite de tiempo
+            resultado = _HEURISTICAS[heuristica](medidas, ancho, orden, girar, limite if mejor else None)
+            intentos += 1
+            if resultado is not None and (mejor is None or resultado[0] < mejor.largo):
+                nombre = f'{heuristica}/{nombre}' + ('' if girar == rotar else '/sin-girar')
+                mejor = _Parcial(resultado[0], tuple(orden), tuple(resultado[1]), nombre, girar)
+            if time.perf_counter() > limite or mejor.largo <= cota:
+                break
+        
+        # Mejora anytime: perturbar el orden del mejor y volver a empaquetar
+        aleatorio = random.Random(semilla)
+        while len(medidas) > 1 and mejor.largo > cota and time.perf_counter() < limite:
+            heuristica = mejor.heuristica.split('/')[0]
+            orden = _perturbar(mejor.orden, aleatorio)
+            resultado = _HEURISTICAS[heuristica](medidas, ancho, orden, mejor.rotar, limite)
+            intentos += 1
+            # Los empates también se aceptan para no quedarse en el mismo orden
+            if resultado is not None and resultado[0] <= mejor.largo:
+                nombre = mejor.heuristica if mejor.heuristica.endswith('+mejora') else mejor.heuristica + '+mejora'
+                mejor = _Parcial(resultado[0], tuple(orden), tuple(resultado[1]), nombre, mejor.rotar)
+    
+        # Con pocos diseños repetidos muchas veces, sus rejillas pueden ganar
+        largo, posiciones = _por_diseño(medidas, [p.diseño for p in validas], ancho, rotar)
+        intentos += 1
+        if largo < mejor.largo:
+            mejor = _Parcial(largo, tuple(range(len(medidas))), tuple(posiciones), 'por-diseño', rotar)
+    
+    return _resultado(ancho_rollo, separacion, ancho, validas, medidas, sin_colocar, mejor, intentos, inicio)
+
+
+def acomodo_por_diseño(piezas: Sequence[Pieza], ancho_rollo: float, margen: float = 0.5,
+                       rotar: bool = True) -> Acomodo:
+    """
+    Acomodar sin agrupar: cada diseño (``Pieza.diseño``) en sus propias filas,
+    uno tras otro, con el mismo margen y giro que ``empaquetar``. Es la
+    referencia con la que se mide el ahorro de agrupar.
+    
+    Args:
+        piezas: Piezas a acomodar (una por copia)
+        ancho_rollo: Ancho útil del rollo en cm
+        margen: Separación entre diseños en cm
+        rotar: Si se permite girar los diseños 90°
+    
+    Returns:
+        Acomodo: Acomodo diseño a diseño
+    """
+    inicio = time.perf_counter()
+    separacion, ancho, validas, sin_colocar, medidas = _preparar(piezas, ancho_rollo, margen, rotar)
+    mejor = None
+    if medidas:
+        largo, posiciones = _por_diseño(medidas, [p.diseño for p in validas], ancho, rotar)
+        mejor = _Parcial(largo, tuple(range(len(medidas))), tuple(posiciones), 'por-diseño', rotar)
+    return _resultado(ancho_rollo, separacion, ancho, validas, medidas, sin_colocar, mejor, 1 if mejor else 0, inicio)
+
+
+def _preparar(piezas, ancho_rollo, margen, rotar):
+    """Separación, ancho del rollo, piezas que caben con sus medidas (enteros) y las que no."""
+    separacion = int(round(margen * _ESCALA))
+    # El margen se suma a cada pieza y al rollo (el último diseño llega al borde)
+    ancho = int(round(ancho_rollo * _ESCALA)) + separacion
+    
+    validas, sin_colocar, medidas = [], [], []
+    for pieza in piezas:
+        w = int(round(pieza.ancho * _ESCALA)) + separacion
+        h = int(round(pieza.alto * _ESCALA)) + separacion
+        if pieza.ancho <= 0 or pieza.alto <= 0 or (min(w, h) if rotar else w) > ancho:
+            sin_colocar.append(pieza)
+            continue
+        validas.append(pieza)
+        medidas.append((w, h))
+    return separacion, ancho, validas, sin_colocar, medidas
+
+
+def _resultado(ancho_rollo, separacion, ancho, validas, medidas, sin_colocar, mejor, intentos, inicio) -> Acomodo:
+    """Acomodo en cm a partir del mejor acomodo interno."""
+    colocaciones = []
+    area = 0
+    largo = 0
+    if mejor is not None:
+        for pieza, (w, h), posicion in zip(validas, medidas, mejor.posiciones):
+            x, y, rotada = posicion
+            pw, ph = (h, w) if rotada else (w, h)
+            pw -= separacion
+            ph -= separacion
+            area += pw * ph
+            largo = max(largo, y + ph)
+            colocaciones.append(Colocacion(pieza.ref, x / _ESCALA, y / _ESCALA, pw / _ESCALA, ph / _ESCALA, rotada))
+    
+    largo_cm = largo / _ESCALA
+    return Acomodo(
+        ancho_rollo=ancho_rollo,
+        largo_cm=largo_cm,
+        metros=round(largo_cm / 100, 4),
+        aprovechamiento=round(area / (largo * (ancho - separacion)), 4) if largo else 0.0,
+        colocaciones=tuple(colocaciones),
+        sin_colocar=tuple(sin_colocar),
+        heuristica=mejor.heuristica if mejor else '',
+        intentos=intentos,
+        ms=round((time.perf_counter() - inicio) * 1000, 1)
+    )
+
+
+def piezas_de(personalizaciones: Sequence[Any]) -> List[Pieza]:
+    """
+    Piezas (una por copia) de una lista de personalizaciones con medidas.
+    
+    Args:
+        personalizaciones: Personalizaciones (se ignoran las que no tienen ancho y alto)
+    
+    Returns:
+        List[Pieza]: Piezas con ref ``(personalizacion_id, copia)`` y la
+        personalización como diseño
+    """
+    piezas = []
+    for pers in personalizaciones:
+        ancho = float(getattr(pers, 'ancho', 0) or 0)
+        alto = float(getattr(pers, 'alto', 0) or 0)
+        if ancho <= 0 or alto <= 0:
+            continue
+        for copia in range(max(int(pers.cantidad or 0), 0)):
+            piezas.append(Pieza((pers.id, copia), ancho, alto, pers.id))
+    return piezas
+
+
+def planificar_pendientes(storage, presupuesto_ms: float = 500, margen: float = 0.5,
+                          rotar: bool = True) -> List[Dict[str, Any]]:
+    """
+    Acomodar en rollos las personalizaciones DTF y sublimación pendientes.
+    
+    Se toman las personalizaciones activas de los pedidos pendientes o en
+    proceso y se acomodan juntas por proceso (cada proceso es un rollo con su
+    ancho disponible). El presupuesto se reparte entre procesos según su
+    número de piezas.
+    
+    Args:
+        storage: Instancia de StorageService
+        presupuesto_ms: Presupuesto total en milisegundos
+        margen: Separación entre diseños en cm
+        rotar: Si se permite girar los diseños 90°
+    
+    Returns:
+        List[Dict[str, Any]]: Por proceso: acomodo, metros diseño a diseño
+        (``acomodo_por_diseño``, con el mismo margen y giro) y ahorro, que
+        nunca es negativo
+    """
+    from app.models.pedido import EstadoPedido, Pedido, Personalizacion
+    from app.services.catalog import catalog
+    
+    procesos = {p.id: p for p in catalog.procesos() if p.is_active and p.get_tipo_enum() in TIPOS_ROLLO}
+    if not procesos:
+        return []
+    
+    pedidos = {
+        p.id for p in storage.query(Pedido).where(
+            estado__in=[EstadoPedido.PENDIENTE.value, EstadoPedido.EN_PROCESO.value], is_active=True
+        ).all()
+    }
+    por_proceso: Dict[str, list] = {}
+    for pers in storage.query(Personalizacion).where(proceso_id__in=list(procesos), is_active=True).all():
+        if getattr(pers, 'pedido_id', None) in pedidos:
+            por_proceso.setdefault(pers.proceso_id, []).append(pers)
+    
+    grupos = [(proceso_id, lista, piezas_de(lista)) for proceso_id, lista in por_proceso.items()]
+    total = sum(len(piezas) for _, _, piezas in grupos) or 1
+    
+    planes = []
+    for proceso_id, lista, piezas in grupos:
+        tarifa = catalog.tarifa(proceso_id)
+        acomodo = empaquetar(
+            piezas, tarifa.ancho_disponible, presupuesto_ms * len(piezas) / total, margen, rotar
+        )
+        sin_agrupar = acomodo_por_diseño(piezas, tarifa.ancho_disponible, margen, rotar).metros
+        planes.append({
+            'proceso_id': proceso_id,
+            'proceso': procesos[proceso_id].nombre,
+            'personalizaciones': len(lista),
+            'sin_medidas': sum(1 for p in lista if not (getattr(p, 'ancho', None) and getattr(p, 'alto', None))),
+            'piezas': len(piezas),
+            'metros_sin_agrupar': round(sin_agrupar, 4),
+            'ahorro_metros': round(sin_agrupar - acomodo.metros, 4),
+            'acomodo': acomodo,
+        })
+    return planes
@@ -0,0 +1,476 @@
+"""
+Vista desnormalizada de cada pedido, lista para mostrar.
+
+Un hash por pedido (``vista:pedido:<id>``, en el nodo y el espacio de tenant
+del pedido) guarda todo lo que necesitan el detalle, la API de totales y la
+vista de impresión:
+
+    pedido       JSON del Pedido
+    cliente      JSON del Cliente
+    item:<id>    JSON con el ItemPedido, su Producto y sus personalizaciones
+                 (cada una con su Proceso)
+    __completo__ Marca de documento completo, con la versión del formato
+
+Se lee con un solo HGETALL. Cada save de un pedido, item o personalización
+anota el cambio y, al terminar la petición, se reescribe solo la parte
+afectada: la cabecera o el sub-documento del item. Los cambios en clientes,
+productos y procesos marcan los pedidos e items que los referencian.
+
+El save incrementa además, al momento, el contador de cambios del pedido
+(``clave_cambios``; también con la vista desactivada, porque lo vigila el
+repreciado). La reconstrucción y la reescritura de una parte lo vigilan: si otro
+cambio del pedido llega entre la lectura de los datos y la escritura, lo
+escrito podría quedar desfasado, así que no se guarda (la reconstrucción) o
+se borra el documento (la reescritura) y la próxima lectura lo construye.
+"""
+
+import json
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, g, has_request_context
+from redis.exceptions import WatchError
+from sirope.coders import JSONCoder, JSONDCoder
+
+
+# Versión del formato del documento: al cambiarla los documentos se reconstruyen
+FORMATO = 1
+MARCA_COMPLETO = '__completo__'
+
+
+def clave(pedido_id: str) -> str:
+    """Clave del documento de un pedido."""
+    return f"vista:pedido:{pedido_id}"
+
+
+def clave_cambios(pedido_id: str) -> str:
+    """Contador de cambios del pedido (y de sus items y personalizaciones), en
+    el nodo y el espacio de tenant del pedido: quien lee el pedido para
+    reescribir algo a partir de él lo vigila, y si cambia no guarda su
+    resultado (podría estar desfasado)."""
+    return f"vista:pedido:{pedido_id}:cambios"
+
+
+def _anotar_cambio(storage, pedido_id: str):
+    """Incrementar el contador de cambios de un pedido."""
+    from app.models.pedido import Pedido
+    with storage.client_for(Pedido, pedido_id).pipeline(transaction=False) as pipe:
+        pipe.incr(clave_cambios(pedido_id))
+        pipe.expire(clave_cambios(pedido_id), 3600)
+        pipe.execute()
+
+
+def _datos(obj) -> Dict[str, Any]:
+    """
+    Atributos guardables de un modelo: sin OID, con los enums por su valor y sin
+    los objetos asignados para mostrar (``item.producto``, ``pers.proceso``...).
+    """
+    from app.models.base_model import BaseModel
+    datos = {}
+    for campo, valor in obj.__dict__.items():
+        if campo == '__oid__' or isinstance(valor, BaseModel):
+            continue
+        if isinstance(valor, (list, tuple)) and any(isinstance(v, BaseModel) for v in valor):
+            continue
+        datos[campo] = valor.value if isinstance(valor, Enum) else valor
+    return datos
+
+
+def _codificar(valor) -> str:
+    return json.dumps(valor, cls=JSONCoder)
+
+
+def _objeto(class_type, datos: Optional[Dict[str, Any]]):
+    """Reconstruir un modelo a partir de sus atributos, como al cargarlo de Redis."""
+    if datos is None:
+        return None
+    obj = object.__new__(class_type)
+    obj.__dict__ = datos
+    obj.restore_enums_after_loading()
+    return obj
+
+
+# ----------------------------------------------------------------------
+# Registro de cambios
+# ----------------------------------------------------------------------
+
+def _vacio() -> Dict[str, Any]:
+    return {'pedidos': {}, 'clientes': set(), 'productos': set(), 'procesos': set()}
+
+
+def _pendientes() -> Dict[str, Any]:
+    """Cambios anotados en la petición actual."""
+    if 'vistas_pedido' not in g:
+        g.vistas_pedido = _vacio()
+    return g.vistas_pedido
+
+
+def _activa() -> bool:
+    return current_app.config.get('ORDER_VIEW_ENABLED', True)
+
+
+def track(storage, obj):
+    """
+    Anotar que se ha guardado un objeto que aparece en las vistas de pedido.
+    Dentro de una petición se aplica al final (``flush``), una sola vez por
+    pedido o item aunque se guarde varias veces; fuera, al momento. El
+    contador de cambios del pedido se incrementa siempre al momento.
+    
+    Args:
+        storage: StorageService con el que se guardó
+        obj: Objeto guardado
+    """
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    from app.models.cliente import Cliente
+    from app.models.producto import Producto
+    from app.models.proceso import Proceso
+    
+    if not isinstance(obj, (Pedido, ItemPedido, Personalizacion, Cliente, Producto, Proceso)):
+        return
+    activa = _activa()
+    if not activa and not isinstance(obj, (Pedido, ItemPedido, Personalizacion)):
+        return
+    pendientes = _pendientes() if activa and has_request_context() else _vacio()
+    
+    def pedido(pedido_id):
+        # El contador se mueve ya, aunque la vista se reescriba al final de la petición
+        _anotar_cambio(storage, pedido_id)
+        return pendientes['pedidos'].setdefault(pedido_id, {'cabecera': False, 'items': set()})
+    
+    if isinstance(obj, Pedido):
+        pedido(obj.id)['cabecera'] = True
+    elif isinstance(obj, ItemPedido):
+        if getattr(obj, 'pedido_id', None):
+            pedido(obj.pedido_id)['items'].add(obj.id)
+    elif isinstance(obj, Personalizacion):
+        if getattr(obj, 'pedido_id', None) and getattr(obj, 'item_pedido_id', None):
+            pedido(obj.pedido_id)['items'].add(obj.item_pedido_id)
+        elif getattr(obj, 'item_pedido_id', None):
+            # Personalización anterior a guardar su pedido_id: se busca por su item
+            item = storage.get(ItemPedido, obj.item_pedido_id)
+            if item and getattr(item, 'pedido_id', None):
+                pedido(item.pedido_id)['items'].add(item.id)
+    elif isinstance(obj, Cliente):
+        pendientes['clientes'].add(obj.id)
+    elif isinstance(obj, Producto):
+        pendientes['productos'].add(obj.id)
+    elif isinstance(obj, Proceso):
+        pendientes['procesos'].add(obj.id)
+    
+    if activa and not has_request_context():
+        _aplicar_o_invalidar(storage, pendientes)
+
+
+def flush(storage=None):
+    """
+    Aplicar los cambios anotados en la petición actual.
+    
+    Args:
+        storage: StorageService a usar (por defecto, uno nuevo)
+    """
+    if 'vistas_pedido' not in g:
+        return
+    pendientes = g.pop('vistas_pedido')
+    if storage is None:
+        from app.services.storage_service import StorageService
+        storage = StorageService()
+    _aplicar_o_invalidar(storage, pendientes)
+
+
+def _aplicar_o_invalidar(storage, pendientes: Dict[str, Any]):
+    try:
+        _aplicar(storage, pendientes)
+    except Exception as e:
+        # La vista se reconstruye entera en la siguiente lectura que la eche en falta
+        current_app.logger.error(f"Error actualizando vistas de pedido: {e}")
+        for pedido_id in pendientes['pedidos']:
+            try:
+                invalidate(storage, pedido_id)
+            except Exception:
+                pass
+
+
+def _aplicar(storage, pendientes: Dict[str, Any]):
+    """Reescribir las partes afectadas de los documentos."""
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    
+    pedidos = pendientes['pedidos']
+    
+    def pedido(pedido_id):
+        return pedidos.setdefault(pedido_id, {'cabecera': False, 'items': set()})
+    
+    # Referencias: marcar lo que muestra datos de clientes, productos o procesos
+    for cliente_id in pendientes['clientes']:
+        for p in storage.query(Pedido).where(cliente_id=cliente_id).all():
+            pedido(p.id)['cabecera'] = True
+    if pendientes['productos']:
+        for item in storage.query(ItemPedido).where(producto_id__in=list(pendientes['productos'])).all():
+            if getattr(item, 'pedido_id', None):
+                pedido(item.pedido_id)['items'].add(item.id)
+    if pendientes['procesos']:
+        for pers in storage.query(Personalizacion).where(proceso_id__in=list(pendientes['procesos'])).all():
+            if getattr(pers, 'pedido_id', None):
+                pedido(pers.pedido_id)['items'].add(pers.item_pedido_id)
+    
+    for pedido_id, cambios in pedidos.items():
+        _reescribir(storage, pedido_id, cambios)
+
+
+def _reescribir(storage, pedido_id: str, cambios: Dict[str, Any]):
+    """
+    Reescribir las partes cambiadas del documento de un pedido, vigilando su
+    contador de cambios. Si el pedido cambia mientras se leen los datos, lo
+    leído podría estar desfasado: el documento se borra y la próxima lectura
+    lo construye entero.
+    """
+    from app.models.pedido import Pedido
+    
+    with storage.client_for(Pedido, pedido_id).pipeline() as pipe:
+        try:
+            pipe.watch(clave_cambios(pedido_id))
+            if not pipe.hexists(clave(pedido_id), MARCA_COMPLETO):
+                # Sin documento (pedido nuevo o anterior a las vistas): se
+                # construye entero la próxima vez que se lea
+                return
+            campos = {}
+            if cambios['cabecera']:
+                campos = _cabecera(storage, pedido_id)
+                if campos is None:
+                    pipe.multi()
+                    pipe.delete(clave(pedido_id))
+                    pipe.execute()
+                    return
+            if cambios['items']:
+                campos.update(_subdocumentos(storage, pedido_id, list(cambios['items'])))
+            pipe.multi()
+            escribir = {campo: valor for campo, valor in campos.items() if valor is not None}
+            if escribir:
+                pipe.hset(clave(pedido_id), mapping=escribir)
+            quitar = [campo for campo, valor in campos.items() if valor is None]
+            if quitar:
+                pipe.hdel(clave(pedido_id), *quitar)
+            pipe.execute()
+        except WatchError:
+            current_app.logger.info(f"Vista del pedido {pedido_id} cambiada durante su actualización")
+            invalidate(storage, pedido_id)
+
+
+def _cabecera(storage, pedido_id: str) -> Optional[Dict[str, str]]:
+    """Campos del pedido y su cliente, o None si el pedido ya no está en las vistas."""
+    from app.models.pedido import Pedido
+    from app.models.cliente import Cliente
+    
+    pedido = storage.load_many([pedido_id], Pedido).get(pedido_id)
+    if pedido is None or not pedido.is_active:
+        return None
+    cliente = storage.load_many([pedido.cliente_id], Cliente).get(str(pedido.cliente_id))
+    return {
+        'pedido': _codificar(_datos(pedido)),
+        'cliente': _codificar(_datos(cliente) if cliente else None),
+    }
+
+
+def _subdocumentos(storage, pedido_id: str, item_ids: List[str]) -> Dict[str, Optional[str]]:
+    """
+    Construir los sub-documentos de varios items con un número fijo de lecturas.
+    
+    Returns:
+        Dict[str, Optional[str]]: Campo "item:<id>" -> JSON, o None si el item
+        ya no pertenece a la vista (borrado o de otro pedido)
+    """
+    from app.models.pedido import ItemPedido, Personalizacion
+    from app.models.producto import Producto
+    from app.models.proceso import Proceso
+    
+    items = storage.load_many(item_ids, ItemPedido)
+    activos = [
+        item for item in items.values()
+        if item.is_active and str(getattr(item, 'pedido_id', '')) == str(pedido_id)
+    ]
+    personalizaciones = storage.query(Personalizacion).where(
+        item_pedido_id__in=[item.id for item in activos], is_active=True
+    ).all() if activos else []
+    storage.prefetch(activos, {'producto_id': Producto})
+    storage.prefetch(personalizaciones, {'proceso_id': Proceso})
+    
+    por_item = {}
+    for pers in personalizaciones:
+        por_item.setdefault(pers.item_pedido_id, []).append(pers)
+    
+    campos = {f"item:{item_id}": None for item_id in item_ids}
+    for item in activos:
+        campos[f"item:{item.id}"] = _codificar({
+            'item': _datos(item),
+            'producto': _datos(item.producto) if item.producto else None,
+            'personalizaciones': [
+                {'pers': _datos(pers), 'proceso': _datos(pers.proceso) if pers.proceso else None}
+                for pers in por_item.get(item.id, [])
+            ],
+        })
+    return campos
+
+
+# ----------------------------------------------------------------------
+# Lectura y reconstrucción
+# ----------------------------------------------------------------------
+
+def _construir(storage, pedido_id: str) -> Optional[Dict[str, str]]:
+    """Campos del documento completo de un pedido, o None si no existe o está eliminado."""
+    from app.models.pedido import Pedido, ItemPedido
+    from app.models.cliente import Cliente
+    
+    pedido = storage.load_many([pedido_id], Pedido).get(pedido_id)
+    if pedido is None or not pedido.is_active:
+        return None
+    cliente = storage.load_many([pedido.cliente_id], Cliente).get(str(pedido.cliente_id))
+    items = storage.query(ItemPedido).where(pedido_id=pedido_id, is_active=True).all()
+    campos = {campo: valor for campo, valor in _subdocumentos(storage, pedido_id, [i.id for i in items]).items()
+              if valor is not None}
+    campos.update({
+        'pedido': _codificar(_datos(pedido)),
+        'cliente': _codificar(_datos(cliente) if cliente else None),
+        MARCA_COMPLETO: str(FORMATO),
+    })
+    return campos
+
+
+def rebuild(storage, pedido_id: str) -> Optional[Dict[str, str]]:
+    """
+    Construir el documento completo de un pedido desde los datos y guardarlo,
+    salvo que el pedido cambie mientras tanto.
+    
+    Args:
+        storage: StorageService
+        pedido_id: ID del pedido
+    
+    Returns:
+        Optional[Dict[str, str]]: Campos construidos, o None si el pedido no
+        existe o está eliminado
+    """
+    from app.models.pedido import Pedido
+    
+    pipe = storage.client_for(Pedido, pedido_id).pipeline()
+    try:
+        pipe.watch(clave_cambios(pedido_id))
+        campos = _construir(storage, pedido_id)
+        pipe.multi()
+        pipe.delete(clave(pedido_id))
+        if campos:
+            pipe.hset(clave(pedido_id), mapping=campos)
+        pipe.execute()
+    except WatchError:
+        # Otro proceso cambió el pedido: lo construido sirve para esta lectura
+        # pero no se guarda; la siguiente lo reconstruirá
+        current_app.logger.info(f"Vista del pedido {pedido_id} cambiada durante su reconstrucción")
+    finally:
+        pipe.reset()
+    return campos
+
+
+def invalidate(storage, pedido_id: str):
+    """
+    Borrar el documento de un pedido (se reconstruye en la próxima lectura).
+    Cuenta como un cambio: una reconstrucción en curso no lo vuelve a guardar.
+    """
+    from app.models.pedido import Pedido
+    with storage.client_for(Pedido, pedido_id).pipeline(transaction=False) as pipe:
+        pipe.delete(clave(pedido_id))
+        pipe.incr(clave_cambios(pedido_id))
+        pipe.expire(clave_cambios(pedido_id), 3600)
+        pipe.execute()
+
+
+def get(storage, pedido_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Leer la vista de un pedido con un solo HGETALL. Si no existe (o es de un
+    formato anterior) se construye y se guarda.
+    
+    Args:
+        storage: StorageService
+        pedido_id: ID del pedido
+    
+    Returns:
+        Optional[Dict[str, Any]]: {'pedido', 'cliente', 'items'} con objetos de
+        modelo (cada item con ``producto`` y ``personalizaciones``, cada
+        personalización con ``proceso``), o None si el pedido no existe
+    """
+    from app.models.pedido import Pedido
+    
+    if _activa():
+        documento = storage.client_for(Pedido, pedido_id).hgetall(clave(pedido_id))
+        if documento.get(MARCA_COMPLETO.encode()) != str(FORMATO).encode():
+            campos = rebuild(storage, pedido_id)
+            documento = None if campos is None else {k.encode(): v.encode() for k, v in campos.items()}
+    else:
+        campos = _construir(storage, pedido_id)
+        documento = None if campos is None else {k.encode(): v.encode() for k, v in campos.items()}
+    if documento is None:
+        return None
+    return _decodificar(documento)
+    
+
+async def get_async(storage_async, pedido_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Versión asíncrona de ``get`` para las vistas async: el HGETALL va por
+    redis.asyncio. Si hay que construir el documento se hace como en ``get``,
+    en el hilo de la petición.
+    
+    Args:
+        storage_async: AsyncStorageService
+        pedido_id: ID del pedido
+    
+    Returns:
+        Optional[Dict[str, Any]]: Igual que ``get``
+    """
+    from asgiref.sync import sync_to_async
+    from app.models.pedido import Pedido
+    from app.services.storage_service import StorageService
+    
+    if _activa():
+        documento = await storage_async.command_for(Pedido, pedido_id, 'HGETALL', clave(pedido_id))
+        if documento.get(MARCA_COMPLETO.encode()) == str(FORMATO).encode():
+            return _decodificar(documento)
+    return await sync_to_async(get)(StorageService(), pedido_id)
+
+
+def _decodificar(documento: Dict[bytes, bytes]) -> Dict[str, Any]:
+    """Objetos de modelo a partir del hash leído de Redis."""
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    from app.models.cliente import Cliente
+    from app.models.producto import Producto
+    from app.models.proceso import Proceso
+    
+    decoder = JSONDCoder()
+    pedido = _objeto(Pedido, decoder.decode(documento[b'pedido'].decode('utf-8')))
+    cliente = _objeto(Cliente, decoder.decode(documento[b'cliente'].decode('utf-8')))
+    items = []
+    for campo, valor in documento.items():
+        if not campo.startswith(b'item:'):
+            continue
+        datos = decoder.decode(valor.decode('utf-8'))
+        item = _objeto(ItemPedido, datos['item'])
+        item.producto = _objeto(Producto, datos['producto'])
+        item.personalizaciones = []
+        for entrada in datos['personalizaciones']:
+            pers = _objeto(Personalizacion, entrada['pers'])
+            pers.proceso = _objeto(Proceso, entrada['proceso'])
+            item.personalizaciones.append(pers)
+        items.append(item)
+    
+    # El hash no guarda orden: el de creación, como en las consultas
+    items.sort(key=lambda i: (str(getattr(i, 'created_at', '')), i.id))
+    return {'pedido': pedido, 'cliente': cliente, 'items': items}
+
+
+def init_app(app):
+    """Aplicar los cambios anotados al terminar cada petición."""
+    @app.after_request
+    def aplicar_vistas_pedido(respuesta):
+        flush()
+        return respuesta
+    
+    @app.teardown_request
+    def aplicar_vistas_pedido_pendientes(error=None):
+        # Si la petición falló antes de after_request
+        if 'vistas_pedido' in g:
+            flush()
@@ -0,0 +1,364 @@
+"""
+Cotización por lotes de procesos de personalización.
+
+Calcula de una vez los metros y el precio de muchos diseños (proceso, ancho,
+alto, cantidad y tamaño de bordado o tipo de vinil), con las mismas fórmulas
+que ``Proceso.calcular_metros_necesarios``, ``calcular_precio_dtf_sublimacion``,
+``calcular_precio_bordado`` y ``calcular_precio_vinil``:
+
+- DTF / Sublimación: filas = ceil(cantidad / diseños por ancho) y
+  metros = filas * alto / 100; precio = metros * precio por metro.
+- Bordado: precio del tamaño * cantidad (+ setup).
+- Vinil: ancho * alto * precio por cm2 del tipo * cantidad.
+
+La configuración de cada proceso se compila en una ``TarifaProceso``
+inmutable (tipo ya interpretado, precios como números y tablas de solo
+lectura), identificada por el id del proceso y su ``config_version``, que sube
+con cada ``Proceso.configurar_precios``. Las tarifas compiladas se guardan en
+memoria del proceso (``tarifas``): cotizar no vuelve a leer atributos, ni a
+interpretar enums, ni a consultar el almacenamiento mientras la versión no
+cambie.
+
+Si NumPy está instalado, el cálculo por lotes se hace con operaciones sobre
+arrays. Sin NumPy se usa un bucle en Python con el mismo resultado.
+"""
+
+import json
+import threading
+import zlib
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+from app.models.proceso import TipoProceso
+
+# Import opcional de numpy para el cálculo vectorizado
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+# Código de fórmula de cada tipo de proceso
+_POR_METRO, _BORDADO, _VINIL, _SIN_FORMULA = 0, 1, 2, -1
+
+_FORMULAS = {
+    TipoProceso.DTF: _POR_METRO,
+    TipoProceso.SUBLIMACION: _POR_METRO,
+    TipoProceso.BORDADO: _BORDADO,
+    TipoProceso.VINIL: _VINIL,
+}
+
+
+class LoteCotizado(NamedTuple):
+    """Resultado de un lote: metros y precio total de cada diseño, en orden."""
+    metros: Sequence[float]
+    precios: Sequence[float]
+
+
+def _opcion(valor) -> str:
+    """Tamaño de bordado o tipo de vinil como texto (acepta el enum)."""
+    if valor is None:
+        return ''
+    return valor.value if hasattr(valor, 'value') else str(valor)
+
+
+class TarifaProceso(NamedTuple):
+    """Configuración de precios de un proceso, compilada e inmutable."""
+    proceso_id: Optional[str]
+    version: int
+    tipo: Optional[TipoProceso]
+    formula: int
+    ancho_disponible: float
+    precio_por_metro: float
+    precio_setup: float
+    precios_por_tamaño: Mapping[str, float]
+    precio_por_cm2: float
+    tipos_vinil: Mapping[str, float]
+
+    def precio_unitario(self, opcion: Any) -> float:
+        """Precio por pieza (bordado) o por cm2 (vinil) de una opción."""
+        opcion = _opcion(opcion)
+        if self.formula == _BORDADO:
+            return self.precios_por_tamaño.get(opcion, 0.0)
+        if self.formula == _VINIL:
+            return self.tipos_vinil.get(opcion, self.precio_por_cm2)
+        return 0.0
+
+    def metros(self, ancho: float, alto: float, cantidad: int) -> float:
+        """Metros de material (DTF / Sublimación; 0 para el resto)."""
+        if self.formula != _POR_METRO or ancho <= 0:
+            return 0.0
+        por_ancho = max(int(self.ancho_disponible // ancho), 1)  # Al menos uno por fila
+        filas = -(-int(cantidad) // por_ancho)
+        return (filas * alto) / 100
+    
+    def precio(self, ancho: float, alto: float, cantidad: int, opcion: Any = None,
+               incluir_setup: bool = True) -> float:
+        """
+        Precio total de un diseño.
+        
+        Args:
+            ancho: Ancho del diseño en cm
+            alto: Alto del diseño en cm
+            cantidad: Piezas
+            opcion: Tamaño de bordado o tipo de vinil
+            incluir_setup: Si sumar el setup del bordado
+        
+        Returns:
+            float: Precio total (0 si el proceso no tiene fórmula)
+        """
+        if self.formula == _POR_METRO:
+            return self.metros(ancho, alto, cantidad) * self.precio_por_metro
+        if self.formula == _BORDADO:
+            return self.precio_unitario(opcion) * cantidad + (self.precio_setup if incluir_setup else 0.0)
+        if self.formula == _VINIL:
+            return ancho * alto * self.precio_unitario(opcion) * cantidad
+        return 0.0
+
+
+def _numeros(valores) -> Mapping[str, float]:
+    """Tabla opción -> precio de solo lectura, con claves de texto."""
+    return MappingProxyType({_opcion(k): float(v or 0.0) for k, v in (valores or {}).items()})
+
+
+def compilar(proceso) -> TarifaProceso:
+    """
+    Compilar la configuración de precios de un proceso (sin caché).
+    
+    Args:
+        proceso: Proceso a compilar
+    
+    Returns:
+        TarifaProceso: Tarifa inmutable con la versión actual del proceso
+    """
+    try:
+        tipo = TipoProceso(proceso.tipo) if isinstance(proceso.tipo, str) else proceso.tipo
+    except ValueError:
+        tipo = None
+    return TarifaProceso(
+        proceso_id=getattr(proceso, 'id', None),
+        version=int(getattr(proceso, 'config_version', 0) or 0),
+        tipo=tipo,
+        formula=_FORMULAS.get(tipo, _SIN_FORMULA),
+        ancho_disponible=float(getattr(proceso, 'ancho_disponible', 0.0) or 0.0),
+        precio_por_metro=float(getattr(proceso, 'precio_por_metro', 0.0) or 0.0),
+        precio_setup=float(getattr(proceso, 'precio_setup', 0.0) or 0.0),
+        precios_por_tamaño=_numeros(getattr(proceso, 'precios_por_tamaño', None)),
+        precio_por_cm2=float(getattr(proceso, 'precio_por_cm2', 0.0) or 0.0),
+        tipos_vinil=_numeros(getattr(proceso, 'tipos_vinil', None))
+    )
+
+
+class TarifasCompiladas:
+    """
+    Tarifas compiladas por id de proceso, válidas mientras no cambie su
+    ``config_version``. Los ids son únicos entre tenants. Es segura entre hilos.
+    """
+    
+    def __init__(self):
+        """Inicializar sin tarifas."""
+        self._lock = threading.Lock()
+        self._tarifas: Dict[str, TarifaProceso] = {}
+        self.stats = {'compiled': 0, 'hits': 0}
+    
+    def buscar(self, proceso_id: str, version: int) -> Optional[TarifaProceso]:
+        """
+        Obtener la tarifa ya compilada de una versión concreta.
+        
+        Args:
+            proceso_id: Id del proceso
+            version: ``config_version`` esperada
+        
+        Returns:
+            Optional[TarifaProceso]: Tarifa o None si no está compilada esa versión
+        """
+        tarifa = self._tarifas.get(proceso_id)
+        if tarifa is None or tarifa.version != version:
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return tarifa
+    
+    def obtener(self, proceso) -> TarifaProceso:
+        """
+        Obtener la tarifa de un proceso, compilándola si su versión es nueva.
+        
+        Args:
+            proceso: Proceso (o una TarifaProceso, que se devuelve tal cual)
+        
+        Returns:
+            TarifaProceso: Tarifa de la versión del proceso
+        """
+        if isinstance(proceso, TarifaProceso):
+            return proceso
+        proceso_id = getattr(proceso, 'id', None)
+        version = int(getattr(proceso, 'config_version', 0) or 0)
+        tarifa = self.buscar(proceso_id, version) if proceso_id else None
+        if tarifa is not None:
+            return tarifa
+        
+        tarifa = compilar(proceso)
+        with self._lock:
+            self.stats['compiled'] += 1
+            actual = self._tarifas.get(proceso_id)
+            # Una versión más reciente compilada por otro hilo no se pisa
+            if proceso_id and (actual is None or actual.version <= version):
+                self._tarifas = {**self._tarifas, proceso_id: tarifa}
+        return tarifa
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Obtener las estadísticas de las tarifas compiladas.
+        
+        Returns:
+            Dict[str, Any]: Compilaciones, aciertos y número de tarifas
+        """
+        with self._lock:
+            estadisticas = dict(self.stats)
+        estadisticas['tarifas'] = len(self._tarifas)
+        return estadisticas
+
+
+# Instancia única por proceso
+tarifas = TarifasCompiladas()
+
+
+# Columnas de cada proceso en el paquete de reglas para el navegador
+CAMPOS_REGLAS = (
+    'id', 'nombre', 'tipo', 'formula', 'ancho_disponible', 'precio_por_metro',
+    'precio_setup', 'precios_por_tamaño', 'precio_por_cm2', 'tipos_vinil'
+)
+
+
+def paquete_reglas(procesos: Sequence[Any]) -> Dict[str, Any]:
+    """
+    Construir el paquete de reglas de precio que evalúa el navegador
+    (``static/js/reglas_precios.js``) con las mismas fórmulas que
+    ``TarifaProceso.precio``.
+    
+    Cada proceso es una fila con las columnas de ``CAMPOS_REGLAS``. La versión
+    es un hash del contenido: cambia con cualquier precio, nombre o proceso
+    nuevo y sirve de ETag.
+    
+    Args:
+        procesos: Procesos a publicar (normalmente los activos)
+    
+    Returns:
+        Dict[str, Any]: {'version', 'formulas', 'campos', 'procesos'}
+    """
+    filas = []
+    for proceso in procesos:
+        tarifa = tarifas.obtener(proceso)
+        filas.append([
+            proceso.id, proceso.nombre, tarifa.tipo.value if tarifa.tipo else None, tarifa.formula,
+            tarifa.ancho_disponible, tarifa.precio_por_metro, tarifa.precio_setup,
+            dict(tarifa.precios_por_tamaño), tarifa.precio_por_cm2, dict(tarifa.tipos_vinil)
+        ])
+    contenido = {
+        'formulas': {'por_metro': _POR_METRO, 'bordado': _BORDADO, 'vinil': _VINIL},
+        'campos': list(CAMPOS_REGLAS),
+        'procesos': filas
+    }
+    texto = json.dumps(contenido, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return {'version': format(zlib.crc32(texto.encode()), '08x'), **contenido}
+
+
+def cotizar_lote(procesos: Sequence[Any], anchos: Sequence[float], altos: Sequence[float],
+                 cantidades: Sequence[int], opciones: Optional[Sequence[Any]] = None,
+                 incluir_setup: bool = True) -> LoteCotizado:
+    """
+    Cotizar un lote de diseños en una sola pasada.
+    
+    Args:
+        procesos: Proceso o TarifaProceso de cada diseño (puede repetirse)
+        anchos: Ancho de cada diseño en cm
+        altos: Alto de cada diseño en cm
+        cantidades: Piezas de cada diseño
+        opciones: Tamaño de bordado o tipo de vinil de cada diseño (opcional)
+        incluir_setup: Si sumar el setup del bordado a cada diseño
+    
+    Returns:
+        LoteCotizado: Metros y precio de cada diseño (arrays de NumPy si está
+        disponible). Los diseños por metro con ancho <= 0 y los procesos sin
+        fórmula cuestan 0.
+    """
+    n = len(procesos)
+    if not (len(anchos) == len(altos) == len(cantidades) == n) or (opciones is not None and len(opciones) != n):
+        raise ValueError("Todas las columnas del lote deben tener la misma longitud")
+    
+    # Tarifa de cada proceso distinto, una vez por lote
+    indices = {}
+    tabla: List[TarifaProceso] = []
+    posicion = []
+    for proceso in procesos:
+        k = indices.get(id(proceso))
+        if k is None:
+            k = indices[id(proceso)] = len(tabla)
+            tabla.append(tarifas.obtener(proceso))
+        posicion.append(k)
+    
+    if HAS_NUMPY:
+        return _cotizar_numpy(tabla, posicion, anchos, altos, cantidades, opciones, incluir_setup)
+    return _cotizar_python(tabla, posicion, anchos, altos, cantidades, opciones, incluir_setup)
+
+
+def _cotizar_numpy(tabla, posicion, anchos, altos, cantidades, opciones, incluir_setup) -> LoteCotizado:
+    """Cálculo vectorizado: cada fórmula se aplica a todo el lote a la vez."""
+    n = len(posicion)
+    if n == 0:
+        return LoteCotizado(np.zeros(0), np.zeros(0))
+    idx = np.asarray(posicion, dtype=np.int64)
+    ancho = np.asarray(anchos, dtype=np.float64)
+    alto = np.asarray(altos, dtype=np.float64)
+    cantidad = np.asarray(cantidades, dtype=np.int64)
+    
+    formula = np.array([t.formula for t in tabla], dtype=np.int8)[idx]
+    ancho_disponible = np.array([t.ancho_disponible for t in tabla])[idx]
+    precio_por_metro = np.array([t.precio_por_metro for t in tabla])[idx]
+    
+    # DTF / Sublimación
+    por_metro = (formula == _POR_METRO) & (ancho > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        por_ancho = np.floor_divide(ancho_disponible, np.where(por_metro, ancho, 1.0)).astype(np.int64)
+    por_ancho = np.maximum(por_ancho, 1)  # Al menos uno por fila
+    filas = -(-cantidad // por_ancho)
+    metros = np.where(por_metro, filas * alto / 100, 0.0)
+    precios = metros * precio_por_metro
+    
+    # Bordado y vinil: precio unitario por (proceso, opción), calculado una
+    # vez por combinación distinta y repartido con un índice
+    con_opcion = (formula == _BORDADO) | (formula == _VINIL)
+    if con_opcion.any():
+        textos = np.array([_opcion(o) for o in opciones] if opciones is not None else [''] * n)
+        valores, codigo = np.unique(textos, return_inverse=True)
+        pares, inverso = np.unique(idx * len(valores) + codigo.reshape(-1), return_inverse=True)
+        unitario = np.array([
+            tabla[par // len(valores)].precio_unitario(str(valores[par % len(valores)]))
+            for par in pares.tolist()
+        ])[inverso.reshape(-1)]
+        
+        bordado = formula == _BORDADO
+        precio_setup = np.array([t.precio_setup for t in tabla])[idx]
+        precio_bordado = unitario * cantidad + (precio_setup if incluir_setup else 0.0)
+        precio_vinil = ancho * alto * unitario * cantidad
+        precios = np.where(bordado, precio_bordado, np.where(formula == _VINIL, precio_vinil, precios))
+    
+    return LoteCotizado(metros, precios)
+
+
+def _cotizar_python(tabla, posicion, anchos, altos, cantidades, opciones, incluir_setup) -> LoteCotizado:
+    """Cálculo sin NumPy, diseño a diseño con las tarifas ya compiladas."""
+    metros: List[float] = []
+    precios: List[float] = []
+    for i, k in enumerate(posicion):
+        tarifa = tabla[k]
+        ancho, alto, cantidad = float(anchos[i]), float(altos[i]), int(cantidades[i])
+        opcion = opciones[i] if opciones is not None else None
+        m = tarifa.metros(ancho, alto, cantidad)
+        metros.append(m)
+        if tarifa.formula == _POR_METRO:
+            precios.append(m * tarifa.precio_por_metro)
+        else:
+            precios.append(tarifa.precio(ancho, alto, cantidad, opcion, incluir_setup))
+    return LoteCotizado(metros, precios)
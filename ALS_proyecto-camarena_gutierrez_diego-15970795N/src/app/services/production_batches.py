@@ -0,0 +1,523 @@
+"""
+Lotes de producción: las personalizaciones abiertas agrupadas para hacerlas juntas.
+
+Un lote reúne las personalizaciones de los pedidos PENDIENTE / EN_PROCESO con
+el mismo proceso, la misma opción (tamaño de bordado o tipo de vinil; en DTF y
+sublimación, todo el pliego del proceso) y la misma fecha de entrega. Los
+lotes se proponen por la prioridad más alta de sus pedidos y después por
+fecha de entrega; dentro de un lote, las líneas van en el mismo orden.
+
+Todo se mantiene en Redis (nodo principal, espacio del tenant de los pedidos)
+con cada cambio, así que el tablero se lee sin recorrer los pedidos:
+
+    lotes:indice            Sorted set lote -> puntuación (prioridad, fecha)
+    lotes:lote:<lote>       Sorted set personalización -> puntuación
+    lotes:resumen:<lote>    Hash con líneas, piezas y líneas por prioridad
+    lotes:pedido:<id>       Hash del pedido: __pedido__ (abierto, prioridad,
+                            entrega) y los parámetros de cada personalización
+    lotes:ubicacion         Personalización -> pedido (para los borrados)
+
+Como en la demanda de material, cada cambio es una transacción que vigila el
+hash del pedido y los resúmenes de los lotes que toca: guardar una
+personalización la mueve de lote; cambiar la prioridad, la fecha o el estado
+de un pedido mueve todas sus líneas. Hasta la primera lectura no hay nada que
+actualizar: esta lo construye todo (``rebuild``).
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from redis.exceptions import WatchError
+
+from app.models.pedido import PrioridadPedido
+
+
+# Versión del formato: al cambiarla los lotes se reconstruyen
+FORMATO = 2
+MARCA = 'lotes:formato'
+CAMBIOS = 'lotes:cambios'         # Una reconstrucción concurrente con un cambio no se guarda
+INDICE = 'lotes:indice'
+UBICACION = 'lotes:ubicacion'
+META = '__pedido__'
+
+ESTADOS_ABIERTOS = ('PENDIENTE', 'EN_PROCESO')
+
+# Rango de cada prioridad: menor primero
+RANGOS = {p.value: r for r, p in enumerate([PrioridadPedido.URGENTE, PrioridadPedido.ALTA,
+                                             PrioridadPedido.NORMAL, PrioridadPedido.BAJA])}
+PRIORIDADES = {r: p for p, r in RANGOS.items()}
+PESO_RANGO = 10 ** 12            # Mayor que cualquier marca de tiempo en segundos
+
+# Pedidos sin fecha de entrega legible: al final
+SIN_FECHA = datetime(2999, 12, 31)
+
+REINTENTOS = 5
+
+
+def _clave_lote(lote: str) -> str:
+    return f'lotes:lote:{lote}'
+
+
+def _clave_resumen(lote: str) -> str:
+    return f'lotes:resumen:{lote}'
+
+
+def _clave_pedido(pedido_id: str) -> str:
+    return f'lotes:pedido:{pedido_id}'
+
+
+def _activa() -> bool:
+    return current_app.config.get('PRODUCTION_BATCHES_ENABLED', True)
+
+
+def _cliente(storage):
+    """Cliente de los lotes (nodo principal, espacio del tenant de los pedidos)."""
+    from app.models.pedido import Pedido
+    return storage._cliente_nodo(storage._nodo_principal(), storage._tenant_de(Pedido))
+
+
+def _texto(valor) -> Optional[str]:
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def _fecha(valor) -> datetime:
+    """Fecha de entrega como datetime (los modelos antiguos la guardan en texto)."""
+    if isinstance(valor, datetime):
+        return valor
+    try:
+        return datetime.fromisoformat(str(valor))
+    except (TypeError, ValueError):
+        return SIN_FECHA
+
+
+def rango_prioridad(prioridad) -> int:
+    """
+    Rango de una prioridad, ya sea el enum o el texto del formulario de
+    pedidos (``'urgente'``, ``'alta'``, ``'normal'``).
+    
+    Args:
+        prioridad: PrioridadPedido o su valor en cualquier capitalización
+    
+    Returns:
+        int: Rango (0 la más urgente); NORMAL si no se reconoce
+    """
+    valor = str(getattr(prioridad, 'value', prioridad) or '').strip().upper()
+    return RANGOS.get(valor, RANGOS['NORMAL'])
+
+
+def meta(pedido) -> List[Any]:
+    """
+    Datos del pedido que deciden el lote y el orden de sus personalizaciones.
+    
+    Args:
+        pedido: Pedido
+    
+    Returns:
+        List[Any]: ``[abierto, rango de prioridad, entrega (timestamp), día de entrega]``
+    """
+    estado = getattr(pedido.estado, 'value', pedido.estado)
+    abierto = 1 if getattr(pedido, 'is_active', True) and estado in ESTADOS_ABIERTOS else 0
+    entrega = _fecha(getattr(pedido, 'fecha_entrega_estimada', None))
+    return [abierto, rango_prioridad(getattr(pedido, 'prioridad', None)), int(entrega.timestamp()),
+            entrega.date().isoformat()]
+
+
+def parametros(pers) -> Optional[List[Any]]:
+    """
+    Parámetros de una personalización que deciden su lote.
+    
+    Args:
+        pers: Personalización
+    
+    Returns:
+        Optional[List[Any]]: ``[proceso_id, opción, piezas]``, o None si no
+        entra en ningún lote (inactiva o sin piezas)
+    """
+    cantidad = int(getattr(pers, 'cantidad', 0) or 0)
+    if not getattr(pers, 'is_active', True) or cantidad <= 0 or not pers.proceso_id:
+        return None
+    opcion = getattr(pers, 'tamaño_bordado', None) or getattr(pers, 'tipo_vinil', None) or ''
+    return [pers.proceso_id, str(getattr(opcion, 'value', opcion)), cantidad]
+
+
+def puntuacion(meta_: List[Any]) -> int:
+    """
+    Puntuación de orden de un pedido: prioridad y después fecha de entrega
+    (menor primero).
+    
+    Args:
+        meta_: Datos del pedido (``meta``)
+    
+    Returns:
+        int: Puntuación
+    """
+    return meta_[1] * PESO_RANGO + meta_[2]
+
+
+def _linea(meta_: Optional[List[Any]], params: Optional[List[Any]]) -> Optional[Tuple[str, int, int, int]]:
+    """Lote, piezas, rango y puntuación de una línea (None si no está en ningún lote)."""
+    if not meta_ or not params or not meta_[0]:
+        return None
+    proceso_id, opcion, piezas = params
+    _, rango, _, dia = meta_
+    return f'{proceso_id}|{dia}|{opcion}', piezas, rango, puntuacion(meta_)
+
+
+def _puntuacion_lote(lote: str, rango: int) -> int:
+    """Puntuación de un lote: su mejor prioridad y su día de entrega."""
+    dia = lote.split('|', 2)[1]
+    return rango * PESO_RANGO + int(datetime.fromisoformat(dia).timestamp())
+
+
+def _cambiar(pipe, cambios: List[Tuple[str, Any, Any]]):
+    """
+    Preparar el movimiento de líneas entre lotes.
+    
+    En modo inmediato: vigila y lee los resúmenes de los lotes afectados.
+    Devuelve la función que encola las escrituras (o None si nada cambia).
+    
+    Args:
+        pipe: Pipeline en modo inmediato (con el hash del pedido vigilado)
+        cambios: ``(personalización, línea anterior, línea nueva)``
+    """
+    cambios = [c for c in cambios if c[1] != c[2]]
+    if not cambios:
+        return None
+    deltas: Dict[str, Dict[str, int]] = {}
+    for _, antes, despues in cambios:
+        for linea, signo in ((antes, -1), (despues, 1)):
+            if linea:
+                lote, piezas, rango, _ = linea
+                delta = deltas.setdefault(lote, {})
+                for campo, valor in (('lineas', 1), ('piezas', piezas), (f'r{rango}', 1)):
+                    delta[campo] = delta.get(campo, 0) + signo * valor
+    
+    lotes = sorted(deltas)
+    pipe.watch(*[_clave_resumen(lote) for lote in lotes])
+    resumenes = {}
+    for lote in lotes:
+        actual = {_texto(k): int(v) for k, v in pipe.hgetall(_clave_resumen(lote)).items()}
+        for campo, valor in deltas[lote].items():
+            actual[campo] = actual.get(campo, 0) + valor
+        resumenes[lote] = {k: v for k, v in actual.items() if v}
+    
+    def escribir(pipe):
+        for pers_id, antes, despues in cambios:
+            if antes:
+                pipe.zrem(_clave_lote(antes[0]), pers_id)
+            if despues:
+                pipe.zadd(_clave_lote(despues[0]), {pers_id: despues[3]})
+        for lote, resumen in resumenes.items():
+            pipe.delete(_clave_resumen(lote))
+            if resumen.get('lineas', 0) > 0:
+                pipe.hset(_clave_resumen(lote), mapping=resumen)
+                mejor = min(int(c[1:]) for c in resumen if c.startswith('r'))
+                pipe.zadd(INDICE, {lote: _puntuacion_lote(lote, mejor)})
+            else:
+                pipe.zrem(INDICE, lote)
+    return escribir
+
+
+def _transaccion(cliente, clave: str, aplicar) -> bool:
+    """
+    Ejecutar una actualización vigilando la clave de un pedido.
+    
+    ``aplicar(pipe)`` lee en modo inmediato y devuelve una función que encola
+    las escrituras (o None si no hay nada que escribir). Se reintenta si otro
+    cambio tocó el pedido o sus lotes entre la lectura y la escritura.
+    
+    Returns:
+        bool: False si los lotes aún no están construidos o no se pudo aplicar
+    """
+    with cliente.pipeline() as pipe:
+        for _ in range(REINTENTOS):
+            try:
+                pipe.watch(clave)
+                if _texto(pipe.get(MARCA)) != str(FORMATO):
+                    pipe.unwatch()
+                    # Anotado para que una construcción en curso no se guarde
+                    cliente.incr(CAMBIOS)
+                    return False
+                escribir = aplicar(pipe)
+                pipe.multi()
+                pipe.incr(CAMBIOS)
+                if escribir is not None:
+                    escribir(pipe)
+                pipe.execute()
+                return True
+            except WatchError:
+                continue
+    current_app.logger.warning(f"Lotes de producción: demasiados cambios concurrentes en {clave}")
+    return False
+
+
+def _meta_guardada(storage, pedido_id: str) -> Optional[List[Any]]:
+    """Datos de un pedido sin hash de lotes, consultándolo."""
+    from app.models.pedido import Pedido
+    pedido = storage.get(Pedido, pedido_id)
+    return meta(pedido) if pedido else None
+
+
+def _fijar_linea(storage, pers_id: str, pedido_id: str, nuevos: Optional[List[Any]]):
+    """Reemplazar los parámetros de una personalización (None para quitarla)."""
+    clave = _clave_pedido(pedido_id)
+    
+    def aplicar(pipe):
+        meta_, anteriores = (_texto(v) for v in pipe.hmget(clave, META, pers_id))
+        meta_ = json.loads(meta_) if meta_ else None
+        anteriores = json.loads(anteriores) if anteriores else None
+        if meta_ is not None and anteriores == nuevos:
+            # Cambios que no tocan el lote (precio, notas...)
+            return None
+        guardar_meta = meta_ is None
+        if guardar_meta:
+            meta_ = _meta_guardada(storage, pedido_id)
+            if meta_ is None:
+                return None
+        mover = _cambiar(pipe, [(pers_id, _linea(meta_, anteriores), _linea(meta_, nuevos))])
+        
+        def escribir(pipe):
+            if guardar_meta:
+                pipe.hset(clave, META, json.dumps(meta_))
+            if nuevos:
+                pipe.hset(clave, pers_id, json.dumps(nuevos))
+                pipe.hset(UBICACION, pers_id, pedido_id)
+            else:
+                pipe.hdel(clave, pers_id)
+                pipe.hdel(UBICACION, pers_id)
+            if mover is not None:
+                mover(pipe)
+        return escribir
+    
+    _transaccion(_cliente(storage), clave, aplicar)
+
+
+def _fijar_pedido(storage, pedido_id: str, nueva: Optional[List[Any]]):
+    """Cambiar los datos de un pedido (None si se borró) moviendo todas sus líneas."""
+    clave = _clave_pedido(pedido_id)
+    
+    def aplicar(pipe):
+        campos = {_texto(k): json.loads(v) for k, v in pipe.hgetall(clave).items()}
+        antes = campos.pop(META, None)
+        if antes == nueva:
+            return None
+        mover = _cambiar(pipe, [(pid, _linea(antes, p), _linea(nueva, p)) for pid, p in campos.items()])
+        
+        def escribir(pipe):
+            if nueva is None:
+                pipe.delete(clave)
+                if campos:
+                    pipe.hdel(UBICACION, *campos)
+            else:
+                pipe.hset(clave, META, json.dumps(nueva))
+            if mover is not None:
+                mover(pipe)
+        return escribir
+    
+    _transaccion(_cliente(storage), clave, aplicar)
+
+
+def track(storage, obj):
+    """
+    Actualizar los lotes tras guardar un pedido o una personalización.
+    
+    Args:
+        storage: StorageService con el que se guardó
+        obj: Objeto guardado
+    """
+    from app.models.pedido import Pedido, Personalizacion
+    from app.services.material_demand import _pedido_de
+    
+    if not isinstance(obj, (Pedido, Personalizacion)) or not _activa():
+        return
+    if isinstance(obj, Pedido):
+        _fijar_pedido(storage, obj.id, meta(obj))
+    else:
+        pedido_id = _pedido_de(storage, obj)
+        if pedido_id:
+            _fijar_linea(storage, obj.id, pedido_id, parametros(obj))
+
+
+def forget(storage, class_type, obj_id: str):
+    """
+    Quitar de los lotes un pedido o una personalización borrados.
+    
+    Args:
+        storage: StorageService con el que se borró
+        class_type: Clase del objeto
+        obj_id: Id del objeto
+    """
+    from app.models.pedido import Pedido, Personalizacion
+    
+    if not _activa():
+        return
+    if class_type is Pedido:
+        _fijar_pedido(storage, obj_id, None)
+    elif class_type is Personalizacion:
+        pedido_id = _texto(_cliente(storage).hget(UBICACION, obj_id))
+        if pedido_id:
+            _fijar_linea(storage, obj_id, pedido_id, None)
+
+
+def _calcular(storage):
+    """
+    Calcular los lotes desde todos los pedidos y personalizaciones.
+    
+    Returns:
+        tuple: Hash de cada pedido, pedido de cada personalización, líneas de
+        cada lote (personalización -> puntuación) y resumen de cada lote
+    """
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    
+    metas = {p.id: meta(p) for p in storage.find_all(Pedido)}
+    items = {i.id: getattr(i, 'pedido_id', None) for i in storage.find_all(ItemPedido)}
+    por_pedido: Dict[str, Dict[str, str]] = {pid: {META: json.dumps(m)} for pid, m in metas.items()}
+    ubicacion: Dict[str, str] = {}
+    miembros: Dict[str, Dict[str, int]] = {}
+    resumenes: Dict[str, Dict[str, int]] = {}
+    for pers in storage.find_all(Personalizacion):
+        pedido_id = getattr(pers, 'pedido_id', None) or items.get(getattr(pers, 'item_pedido_id', None))
+        params = parametros(pers)
+        if pedido_id not in metas or not params:
+            continue
+        por_pedido[pedido_id][pers.id] = json.dumps(params)
+        ubicacion[pers.id] = pedido_id
+        linea = _linea(metas[pedido_id], params)
+        if linea:
+            lote, piezas, rango, puntuacion = linea
+            miembros.setdefault(lote, {})[pers.id] = puntuacion
+            resumen = resumenes.setdefault(lote, {})
+            for campo, valor in (('lineas', 1), ('piezas', piezas), (f'r{rango}', 1)):
+                resumen[campo] = resumen.get(campo, 0) + valor
+    return por_pedido, ubicacion, miembros, resumenes
+
+
+def _mejor_rango(resumen: Dict[str, int]) -> int:
+    return min(int(c[1:]) for c, v in resumen.items() if c.startswith('r') and v)
+
+
+def rebuild(storage) -> int:
+    """
+    Reconstruir los lotes desde todos los pedidos y personalizaciones.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        int: Número de lotes
+    """
+    cliente = _cliente(storage)
+    resumenes: Dict[str, Dict[str, int]] = {}
+    for _ in range(REINTENTOS):
+        with cliente.pipeline() as pipe:
+            try:
+                pipe.watch(CAMBIOS)
+                anteriores = [_texto(l) for l in pipe.zrange(INDICE, 0, -1)]
+                por_pedido, ubicacion, miembros, resumenes = _calcular(storage)
+                
+                pipe.multi()
+                for lote in anteriores:
+                    pipe.delete(_clave_lote(lote), _clave_resumen(lote))
+                pipe.delete(INDICE, UBICACION)
+                for pedido_id, campos in por_pedido.items():
+                    pipe.delete(_clave_pedido(pedido_id))
+                    pipe.hset(_clave_pedido(pedido_id), mapping=campos)
+                if ubicacion:
+                    pipe.hset(UBICACION, mapping=ubicacion)
+                for lote, resumen in resumenes.items():
+                    pipe.zadd(_clave_lote(lote), miembros[lote])
+                    pipe.hset(_clave_resumen(lote), mapping=resumen)
+                    pipe.zadd(INDICE, {lote: _puntuacion_lote(lote, _mejor_rango(resumen))})
+                pipe.set(MARCA, FORMATO)
+                pipe.execute()
+                break
+            except WatchError:
+                continue
+    else:
+        current_app.logger.warning("Lotes de producción reconstruidos pero no guardados: cambios concurrentes")
+    return len(resumenes)
+
+
+def _lote(storage, lote: str, resumen: Dict[str, int], lineas: List[str],
+          pedidos: List[Optional[str]]) -> Dict[str, Any]:
+    """Lote listo para mostrar."""
+    from app.services.catalog import catalog
+    proceso_id, dia, opcion = lote.split('|', 2)
+    tarifa = catalog.tarifa(proceso_id)
+    proceso = catalog.proceso(proceso_id)
+    return {
+        'lote': lote,
+        'proceso_id': proceso_id,
+        'proceso': getattr(proceso, 'nombre', None),
+        'tipo': tarifa.tipo.value if tarifa and tarifa.tipo else None,
+        'opcion': opcion or None,
+        'fecha_entrega': dia,
+        'prioridad': PRIORIDADES[_mejor_rango(resumen)],
+        'lineas': resumen.get('lineas', 0),
+        'piezas': resumen.get('piezas', 0),
+        'personalizaciones': lineas,
+        'pedidos': list(dict.fromkeys(p for p in pedidos if p)),
+    }
+
+
+def tablero(storage, limite: int = 50, proceso_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Lotes propuestos, en el orden en que conviene hacerlos.
+    
+    Args:
+        storage: Instancia de StorageService
+        limite: Lotes como máximo
+        proceso_id: Solo los lotes de este proceso (opcional)
+    
+    Returns:
+        Dict[str, Any]: ``lotes`` (cada uno con su proceso, opción, fecha de
+        entrega, mejor prioridad, piezas, personalizaciones y pedidos) y
+        ``total`` de lotes
+    """
+    if not _activa():
+        # Sin actualizaciones incrementales, lo guardado podría estar desfasado
+        por_pedido, ubicacion, miembros, resumenes = _calcular(storage)
+        orden = sorted(resumenes, key=lambda l: (_puntuacion_lote(l, _mejor_rango(resumenes[l])), l))
+        orden = [l for l in orden if not proceso_id or l.startswith(f'{proceso_id}|')]
+        lotes = []
+        for lote in orden[:limite]:
+            lineas = sorted(miembros[lote], key=lambda p: (miembros[lote][p], p))
+            lotes.append(_lote(storage, lote, resumenes[lote], lineas, [ubicacion.get(p) for p in lineas]))
+        return {'lotes': lotes, 'total': len(orden)}
+    
+    cliente = _cliente(storage)
+    if _texto(cliente.get(MARCA)) != str(FORMATO):
+        rebuild(storage)
+    if proceso_id:
+        orden = [l for l in (_texto(v) for v in cliente.zrange(INDICE, 0, -1)) if l.startswith(f'{proceso_id}|')]
+        total = len(orden)
+        orden = orden[:limite]
+    else:
+        with cliente.pipeline(transaction=False) as pipe:
+            pipe.zrange(INDICE, 0, limite - 1)
+            pipe.zcard(INDICE)
+            orden, total = pipe.execute()
+        orden = [_texto(l) for l in orden]
+    if not orden:
+        return {'lotes': [], 'total': total}
+    
+    with cliente.pipeline(transaction=False) as pipe:
+        for lote in orden:
+            pipe.hgetall(_clave_resumen(lote))
+            pipe.zrange(_clave_lote(lote), 0, -1)
+        respuestas = pipe.execute()
+    lineas = [[_texto(p) for p in respuestas[i + 1]] for i in range(0, len(respuestas), 2)]
+    todas = [p for lista in lineas for p in lista]
+    pedidos = iter([_texto(p) for p in cliente.hmget(UBICACION, todas)] if todas else [])
+    
+    lotes = []
+    for lote, resumen, lista in zip(orden, respuestas[0::2], lineas):
+        resumen = {_texto(k): int(v) for k, v in resumen.items()}
+        de_lista = [next(pedidos) for _ in lista]
+        if not resumen.get('lineas'):
+            # Vaciado entre la lectura del índice y la del resumen
+            continue
+        lotes.append(_lote(storage, lote, resumen, lista, de_lista))
+    return {'lotes': lotes, 'total': total}
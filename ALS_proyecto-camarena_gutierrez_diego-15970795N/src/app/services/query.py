@@ -0,0 +1,312 @@
+"""
+Consultas declarativas sobre StorageService.
+
+Permite expresar filtros como datos en lugar de lambdas opacas, de modo que un
+planificador pueda resolverlos con los índices secundarios de Redis cuando
+existen y con un recorrido en streaming en caso contrario:
+
+    Q(Pedido).where(estado='PENDIENTE', cliente_id=x).order_by('-created_at').limit(20)
+
+Las lambdas siguen admitiéndose con ``where(lambda p: ...)`` y se aplican como
+filtro residual sobre los candidatos.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from app.services.storage_service import normalizar_valor_indice
+
+
+# Tipos de plan que puede elegir el planificador
+PLAN_ID = 'ID_LOOKUP'
+PLAN_INDICE = 'INDEX'
+PLAN_SCAN = 'FULL_SCAN'
+
+
+class Q:
+    """
+    Constructor de consultas inmutable sobre un tipo de modelo.
+    Cada método devuelve una nueva consulta, por lo que pueden reutilizarse.
+    """
+    
+    def __init__(self, class_type: Type, storage=None):
+        """
+        Inicializar consulta.
+        
+        Args:
+            class_type: Tipo de modelo a consultar
+            storage: Instancia de StorageService (por defecto, una nueva)
+        """
+        if storage is None:
+            from app.services.storage_service import StorageService
+            storage = StorageService()
+        self.class_type = class_type
+        self.storage = storage
+        self._criterios: Dict[str, Any] = {}
+        self._condiciones: List[Callable] = []
+        self._orden: List[str] = []
+        self._limite: Optional[int] = None
+        self._cachear = False
+    
+    def _copiar(self) -> 'Q':
+        """Crear una copia de la consulta para encadenar sin efectos laterales."""
+        copia = Q(self.class_type, self.storage)
+        copia._criterios = dict(self._criterios)
+        copia._condiciones = list(self._condiciones)
+        copia._orden = list(self._orden)
+        copia._limite = self._limite
+        copia._cachear = self._cachear
+        return copia
+    
+    def where(self, condicion: Callable = None, **criterios) -> 'Q':
+        """
+        Añadir filtros de igualdad y, opcionalmente, una condición lambda.
+        
+        Args:
+            condicion: Función de condición residual (compatibilidad)
+            **criterios: ``campo=valor`` o ``campo__in=[valores]``
+        
+        Returns:
+            Q: Nueva consulta con los filtros añadidos
+        """
+        copia = self._copiar()
+        copia._criterios.update(criterios)
+        if condicion is not None:
+            copia._condiciones.append(condicion)
+        return copia
+    
+    def order_by(self, *campos: str) -> 'Q':
+        """
+        Ordenar resultados. Un prefijo '-' indica orden descendente.
+        
+        Args:
+            *campos: Campos de ordenación, p. ej. '-created_at'
+        
+        Returns:
+            Q: Nueva consulta ordenada
+        """
+        copia = self._copiar()
+        copia._orden = list(campos)
+        return copia
+    
+    def limit(self, n: int) -> 'Q':
+        """
+        Limitar el número de resultados.
+        
+        Args:
+            n: Número máximo de resultados
+        
+        Returns:
+            Q: Nueva consulta limitada
+        """
+        copia = self._copiar()
+        copia._limite = max(0, int(n))
+        return copia
+    
+    def cached(self) -> 'Q':
+        """
+        Servir el resultado desde la caché de consultas mientras no cambie
+        ningún objeto de la clase (ver app.services.query_cache). Solo admite
+        filtros declarativos: una lambda no puede formar parte de la clave.
+        
+        Returns:
+            Q: Nueva consulta cacheable
+        """
+        copia = self._copiar()
+        copia._cachear = True
+        return copia
+    
+    def _clave_cache(self) -> tuple:
+        """Clave normalizada: el mismo filtro escrito de otra forma da la misma clave."""
+        # campo=x y campo__in=[x] dan la misma clave; el orden de los valores no cuenta
+        criterios = sorted(
+            (campo, tuple(sorted({normalizar_valor_indice(v) for v in valores})))
+            for campo, _, valores in self._predicados()
+        )
+        return (self.class_type.__name__, tuple(criterios), tuple(self._orden), self._limite)
+    
+    def _forma(self) -> str:
+        """Forma de la consulta (campos filtrados, orden y límite) para las estadísticas."""
+        forma = f"{self.class_type.__name__}({','.join(sorted(self._criterios))})"
+        if self._orden:
+            forma += f" order_by({','.join(self._orden)})"
+        if self._limite is not None:
+            forma += " limit"
+        return forma
+    
+    # ------------------------------------------------------------------
+    # Planificación
+    # ------------------------------------------------------------------
+    
+    def _predicados(self):
+        """Separar los criterios en (campo, operador, valores)."""
+        predicados = []
+        for clave, valor in self._criterios.items():
+            if clave.endswith('__in'):
+                predicados.append((clave[:-4], 'in', list(valor)))
+            else:
+                predicados.append((clave, 'eq', [valor]))
+        return predicados
+    
+    def plan(self) -> Dict[str, Any]:
+        """
+        Elegir el plan de ejecución más barato para la consulta.
+        
+        Returns:
+            Dict[str, Any]: Descripción del plan (ver ``explain``)
+        """
+        predicados = self._predicados()
+        indexados = getattr(self.class_type, 'INDEXED_FIELDS', ())
+        
+        # Búsqueda directa por id: un único acceso al directorio
+        for campo, operador, valores in predicados:
+            if campo == 'id' and operador == 'eq':
+                return {
+                    'plan': PLAN_ID,
+                    'indices': ['id'],
+                    'residuales': [p[0] for p in predicados if p[0] != 'id'],
+                    'costo_estimado': 1,
+                }
+        
+        usables = [p for p in predicados if p[0] in indexados]
+        claves = {}
+        for campo, operador, valores in usables:
+            claves[campo] = [self.storage.index_key(self.class_type, campo, v) for v in valores]
+        
+        cardinalidades = self.storage.estimate_cardinalities(
+            self.class_type, [c for lista in claves.values() for c in lista]
+        )
+        costo_scan = cardinalidades.pop('__total__')
+        
+        plan = {
+            'plan': PLAN_SCAN,
+            'indices': [],
+            'residuales': [p[0] for p in predicados],
+            'costo_estimado': costo_scan,
+        }
+        
+        if usables and self.storage.index_ready(self.class_type):
+            # El coste de una intersección lo marca el conjunto más pequeño
+            costos = {campo: sum(cardinalidades[c] for c in lista) for campo, lista in claves.items()}
+            costo_indice = min(costos.values()) + len(costos)
+            if costo_indice < costo_scan:
+                plan = {
+                    'plan': PLAN_INDICE,
+                    'indices': sorted(costos, key=costos.get),
+                    'residuales': [p[0] for p in predicados if p[0] not in claves],
+                    'costo_estimado': costo_indice,
+                    '_claves': claves,
+                }
+        
+        plan['costo_scan'] = costo_scan
+        return plan
+    
+    def explain(self) -> Dict[str, Any]:
+        """
+        Describir el plan elegido y su coste estimado sin ejecutar la consulta.
+        
+        Returns:
+            Dict[str, Any]: Clase, plan, índices usados, filtros residuales,
+            orden, límite y coste estimado (objetos a deserializar)
+        """
+        plan = self.plan()
+        plan.pop('_claves', None)
+        plan.update({
+            'clase': self.class_type.__name__,
+            'criterios': {k: normalizar_valor_indice(v) if not k.endswith('__in') else
+                          [normalizar_valor_indice(x) for x in v]
+                          for k, v in self._criterios.items()},
+            'condiciones_lambda': len(self._condiciones),
+            'orden': list(self._orden),
+            'limite': self._limite,
+        })
+        return plan
+    
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    
+    def _cumple(self, obj) -> bool:
+        """Evaluar todos los criterios y condiciones sobre un objeto cargado."""
+        for campo, operador, valores in self._predicados():
+            actual = normalizar_valor_indice(getattr(obj, campo, None))
+            if actual not in [normalizar_valor_indice(v) for v in valores]:
+                return False
+        return all(condicion(obj) for condicion in self._condiciones)
+    
+    def _candidatos_indice(self, claves: Dict[str, List[str]]) -> List[Any]:
+        """Intersecar en Redis los conjuntos de índice y cargar los candidatos."""
+        return self.storage.index_candidates(self.class_type, claves)
+    
+    def _ordenar(self, objetos: List[Any]) -> List[Any]:
+        """Aplicar order_by con ordenaciones estables de la última clave a la primera."""
+        for campo in reversed(self._orden):
+            descendente = campo.startswith('-')
+            nombre = campo.lstrip('-')
+            # Los valores None quedan al principio en ascendente y al final en descendente
+            objetos.sort(
+                key=lambda o: (getattr(o, nombre, None) is not None, getattr(o, nombre, None)),
+                reverse=descendente
+            )
+        return objetos
+    
+    def all(self) -> List[Any]:
+        """
+        Ejecutar la consulta.
+        
+        Returns:
+            List[Any]: Objetos que cumplen la consulta
+        
+        Raises:
+            ValueError: Si una consulta con ``cached()`` tiene lambdas
+        """
+        if self._cachear:
+            if self._condiciones:
+                raise ValueError("Las consultas con lambdas no pueden cachearse")
+            return self.storage.cached_results(self.class_type, self._clave_cache(), self._forma(), self._ejecutar)
+        return self._ejecutar()
+    
+    def _ejecutar(self) -> List[Any]:
+        """Planificar y ejecutar la consulta contra Redis."""
+        plan = self.plan()
+        
+        if plan['plan'] == PLAN_ID:
+            obj = self.storage.get(self.class_type, self._criterios['id'])
+            objetos = [obj] if obj is not None and isinstance(obj, self.class_type) else []
+            objetos = [o for o in objetos if self._cumple(o)]
+        elif plan['plan'] == PLAN_INDICE:
+            objetos = [o for o in self._candidatos_indice(plan['_claves']) if self._cumple(o)]
+        else:
+            # Recorrido en streaming; sin orden se puede cortar al llegar al límite
+            maximo = self._limite if (self._limite and not self._orden) else 0
+            objetos = self.storage.find_by_condition(self.class_type, self._cumple, max=maximo)
+        
+        if self._orden:
+            objetos = self._ordenar(objetos)
+        if self._limite is not None:
+            objetos = objetos[:self._limite]
+        return objetos
+    
+    def first(self) -> Optional[Any]:
+        """
+        Obtener el primer resultado.
+        
+        Returns:
+            Optional[Any]: Primer objeto o None
+        """
+        resultados = self.limit(1).all()
+        return resultados[0] if resultados else None
+    
+    def count(self) -> int:
+        """
+        Contar resultados.
+        
+        Returns:
+            int: Número de objetos que cumplen la consulta
+        """
+        return len(self.all())
+    
+    def __iter__(self):
+        return iter(self.all())
+    
+    def __repr__(self) -> str:
+        return f"Q({self.class_type.__name__}, criterios={self._criterios}, orden={self._orden}, limite={self._limite})"
@@ -0,0 +1,189 @@
+"""
+Caché de resultados de consultas, invalidada por generaciones de clase.
+
+Cada clase tiene un contador de generación en Redis (hash
+``cache:__generaciones__`` del nodo principal, en el espacio del tenant) que
+se incrementa con cada save/delete de un objeto de la clase. Un resultado se
+guarda con la generación leída antes de ejecutar la consulta y solo se sirve
+mientras la generación siga siendo la misma. Comprobarlo cuesta un HGET, en
+lugar de planificar, intersecar índices y cargar los objetos. Como el contador
+es compartido, una escritura en cualquier worker invalida los resultados en
+todos.
+
+Los resultados se guardan como JSON y se decodifican en cada acierto, de modo
+que cada petición recibe objetos propios que puede modificar.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sirope.utils import full_name_from_obj
+
+
+# Hash clase -> generación
+GENERATIONS_KEY = 'cache:__generaciones__'
+
+
+def generation(redis_client, class_type: type) -> int:
+    """
+    Leer la generación actual de una clase.
+    
+    Args:
+        redis_client: Cliente del nodo principal (en el espacio del tenant)
+        class_type: Clase consultada
+    
+    Returns:
+        int: Generación (0 si la clase no ha cambiado nunca)
+    """
+    valor = redis_client.hget(GENERATIONS_KEY, full_name_from_obj(class_type))
+    return int(valor) if valor else 0
+
+
+def generations(redis_client, class_types) -> List[int]:
+    """
+    Leer la generación de varias clases con un solo HMGET.
+    
+    Args:
+        redis_client: Cliente del nodo principal (en el espacio del tenant)
+        class_types: Clases
+    
+    Returns:
+        List[int]: Generación de cada clase, en el mismo orden
+    """
+    campos = [full_name_from_obj(class_type) for class_type in class_types]
+    if not campos:
+        return []
+    return [int(valor) if valor else 0 for valor in redis_client.hmget(GENERATIONS_KEY, campos)]
+
+
+def bump(redis_client, class_type: type):
+    """
+    Invalidar los resultados cacheados de una clase (tras save/delete).
+    
+    Args:
+        redis_client: Cliente del nodo principal (en el espacio del tenant)
+        class_type: Clase modificada
+    """
+    redis_client.hincrby(GENERATIONS_KEY, full_name_from_obj(class_type), 1)
+
+
+class QueryResultCache:
+    """
+    Resultados de consultas por clave normalizada (LRU), con aciertos y fallos
+    por forma de consulta. Es segura entre hilos.
+    """
+    
+    def __init__(self, max_entries: int = 500):
+        """
+        Inicializar la caché.
+        
+        Args:
+            max_entries: Resultados guardados como máximo
+        """
+        self._lock = threading.Lock()
+        self._entradas: 'OrderedDict[tuple, tuple[int, List[str]]]' = OrderedDict()
+        self._formas: Dict[str, Dict[str, int]] = {}
+        self.max_entries = max_entries
+        self.enabled = True
+        self.configured = False
+        self.evictions = 0
+    
+    def configure(self, max_entries: int, enabled: bool = True):
+        """
+        Configurar la caché.
+        
+        Args:
+            max_entries: Resultados guardados como máximo
+            enabled: Si la caché está activa
+        """
+        with self._lock:
+            self.max_entries = max(1, int(max_entries))
+            self.enabled = enabled
+            self.configured = True
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+    
+    def _contadores(self, forma: str) -> Dict[str, int]:
+        return self._formas.setdefault(forma, {'hits': 0, 'misses': 0, 'stale': 0})
+    
+    def get(self, clave: tuple, forma: str, generacion: int) -> Optional[List[str]]:
+        """
+        Obtener un resultado si se calculó con la generación actual.
+        
+        Args:
+            clave: Clave normalizada de la consulta
+            forma: Forma de la consulta (para las estadísticas)
+            generacion: Generación actual de la clase
+        
+        Returns:
+            Optional[List[str]]: JSON de cada objeto, o None si no está o es antiguo
+        """
+        with self._lock:
+            contadores = self._contadores(forma)
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == generacion:
+                self._entradas.move_to_end(clave)
+                contadores['hits'] += 1
+                return entrada[1]
+            if entrada is not None:
+                # La clase cambió desde que se calculó
+                del self._entradas[clave]
+                contadores['stale'] += 1
+            contadores['misses'] += 1
+            return None
+    
+    def put(self, clave: tuple, generacion: int, resultado: List[str]):
+        """
+        Guardar un resultado.
+        
+        Args:
+            clave: Clave normalizada de la consulta
+            generacion: Generación leída antes de ejecutar la consulta
+            resultado: JSON de cada objeto
+        """
+        with self._lock:
+            actual = self._entradas.get(clave)
+            if actual is not None and actual[0] > generacion:
+                # Otro hilo ya guardó un resultado más reciente
+                return
+            self._entradas[clave] = (generacion, resultado)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Vaciar los resultados manteniendo los contadores."""
+        with self._lock:
+            self._entradas.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Obtener tamaño y aciertos, en total y por forma de consulta.
+        
+        Returns:
+            Dict[str, Any]: Contadores y ratio de aciertos
+        """
+        with self._lock:
+            formas = {forma: dict(c) for forma, c in self._formas.items()}
+            tamaño = len(self._entradas)
+        for contadores in formas.values():
+            consultas = contadores['hits'] + contadores['misses']
+            contadores['hit_ratio'] = round(contadores['hits'] / consultas, 4) if consultas else 0.0
+        hits = sum(c['hits'] for c in formas.values())
+        misses = sum(c['misses'] for c in formas.values())
+        return {
+            'enabled': self.enabled,
+            'size': tamaño,
+            'max_entries': self.max_entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'evictions': self.evictions,
+            'formas': formas,
+        }
+
+
+# Instancia única por proceso
+query_cache = QueryResultCache()
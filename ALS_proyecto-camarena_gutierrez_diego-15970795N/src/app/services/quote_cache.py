@@ -0,0 +1,197 @@
+"""
+Caché de cotizaciones de la calculadora de precios.
+
+Los vendedores piden una y otra vez las mismas cotizaciones (10x10 cm, 50
+piezas...) a la calculadora de procesos fijos (``procesos.PROCESOS_FIJOS``).
+El resultado de cada una se guarda en Redis, compartido por todos los
+workers, en un hash por proceso (``cot:<proceso>``, dentro del espacio del
+tenant) cuyo campo es la versión de la configuración del proceso, el ancho,
+el alto, la cantidad y las opciones. Así:
+
+- Un cambio de precios cambia la versión (``VERSION_PROCESOS_FIJOS``): las
+  cotizaciones viejas dejan de coincidir sin borrarlas y caducan solas.
+- El hash de cada proceso tiene como máximo ``max_entries`` campos (al
+  superarlo se descarta uno al azar) y caduca ``ttl`` segundos después de la
+  última cotización guardada.
+
+Las cotizaciones de los procesos guardados no pasan por aquí: la API de
+cotización las calcula en lote con las tarifas compiladas (``pricing``), que
+ya siguen la ``config_version`` de cada proceso.
+
+Los aciertos y fallos se cuentan en este proceso y, para todos los workers,
+en ``cot:__stats__``. Si Redis falla, se calcula sin caché.
+"""
+
+import json
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from flask import current_app
+
+
+# Hash con los contadores compartidos por todos los workers
+STATS_KEY = 'cot:__stats__'
+
+
+def _clave_proceso(proceso_id: str) -> str:
+    return f'cot:{proceso_id}'
+
+
+def _numero(valor: Any) -> str:
+    """Medida normalizada (10, 10.0 y '10' dan la misma clave)."""
+    return repr(float(valor or 0.0))
+
+
+class QuoteCache:
+    """
+    Cotizaciones memorizadas en Redis por proceso y versión de su
+    configuración. Es segura entre hilos.
+    """
+    
+    def __init__(self):
+        """Inicializar con la configuración por defecto."""
+        self._lock = threading.Lock()
+        self.enabled = True
+        self.configured = False
+        self.max_entries = 1000
+        self.ttl = 86400
+        self.stats_counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+    
+    def configure(self, enabled: bool = True, max_entries: int = 1000, ttl: int = 86400):
+        """
+        Configurar la caché.
+        
+        Args:
+            enabled: Si está activa (si no, cada cotización se calcula)
+            max_entries: Cotizaciones máximas por proceso
+            ttl: Segundos sin cotizaciones nuevas tras los que se descarta un proceso
+        """
+        with self._lock:
+            self.enabled = enabled
+            self.max_entries = max(1, int(max_entries))
+            self.ttl = max(1, int(ttl))
+            self.configured = True
+    
+    def _contar(self, contador: str, cantidad: int = 1):
+        with self._lock:
+            self.stats_counters[contador] += cantidad
+    
+    @staticmethod
+    def field(version: Any, ancho: Any, alto: Any, cantidad: Any, opciones: Iterable[Any] = ()) -> str:
+        """
+        Campo de una cotización dentro del hash de su proceso.
+        
+        Args:
+            version: Versión de la configuración de precios del proceso
+            ancho: Ancho del diseño en cm
+            alto: Alto del diseño en cm
+            cantidad: Piezas
+            opciones: Resto de parámetros que cambian el precio (tamaño, vinil, setup...)
+        
+        Returns:
+            str: Campo normalizado
+        """
+        partes = [str(version), _numero(ancho), _numero(alto), str(int(cantidad or 0))]
+        partes.extend('' if o is None else str(getattr(o, 'value', o)) for o in opciones)
+        return '|'.join(partes)
+    
+    def _guardar(self, cliente, clave: str, campo: str, texto: str):
+        """Guardar una cotización y descartar una al azar si el hash se pasa del límite."""
+        with cliente.pipeline(transaction=False) as pipe:
+            pipe.hset(clave, campo, texto)
+            pipe.hlen(clave)
+            pipe.expire(clave, self.ttl)
+            pipe.hincrby(STATS_KEY, 'misses', 1)
+            _, tamaño, _, _ = pipe.execute()
+        self._contar('stores')
+        
+        sobrantes = tamaño - self.max_entries
+        if sobrantes > 0:
+            # Puede salir la recién guardada: solo se pierde un acierto futuro
+            campos = cliente.hrandfield(clave, sobrantes)
+            if campos:
+                cliente.hdel(clave, *campos)
+                self._contar('evictions', len(campos))
+    
+    def get_or_compute(self, cliente, proceso_id: str, campo: str,
+                       calcular: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Obtener una cotización de la caché o calcularla y guardarla.
+        
+        Args:
+            cliente: Cliente Redis (nodo principal, en el espacio del tenant)
+            proceso_id: Id del proceso (o clave del proceso fijo)
+            campo: Campo de la cotización (ver ``field``)
+            calcular: Función sin argumentos que devuelve la cotización
+                (serializable a JSON) o None si no se puede cotizar
+        
+        Returns:
+            Optional[Dict[str, Any]]: Cotización (una copia propia) o None
+        """
+        if not self.enabled:
+            return calcular()
+        
+        clave = _clave_proceso(proceso_id)
+        try:
+            with cliente.pipeline(transaction=False) as pipe:
+                pipe.hget(clave, campo)
+                pipe.hincrby(STATS_KEY, 'lookups', 1)
+                texto, _ = pipe.execute()
+        except Exception as e:
+            current_app.logger.warning(f"Caché de cotizaciones no disponible: {e}")
+            self._contar('errors')
+            return calcular()
+        
+        if texto is not None:
+            self._contar('hits')
+            return json.loads(texto)
+        
+        self._contar('misses')
+        resultado = calcular()
+        try:
+            if resultado is not None:
+                self._guardar(cliente, clave, campo, json.dumps(resultado))
+            else:
+                cliente.hincrby(STATS_KEY, 'misses', 1)
+        except Exception as e:
+            current_app.logger.warning(f"No se pudo guardar la cotización de {proceso_id}: {e}")
+            self._contar('errors')
+        return resultado
+    
+    def stats(self, cliente=None) -> Dict[str, Any]:
+        """
+        Obtener los contadores de la caché.
+        
+        Args:
+            cliente: Cliente Redis para leer también los contadores de todos los workers
+        
+        Returns:
+            Dict[str, Any]: Contadores de este proceso y, si se pudo, los compartidos
+        """
+        with self._lock:
+            contadores = dict(self.stats_counters)
+        consultas = contadores['hits'] + contadores['misses']
+        contadores['hit_rate'] = round(contadores['hits'] / consultas, 3) if consultas else None
+        contadores['enabled'] = self.enabled
+        contadores['max_entries'] = self.max_entries
+        if cliente is not None:
+            try:
+                compartidos = {
+                    (k.decode() if isinstance(k, bytes) else k): int(v)
+                    for k, v in cliente.hgetall(STATS_KEY).items()
+                }
+                buscadas = compartidos.get('lookups', 0)
+                fallos = compartidos.get('misses', 0)
+                contadores['all_workers'] = {
+                    'lookups': buscadas,
+                    'hits': buscadas - fallos,
+                    'misses': fallos,
+                    'hit_rate': round((buscadas - fallos) / buscadas, 3) if buscadas else None
+                }
+            except Exception as e:
+                contadores['all_workers'] = {'error': str(e)}
+        return contadores
+
+
+# Instancia única por proceso
+quote_cache = QuoteCache()
@@ -0,0 +1,146 @@
+"""
+Enrutado de lecturas a réplicas de Redis.
+
+Las escrituras van siempre al primario. Las lecturas que toleran datos algo
+desfasados (dashboard, listados, APIs de catálogo) pueden servirse desde una
+réplica, elegida por turno entre las que están sanas. Para que un usuario vea
+siempre lo que acaba de guardar, cada escritura deja una marca en su sesión y,
+durante una ventana de unos segundos, sus lecturas vuelven al primario.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import has_request_context, session
+
+from app.services.circuit_breaker import CERRADO
+
+
+# Marca en la sesión con el instante de la última escritura
+SESSION_KEY = '_ultima_escritura'
+
+
+def parse_endpoints(texto: str, db_defecto: int = 0) -> List[Tuple[str, int, int]]:
+    """
+    Interpretar una lista de endpoints ``host:puerto[/db]`` separados por comas.
+    
+    Args:
+        texto: Lista de endpoints, p. ej. "localhost:6380,localhost:6381/0"
+        db_defecto: Base de datos si el endpoint no la indica
+    
+    Returns:
+        List[Tuple[str, int, int]]: (host, puerto, db) de cada endpoint
+    """
+    endpoints = []
+    for parte in (texto or '').split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        direccion, _, db = parte.partition('/')
+        host, _, puerto = direccion.rpartition(':')
+        if not host:
+            host, puerto = direccion, '6379'
+        endpoints.append((host, int(puerto), int(db) if db else db_defecto))
+    return endpoints
+
+
+def marcar_escritura():
+    """Anotar en la sesión del usuario que acaba de escribir."""
+    if has_request_context():
+        session[SESSION_KEY] = time.time()
+
+
+def escritura_reciente(ventana: float) -> bool:
+    """
+    Indicar si la sesión actual escribió hace menos de ``ventana`` segundos.
+    
+    Args:
+        ventana: Segundos durante los que se leen del primario
+    
+    Returns:
+        bool: True si las lecturas deben ir al primario
+    """
+    if not has_request_context():
+        return False
+    ultima = session.get(SESSION_KEY)
+    return ultima is not None and time.time() - ultima < ventana
+
+
+class ReplicaRouter:
+    """
+    Elige réplica por turno y mantiene los contadores de enrutado del proceso.
+    """
+    
+    def __init__(self):
+        """Inicializar el router sin réplicas conocidas."""
+        self._lock = threading.Lock()
+        self._turno = 0
+        self._salud: Dict[str, Tuple[bool, float]] = {}  # nombre -> (enlazada, comprobada en)
+        self.stats = {
+            'primary_reads': 0,
+            'replica_reads': 0,
+            'read_your_writes': 0,
+            'fallbacks': 0,
+            'skipped_unhealthy': 0,
+        }
+    
+    def record(self, contador: str):
+        """Incrementar un contador de enrutado."""
+        with self._lock:
+            self.stats[contador] += 1
+    
+    def _enlazada(self, cliente, intervalo: float) -> bool:
+        """
+        Comprobar (como mucho una vez por intervalo) que la réplica sigue
+        enlazada con el primario; una réplica desconectada sirve datos cada vez
+        más antiguos sin dar error.
+        """
+        nombre = cliente.breaker.nombre
+        ahora = time.monotonic()
+        enlazada, comprobada = self._salud.get(nombre, (True, 0.0))
+        if ahora - comprobada < intervalo:
+            return enlazada
+        try:
+            info = cliente.info('replication')
+            # Un primario configurado por error como réplica también sirve
+            enlazada = info.get('role') == 'master' or info.get('master_link_status') == 'up'
+        except Exception:
+            enlazada = False
+        self._salud[nombre] = (enlazada, ahora)
+        return enlazada
+    
+    def choose(self, clientes: List[Any], intervalo_salud: float = 1.0) -> Optional[Any]:
+        """
+        Elegir la siguiente réplica sana.
+        
+        Args:
+            clientes: Clientes BreakerRedis de las réplicas
+            intervalo_salud: Segundos entre comprobaciones de enlace
+        
+        Returns:
+            Optional[Any]: Cliente elegido o None si ninguna está disponible
+        """
+        if not clientes:
+            return None
+        with self._lock:
+            inicio = self._turno
+            self._turno = (self._turno + 1) % len(clientes)
+        for desplazamiento in range(len(clientes)):
+            cliente = clientes[(inicio + desplazamiento) % len(clientes)]
+            if cliente.breaker.state != CERRADO or not self._enlazada(cliente, intervalo_salud):
+                self.record('skipped_unhealthy')
+                continue
+            return cliente
+        return None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores y salud conocida de las réplicas."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['replicas'] = {nombre: enlazada for nombre, (enlazada, _) in self._salud.items()}
+        return stats
+
+
+# Instancia única por proceso
+router = ReplicaRouter()
@@ -0,0 +1,574 @@
+"""
+Repreciado en segundo plano de los pedidos abiertos tras un cambio de precios.
+
+Cuando cambia la configuración de precios de un proceso (``procesos.configurar``)
+o el precio base de un producto (``productos.editar``), los pedidos pendientes
+y en proceso que lo usan conservaban el precio anterior hasta que alguien los
+editaba. Ahora esas rutas encolan un trabajo que:
+
+1. Busca los pedidos afectados por referencias (personalizaciones del proceso
+   o items del producto, por sus índices) y se queda con los abiertos. La
+   lista se guarda en Redis (``reprecio:<id>:pedidos``).
+2. Los recorre en lotes de REPRICING_BATCH_SIZE: carga pedidos, items y
+   personalizaciones con tres consultas, cotiza todas las personalizaciones
+   del lote de una vez (``pricing.cotizar_lote``), recalcula subtotales y
+   totales, y guarda solo lo que cambió con ``StorageService.save_many``
+   (escrituras en pipeline). Antes de cargar cada pedido lee su contador de
+   cambios (``order_view.clave_cambios``) y la escritura lo vigila: si alguien
+   editó el pedido mientras tanto no se pisa su cambio, sino que el pedido se
+   vuelve a cargar y cotizar.
+3. Tras cada lote anota el avance (``procesados`` es el cursor), así que un
+   trabajo interrumpido se reanuda donde se quedó: rehacer un lote da el
+   mismo resultado. Un lote que falla se reintenta REINTENTOS veces; los
+   pedidos que aun así no se repreciaron quedan en ``reprecio:<id>:fallidos``
+   y el trabajo termina PARCIAL (``reintentar`` los vuelve a encolar).
+
+Los trabajos se ejecutan en un hilo de fondo del worker que los encola (las
+peticiones no esperan), o con ``scripts/repreciar.py``. Un cerrojo con
+caducidad, renovado en cada lote, impide que dos procesos ejecuten el mismo
+trabajo; si el que lo ejecutaba muere, otro lo retoma al caducar.
+"""
+
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from redis.exceptions import WatchError
+
+from app.services import order_view, tenancy
+
+
+# Estados de un trabajo
+PENDIENTE = 'PENDIENTE'
+EN_CURSO = 'EN_CURSO'
+COMPLETADO = 'COMPLETADO'
+PARCIAL = 'PARCIAL'               # Terminado, con pedidos que no se pudieron repreciar
+ERROR = 'ERROR'
+
+# Intentos de cada lote (y de cada pedido que cambia mientras se reprecia)
+REINTENTOS = 3
+
+# Tipos de cambio que originan un trabajo
+PROCESO = 'proceso'
+PRODUCTO = 'producto'
+
+# Cola de trabajos de todos los tenants (espacio global): "<tenant>|<id>"
+COLA = 'reprecio:cola'
+# Últimos trabajos del tenant, para listarlos
+RECIENTES = 'reprecio:recientes'
+MAX_RECIENTES = 50
+
+ESTADOS_ABIERTOS = ('PENDIENTE', 'EN_PROCESO')
+
+
+def _clave(trabajo_id: str) -> str:
+    return f'reprecio:{trabajo_id}'
+
+
+def _clave_pedidos(trabajo_id: str) -> str:
+    return f'reprecio:{trabajo_id}:pedidos'
+
+
+def _clave_fallidos(trabajo_id: str) -> str:
+    return f'reprecio:{trabajo_id}:fallidos'
+
+
+def _clave_cerrojo(trabajo_id: str) -> str:
+    return f'reprecio:{trabajo_id}:cerrojo'
+
+
+def _texto(valor) -> Optional[str]:
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def _ahora() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _cliente(storage):
+    """Cliente de los trabajos (nodo principal, espacio del tenant actual)."""
+    return storage._cliente_nodo(storage._nodo_principal(), tenancy.current_tenant())
+
+
+def _cliente_global(storage):
+    """Cliente de la cola (nodo principal, espacio global)."""
+    return storage._cliente_nodo(storage._nodo_principal(), None)
+
+
+def _abierto(pedido) -> bool:
+    estado = getattr(pedido.estado, 'value', pedido.estado)
+    return bool(getattr(pedido, 'is_active', True)) and estado in ESTADOS_ABIERTOS
+
+
+def encolar(storage, tipo: str, ref_id: str) -> str:
+    """
+    Encolar el repreciado de los pedidos abiertos que usan un proceso o producto.
+    
+    Args:
+        storage: Instancia de StorageService
+        tipo: ``PROCESO`` o ``PRODUCTO``
+        ref_id: Id del proceso o producto cuyo precio cambió
+    
+    Returns:
+        str: Id del trabajo
+    """
+    trabajo_id = uuid.uuid4().hex
+    tenant = tenancy.current_tenant()
+    cliente = _cliente(storage)
+    with cliente.pipeline(transaction=False) as pipe:
+        pipe.hset(_clave(trabajo_id), mapping={
+            'id': trabajo_id, 'tipo': tipo, 'ref_id': ref_id, 'estado': PENDIENTE,
+            'total': 0, 'procesados': 0, 'actualizados': 0, 'errores': 0,
+            'creado': _ahora(), 'actualizado': _ahora(),
+        })
+        pipe.lpush(RECIENTES, trabajo_id)
+        pipe.ltrim(RECIENTES, 0, MAX_RECIENTES - 1)
+        pipe.execute()
+    _cliente_global(storage).rpush(COLA, f'{tenant or ""}|{trabajo_id}')
+    current_app.logger.info(f"Repreciado encolado: {tipo} {ref_id} (trabajo {trabajo_id})")
+    
+    if current_app.config.get('REPRICING_BACKGROUND', True):
+        ejecutor.iniciar(current_app._get_current_object())
+    return trabajo_id
+
+
+def estado(storage, trabajo_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Estado y avance de un trabajo.
+    
+    Args:
+        storage: Instancia de StorageService
+        trabajo_id: Id del trabajo
+    
+    Returns:
+        Optional[Dict[str, Any]]: Campos del trabajo con ``progreso`` (0 a 1)
+        y, si terminó PARCIAL, los ``fallidos``; o None si no existe
+    """
+    cliente = _cliente(storage)
+    campos = {_texto(k): _texto(v) for k, v in cliente.hgetall(_clave(trabajo_id)).items()}
+    if not campos:
+        return None
+    for campo in ('total', 'procesados', 'actualizados', 'errores'):
+        campos[campo] = int(campos.get(campo) or 0)
+    if campos['estado'] == PARCIAL:
+        campos['fallidos'] = [_texto(p) for p in cliente.lrange(_clave_fallidos(trabajo_id), 0, -1)]
+    if campos['estado'] in (COMPLETADO, PARCIAL):
+        campos['progreso'] = 1.0
+    else:
+        campos['progreso'] = round(campos['procesados'] / campos['total'], 4) if campos['total'] else 0.0
+    return campos
+
+
+def recientes(storage) -> List[Dict[str, Any]]:
+    """
+    Últimos trabajos del tenant actual, del más reciente al más antiguo.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        List[Dict[str, Any]]: Estado de cada trabajo
+    """
+    ids = [_texto(i) for i in _cliente(storage).lrange(RECIENTES, 0, -1)]
+    return [e for e in (estado(storage, i) for i in ids) if e]
+
+
+def _planificar(storage, tipo: str, ref_id: str) -> List[str]:
+    """Ids de los pedidos abiertos que usan el proceso o producto (ordenados)."""
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    
+    candidatos = set()
+    if tipo == PROCESO:
+        sin_pedido = []
+        for pers in storage.query(Personalizacion).where(proceso_id=ref_id, is_active=True).all():
+            if getattr(pers, 'pedido_id', None):
+                candidatos.add(pers.pedido_id)
+            elif getattr(pers, 'item_pedido_id', None):
+                sin_pedido.append(pers.item_pedido_id)
+        # Personalizaciones anteriores a guardar su pedido_id: por su item
+        for item in storage.load_many(sin_pedido, ItemPedido).values():
+            if getattr(item, 'pedido_id', None):
+                candidatos.add(item.pedido_id)
+    else:
+        for item in storage.query(ItemPedido).where(producto_id=ref_id, is_active=True).all():
+            if getattr(item, 'pedido_id', None):
+                candidatos.add(item.pedido_id)
+    
+    pedidos = storage.load_many(sorted(candidatos), Pedido)
+    return sorted(pid for pid, pedido in pedidos.items() if _abierto(pedido))
+
+
+def _versiones(storage, pedido_ids: List[str]) -> Dict[str, Optional[str]]:
+    """Contador de cambios de cada pedido (un pipeline por nodo)."""
+    from app.models.pedido import Pedido
+    
+    por_cliente: Dict[int, tuple] = {}
+    for pid in pedido_ids:
+        cliente = storage.client_for(Pedido, pid)
+        por_cliente.setdefault(id(cliente), (cliente, []))[1].append(pid)
+    versiones = {}
+    for cliente, pids in por_cliente.values():
+        valores = cliente.mget([order_view.clave_cambios(pid) for pid in pids])
+        versiones.update({pid: _texto(valor) for pid, valor in zip(pids, valores)})
+    return versiones
+
+
+def _guardar(storage, cambiados: Dict[str, Dict[str, Any]], versiones: Dict[str, Optional[str]]) -> List[str]:
+    """
+    Guardar lo que cambió en cada pedido si nadie lo ha tocado desde que se
+    leyó su contador: una transacción por nodo que vigila los contadores de
+    sus pedidos. Si alguno cambió, el resto se guarda sin él.
+    
+    Args:
+        storage: Instancia de StorageService
+        cambiados: Pedido -> objetos a guardar (id -> objeto)
+        versiones: Contador de cambios de cada pedido al leerlo
+    
+    Returns:
+        List[str]: Pedidos que no se guardaron porque cambiaron
+    """
+    por_nodo: Dict[str, List[str]] = {}
+    for pid in cambiados:
+        por_nodo.setdefault(storage._anillo().node_for(str(pid)), []).append(pid)
+    conflictos = []
+    for pids in por_nodo.values():
+        for _ in range(REINTENTOS):
+            if not pids:
+                break
+            try:
+                storage.save_many(
+                    [obj for pid in pids for obj in cambiados[pid].values()],
+                    si_no_cambian={order_view.clave_cambios(pid): versiones.get(pid) for pid in pids}
+                )
+                pids = []
+            except WatchError:
+                actuales = _versiones(storage, pids)
+                cambiados_ya = [pid for pid in pids if actuales[pid] != versiones.get(pid)]
+                conflictos.extend(cambiados_ya)
+                pids = [pid for pid in pids if pid not in cambiados_ya]
+        conflictos.extend(pids)
+    return conflictos
+
+
+def _repreciar_lote(storage, tipo: str, referencia, pedido_ids: List[str]) -> tuple:
+    """
+    Repreciar un lote de pedidos. Los que alguien cambia mientras se
+    reprecian se vuelven a cargar y cotizar (hasta REINTENTOS veces).
+    
+    Args:
+        storage: Instancia de StorageService
+        tipo: ``PROCESO`` o ``PRODUCTO``
+        referencia: Tarifa del proceso o producto con los precios nuevos
+        pedido_ids: Pedidos del lote
+    
+    Returns:
+        tuple: Pedidos cuyo total cambió y pedidos que no se pudieron guardar
+        porque seguían cambiando
+    """
+    actualizados = 0
+    for _ in range(REINTENTOS):
+        cambiados, versiones, cuenta = _cotizar_lote(storage, tipo, referencia, pedido_ids)
+        conflictos = _guardar(storage, cambiados, versiones)
+        actualizados += len([pid for pid in cuenta if pid not in conflictos])
+        if not conflictos:
+            return actualizados, []
+        current_app.logger.info(f"Repreciado: {len(conflictos)} pedidos cambiaron mientras se cotizaban")
+        pedido_ids = conflictos
+    return actualizados, pedido_ids
+
+
+def _cotizar_lote(storage, tipo: str, referencia, pedido_ids: List[str]) -> tuple:
+    """
+    Cargar y cotizar un lote de pedidos, sin guardar nada.
+    
+    Returns:
+        tuple: Objetos cambiados de cada pedido (pedido -> id -> objeto), el
+        contador de cambios de cada pedido antes de cargarlo y los pedidos
+        cuyo total cambió
+    """
+    from app.models.pedido import Pedido, ItemPedido, Personalizacion
+    from app.services import pricing
+    
+    # Antes de cargar: un cambio posterior invalida lo calculado
+    versiones = _versiones(storage, pedido_ids)
+    pedidos = {pid: p for pid, p in storage.load_many(pedido_ids, Pedido).items() if _abierto(p)}
+    if not pedidos:
+        return {}, versiones, []
+    items = storage.query(ItemPedido).where(pedido_id__in=list(pedidos), is_active=True).all()
+    por_item = {item.id: [] for item in items}
+    if por_item:
+        for pers in storage.query(Personalizacion).where(item_pedido_id__in=list(por_item), is_active=True).all():
+            por_item[pers.item_pedido_id].append(pers)
+    
+    cambiados = {}
+    
+    if tipo == PROCESO:
+        # Todas las personalizaciones del proceso en el lote, cotizadas juntas;
+        # las de precio manual (sin medidas ni opción) no se tocan
+        lote = []
+        for lista in por_item.values():
+            for pers in lista:
+                opcion = getattr(pers, 'tamaño_bordado', None) or getattr(pers, 'tipo_vinil', None)
+                medidas = getattr(pers, 'ancho', 0) and getattr(pers, 'alto', 0)
+                if pers.proceso_id == referencia.proceso_id and pers.cantidad and (medidas or opcion):
+                    lote.append((pers, opcion))
+        if lote:
+            cotizado = pricing.cotizar_lote(
+                [referencia] * len(lote),
+                [float(getattr(pers, 'ancho', 0) or 0) for pers, _ in lote],
+                [float(getattr(pers, 'alto', 0) or 0) for pers, _ in lote],
+                [int(pers.cantidad) for pers, _ in lote],
+                [opcion for _, opcion in lote]
+            )
+            for (pers, _), precio in zip(lote, cotizado.precios):
+                # El precio del lote es el total de las piezas; se guarda por pieza
+                nuevo = float(precio) / pers.cantidad
+                if precio > 0 and nuevo != pers.precio_proceso:
+                    pers.precio_proceso = nuevo
+                    cambiados[pers.id] = pers
+    else:
+        for item in items:
+            if item.producto_id == referencia.id and item.precio_prenda != referencia.precio_base:
+                item.precio_prenda = referencia.precio_base
+                cambiados[item.id] = item
+    
+    # Subtotales y totales, como calcular_totales_pedido
+    subtotales = {pid: 0.0 for pid in pedidos}
+    for item in items:
+        personalizaciones = por_item[item.id]
+        for pers in personalizaciones:
+            subtotal = pers.precio_proceso * pers.cantidad
+            if pers.subtotal != subtotal:
+                pers.subtotal = subtotal
+                cambiados[pers.id] = pers
+        subtotal_item = item.precio_prenda * item.cantidad
+        subtotal_personalizaciones = sum(p.subtotal for p in personalizaciones)
+        if item.subtotal != subtotal_item or item.subtotal_personalizaciones != subtotal_personalizaciones:
+            item.subtotal = subtotal_item
+            item.subtotal_personalizaciones = subtotal_personalizaciones
+            cambiados[item.id] = item
+        subtotales[item.pedido_id] += item.subtotal + item.subtotal_personalizaciones
+    
+    actualizados = []
+    for pid, pedido in pedidos.items():
+        if pedido.subtotal != subtotales[pid]:
+            # calcular_totales toma el subtotal de _calculated_subtotal
+            pedido._calculated_subtotal = subtotales[pid]
+            pedido.calcular_totales()
+            del pedido._calculated_subtotal
+            cambiados[pid] = pedido
+            actualizados.append(pid)
+    
+    # Cada objeto con su pedido, para vigilar el contador de ese pedido
+    pedido_de = {item.id: item.pedido_id for item in items}
+    pedido_de.update({pers.id: item.pedido_id for item in items for pers in por_item[item.id]})
+    pedido_de.update({pid: pid for pid in pedidos})
+    por_pedido: Dict[str, Dict[str, Any]] = {}
+    for obj_id, obj in cambiados.items():
+        por_pedido.setdefault(pedido_de[obj_id], {})[obj_id] = obj
+    return por_pedido, versiones, actualizados
+
+
+def _referencia(storage, tipo: str, ref_id: str):
+    """Precios vigentes del proceso (su tarifa) o del producto, o None si ya no existe."""
+    from app.models.proceso import Proceso
+    from app.models.producto import Producto
+    from app.services.pricing import tarifas
+    
+    if tipo == PROCESO:
+        proceso = storage.get(Proceso, ref_id)
+        return tarifas.obtener(proceso) if proceso else None
+    return storage.get(Producto, ref_id)
+
+
+def ejecutar(storage, trabajo_id: str, propietario: str = None) -> bool:
+    """
+    Ejecutar (o reanudar) un trabajo del tenant actual hasta terminarlo.
+    
+    Args:
+        storage: Instancia de StorageService
+        trabajo_id: Id del trabajo
+        propietario: Identificador de quien lo ejecuta (para el cerrojo)
+    
+    Returns:
+        bool: True si el trabajo quedó terminado (o ya lo estaba); False si
+        otro proceso lo está ejecutando
+    """
+    config = current_app.config
+    tamaño_lote = max(1, int(config.get('REPRICING_BATCH_SIZE', 100)))
+    ttl = max(5, int(config.get('REPRICING_LOCK_TTL', 60)))
+    propietario = propietario or f'{os.getpid()}:{threading.get_ident()}'
+    cliente = _cliente(storage)
+    clave = _clave(trabajo_id)
+    
+    trabajo = estado(storage, trabajo_id)
+    if trabajo is None or trabajo['estado'] in (COMPLETADO, PARCIAL, ERROR):
+        return True
+    if not cliente.set(_clave_cerrojo(trabajo_id), propietario, nx=True, ex=ttl):
+        return False
+    
+    try:
+        tipo, ref_id = trabajo['tipo'], trabajo['ref_id']
+        if trabajo['estado'] == PENDIENTE:
+            pedido_ids = _planificar(storage, tipo, ref_id)
+            with cliente.pipeline() as pipe:
+                pipe.delete(_clave_pedidos(trabajo_id))
+                for inicio in range(0, len(pedido_ids), 1000):
+                    pipe.rpush(_clave_pedidos(trabajo_id), *pedido_ids[inicio:inicio + 1000])
+                pipe.hset(clave, mapping={'estado': EN_CURSO, 'total': len(pedido_ids), 'procesados': 0,
+                                          'iniciado': _ahora(), 'actualizado': _ahora()})
+                pipe.execute()
+            trabajo.update(estado=EN_CURSO, total=len(pedido_ids), procesados=0)
+        
+        cursor = trabajo['procesados']
+        while cursor < trabajo['total']:
+            lote = [_texto(p) for p in cliente.lrange(_clave_pedidos(trabajo_id), cursor, cursor + tamaño_lote - 1)]
+            if not lote:
+                break
+            # Precios vigentes en cada lote: un cambio a mitad de trabajo se
+            # aplica a los lotes restantes (y el trabajo nuevo, a todos)
+            referencia = _referencia(storage, tipo, ref_id)
+            if referencia is None:
+                raise LookupError(f'{tipo} {ref_id} ya no existe')
+            # Un lote que falla se reintenta; si sigue fallando, sus pedidos
+            # quedan como fallidos y el trabajo sigue con el siguiente
+            actualizados, fallidos = 0, lote
+            for intento in range(1, REINTENTOS + 1):
+                try:
+                    actualizados, fallidos = _repreciar_lote(storage, tipo, referencia, lote)
+                    break
+                except Exception as e:
+                    current_app.logger.error(
+                        f"Repreciado {trabajo_id}: error en el lote {cursor} (intento {intento}/{REINTENTOS}): {e}"
+                    )
+            cursor += len(lote)
+            with cliente.pipeline(transaction=False) as pipe:
+                pipe.hset(clave, mapping={'procesados': cursor, 'actualizado': _ahora()})
+                pipe.hincrby(clave, 'actualizados', actualizados)
+                if fallidos:
+                    pipe.rpush(_clave_fallidos(trabajo_id), *fallidos)
+                    pipe.hincrby(clave, 'errores', len(fallidos))
+                pipe.expire(_clave_cerrojo(trabajo_id), ttl)
+                pipe.execute()
+        
+        # Los fallidos se conservan para reintentarlos (``reintentar``)
+        final = PARCIAL if cliente.llen(_clave_fallidos(trabajo_id)) else COMPLETADO
+        with cliente.pipeline(transaction=False) as pipe:
+            pipe.hset(clave, mapping={'estado': final, 'terminado': _ahora(), 'actualizado': _ahora()})
+            pipe.delete(_clave_pedidos(trabajo_id))
+            pipe.execute()
+        current_app.logger.info(f"Repreciado {trabajo_id} terminado: {final} ({cursor} pedidos)")
+        return True
+    
+    except Exception as e:
+        current_app.logger.error(f"Repreciado {trabajo_id} fallido: {e}")
+        cliente.hset(clave, mapping={'estado': ERROR, 'error': str(e), 'actualizado': _ahora()})
+        return True
+    finally:
+        if _texto(cliente.get(_clave_cerrojo(trabajo_id))) == propietario:
+            cliente.delete(_clave_cerrojo(trabajo_id))
+
+
+def reintentar(storage, trabajo_id: str) -> bool:
+    """
+    Volver a encolar los pedidos que un trabajo PARCIAL no pudo repreciar.
+    
+    Args:
+        storage: Instancia de StorageService
+        trabajo_id: Id del trabajo
+    
+    Returns:
+        bool: True si se encolaron; False si el trabajo no existe o no
+        terminó PARCIAL
+    """
+    trabajo = estado(storage, trabajo_id)
+    if trabajo is None or trabajo['estado'] != PARCIAL:
+        return False
+    cliente = _cliente(storage)
+    with cliente.pipeline() as pipe:
+        pipe.delete(_clave_pedidos(trabajo_id), _clave_fallidos(trabajo_id))
+        for inicio in range(0, len(trabajo['fallidos']), 1000):
+            pipe.rpush(_clave_pedidos(trabajo_id), *trabajo['fallidos'][inicio:inicio + 1000])
+        pipe.hset(_clave(trabajo_id), mapping={
+            'estado': EN_CURSO, 'total': len(trabajo['fallidos']), 'procesados': 0,
+            'errores': 0, 'actualizado': _ahora(),
+        })
+        pipe.execute()
+    _cliente_global(storage).rpush(COLA, f'{tenancy.current_tenant() or ""}|{trabajo_id}')
+    current_app.logger.info(f"Repreciado {trabajo_id}: {len(trabajo['fallidos'])} pedidos reencolados")
+    
+    if current_app.config.get('REPRICING_BACKGROUND', True):
+        ejecutor.iniciar(current_app._get_current_object())
+    return True
+
+
+def ejecutar_pendientes(storage=None) -> int:
+    """
+    Ejecutar los trabajos de la cola (de todos los tenants) que nadie esté
+    ejecutando, incluidos los interrumpidos.
+    
+    Args:
+        storage: Instancia de StorageService (por defecto, una nueva)
+    
+    Returns:
+        int: Trabajos terminados
+    """
+    if storage is None:
+        from app.services.storage_service import StorageService
+        storage = StorageService()
+    cola = _cliente_global(storage)
+    terminados = 0
+    for entrada in [_texto(e) for e in cola.lrange(COLA, 0, -1)]:
+        tenant, _, trabajo_id = entrada.partition('|')
+        with tenancy.tenant_scope(tenant or None):
+            if ejecutar(storage, trabajo_id):
+                cola.lrem(COLA, 1, entrada)
+                terminados += 1
+    return terminados
+
+
+class _Ejecutor:
+    """Hilo de fondo que ejecuta los trabajos de la cola en este proceso."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._despertar = threading.Event()
+        self.stats = {'ejecuciones': 0, 'terminados': 0, 'errores': 0}
+    
+    def iniciar(self, app):
+        """
+        Despertar el hilo, creándolo si no existe en este proceso (tras un
+        fork el del padre no existe).
+        
+        Args:
+            app: Aplicación Flask (el hilo trabaja en su contexto)
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, args=(app,), name='repricing', daemon=True)
+                self._thread.start()
+        self._despertar.set()
+    
+    def _run(self, app):
+        """Ejecutar la cola hasta vaciarla; revisarla cada poco por si hay trabajos huérfanos."""
+        espera = app.config.get('REPRICING_POLL_INTERVAL', 30)
+        while True:
+            self._despertar.clear()
+            try:
+                with app.app_context():
+                    self.stats['ejecuciones'] += 1
+                    self.stats['terminados'] += ejecutar_pendientes()
+            except Exception as e:
+                self.stats['errores'] += 1
+                app.logger.error(f"Error ejecutando repreciados: {e}")
+            self._despertar.wait(espera)
+
+
+# Instancia única por proceso
+ejecutor = _Ejecutor()
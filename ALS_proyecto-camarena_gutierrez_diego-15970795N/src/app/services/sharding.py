@@ -0,0 +1,116 @@
+"""
+Reparto de los datos entre varios nodos Redis (sharding en el cliente).
+
+Cada objeto se asigna a un nodo con hashing consistente sobre su clave de
+shard. Por defecto es su id, pero ItemPedido y Personalizacion usan el id de su
+pedido (equivalente a una hash tag ``{pedido_id}``), de modo que un pedido y
+todas sus filas viven en el mismo nodo. Al añadir un nodo solo cambia de sitio
+la fracción de claves que le corresponde, y ``StorageService.rebalance`` las
+mueve en segundo plano.
+"""
+
+import bisect
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+
+# Puntos de cada nodo en el anillo: más puntos, reparto más uniforme
+VNODES = 160
+
+
+def _hash(texto: str) -> int:
+    """Hash estable de 32 bits (igual en todos los procesos y arranques)."""
+    return int.from_bytes(hashlib.md5(texto.encode('utf-8')).digest()[:4], 'big')
+
+
+class HashRing:
+    """
+    Anillo de hashing consistente con nodos virtuales.
+    """
+
+    def __init__(self, nodos: Sequence[str], vnodes: int = VNODES):
+        """
+        Construir el anillo.
+
+        Args:
+            nodos: Nombres de los nodos ("host:puerto/db")
+            vnodes: Puntos por nodo
+        """
+        self.nodos = list(nodos)
+        puntos = sorted(
+            (_hash(f"{nodo}#{i}"), nodo) for nodo in self.nodos for i in range(vnodes)
+        )
+        self._claves = [p[0] for p in puntos]
+        self._nodos = [p[1] for p in puntos]
+
+    def node_for(self, clave: str) -> str:
+        """
+        Obtener el nodo responsable de una clave.
+
+        Args:
+            clave: Clave de shard
+
+        Returns:
+            str: Nombre del nodo
+        """
+        if len(self.nodos) == 1:
+            return self.nodos[0]
+        posicion = bisect.bisect(self._claves, _hash(str(clave))) % len(self._claves)
+        return self._nodos[posicion]
+
+
+def shard_key(obj: Any) -> str:
+    """
+    Clave de shard de un objeto según el ``SHARD_KEY_FIELD`` de su clase.
+    Si el campo no tiene valor se usa el id del objeto.
+
+    Args:
+        obj: Objeto a ubicar
+
+    Returns:
+        str: Clave con la que se elige el nodo
+    """
+    campo = getattr(type(obj), 'SHARD_KEY_FIELD', 'id')
+    return str(getattr(obj, campo, None) or getattr(obj, 'id', ''))
+
+
+_anillos: Dict[tuple, HashRing] = {}
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def get_ring(nodos: Sequence[str]) -> HashRing:
+    """Anillo del proceso para una lista de nodos (se construye una vez)."""
+    clave = tuple(nodos)
+    with _lock:
+        if clave not in _anillos:
+            _anillos[clave] = HashRing(clave)
+        return _anillos[clave]
+
+
+def scatter(funcion: Callable[[Any], Any], nodos: List[Any]) -> List[Any]:
+    """
+    Ejecutar una función en todos los nodos en paralelo (scatter-gather).
+    Si algún nodo falla se propaga el error: un resultado parcial sería
+    indistinguible de uno completo.
+
+    Args:
+        funcion: Función que recibe cada nodo (nombre o cliente)
+        nodos: Nodos a consultar
+
+    Returns:
+        List[Any]: Resultado de cada nodo, en el orden de ``nodos``
+    """
+    global _executor, _executor_pid
+    if len(nodos) == 1:
+        return [funcion(nodos[0])]
+    with _lock:
+        # Tras un fork los hilos del pool del padre no existen en el hijo
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='shard-scatter')
+            _executor_pid = os.getpid()
+    return list(_executor.map(funcion, nodos))
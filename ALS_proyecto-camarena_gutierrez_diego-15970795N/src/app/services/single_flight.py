@@ -0,0 +1,313 @@
+"""
+Coalescencia de cálculos costosos (single-flight).
+
+Cuando muchas peticiones piden a la vez el mismo agregado (el dashboard tras
+un despliegue, el catálogo tras vaciar la caché), solo una lo calcula:
+
+1. En el proceso: la primera petición con una clave calcula y el resto de
+   hilos esperan su resultado.
+2. Entre workers: antes de calcular se busca el resultado publicado por otro
+   worker (``sf:<clave>``); si no está, se toma un lock en Redis
+   (``sf:<clave>:lock``, SET NX con caducidad). Quien no consigue el lock
+   espera a que se publique el resultado.
+
+El resultado publicado se reutiliza durante unos segundos, y las claves
+incluyen la generación de las clases de las que depende el cálculo (ver
+``query_cache``), de modo que cualquier escritura en ellas lo deja sin uso.
+
+Si Redis no está disponible, o el worker que calcula tarda más de lo
+previsto, cada petición calcula por su cuenta: la coalescencia ahorra
+trabajo pero nunca deja una petición sin respuesta. Los resultados deben ser
+serializables a JSON; cada llamada recibe su propia copia.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis
+from flask import current_app
+
+
+# Cada cuánto consulta Redis quien espera a otro worker (segundos)
+_INTERVALO_ESPERA = 0.05
+
+# Marca de "no hay resultado" (None es un resultado válido)
+_NADA = object()
+
+
+class _Llamada:
+    """Cálculo en curso en este proceso, compartido con los hilos que esperan."""
+    
+    def __init__(self):
+        self.evento = threading.Event()
+        self.texto: Optional[str] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalescencia de cálculos por clave, en el proceso y entre workers.
+    Es segura entre hilos.
+    """
+    
+    def __init__(self):
+        """Inicializar con la configuración por defecto."""
+        self._lock = threading.Lock()
+        self._en_curso: Dict[str, _Llamada] = {}
+        self.enabled = True
+        self.configured = False
+        self.ttl = 5
+        self.lock_timeout = 30.0
+        self.wait_timeout = 10.0
+        self.stats_counters = {
+            'computed': 0,      # cálculos hechos por este proceso
+            'coalesced': 0,     # peticiones que esperaron a otro hilo
+            'shared': 0,        # resultados publicados por otro worker
+            'fallbacks': 0,     # cálculos sin coordinar (Redis caído o espera agotada)
+        }
+    
+    def configure(self, enabled: bool = True, ttl: int = 5,
+                  lock_timeout: float = 30.0, wait_timeout: float = 10.0):
+        """
+        Configurar la coalescencia.
+        
+        Args:
+            enabled: Si está activa (si no, cada llamada calcula)
+            ttl: Segundos durante los que se reutiliza un resultado publicado
+            lock_timeout: Caducidad del lock entre workers (segundos)
+            wait_timeout: Espera máxima por el cálculo de otro (segundos)
+        """
+        with self._lock:
+            self.enabled = enabled
+            self.ttl = max(1, int(ttl))
+            self.lock_timeout = float(lock_timeout)
+            self.wait_timeout = float(wait_timeout)
+            self.configured = True
+    
+    def _contar(self, contador: str):
+        with self._lock:
+            self.stats_counters[contador] += 1
+    
+    def _unirse(self, clave: str):
+        """Registrar la llamada; devuelve (llamada, es_lider)."""
+        with self._lock:
+            llamada = self._en_curso.get(clave)
+            if llamada is not None:
+                self.stats_counters['coalesced'] += 1
+                return llamada, False
+            llamada = self._en_curso[clave] = _Llamada()
+            return llamada, True
+    
+    def _terminar(self, clave: str, llamada: _Llamada):
+        with self._lock:
+            self._en_curso.pop(clave, None)
+        llamada.evento.set()
+    
+    @staticmethod
+    def _resultado(llamada: _Llamada) -> Any:
+        """
+        Resultado del líder para un hilo que esperó: su error si falló, o
+        _NADA si no llegó a terminar (p. ej. se canceló) y hay que calcular.
+        """
+        if llamada.error is not None:
+            raise llamada.error
+        if llamada.texto is None:
+            return _NADA
+        return json.loads(llamada.texto)
+    
+    # ------------------------------------------------------------------
+    # Pasos en Redis
+    # ------------------------------------------------------------------
+    
+    def _publicado(self, cliente, clave: str) -> Any:
+        """Resultado publicado por otro worker, o _NADA."""
+        texto = cliente.get(f'sf:{clave}')
+        return _NADA if texto is None else texto
+    
+    def _adquirir(self, cliente, clave: str) -> Optional[str]:
+        """Tomar el lock entre workers; devuelve el token o None si lo tiene otro."""
+        token = uuid.uuid4().hex
+        if cliente.set(f'sf:{clave}:lock', token, nx=True, px=int(self.lock_timeout * 1000)):
+            return token
+        return None
+    
+    def _publicar(self, cliente, clave: str, token: str, texto: Optional[str]):
+        """
+        Publicar el resultado (si lo hay) y soltar el lock, solo si sigue
+        siendo nuestro: si caducó, ya puede tenerlo otro worker.
+        """
+        clave_lock = f'sf:{clave}:lock'
+        try:
+            with cliente.pipeline() as pipe:
+                pipe.watch(clave_lock)
+                propio = pipe.get(clave_lock)
+                if isinstance(propio, bytes):
+                    propio = propio.decode()
+                pipe.multi()
+                if texto is not None:
+                    pipe.set(f'sf:{clave}', texto, ex=self.ttl)
+                if propio == token:
+                    pipe.delete(clave_lock)
+                pipe.execute()
+        except redis.WatchError:
+            # El lock cambió de dueño entre la lectura y el borrado: se deja
+            pass
+        except Exception as e:
+            current_app.logger.error(f"Error publicando resultado coalescido {clave}: {e}")
+    
+    def _esperar_publicacion(self, cliente, clave: str) -> Any:
+        """
+        Esperar a que el worker con el lock publique el resultado.
+        
+        Returns:
+            Any: Texto publicado, o _NADA si el lock se soltó sin resultado o
+            se agotó la espera
+        """
+        limite = time.monotonic() + self.wait_timeout
+        while time.monotonic() < limite:
+            time.sleep(_INTERVALO_ESPERA)
+            with cliente.pipeline(transaction=False) as pipe:
+                pipe.get(f'sf:{clave}')
+                pipe.exists(f'sf:{clave}:lock')
+                texto, bloqueado = pipe.execute()
+            if texto is not None:
+                return texto
+            if not bloqueado:
+                break
+        return _NADA
+    
+    def _coordinar(self, cliente, clave: str):
+        """
+        Primera fase entre workers: resultado publicado, lock propio o espera.
+        
+        Returns:
+            tuple: (texto publicado o _NADA, token del lock o None)
+        """
+        try:
+            texto = self._publicado(cliente, clave)
+            if texto is not _NADA:
+                self._contar('shared')
+                return texto, None
+            token = self._adquirir(cliente, clave)
+            if token is not None:
+                return _NADA, token
+            texto = self._esperar_publicacion(cliente, clave)
+            if texto is not _NADA:
+                self._contar('shared')
+                return texto, None
+        except Exception as e:
+            current_app.logger.warning(f"Coalescencia entre workers no disponible para {clave}: {e}")
+        self._contar('fallbacks')
+        return _NADA, None
+    
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    
+    def do(self, cliente, clave: str, calcular: Callable[[], Any]) -> Any:
+        """
+        Obtener el resultado de un cálculo coalescido.
+        
+        Args:
+            cliente: Cliente Redis donde coordinar (nodo principal del tenant)
+            clave: Clave del cálculo (incluye todo aquello de lo que depende)
+            calcular: Función sin argumentos que calcula el resultado
+        
+        Returns:
+            Any: Resultado (una copia propia para cada llamada)
+        """
+        if not self.enabled:
+            return calcular()
+        
+        llamada, lider = self._unirse(clave)
+        if not lider:
+            if llamada.evento.wait(self.wait_timeout):
+                resultado = self._resultado(llamada)
+                if resultado is not _NADA:
+                    return resultado
+            self._contar('fallbacks')
+            return calcular()
+        
+        try:
+            texto, token = self._coordinar(cliente, clave)
+            if texto is not _NADA:
+                llamada.texto = texto
+                return json.loads(texto)
+            try:
+                resultado = calcular()
+                self._contar('computed')
+                llamada.texto = json.dumps(resultado)
+            finally:
+                if token is not None:
+                    self._publicar(cliente, clave, token, llamada.texto)
+            return resultado
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            self._terminar(clave, llamada)
+    
+    async def do_async(self, cliente, clave: str, calcular: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Versión de ``do`` para vistas async: el cálculo es una corrutina y
+        las esperas y los pasos en Redis se hacen fuera del bucle de eventos.
+        
+        Args:
+            cliente: Cliente Redis donde coordinar (nodo principal del tenant)
+            clave: Clave del cálculo (incluye todo aquello de lo que depende)
+            calcular: Función sin argumentos que devuelve la corrutina del cálculo
+        
+        Returns:
+            Any: Resultado (una copia propia para cada llamada)
+        """
+        if not self.enabled:
+            return await calcular()
+        
+        llamada, lider = self._unirse(clave)
+        if not lider:
+            if await asyncio.to_thread(llamada.evento.wait, self.wait_timeout):
+                resultado = self._resultado(llamada)
+                if resultado is not _NADA:
+                    return resultado
+            self._contar('fallbacks')
+            return await calcular()
+        
+        try:
+            texto, token = await asyncio.to_thread(self._coordinar, cliente, clave)
+            if texto is not _NADA:
+                llamada.texto = texto
+                return json.loads(texto)
+            try:
+                resultado = await calcular()
+                self._contar('computed')
+                llamada.texto = json.dumps(resultado)
+            finally:
+                if token is not None:
+                    await asyncio.to_thread(self._publicar, cliente, clave, token, llamada.texto)
+            return resultado
+        except Exception as e:
+            llamada.error = e
+            raise
+        finally:
+            self._terminar(clave, llamada)
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Obtener los contadores de la coalescencia.
+        
+        Returns:
+            Dict[str, Any]: Cálculos hechos, evitados y sin coordinar
+        """
+        with self._lock:
+            contadores = dict(self.stats_counters)
+            contadores['in_flight'] = len(self._en_curso)
+        contadores['enabled'] = self.enabled
+        return contadores
+
+
+# Instancia única por proceso
+single_flight = SingleFlight()
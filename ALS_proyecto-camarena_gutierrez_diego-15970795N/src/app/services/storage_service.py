@@ -3,10 +3,78 @@ Servicio simplificado de almacenamiento usando Sirope/Redis.
 Centraliza todas las operaciones de persistencia de datos.
 """
 
+import asyncio
+import json
+import os
+import threading
+import time
 import sirope
 import redis
-from typing import Any, List, Optional, Type
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
 from flask import current_app
+from redis.exceptions import WatchError
+from sirope.coders import JSONCoder, JSONDCoder, Transcoder
+from sirope.oid import OID
+from sirope.utils import cls_from_str, full_name_from_obj
+
+from app.services.cache import object_cache
+from app.services import invalidation
+from app.services import (
+    material_demand, order_view, production_batches, query_cache, quote_cache, replicas, sharding, single_flight,
+    tenancy, work_queue
+)
+from app.services.circuit_breaker import ERRORES_CONEXION, BreakerRedis, get_breaker
+
+
+# Clientes Redis compartidos por proceso: (pid, host, puerto, db) -> cliente
+_clientes: Dict[tuple, redis.Redis] = {}
+_lock_clientes = threading.Lock()
+
+# Instancias de Sirope por cliente (réplicas y nodos adicionales)
+_siropes: Dict[int, sirope.Sirope] = {}
+
+# Vistas de cada cliente limitadas a un tenant: (id del cliente, tenant) -> vista
+_vistas: Dict[tuple, redis.Redis] = {}
+
+
+def normalizar_valor_indice(valor: Any) -> str:
+    """
+    Normalizar un valor para usarlo como clave de índice.
+    
+    Los enums se guardan por su valor y los booleanos como '1'/'0', de modo que
+    un objeto recién creado y uno cargado desde Redis producen la misma clave.
+    
+    Args:
+        valor: Valor del campo
+        
+    Returns:
+        str: Valor normalizado
+    """
+    if isinstance(valor, Enum):
+        valor = valor.value
+    if isinstance(valor, bool):
+        return '1' if valor else '0'
+    if valor is None:
+        return ''
+    return str(valor)
+
+
+class _OIDCoder(JSONCoder):
+    """JSONCoder de Sirope sin su efecto lateral: al codificar un OID no le
+    añade ``__class__`` a su ``__dict__`` (el OID puede estar compartido)."""
+    
+    def default(self, obj):
+        if isinstance(obj, OID):
+            return dict(obj.__dict__, **{Transcoder.CLASS_ID: full_name_from_obj(OID)})
+        return super().default(obj)
+
+
+def _json_de(obj: Any) -> str:
+    """JSON con el que se guarda un objeto (el formato de Sirope), sin modificarlo."""
+    from app.models.base_model import BaseModel
+    datos = obj.serialize() if isinstance(obj, BaseModel) else dict(obj.__dict__)
+    return json.dumps(datos, cls=_OIDCoder)
 
 
 class StorageService:
@@ -15,56 +83,610 @@ class StorageService:
     Encapsula la lógica de Sirope/Redis y proporciona una interfaz limpia.
     """
     
-    def __init__(self):
-        """Inicializar el servicio de almacenamiento."""
+    # Claves auxiliares mantenidas por el servicio
+    INDEX_PREFIX = 'idx'
+    IDS_KEY = 'idx:__ids__'  # Hash id de modelo -> OID en texto ("ns@num[|nodo]")
+    
+    def __init__(self, stale_ok: bool = False):
+        """
+        Inicializar el servicio de almacenamiento.
+        
+        Args:
+            stale_ok: Si las lecturas toleran cierto desfase y pueden servirse
+                desde una réplica (las escrituras siempre van al primario)
+        """
         self._sirope = None
+        self._redis = None
+        self.stale_ok = stale_ok
     
     @property
     def sirope(self):
         """Obtener instancia de Sirope (lazy loading)."""
         if self._sirope is None:
-            try:
-                current_app.logger.info("Inicializando Sirope")
-                
-                # Verificar si debemos usar Redis o no
-                use_redis = current_app.config.get('USE_REDIS', True)
-                
-                if use_redis:
-                    # Intentar conectar a Redis
-                    try:
-                        redis_host = current_app.config.get('REDIS_HOST', 'localhost')
-                        redis_port = current_app.config.get('REDIS_PORT', 6379)
-                        redis_db = current_app.config.get('REDIS_DB', 0)
-                        
-                        # Crear conexión Redis
-                        redis_client = redis.Redis(host=redis_host, port=redis_port, db=redis_db)
-                        # Probar conexión
-                        redis_client.ping()
-                        
-                        current_app.logger.info(f"Conectando a Redis en {redis_host}:{redis_port}")
-                        self._sirope = sirope.Sirope(redis_client)
-                        
-                    except (redis.ConnectionError, ConnectionRefusedError, Exception) as redis_error:
-                        current_app.logger.warning(f"No se pudo conectar a Redis: {redis_error}")
-                        current_app.logger.info("Usando backend en memoria para demo")
-                        # Fallback a backend en memoria
-                        self._sirope = sirope.Sirope(None)
+            # El cliente Redis se comparte en el proceso: crear un StorageService
+            # por petición ya no abre conexiones ni hace ping
+            self._redis = self._cliente_redis()
+            self._sirope = sirope.Sirope(self._redis)
+        return self._sirope
+    
+    @staticmethod
+    def _cliente_redis() -> redis.Redis:
+        """
+        Obtener el cliente Redis compartido del proceso.
+        
+        El cliente usa timeouts cortos y pasa por un circuit breaker: si Redis no
+        responde, tras unos pocos fallos los comandos fallan en microsegundos en
+        lugar de esperar al timeout del socket en cada petición.
+        
+        Returns:
+            redis.Redis: Cliente protegido por el breaker del endpoint
+        """
+        config = current_app.config
+        if config.get('USE_REDIS', True):
+            redis_host = config.get('REDIS_HOST', 'localhost')
+            redis_port = config.get('REDIS_PORT', 6379)
+            redis_db = config.get('REDIS_DB', 0)
+        else:
+            # Sin Redis configurado, Sirope usa el Redis local por defecto
+            redis_host, redis_port, redis_db = 'localhost', 6379, 0
+        return StorageService._cliente_endpoint(redis_host, redis_port, redis_db)
+    
+    @staticmethod
+    def _cliente_endpoint(redis_host: str, redis_port: int, redis_db: int) -> redis.Redis:
+        """
+        Obtener el cliente compartido del proceso para un endpoint concreto.
+        
+        Args:
+            redis_host: Host de Redis
+            redis_port: Puerto de Redis
+            redis_db: Base de datos
+            
+        Returns:
+            redis.Redis: Cliente protegido por el breaker del endpoint
+        """
+        config = current_app.config
+        clave = (os.getpid(), redis_host, redis_port, redis_db)
+        nuevo = False
+        with _lock_clientes:
+            cliente = _clientes.get(clave)
+            if cliente is None:
+                breaker = get_breaker(
+                    f"{redis_host}:{redis_port}/{redis_db}",
+                    config.get('REDIS_BREAKER_FAILURE_THRESHOLD', 5),
+                    config.get('REDIS_BREAKER_RESET_TIMEOUT', 10.0)
+                )
+                parametros = dict(
+                    host=redis_host, port=redis_port, db=redis_db,
+                    socket_timeout=config.get('REDIS_SOCKET_TIMEOUT', 0.5),
+                    socket_connect_timeout=config.get('REDIS_CONNECT_TIMEOUT', 0.25)
+                )
+                maximo = config.get('REDIS_MAX_CONNECTIONS', 0)
+                if maximo:
+                    # Cada hilo o greenlet toma su propia conexión del pool
+                    # durante cada comando; con un tope, los que sobran esperan
+                    # a que se libere una en lugar de abrir otra
+                    pool = redis.BlockingConnectionPool(
+                        max_connections=maximo, timeout=config.get('REDIS_POOL_TIMEOUT', 5.0), **parametros
+                    )
+                    cliente = BreakerRedis(connection_pool=pool, breaker=breaker)
                 else:
-                    current_app.logger.info("Configurado para usar backend en memoria")
-                    # Usar backend en memoria directamente
-                    self._sirope = sirope.Sirope(None)
-                
-                current_app.logger.info("Sirope inicializado con éxito")
+                    cliente = BreakerRedis(breaker=breaker, **parametros)
+                _clientes[clave] = cliente
+                nuevo = True
+        
+        if nuevo:
+            current_app.logger.info(f"Inicializando conexión a Redis en {redis_host}:{redis_port}/{redis_db}")
+            try:
+                cliente.ping()
+            except redis.ConnectionError as e:
+                current_app.logger.warning(
+                    f"No se pudo conectar a Redis: {e}. Las operaciones fallarán rápido "
+                    f"mientras el circuito esté abierto"
+                )
+        return cliente
+    
+    @staticmethod
+    def _clientes_replica() -> List[redis.Redis]:
+        """Clientes de las réplicas configuradas en REDIS_REPLICAS."""
+        config = current_app.config
+        if not config.get('USE_REDIS', True):
+            return []
+        endpoints = replicas.parse_endpoints(config.get('REDIS_REPLICAS', ''), config.get('REDIS_DB', 0))
+        return [StorageService._cliente_endpoint(*endpoint) for endpoint in endpoints]
+    
+    def _replica_lectura(self) -> Optional[redis.Redis]:
+        """
+        Decidir si una lectura puede ir a una réplica.
+        
+        Returns:
+            Optional[redis.Redis]: Cliente de réplica o None para leer del primario
+        """
+        if not self.stale_ok:
+            return None
+        clientes = self._clientes_replica()
+        if not clientes:
+            return None
+        if replicas.escritura_reciente(current_app.config.get('REDIS_READ_YOUR_WRITES_WINDOW', 5.0)):
+            # La sesión acaba de escribir: leer del primario para ver sus cambios
+            replicas.router.record('read_your_writes')
+            return None
+        return replicas.router.choose(clientes, current_app.config.get('REDIS_REPLICA_HEALTH_INTERVAL', 1.0))
+    
+    def _leer(self, funcion, nodo: str = None, tenant: Optional[str] = None):
+        """
+        Ejecutar una lectura en una réplica si procede, o en el primario.
+        Si la réplica falla, la lectura se repite en el primario.
+        
+        Args:
+            funcion: Función (sirope, cliente_redis, es_replica) -> resultado
+            nodo: Nodo del anillo a leer (por defecto, el principal). Las
+                réplicas de REDIS_REPLICAS solo lo son del nodo principal.
+            tenant: Tenant cuyo espacio de claves se lee (None para el global)
+            
+        Returns:
+            Any: Resultado de la función
+        """
+        if nodo is not None and nodo != self._nodo_principal():
+            cliente = self._cliente_nodo(nodo, tenant)
+            return funcion(self._sirope_de(cliente), cliente, False)
+        replica = self._replica_lectura()
+        if replica is not None:
+            try:
+                vista = self._vista(replica, tenant)
+                resultado = funcion(self._sirope_de(vista), vista, True)
+                replicas.router.record('replica_reads')
+                return resultado
+            except ERRORES_CONEXION as e:
+                replicas.router.record('fallbacks')
+                current_app.logger.warning(f"Réplica {replica.breaker.nombre} no disponible, leyendo del primario: {e}")
+        if self.stale_ok:
+            replicas.router.record('primary_reads')
+        principal = self._nodo_principal()
+        return funcion(self._sirope_nodo(principal, tenant), self._cliente_nodo(principal, tenant), False)
+    
+    @staticmethod
+    def _sirope_de(cliente: redis.Redis):
+        """Instancia de Sirope sobre el cliente de una réplica o de otro nodo."""
+        instancia = _siropes.get(id(cliente))
+        if instancia is None:
+            instancia = _siropes.setdefault(id(cliente), sirope.Sirope(cliente))
+        return instancia
+    
+    # ------------------------------------------------------------------
+    # Tenants (espacios de claves separados)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _vista(cliente, tenant: Optional[str]):
+        """Cliente limitado al espacio de claves de un tenant (el mismo cliente si es global)."""
+        if not tenant:
+            return cliente
+        clave = (id(cliente), tenant)
+        vista = _vistas.get(clave)
+        if vista is None:
+            vista = _vistas.setdefault(clave, tenancy.PrefixedRedis(cliente, tenancy.prefijo(tenant)))
+        return vista
+    
+    @staticmethod
+    def _tenant_de(class_type: Type = None) -> Optional[str]:
+        """
+        Tenant cuyo espacio de claves corresponde a una clase en la operación
+        actual. Las clases con ``TENANT_SCOPED = False`` (Usuario) son globales.
+        """
+        if class_type is not None and not getattr(class_type, 'TENANT_SCOPED', True):
+            return None
+        return tenancy.current_tenant()
+    
+    def _registrar_uso(self, tenant: Optional[str], **contadores: int):
+        """Sumar operaciones a los contadores de uso del tenant."""
+        for operacion, cantidad in contadores.items():
+            tenancy.usage.record(tenant, operacion, cantidad)
+        tenancy.usage.flush(self.redis)
+    
+    # ------------------------------------------------------------------
+    # Nodos (sharding en el cliente)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _nodos() -> Dict[str, redis.Redis]:
+        """
+        Nodos del almacenamiento: el principal (REDIS_HOST/PORT/DB) seguido de
+        los de REDIS_SHARDS. El principal aloja además las claves globales
+        (canal de invalidación, versiones de la caché).
+        
+        Returns:
+            Dict[str, redis.Redis]: Nombre del nodo -> cliente
+        """
+        config = current_app.config
+        principal = StorageService._cliente_redis()
+        nodos = {principal.breaker.nombre: principal}
+        if config.get('USE_REDIS', True):
+            for endpoint in replicas.parse_endpoints(config.get('REDIS_SHARDS', ''), config.get('REDIS_DB', 0)):
+                cliente = StorageService._cliente_endpoint(*endpoint)
+                nodos.setdefault(cliente.breaker.nombre, cliente)
+        return nodos
+    
+    def _nodo_principal(self) -> str:
+        """Nombre del nodo principal."""
+        return self.redis.breaker.nombre
+    
+    def _anillo(self) -> sharding.HashRing:
+        """Anillo de hashing consistente sobre los nodos configurados."""
+        return sharding.get_ring(list(self._nodos()))
+    
+    def _cliente_nodo(self, nodo: str, tenant: Optional[str] = None):
+        """Cliente del primario de un nodo (limitado al espacio del tenant)."""
+        cliente = self.redis if nodo == self._nodo_principal() else self._nodos()[nodo]
+        return self._vista(cliente, tenant)
+    
+    def _sirope_nodo(self, nodo: str, tenant: Optional[str] = None):
+        """Instancia de Sirope del primario de un nodo (en el espacio del tenant)."""
+        if nodo == self._nodo_principal() and not tenant:
+            return self.sirope
+        return self._sirope_de(self._cliente_nodo(nodo, tenant))
+    
+    def client_for(self, class_type: Type, shard_value: Any):
+        """
+        Cliente del nodo que guarda los datos con una clave de shard, en el
+        espacio del tenant de la clase. Para estructuras auxiliares que deben
+        vivir junto a los objetos (p. ej. la vista de un pedido).
+        
+        Args:
+            class_type: Clase de los objetos (decide el tenant)
+            shard_value: Clave de shard (p. ej. el id del pedido)
+        
+        Returns:
+            redis.Redis: Cliente del primario del nodo
+        """
+        return self._cliente_nodo(self._anillo().node_for(str(shard_value)), self._tenant_de(class_type))
+    
+    def _nodo_directorio(self, obj_id: str) -> str:
+        """Nodo que guarda la entrada de directorio de un id."""
+        return self._anillo().node_for(str(obj_id))
+    
+    def _texto_ubicacion(self, oid: OID, nodo: str) -> str:
+        """Valor del directorio: el OID y, si no vive en el principal, su nodo."""
+        return str(oid) if nodo == self._nodo_principal() else f"{oid}|{nodo}"
+    
+    def _parse_ubicacion(self, texto) -> Tuple[OID, str]:
+        """Interpretar un valor del directorio como (OID, nodo)."""
+        if isinstance(texto, bytes):
+            texto = texto.decode('utf-8')
+        texto_oid, _, nodo = texto.partition('|')
+        return OID.from_text(texto_oid), nodo or self._nodo_principal()
+    
+    def _en_todos(self, funcion, tenant: Optional[str] = None) -> List[Any]:
+        """
+        Scatter-gather: ejecutar una lectura en todos los nodos en paralelo.
+        Con un único nodo equivale a ``_leer`` (y puede usar réplicas).
+        
+        Args:
+            funcion: Función (sirope, cliente_redis, es_replica) -> resultado
+            tenant: Tenant cuyo espacio de claves se lee (None para el global)
+            
+        Returns:
+            List[Any]: Resultado de cada nodo
+        """
+        nodos = self._nodos()
+        if len(nodos) == 1:
+            return [self._leer(funcion, tenant=tenant)]
+        app = current_app._get_current_object()
+        
+        def en_nodo(cliente):
+            with app.app_context():
+                vista = self._vista(cliente, tenant)
+                return funcion(self._sirope_de(vista), vista, False)
+        
+        return sharding.scatter(en_nodo, list(nodos.values()))
+    
+    def _en_nodos(self, trabajo: Dict[str, Any], funcion, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecutar en paralelo ``funcion(cliente, datos)`` en el primario de cada
+        nodo de ``trabajo``.
+        
+        Args:
+            trabajo: Nodo -> datos que le corresponden
+            funcion: Función (cliente_redis, datos) -> resultado
+            tenant: Tenant cuyo espacio de claves se lee
+        
+        Returns:
+            Dict[str, Any]: Nodo -> resultado
+        """
+        if not trabajo:
+            return {}
+        app = current_app._get_current_object()
+        nombres = list(trabajo)
+        
+        def en_nodo(nodo):
+            with app.app_context():
+                return funcion(self._cliente_nodo(nodo, tenant), trabajo[nodo])
+        
+        return dict(zip(nombres, sharding.scatter(en_nodo, nombres)))
+    
+    @staticmethod
+    def _unir(partes: List[List[Any]]) -> List[Any]:
+        """
+        Unir los resultados de varios nodos. Un objeto que se está moviendo de
+        nodo puede aparecer en ambos durante un instante: se deja una copia.
+        """
+        if len(partes) == 1:
+            return partes[0]
+        vistos = set()
+        objetos = []
+        for parte in partes:
+            for obj in parte:
+                obj_id = getattr(obj, 'id', None)
+                if obj_id is not None:
+                    if obj_id in vistos:
+                        continue
+                    vistos.add(obj_id)
+                objetos.append(obj)
+        return objetos
+    
+    def _nodo_para_guardar(self, obj, tenant: Optional[str] = None) -> str:
+        """
+        Elegir el nodo de un objeto según su clave de shard. Si ya estaba
+        guardado en otro nodo (cambió su clave o se añadió un nodo), se retira
+        de allí y se guardará con un OID nuevo en el nodo que le corresponde.
+        
+        Args:
+            obj: Objeto a guardar
+            tenant: Tenant en cuyo espacio se guarda
+            
+        Returns:
+            str: Nombre del nodo destino
+        """
+        nodos = self._nodos()
+        principal = self._nodo_principal()
+        if len(nodos) == 1:
+            return principal
+        destino = self._anillo().node_for(sharding.shard_key(obj))
+        ubicacion = self._resolver_oid(obj.id, tenant=tenant) if getattr(obj, 'id', None) else None
+        if ubicacion is None:
+            oid = obj.__dict__.get(sirope.Sirope.OID_ID)
+            # Objetos guardados antes de existir los shards viven en el principal
+            ubicacion = (oid, principal) if oid else None
+        if ubicacion is not None:
+            oid, actual = ubicacion
+            if actual == destino:
+                # El OID del directorio manda sobre el que traiga el objeto (caché)
+                obj.__dict__[sirope.Sirope.OID_ID] = oid
+            else:
+                self._eliminar_indices(oid, actual, directorio=False, tenant=tenant)
+                self._sirope_nodo(actual, tenant).delete(oid)
+                obj.__dict__.pop(sirope.Sirope.OID_ID, None)
+        return destino
+    
+    @staticmethod
+    def cache():
+        """Caché de objetos del proceso, configurada en el primer uso."""
+        if not object_cache.configured:
+            object_cache.configure(
+                current_app.config.get('OBJECT_CACHE_CLASSES', {}),
+                current_app.config.get('OBJECT_CACHE_ENABLED', True)
+            )
+        if object_cache.enabled and current_app.config.get('CACHE_INVALIDATION_ENABLED', True):
+            # Idempotente; vuelve a arrancar el listener en cada worker tras el fork
+            StorageService._invalidation_bus().start(
+                StorageService._redis_factory(), current_app.logger
+            )
+        return object_cache
+    
+    @staticmethod
+    def results_cache() -> query_cache.QueryResultCache:
+        """Caché de resultados de consultas del proceso, configurada en el primer uso."""
+        cache = query_cache.query_cache
+        if not cache.configured:
+            cache.configure(
+                current_app.config.get('QUERY_CACHE_MAX_ENTRIES', 500),
+                current_app.config.get('QUERY_CACHE_ENABLED', True)
+            )
+        return cache
+    
+    def cached_results(self, class_type: Type, clave: tuple, forma: str, ejecutar) -> List[Any]:
+        """
+        Resultado de una consulta desde la caché de consultas o, si la clase
+        cambió desde que se guardó, ejecutándola.
+        
+        Args:
+            class_type: Clase consultada
+            clave: Clave normalizada de la consulta
+            forma: Forma de la consulta (para las estadísticas)
+            ejecutar: Función sin argumentos que ejecuta la consulta
+        
+        Returns:
+            List[Any]: Objetos resultantes (nuevos en cada llamada)
+        """
+        cache = self.results_cache()
+        if not cache.enabled:
+            return ejecutar()
+        tenant = self._tenant_de(class_type)
+        clave = (tenancy.prefijo(tenant),) + clave
+        # La generación se lee antes de ejecutar: si la clase cambia durante la
+        # consulta, el resultado se guarda con la generación anterior y no se sirve
+        generacion = query_cache.generation(self._cliente_nodo(self._nodo_principal(), tenant), class_type)
+        guardado = cache.get(clave, forma, generacion)
+        if guardado is not None:
+            from app.models.base_model import BaseModel
+            objetos = [self._obj_from_json(class_type, raw) for raw in guardado]
+            for obj in objetos:
+                if isinstance(obj, BaseModel):
+                    obj.restore_enums_after_loading()
+            return objetos
+        objetos = ejecutar()
+        cache.put(clave, generacion, [_json_de(obj) for obj in objetos])
+        return objetos
+    
+    @staticmethod
+    def single_flight() -> single_flight.SingleFlight:
+        """Coalescencia de cálculos del proceso, configurada en el primer uso."""
+        coalescencia = single_flight.single_flight
+        if not coalescencia.configured:
+            coalescencia.configure(
+                current_app.config.get('SINGLE_FLIGHT_ENABLED', True),
+                current_app.config.get('SINGLE_FLIGHT_TTL', 5),
+                current_app.config.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 30),
+                current_app.config.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 10)
+            )
+        return coalescencia
+    
+    def _clave_coalescida(self, nombre: str, depende_de: Iterable[Type]) -> str:
+        """Clave de un cálculo: tenant, nombre y generación de sus clases."""
+        tenant = tenancy.current_tenant()
+        clases = list(depende_de)
+        generaciones = query_cache.generations(self._cliente_nodo(self._nodo_principal(), tenant), clases)
+        return f"{tenancy.prefijo(tenant)}{nombre}@{'.'.join(map(str, generaciones))}"
+    
+    def coalesce(self, nombre: str, calcular, depende_de: Iterable[Type] = ()) -> Any:
+        """
+        Calcular un agregado costoso una sola vez aunque lo pidan a la vez
+        muchas peticiones, de este worker o de otros.
+        
+        Args:
+            nombre: Nombre del cálculo (con sus parámetros, si los tiene)
+            calcular: Función sin argumentos; su resultado debe ser serializable a JSON
+            depende_de: Clases cuyos cambios invalidan el resultado
+        
+        Returns:
+            Any: Resultado del cálculo (una copia propia)
+        """
+        coalescencia = self.single_flight()
+        if not coalescencia.enabled:
+            return calcular()
+        try:
+            clave = self._clave_coalescida(nombre, depende_de)
+        except Exception as e:
+            current_app.logger.warning(f"Calculando {nombre} sin coalescencia: {e}")
+            return calcular()
+        return coalescencia.do(self._cliente_nodo(self._nodo_principal()), clave, calcular)
+    
+    async def coalesce_async(self, nombre: str, calcular, depende_de: Iterable[Type] = ()) -> Any:
+        """
+        Versión de ``coalesce`` para vistas async.
+        
+        Args:
+            nombre: Nombre del cálculo (con sus parámetros, si los tiene)
+            calcular: Función sin argumentos que devuelve la corrutina del cálculo
+            depende_de: Clases cuyos cambios invalidan el resultado
+        
+        Returns:
+            Any: Resultado del cálculo (una copia propia)
+        """
+        coalescencia = self.single_flight()
+        if not coalescencia.enabled:
+            return await calcular()
+        try:
+            clave = await asyncio.to_thread(self._clave_coalescida, nombre, list(depende_de))
+        except Exception as e:
+            current_app.logger.warning(f"Calculando {nombre} sin coalescencia: {e}")
+            return await calcular()
+        return await coalescencia.do_async(self._cliente_nodo(self._nodo_principal()), clave, calcular)
+    
+    @staticmethod
+    def quote_cache() -> quote_cache.QuoteCache:
+        """Caché de cotizaciones compartida entre workers, configurada en el primer uso."""
+        cotizaciones = quote_cache.quote_cache
+        if not cotizaciones.configured:
+            cotizaciones.configure(
+                current_app.config.get('QUOTE_CACHE_ENABLED', True),
+                current_app.config.get('QUOTE_CACHE_MAX_ENTRIES', 1000),
+                current_app.config.get('QUOTE_CACHE_TTL', 86400)
+            )
+        return cotizaciones
+    
+    def _cliente_cotizaciones(self):
+        """Cliente de la caché de cotizaciones (nodo principal, espacio del tenant)."""
+        return self._cliente_nodo(self._nodo_principal(), tenancy.current_tenant())
+    
+    def cached_quote(self, proceso_id: str, campo: str, calcular) -> Optional[Dict[str, Any]]:
+        """
+        Obtener una cotización memorizada o calcularla y memorizarla.
+        
+        Args:
+            proceso_id: Id del proceso (o clave del proceso fijo)
+            campo: Versión y parámetros de la cotización (ver ``QuoteCache.field``)
+            calcular: Función sin argumentos que devuelve la cotización o None
+        
+        Returns:
+            Optional[Dict[str, Any]]: Cotización o None si no se pudo cotizar
+        """
+        return self.quote_cache().get_or_compute(self._cliente_cotizaciones(), proceso_id, campo, calcular)
+    
+    def quote_stats(self) -> Dict[str, Any]:
+        """
+        Obtener las estadísticas de la caché de cotizaciones.
+        
+        Returns:
+            Dict[str, Any]: Contadores de este worker y de todos los workers
+        """
+        return self.quote_cache().stats(self._cliente_cotizaciones())
+
+    @staticmethod
+    def _invalidation_bus() -> invalidation.InvalidationBus:
+        """Bus de invalidación entre workers del proceso."""
+        return invalidation.get_bus(
+            object_cache,
+            current_app.config.get('CACHE_INVALIDATION_CHANNEL', 'textiles:cache:invalidacion')
+        )
+    
+    @staticmethod
+    def _redis_factory():
+        """Función que crea clientes Redis con la configuración de la aplicación."""
+        redis_host = current_app.config.get('REDIS_HOST', 'localhost')
+        redis_port = current_app.config.get('REDIS_PORT', 6379)
+        redis_db = current_app.config.get('REDIS_DB', 0)
+        # health_check_interval detecta conexiones pub/sub caídas sin error TCP
+        connect_timeout = current_app.config.get('REDIS_CONNECT_TIMEOUT', 0.25)
+        return lambda: redis.Redis(host=redis_host, port=redis_port, db=redis_db,
+                                   socket_connect_timeout=connect_timeout,
+                                   health_check_interval=30)
+    
+    def _invalidar(self, class_type: Type, obj_id: str, tenant: Optional[str] = None):
+        """
+        Invalidar un objeto en la caché local y, si su clase se cachea, en el
+        resto de workers, y subir la generación de su clase (de la que dependen
+        la caché de consultas, la coalescencia y el catálogo de referencia).
+        
+        Args:
+            class_type: Clase del objeto
+            obj_id: Id del objeto
+            tenant: Tenant del objeto (las entradas de caché llevan su prefijo)
+        """
+        self._invalidar_varios(class_type, [obj_id], tenant)
+    
+    def _invalidar_varios(self, class_type: Type, obj_ids: Iterable[str], tenant: Optional[str] = None):
+        """
+        Invalidar varios objetos de una clase subiendo su generación una sola vez.
+        
+        Args:
+            class_type: Clase de los objetos
+            obj_ids: Ids de los objetos
+            tenant: Tenant de los objetos
+        """
+        try:
+            query_cache.bump(self._cliente_nodo(self._nodo_principal(), tenant), class_type)
+        except Exception as e:
+            # Sin la nueva generación otros workers podrían servir resultados
+            # antiguos; al menos este deja de hacerlo
+            self.results_cache().clear()
+            current_app.logger.error(f"Error subiendo la generación de {class_type.__name__}: {e}")
+        cache = self.cache()
+        publicar = cache.caches_class(class_type.__name__) and current_app.config.get('CACHE_INVALIDATION_ENABLED', True)
+        obj_ids = [tenancy.prefijo(tenant) + obj_id for obj_id in obj_ids]
+        for obj_id in obj_ids:
+            cache.invalidate(obj_id)
+        if publicar and obj_ids:
+            try:
+                self._invalidation_bus().publish_many(self.redis, class_type.__name__, obj_ids)
             except Exception as e:
-                current_app.logger.error(f"Error al inicializar Sirope: {e}")
-                # Último recurso: backend en memoria
-                try:
-                    current_app.logger.info("Intentando backend en memoria como último recurso")
-                    self._sirope = sirope.Sirope(None)
-                except Exception as final_error:
-                    current_app.logger.error(f"Error crítico inicializando Sirope: {final_error}")
-                    raise
-        return self._sirope
+                current_app.logger.error(f"Error publicando invalidación de {len(obj_ids)} {class_type.__name__}: {e}")
+    
+    @property
+    def redis(self) -> redis.Redis:
+        """Cliente Redis subyacente (para índices y operaciones auxiliares)."""
+        if self._redis is None:
+            self.sirope
+        return self._redis
     
     def save(self, obj: Any) -> str:
         """
@@ -95,42 +717,173 @@ class StorageService:
                 current_app.logger.error("¡Error crítico! Sirope no está disponible")
                 raise RuntimeError("Sirope no está disponible")
                 
-            # Preparar objeto para serialización si es BaseModel
-            original_values = {}
             original_id = getattr(obj, 'id', None)
             
-            if isinstance(obj, BaseModel):
-                current_app.logger.info("Preparando objeto BaseModel para serialización")
-                original_values = obj.prepare_for_serialization()
+            # Guardar el objeto en el nodo que le corresponde, dentro del
+            # espacio de claves de su tenant
+            tenant = self._tenant_de(type(obj))
+            nodo = self._nodo_para_guardar(obj, tenant) if isinstance(obj, BaseModel) else self._nodo_principal()
+            obj_id = self._escribir(obj, nodo, tenant)
             
-            try:
-                # Guardar el objeto directamente
-                obj_id = self.sirope.save(obj)
+            if not obj_id:
+                current_app.logger.error("Sirope devolvió un ID vacío")
+                raise ValueError("Error al guardar: ID vacío")
                 
-                if not obj_id:
-                    current_app.logger.error("Sirope devolvió un ID vacío")
-                    raise ValueError("Error al guardar: ID vacío")
+            # Registrar éxito
+            current_app.logger.info(f"Objeto de tipo {obj_type} guardado exitosamente con ID: {obj_id}")
                 
-                # Registrar éxito
-                current_app.logger.info(f"Objeto de tipo {obj_type} guardado exitosamente con ID: {obj_id}")
+            if isinstance(obj, BaseModel):
+                self._actualizar_indices(obj, obj_id, nodo, tenant)
+                self._invalidar(type(obj), str(obj.id), tenant)
+                self._anotar_cambio(obj)
+            replicas.marcar_escritura()
+            self._registrar_uso(tenant, writes=1)
                 
-                # Importante: Si teníamos un ID original, lo retornamos para mantener consistencia
-                if original_id and isinstance(obj, BaseModel):
-                    current_app.logger.info(f"Manteniendo ID original: {original_id}")
-                    return original_id
+            # Importante: Si teníamos un ID original, lo retornamos para mantener consistencia
+            if original_id and isinstance(obj, BaseModel):
+                current_app.logger.info(f"Manteniendo ID original: {original_id}")
+                return original_id
                 
-                return obj_id
+            return obj_id
                 
-            finally:
-                # Restaurar valores originales si es BaseModel
-                if isinstance(obj, BaseModel) and original_values:
-                    current_app.logger.info("Restaurando valores originales después de serialización")
-                    obj.restore_after_serialization(original_values)
-            
         except Exception as e:
             current_app.logger.error(f"Error guardando objeto: {e}", exc_info=True)
             raise
     
+    def save_many(self, objs: Iterable[Any], si_no_cambian: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Guardar muchos objetos ya existentes con una escritura en pipeline por
+        nodo (actualizaciones masivas, como un cambio de precios). Mantiene
+        los índices, invalida cada clase una sola vez y avisa a las vistas de
+        pedido, a la demanda de material, a los lotes y a la cola de trabajo
+        igual que ``save``. Los objetos
+        nuevos se guardan uno a uno con ``save``.
+        
+        Args:
+            objs: Objetos a guardar
+            si_no_cambian: Claves de control (p. ej. contadores de cambios) con
+                el valor que tenían al leer los objetos. Si se indican, los
+                objetos deben existir y estar en el mismo nodo y tenant que las
+                claves, y se escriben en una transacción que las vigila: si
+                alguna cambió, no se escribe nada
+        
+        Returns:
+            int: Objetos guardados
+        
+        Raises:
+            WatchError: Si cambió alguna clave de ``si_no_cambian``
+            ValueError: Si con ``si_no_cambian`` hay objetos nuevos o de varios nodos
+        """
+        from app.models.base_model import BaseModel
+        
+        grupos: Dict[Tuple[Optional[str], str], List[Tuple[Any, OID]]] = {}
+        nuevos = []
+        for obj in objs:
+            tenant = self._tenant_de(type(obj))
+            nodo = self._nodo_para_guardar(obj, tenant) if isinstance(obj, BaseModel) else None
+            oid = obj.__dict__.get(sirope.Sirope.OID_ID)
+            if nodo is None or not oid:
+                nuevos.append(obj)
+            else:
+                grupos.setdefault((tenant, nodo), []).append((obj, oid))
+        if si_no_cambian and (nuevos or len(grupos) > 1):
+            raise ValueError("Una escritura vigilada solo admite objetos existentes de un mismo nodo")
+        
+        for obj in nuevos:
+            self.save(obj)
+        guardados = len(nuevos)
+        
+        for (tenant, nodo), lista in grupos.items():
+            cliente = self._cliente_nodo(nodo, tenant)
+            if si_no_cambian:
+                self._escribir_vigilando(cliente, lista, si_no_cambian)
+            else:
+                with cliente.pipeline(transaction=False) as pipe:
+                    for obj, oid in lista:
+                        pipe.hset(oid.namespace, str(oid.num), _json_de(obj))
+                    pipe.execute()
+            guardados += len(lista)
+            
+            por_clase: Dict[Type, List[str]] = {}
+            for obj, oid in lista:
+                self._actualizar_indices(obj, oid, nodo, tenant)
+                por_clase.setdefault(type(obj), []).append(str(obj.id))
+            for class_type, ids in por_clase.items():
+                self._invalidar_varios(class_type, ids, tenant)
+            for obj, _ in lista:
+                self._anotar_cambio(obj)
+            replicas.marcar_escritura()
+            self._registrar_uso(tenant, writes=len(lista))
+        return guardados
+    
+    @staticmethod
+    def _escribir_vigilando(cliente, lista: List[Tuple[Any, OID]], si_no_cambian: Dict[str, Any]):
+        """Escribir objetos en una transacción que vigila las claves de control."""
+        def texto(valor):
+            return valor.decode() if isinstance(valor, bytes) else None if valor is None else str(valor)
+        
+        claves = list(si_no_cambian)
+        with cliente.pipeline() as pipe:
+            pipe.watch(*claves)
+            actuales = pipe.mget(claves)
+            if any(texto(actual) != texto(si_no_cambian[c]) for c, actual in zip(claves, actuales)):
+                raise WatchError(f"Cambió alguna de las claves vigiladas: {claves}")
+            pipe.multi()
+            for obj, oid in lista:
+                pipe.hset(oid.namespace, str(oid.num), _json_de(obj))
+            pipe.execute()
+    
+    def _anotar_cambio(self, obj: Any):
+        """
+        Avisar de un objeto guardado a las estructuras derivadas (vistas de
+        pedido, demanda de material, lotes y cola de trabajo). Cada una por
+        separado: el fallo de una no impide actualizar las demás.
+        
+        Args:
+            obj: Objeto guardado
+        """
+        try:
+            order_view.track(self, obj)
+        except Exception as e:
+            current_app.logger.error(f"Error anotando cambio de vista de pedido: {e}")
+        try:
+            material_demand.track(self, obj)
+        except Exception as e:
+            current_app.logger.error(f"Error actualizando la demanda de material: {e}")
+        try:
+            production_batches.track(self, obj)
+        except Exception as e:
+            current_app.logger.error(f"Error actualizando los lotes de producción: {e}")
+        try:
+            work_queue.track(self, obj)
+        except Exception as e:
+            current_app.logger.error(f"Error actualizando la cola de trabajo: {e}")
+    
+    def _escribir(self, obj: Any, nodo: str, tenant: Optional[str] = None) -> OID:
+        """
+        Guardar un objeto con el mismo formato y contadores de OID que
+        ``Sirope.save``, pero sin modificarlo para serializarlo: los modelos
+        pueden estar compartidos entre hilos (workers gthread o gevent) y otro
+        hilo podría ver sus enums convertidos a texto. El único cambio en el
+        objeto es asignarle su OID si es nuevo.
+        
+        Args:
+            obj: Objeto a guardar
+            nodo: Nodo destino
+            tenant: Tenant en cuyo espacio se guarda
+        
+        Returns:
+            OID: OID del objeto
+        """
+        cliente = self._cliente_nodo(nodo, tenant)
+        oid = obj.__dict__.get(sirope.Sirope.OID_ID)
+        if not oid:
+            ns = full_name_from_obj(obj)
+            oid = OID.from_pair((ns, cliente.hincrby(sirope.Sirope.NEXT_IDS_ID, ns, 1) - 1))
+            obj.__dict__[sirope.Sirope.OID_ID] = oid
+        cliente.hset(oid.namespace, str(oid.num), _json_de(obj))
+        return oid
+    
     def load(self, obj_id: str) -> Any:
         """
         Cargar un objeto por su ID.
@@ -143,8 +896,41 @@ class StorageService:
         """
         try:
             current_app.logger.info(f"Intentando cargar objeto con ID: {obj_id}")
+            
+            tenant = self._tenant_de()
+            self._registrar_uso(tenant, reads=1)
+            
+            # Datos de referencia: servir desde la caché del proceso si está
+            cacheado = self.cache().get(tenancy.prefijo(tenant) + obj_id) if isinstance(obj_id, str) else None
+            if cacheado is not None:
+                obj = self._obj_from_json(*cacheado)
+                obj.restore_enums_after_loading()
+                return obj
+            
             try:
-                obj = self.sirope.load(obj_id)
+                nodo_directorio = self._nodo_directorio(obj_id) if isinstance(obj_id, str) else None
+                
+                def cargar_en(espacio):
+                    def cargar(_, cliente, es_replica):
+                        ubicacion = self._resolver_oid(obj_id, cliente, espacio)
+                        if ubicacion is None:
+                            return None
+                        oid, nodo = ubicacion
+                        if espacio != tenant and getattr(cls_from_str(oid.namespace), 'TENANT_SCOPED', True):
+                            # Fuera del espacio del tenant solo se ven las clases globales
+                            return None
+                        if nodo_directorio is not None and nodo != nodo_directorio:
+                            # El objeto vive con su pedido, en otro nodo
+                            cliente, es_replica = self._cliente_nodo(nodo, espacio), False
+                        # Lo leído de una réplica puede ser anterior a una invalidación
+                        # ya procesada, así que no se guarda en la caché
+                        return self._cargar_oid(oid, cliente, cachear=not es_replica, tenant=espacio)
+                    return self._leer(cargar, nodo_directorio, espacio)
+                
+                obj = cargar_en(tenant)
+                if obj is None and tenant:
+                    # Los usuarios viven en el espacio global
+                    obj = cargar_en(None)
             except Exception as load_error:
                 current_app.logger.error(f"Error cargando objeto {obj_id}: {load_error}")
                 # Si hay error al cargar, intentamos búsqueda alternativa inmediatamente
@@ -229,6 +1015,187 @@ class StorageService:
                 current_app.logger.error(f"Error en get(Class, id) para {class_type_or_id}, {obj_id}: {e}")
                 return None
     
+    def load_many(self, ids: Iterable[str], class_type: Type = None) -> Dict[str, Any]:
+        """
+        Cargar varios objetos por id con un número fijo de viajes a Redis: un
+        HMGET al directorio de ids y un pipeline con un HMGET por clase (por
+        nodo, en paralelo). Los objetos de clases cacheadas se sirven desde la
+        caché cuando están.
+        
+        Args:
+            ids: Ids de los objetos (se ignoran vacíos y repetidos)
+            class_type: Clase esperada (opcional). Decide el espacio de claves y
+                descarta objetos de otras clases.
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto; los ids que no existen no aparecen
+        """
+        from app.models.base_model import BaseModel
+        try:
+            pendientes = list(dict.fromkeys(str(obj_id) for obj_id in ids if obj_id))
+            if not pendientes:
+                return {}
+            tenant = self._tenant_de(class_type)
+            prefijo = tenancy.prefijo(tenant)
+            
+            cache = self.cache()
+            encontrados = {}
+            sin_cache = []
+            for obj_id in pendientes:
+                cacheado = cache.get(prefijo + obj_id)
+                if cacheado is not None:
+                    encontrados[obj_id] = self._obj_from_json(*cacheado)
+                else:
+                    sin_cache.append(obj_id)
+            
+            if sin_cache:
+                encontrados.update(self._cargar_varios(sin_cache, tenant))
+                faltan = [obj_id for obj_id in sin_cache if obj_id not in encontrados]
+                if faltan:
+                    # Objetos guardados antes de existir el directorio
+                    encontrados.update(self._buscar_sin_directorio(faltan, tenant, class_type))
+                    faltan = [obj_id for obj_id in faltan if obj_id not in encontrados]
+                if faltan and tenant and class_type is None:
+                    # Los usuarios viven en el espacio global
+                    encontrados.update({
+                        obj_id: obj for obj_id, obj in self._cargar_varios(faltan, None).items()
+                        if not getattr(type(obj), 'TENANT_SCOPED', True)
+                    })
+            
+            resultado = {}
+            for obj_id, obj in encontrados.items():
+                if class_type is not None and not isinstance(obj, class_type):
+                    continue
+                if isinstance(obj, BaseModel):
+                    obj.restore_enums_after_loading()
+                resultado[obj_id] = obj
+            self._registrar_uso(tenant, reads=len(pendientes))
+            return resultado
+        except Exception as e:
+            current_app.logger.error(f"Error cargando objetos en lote: {e}")
+            return {}
+    
+    def _cargar_varios(self, ids: List[str], tenant: Optional[str]) -> Dict[str, Any]:
+        """
+        Resolver ids en el directorio y leer los objetos con HMGET.
+        
+        Args:
+            ids: Ids sin repetir
+            tenant: Tenant cuyo espacio de claves se lee
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto encontrado
+        """
+        if len(self._nodos()) == 1:
+            def cargar(_, cliente, es_replica):
+                textos = cliente.hmget(self.IDS_KEY, ids)
+                oids = {obj_id: self._parse_ubicacion(texto)[0] for obj_id, texto in zip(ids, textos) if texto}
+                # Lo leído de una réplica no se guarda en la caché (ver load)
+                return self._leer_objetos(cliente, oids, not es_replica, tenant)
+            return self._leer(cargar, tenant=tenant)
+        
+        anillo = self._anillo()
+        por_nodo = {}
+        for obj_id in ids:
+            por_nodo.setdefault(anillo.node_for(obj_id), []).append(obj_id)
+        ubicaciones = {}
+        for nodo, textos in self._en_nodos(por_nodo, lambda c, lista: c.hmget(self.IDS_KEY, lista), tenant).items():
+            for obj_id, texto in zip(por_nodo[nodo], textos):
+                if texto:
+                    ubicaciones[obj_id] = self._parse_ubicacion(texto)
+        faltan = [obj_id for obj_id in ids if obj_id not in ubicaciones]
+        if faltan:
+            # Durante un rebalanceo la entrada puede seguir en su nodo anterior
+            todos = {nodo: faltan for nodo in self._nodos()}
+            for textos in self._en_nodos(todos, lambda c, lista: c.hmget(self.IDS_KEY, lista), tenant).values():
+                for obj_id, texto in zip(faltan, textos):
+                    if texto and obj_id not in ubicaciones:
+                        ubicaciones[obj_id] = self._parse_ubicacion(texto)
+        
+        por_nodo_objetos = {}
+        for obj_id, (oid, nodo) in ubicaciones.items():
+            por_nodo_objetos.setdefault(nodo, {})[obj_id] = oid
+        objetos = {}
+        partes = self._en_nodos(por_nodo_objetos, lambda c, oids: self._leer_objetos(c, oids, True, tenant), tenant)
+        for parte in partes.values():
+            objetos.update(parte)
+        return objetos
+    
+    def _buscar_sin_directorio(self, ids: List[str], tenant: Optional[str],
+                               class_type: Type = None) -> Dict[str, Any]:
+        """
+        Buscar recorriendo sus clases los ids sin entrada de directorio
+        (objetos guardados antes de existir el directorio) y completar sus
+        entradas, para que la siguiente carga no recorra nada. Las clases con
+        el índice completo no se recorren: sus objetos ya están en el directorio.
+        
+        Args:
+            ids: Ids no encontrados en el directorio
+            tenant: Tenant cuyo espacio de claves se recorre
+            class_type: Clase esperada (por defecto, todos los modelos del espacio)
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto encontrado
+        """
+        buscados = set(ids)
+        encontrados = {}
+        modelos = [class_type] if class_type is not None else self._modelos()
+        for modelo in modelos:
+            if not buscados:
+                break
+            if self._tenant_de(modelo) != tenant or self.index_ready(modelo):
+                continue
+            ns = full_name_from_obj(modelo)
+            for nodo in self._nodos():
+                cliente = self._cliente_nodo(nodo, tenant)
+                for num, raw in cliente.hscan_iter(ns):
+                    texto = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+                    if not any(obj_id in texto for obj_id in buscados):
+                        continue
+                    obj = self._obj_from_json(modelo, raw)
+                    obj_id = getattr(obj, 'id', None)
+                    if obj_id in buscados:
+                        self._actualizar_indices(obj, OID.from_pair((ns, num)), nodo, tenant)
+                        encontrados[obj_id] = obj
+                        buscados.discard(obj_id)
+            self._registrar_uso(tenant, scans=1)
+        if encontrados:
+            current_app.logger.info(f"Directorio de ids completado para {len(encontrados)} objetos anteriores")
+        return encontrados
+    
+    def prefetch(self, objetos: Iterable[Any], relaciones: Dict[str, Type]) -> Dict[str, Any]:
+        """
+        Resolver de una vez las referencias de un conjunto de objetos. Por cada
+        campo ``<nombre>_id`` se asigna el objeto referenciado a ``<nombre>``
+        (None si no existe); todas las relaciones se cargan con un único
+        ``load_many``. Los atributos asignados son para mostrar: el objeto no
+        debe guardarse con ellos.
+        
+        Args:
+            objetos: Objetos cuyas referencias se resuelven
+            relaciones: Campo con el id -> clase referenciada
+                (p. ej. {'producto_id': Producto})
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto de todos los referenciados
+        """
+        for campo in relaciones:
+            if not campo.endswith('_id'):
+                raise ValueError(f"El campo de relación {campo} debe terminar en _id")
+        objetos = [obj for obj in objetos if obj is not None]
+        clases = set(relaciones.values())
+        cargados = self.load_many(
+            (getattr(obj, campo, None) for obj in objetos for campo in relaciones),
+            next(iter(clases)) if len(clases) == 1 else None
+        )
+        for obj in objetos:
+            for campo, class_type in relaciones.items():
+                referenciado = cargados.get(str(getattr(obj, campo, None) or ''))
+                if referenciado is not None and not isinstance(referenciado, class_type):
+                    referenciado = None
+                setattr(obj, campo[:-3], referenciado)
+        return cargados
+    
     def delete(self, obj_id: str) -> bool:
         """
         Eliminar un objeto por su ID.
@@ -240,12 +1207,102 @@ class StorageService:
             bool: True si se eliminó correctamente
         """
         try:
-            self.sirope.delete(obj_id)
+            tenant = self._tenant_de(cls_from_str(obj_id.namespace) if isinstance(obj_id, OID) else None)
+            ubicacion = self._resolver_oid(obj_id, tenant=tenant)
+            if ubicacion is None and tenant:
+                # Los objetos de clases globales (Usuario) están fuera del tenant
+                ubicacion = self._resolver_oid(obj_id)
+                if ubicacion is not None and getattr(cls_from_str(ubicacion[0].namespace), 'TENANT_SCOPED', True):
+                    ubicacion = None
+                tenant = None
+            if ubicacion is None:
+                current_app.logger.warning(f"No se encontró objeto para eliminar con ID: {obj_id}")
+                return False
+            oid, nodo = ubicacion
+            # Se lee antes de borrar: el pedido que lo muestra sale del propio objeto
+            pedido_afectado = self._pedido_afectado(obj_id, oid, nodo, tenant) if isinstance(obj_id, str) else None
+            self._eliminar_indices(oid, nodo, tenant=tenant)
+            self._sirope_nodo(nodo, tenant).delete(oid)
+            replicas.marcar_escritura()
+            self._registrar_uso(tenant, deletes=1)
+            if isinstance(obj_id, str):
+                self._invalidar(cls_from_str(oid.namespace), obj_id, tenant)
+                if pedido_afectado:
+                    try:
+                        order_view.invalidate(self, pedido_afectado)
+                    except Exception as e:
+                        current_app.logger.error(f"Error invalidando la vista del pedido {pedido_afectado}: {e}")
+                try:
+                    material_demand.forget(self, cls_from_str(oid.namespace), obj_id)
+                except Exception as e:
+                    current_app.logger.error(f"Error actualizando la demanda de material: {e}")
+                try:
+                    production_batches.forget(self, cls_from_str(oid.namespace), obj_id)
+                except Exception as e:
+                    current_app.logger.error(f"Error actualizando los lotes de producción: {e}")
+                try:
+                    work_queue.forget(self, cls_from_str(oid.namespace), obj_id)
+                except Exception as e:
+                    current_app.logger.error(f"Error actualizando la cola de trabajo: {e}")
             return True
         except Exception as e:
             current_app.logger.error(f"Error eliminando objeto {obj_id}: {e}")
             return False
     
+    def _pedido_afectado(self, obj_id: str, oid: OID, nodo: str, tenant: Optional[str]) -> Optional[str]:
+        """
+        Pedido cuya vista incluye un objeto (él mismo si es un pedido; el de
+        su item si es un item o una personalización).
+        
+        Args:
+            obj_id: ID del objeto
+            oid: OID del objeto
+            nodo: Nodo en el que está guardado
+            tenant: Tenant del objeto
+        
+        Returns:
+            Optional[str]: ID del pedido, o None si el objeto no aparece en ninguna vista
+        """
+        from app.models.pedido import Pedido, ItemPedido, Personalizacion
+        
+        class_type = cls_from_str(oid.namespace)
+        if class_type is Pedido:
+            return obj_id
+        if class_type not in (ItemPedido, Personalizacion):
+            return None
+        try:
+            obj = self._cargar_oid(oid, self._cliente_nodo(nodo, tenant), cachear=False, tenant=tenant)
+            if obj is None:
+                return None
+            if getattr(obj, 'pedido_id', None):
+                return str(obj.pedido_id)
+            if getattr(obj, 'item_pedido_id', None):
+                # Personalización anterior a guardar su pedido_id: se busca por su item
+                item = self.get(ItemPedido, obj.item_pedido_id)
+                if item and getattr(item, 'pedido_id', None):
+                    return str(item.pedido_id)
+        except Exception as e:
+            current_app.logger.error(f"Error buscando el pedido de {oid}: {e}")
+        return None
+    
+    def raw_all(self, class_type: Type) -> List[str]:
+        """
+        JSON guardado de todos los objetos de una clase, sin decodificar (para
+        estructuras compactas como el catálogo de referencia). Un objeto que se
+        está moviendo de nodo puede aparecer dos veces.
+        
+        Args:
+            class_type: Clase de los objetos
+        
+        Returns:
+            List[str]: JSON de cada objeto, tal como lo guarda Sirope
+        """
+        tenant = self._tenant_de(class_type)
+        namespace = full_name_from_obj(class_type)
+        partes = self._en_todos(lambda _, cliente, __: cliente.hvals(namespace), tenant)
+        self._registrar_uso(tenant, scans=1)
+        return [raw.decode('utf-8') if isinstance(raw, bytes) else raw for parte in partes for raw in parte]
+    
     def find_all(self, class_type: Type) -> List[Any]:
         """
         Encontrar todos los objetos de un tipo específico.
@@ -261,7 +1318,9 @@ class StorageService:
             current_app.logger.info(f"Buscando todos los objetos de tipo: {class_type.__name__}")
             
             # Usar enumerate para obtener todos los objetos de un tipo
-            objects = list(self.sirope.enumerate(class_type))
+            tenant = self._tenant_de(class_type)
+            objects = self._unir(self._en_todos(lambda s, r, _: list(s.enumerate(class_type)), tenant))
+            self._registrar_uso(tenant, scans=1, objects_loaded=len(objects))
             
             # Imprimir información sobre los objetos encontrados
             current_app.logger.info(f"Se encontraron {len(objects)} objetos de tipo {class_type.__name__}")
@@ -296,7 +1355,10 @@ class StorageService:
         """
         try:
             if condition:
-                return self.sirope.find_first(class_type, condition)
+                tenant = self._tenant_de(class_type)
+                encontrados = self._en_todos(lambda s, r, _: s.find_first(class_type, condition), tenant)
+                self._registrar_uso(tenant, scans=1)
+                return next((obj for obj in encontrados if obj is not None), None)
             else:
                 objects = self.find_all(class_type)
                 return objects[0] if objects else None
@@ -304,19 +1366,23 @@ class StorageService:
             current_app.logger.error(f"Error buscando primer objeto: {e}")
             return None
     
-    def find_by_condition(self, class_type: Type, condition) -> List[Any]:
+    def find_by_condition(self, class_type: Type, condition, max: int = 0) -> List[Any]:
         """
         Encontrar objetos que cumplan una condición específica.
         
         Args:
             class_type: Tipo de clase a buscar
             condition: Función de condición
+            max: Número máximo de resultados (0 = sin límite)
             
         Returns:
             List[Any]: Lista de objetos que cumplen la condición
         """
         try:
-            return list(self.sirope.filter(class_type, condition))
+            tenant = self._tenant_de(class_type)
+            objetos = self._unir(self._en_todos(lambda s, r, _: list(s.filter(class_type, condition, max)), tenant))
+            self._registrar_uso(tenant, scans=1, objects_loaded=len(objetos))
+            return objetos[:max] if max > 0 else objetos
         except Exception as e:
             current_app.logger.error(f"Error buscando objetos con condición: {e}")
             return []
@@ -333,3 +1399,553 @@ class StorageService:
             List[Any]: Lista de objetos que cumplen la condición
         """
         return self.find_by_condition(class_type, condition)
+
+    
+    def query(self, class_type: Type):
+        """
+        Crear una consulta declarativa sobre un tipo de modelo.
+        
+        Args:
+            class_type: Tipo de clase a consultar
+            
+        Returns:
+            Q: Constructor de consultas ligado a este servicio
+        """
+        from app.services.query import Q
+        return Q(class_type, storage=self)
+    
+    # ------------------------------------------------------------------
+    # Índices secundarios
+    # ------------------------------------------------------------------
+    
+    def index_key(self, class_type: Type, campo: str, valor: Any) -> str:
+        """Clave del conjunto de OIDs con ``campo == valor``."""
+        return f"{self.INDEX_PREFIX}:{full_name_from_obj(class_type)}:{campo}:{normalizar_valor_indice(valor)}"
+    
+    def _index_values_key(self, namespace: str) -> str:
+        """Hash num -> valores indexados, para poder retirar entradas antiguas."""
+        return f"{self.INDEX_PREFIX}:{namespace}:__valores__"
+    
+    def _index_ready_key(self, namespace: str) -> str:
+        """Marca que indica que el índice de la clase está completo."""
+        return f"{self.INDEX_PREFIX}:{namespace}:__listo__"
+    
+    def _resolver_oid(self, obj_id, cliente=None, tenant: Optional[str] = None) -> Optional[Tuple[OID, str]]:
+        """
+        Resolver un identificador (OID o id de modelo) a su OID de Sirope.
+        
+        Args:
+            obj_id: OID de Sirope o id (uuid) de un BaseModel
+            cliente: Cliente con el que leer (por defecto, el del nodo que
+                guarda la entrada de directorio del id)
+            tenant: Tenant cuyo directorio se consulta (None para el global)
+        
+        Returns:
+            Optional[Tuple[OID, str]]: OID encontrado y nodo donde vive, o None
+        """
+        if isinstance(obj_id, OID):
+            # Un OID suelto no indica nodo: solo se admite en el principal
+            return obj_id, self._nodo_principal()
+        if not obj_id:
+            return None
+        if cliente is None:
+            cliente = self._cliente_nodo(self._nodo_directorio(obj_id), tenant)
+        texto_oid = cliente.hget(self.IDS_KEY, str(obj_id))
+        if not texto_oid:
+            nodos = self._nodos()
+            if len(nodos) > 1:
+                # Durante un rebalanceo la entrada puede seguir en su nodo anterior
+                for otro in nodos.values():
+                    otro = self._vista(otro, tenant)
+                    if otro is not cliente:
+                        texto_oid = otro.hget(self.IDS_KEY, str(obj_id))
+                        if texto_oid:
+                            break
+        if not texto_oid:
+            return None
+        return self._parse_ubicacion(texto_oid)
+    
+    def _cargar_oid(self, oid: OID, cliente=None, cachear: bool = True, tenant: Optional[str] = None) -> Any:
+        """
+        Cargar un objeto por OID, guardándolo en la caché si su clase se cachea.
+        
+        Args:
+            oid: OID del objeto
+            cliente: Cliente con el que leer (por defecto, el primario)
+            cachear: Si el valor leído puede guardarse en la caché
+            tenant: Tenant del objeto
+            
+        Returns:
+            Any: Objeto cargado o None si no existe
+        """
+        class_type = cls_from_str(oid.namespace)
+        if not class_type:
+            raise NameError(oid.namespace)
+        cache = self.cache()
+        token = cache.token()
+        raw = (cliente or self._cliente_nodo(self._nodo_principal(), tenant)).hget(oid.namespace, str(oid.num))
+        if not raw:
+            return None
+        obj = self._obj_from_json(class_type, raw)
+        if cachear and cache.caches_class(class_type.__name__) and getattr(obj, 'id', None):
+            cache.record_miss(class_type.__name__)
+            cache.put(tenancy.prefijo(tenant) + str(obj.id), class_type, raw, token)
+        return obj
+    
+    def _leer_objetos(self, cliente, oids: Dict[str, OID], cachear: bool,
+                      tenant: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Leer en un solo pipeline los objetos de un nodo (un HMGET por clase).
+        
+        Args:
+            cliente: Cliente del nodo
+            oids: Id -> OID de los objetos a leer
+            cachear: Si los valores leídos pueden guardarse en la caché
+            tenant: Tenant de los objetos
+        
+        Returns:
+            Dict[str, Any]: Id -> objeto encontrado
+        """
+        if not oids:
+            return {}
+        por_ns = {}
+        for obj_id, oid in oids.items():
+            por_ns.setdefault(oid.namespace, []).append((obj_id, str(oid.num)))
+        cache = self.cache()
+        token = cache.token()
+        pipe = cliente.pipeline(transaction=False)
+        for ns, pares in por_ns.items():
+            pipe.hmget(ns, [num for _, num in pares])
+        
+        objetos = {}
+        for (ns, pares), valores in zip(por_ns.items(), pipe.execute()):
+            class_type = cls_from_str(ns)
+            if not class_type:
+                continue
+            cacheable = cachear and cache.caches_class(class_type.__name__)
+            for (obj_id, _), raw in zip(pares, valores):
+                if not raw:
+                    continue
+                objetos[obj_id] = self._obj_from_json(class_type, raw)
+                if cacheable:
+                    cache.record_miss(class_type.__name__)
+                    cache.put(tenancy.prefijo(tenant) + obj_id, class_type, raw, token)
+        return objetos
+    
+    def _valores_indexados(self, obj) -> Dict[str, str]:
+        """Obtener los valores normalizados de los campos indexados de un objeto."""
+        valores = {}
+        for campo in getattr(type(obj), 'INDEXED_FIELDS', ()):
+            if hasattr(obj, campo):
+                valores[campo] = normalizar_valor_indice(getattr(obj, campo))
+        return valores
+    
+    def _actualizar_indices(self, obj, oid: OID, nodo: str = None, tenant: Optional[str] = None):
+        """
+        Mantener el directorio de ids y los índices secundarios tras un save.
+        Los índices viven en el nodo del objeto; la entrada de directorio, en el
+        nodo que corresponde a su id.
+        
+        Args:
+            obj: Objeto recién guardado
+            oid: OID asignado por Sirope
+            nodo: Nodo donde se guardó (por defecto, el principal)
+            tenant: Tenant en cuyo espacio viven el objeto y sus índices
+        """
+        nodo = nodo or self._nodo_principal()
+        cliente = self._cliente_nodo(nodo, tenant)
+        ns = oid.namespace
+        num = str(oid.num)
+        nuevos = self._valores_indexados(obj)
+        
+        with cliente.pipeline(transaction=False) as lectura:
+            lectura.hget(self._index_values_key(ns), num)
+            lectura.exists(self._index_ready_key(ns))
+            lectura.hlen(ns)
+            anteriores_raw, listo, guardados = lectura.execute()
+        anteriores = json.loads(anteriores_raw) if anteriores_raw else {}
+        
+        pipe = cliente.pipeline()
+        if not listo and guardados <= 1:
+            # Primer objeto de la clase en este nodo: el índice nace completo
+            pipe.set(self._index_ready_key(ns), 1)
+        if getattr(obj, 'id', None):
+            nodo_directorio = self._nodo_directorio(obj.id)
+            if nodo_directorio == nodo:
+                pipe.hset(self.IDS_KEY, str(obj.id), self._texto_ubicacion(oid, nodo))
+            else:
+                self._cliente_nodo(nodo_directorio, tenant).hset(
+                    self.IDS_KEY, str(obj.id), self._texto_ubicacion(oid, nodo)
+                )
+        for campo, valor in anteriores.items():
+            if nuevos.get(campo) != valor:
+                pipe.srem(f"{self.INDEX_PREFIX}:{ns}:{campo}:{valor}", num)
+        for campo, valor in nuevos.items():
+            if anteriores.get(campo) != valor:
+                pipe.sadd(f"{self.INDEX_PREFIX}:{ns}:{campo}:{valor}", num)
+        pipe.hset(self._index_values_key(ns), num, json.dumps(nuevos))
+        pipe.execute()
+    
+    def _eliminar_indices(self, oid: OID, nodo: str = None, directorio: bool = True,
+                          tenant: Optional[str] = None):
+        """
+        Retirar un objeto de los índices secundarios de su nodo y, opcionalmente,
+        del directorio de ids.
+        
+        Args:
+            oid: OID del objeto
+            nodo: Nodo donde vive (por defecto, el principal)
+            directorio: Si también se borra su entrada de directorio
+            tenant: Tenant en cuyo espacio vive el objeto
+        """
+        nodo = nodo or self._nodo_principal()
+        cliente = self._cliente_nodo(nodo, tenant)
+        ns = oid.namespace
+        num = str(oid.num)
+        anteriores_raw = cliente.hget(self._index_values_key(ns), num)
+        anteriores = json.loads(anteriores_raw) if anteriores_raw else {}
+        
+        obj_id = None
+        if directorio:
+            try:
+                obj = self._sirope_nodo(nodo, tenant).load(oid)
+                obj_id = getattr(obj, 'id', None)
+            except Exception:
+                pass
+        
+        if obj_id:
+            ubicacion = self._resolver_oid(obj_id, tenant=tenant)
+            # Solo se borra la entrada si sigue apuntando a esta copia del objeto
+            if ubicacion is not None and ubicacion[0] == oid and ubicacion[1] == nodo:
+                self._cliente_nodo(self._nodo_directorio(obj_id), tenant).hdel(self.IDS_KEY, str(obj_id))
+        pipe = cliente.pipeline()
+        for campo, valor in anteriores.items():
+            pipe.srem(f"{self.INDEX_PREFIX}:{ns}:{campo}:{valor}", num)
+        pipe.hdel(self._index_values_key(ns), num)
+        pipe.execute()
+    
+    def index_ready(self, class_type: Type) -> bool:
+        """
+        Indicar si los índices de una clase cubren todos sus objetos (en todos
+        los nodos). Un nodo sin objetos de la clase cuenta como indexado.
+        """
+        try:
+            ns = full_name_from_obj(class_type)
+            clave = self._index_ready_key(ns)
+            return all(self._en_todos(
+                lambda s, r, _: r.exists(clave) or not r.exists(ns), self._tenant_de(class_type)
+            ))
+        except Exception:
+            return False
+    
+    def reindex(self, class_type: Type) -> int:
+        """
+        Reconstruir el directorio de ids y los índices de una clase.
+        Necesario una vez para datos guardados antes de existir los índices.
+        
+        Args:
+            class_type: Tipo de clase a reindexar
+        
+        Returns:
+            int: Número de objetos indexados
+        """
+        ns = full_name_from_obj(class_type)
+        tenant = self._tenant_de(class_type)
+        total = 0
+        for nodo in self._nodos():
+            cliente = self._cliente_nodo(nodo, tenant)
+            for num, raw in cliente.hscan_iter(ns):
+                obj = self._obj_from_json(class_type, raw)
+                self._actualizar_indices(obj, OID.from_pair((ns, num)), nodo, tenant)
+                total += 1
+            cliente.set(self._index_ready_key(ns), 1)
+        current_app.logger.info(f"Índices de {class_type.__name__} reconstruidos: {total} objetos")
+        return total
+    
+    @staticmethod
+    def _modelos() -> List[Type]:
+        """Modelos guardados con índices y directorio de ids."""
+        from app.models.usuario import Usuario
+        from app.models.cliente import Cliente
+        from app.models.producto import Producto
+        from app.models.proceso import Proceso
+        from app.models.pedido import Pedido, ItemPedido, Personalizacion
+        return [Usuario, Cliente, Producto, Proceso, Pedido, ItemPedido, Personalizacion]
+    
+    def reindex_pending(self) -> Dict[str, int]:
+        """
+        Reindexar las clases cuyo índice no está completo, en el espacio global
+        y en el de cada tenant conocido (datos guardados antes de existir los
+        índices). Se ejecuta al arrancar y desde ``scripts/init_db.py``; un
+        cerrojo evita que varios workers lo hagan a la vez.
+        
+        Returns:
+            Dict[str, int]: Objetos indexados por clase y tenant
+        """
+        cerrojo = f"{self.INDEX_PREFIX}:__reindexando__"
+        global_ = self._cliente_nodo(self._nodo_principal(), None)
+        if not global_.set(cerrojo, os.getpid(), nx=True, ex=600):
+            return {}
+        indexados = {}
+        try:
+            for tenant in [None] + tenancy.known_tenants(global_):
+                with tenancy.tenant_scope(tenant):
+                    for modelo in self._modelos():
+                        if tenant and not modelo.TENANT_SCOPED:
+                            continue
+                        if not self.index_ready(modelo):
+                            indexados[f"{modelo.__name__}[{tenant or 'global'}]"] = self.reindex(modelo)
+        finally:
+            global_.delete(cerrojo)
+        return indexados
+    
+    def estimate_cardinalities(self, class_type: Type, claves: Iterable[str]) -> Dict[str, int]:
+        """
+        Obtener en un único viaje por nodo el tamaño de varios conjuntos de índice.
+        
+        Args:
+            class_type: Tipo de clase consultada
+            claves: Claves de índice
+        
+        Returns:
+            Dict[str, int]: Cardinalidad por clave, más '__total__' con el
+            número de objetos de la clase (sumados en todos los nodos)
+        """
+        claves = list(claves)
+        
+        def leer(_, cliente, __):
+            pipe = cliente.pipeline(transaction=False)
+            for clave in claves:
+                pipe.scard(clave)
+            pipe.hlen(full_name_from_obj(class_type))
+            return pipe.execute()
+        
+        resultados = [sum(valores) for valores in zip(*self._en_todos(leer, self._tenant_de(class_type)))]
+        cardinalidades = dict(zip(claves, resultados[:-1]))
+        cardinalidades['__total__'] = resultados[-1]
+        return cardinalidades
+    
+    def load_nums(self, class_type: Type, nums: List[Any], nodo: str = None) -> List[Any]:
+        """
+        Cargar objetos de una clase por sus números de OID con HMGET.
+        
+        Args:
+            class_type: Tipo de clase
+            nums: Números de OID (tal como se guardan en los índices)
+            nodo: Nodo al que pertenecen los números (por defecto, el principal)
+        
+        Returns:
+            List[Any]: Objetos encontrados, en el orden de ``nums``
+        """
+        return self._leer(lambda s, r, _: self._cargar_nums(r, class_type, nums), nodo, self._tenant_de(class_type))
+    
+    @staticmethod
+    def _cargar_nums(cliente, class_type: Type, nums: List[Any]) -> List[Any]:
+        """Cargar con HMGET por lotes los objetos de ``nums`` de un nodo."""
+        from app.models.base_model import BaseModel
+        if not nums:
+            return []
+        ns = full_name_from_obj(class_type)
+        objetos = []
+        lote = 500
+        for inicio in range(0, len(nums), lote):
+            valores = cliente.hmget(ns, nums[inicio:inicio + lote])
+            for raw in valores:
+                if raw:
+                    obj = StorageService._obj_from_json(class_type, raw)
+                    if isinstance(obj, BaseModel):
+                        obj.restore_enums_after_loading()
+                    objetos.append(obj)
+        return objetos
+    
+    @staticmethod
+    def _miembros_indice(cliente, claves: Dict[str, List[str]]) -> List[int]:
+        """
+        Intersecar conjuntos de índice de un nodo: cada campo aporta una o varias
+        claves (varias para ``campo__in``, que se unen) y el resultado es la
+        intersección. Solo usa comandos de lectura, por lo que puede servirse
+        desde una réplica.
+        """
+        simples = [lista[0] for lista in claves.values() if len(lista) == 1]
+        uniones = [lista for lista in claves.values() if len(lista) > 1]
+        pipe = cliente.pipeline(transaction=False)
+        if simples:
+            pipe.sinter(simples)
+        for lista in uniones:
+            pipe.sunion(lista)
+        conjuntos = pipe.execute()
+        resultado = set(conjuntos[0])
+        for conjunto in conjuntos[1:]:
+            resultado &= set(conjunto)
+        return sorted(int(n) for n in resultado)
+    
+    def index_candidates(self, class_type: Type, claves: Dict[str, List[str]]) -> List[Any]:
+        """
+        Resolver una consulta indexada en todos los nodos y cargar los candidatos.
+        
+        Args:
+            class_type: Tipo de clase consultada
+            claves: Campo -> claves de índice de sus valores
+        
+        Returns:
+            List[Any]: Objetos cuyos valores indexados cumplen los criterios
+        """
+        tenant = self._tenant_de(class_type)
+        partes = self._en_todos(
+            lambda s, r, _: self._cargar_nums(r, class_type, self._miembros_indice(r, claves)), tenant
+        )
+        objetos = self._unir(partes)
+        self._registrar_uso(tenant, index_queries=1, objects_loaded=len(objetos))
+        return objetos
+    
+    # ------------------------------------------------------------------
+    # Rebalanceo de nodos
+    # ------------------------------------------------------------------
+    
+    def rebalance(self, class_type: Type, batch_size: int = 200, pause: float = 0.05,
+                  progreso=None) -> Dict[str, int]:
+        """
+        Mover a su nodo los objetos de una clase que ya no están donde indica
+        el anillo (tras añadir nodos a REDIS_SHARDS). Trabaja por lotes con una
+        pausa entre ellos para no competir con el tráfico normal; es idempotente,
+        así que puede interrumpirse y relanzarse.
+        
+        Args:
+            class_type: Tipo de clase a rebalancear
+            batch_size: Objetos por lote
+            pause: Segundos de pausa entre lotes
+            progreso: Función opcional llamada con los contadores tras cada lote
+        
+        Returns:
+            Dict[str, int]: Objetos revisados y movidos
+        """
+        ns = full_name_from_obj(class_type)
+        tenant = self._tenant_de(class_type)
+        anillo = self._anillo()
+        contadores = {'revisados': 0, 'movidos': 0}
+        
+        for nodo in self._nodos():
+            cliente = self._cliente_nodo(nodo, tenant)
+            pendientes = []
+            for num, raw in cliente.hscan_iter(ns, count=batch_size):
+                contadores['revisados'] += 1
+                obj = self._obj_from_json(class_type, raw)
+                if anillo.node_for(sharding.shard_key(obj)) != nodo:
+                    pendientes.append((OID.from_pair((ns, num)), obj))
+                if len(pendientes) >= batch_size:
+                    contadores['movidos'] += self._mover(pendientes, nodo, tenant)
+                    pendientes = []
+                    if progreso:
+                        progreso(dict(contadores))
+                    time.sleep(pause)
+            contadores['movidos'] += self._mover(pendientes, nodo, tenant)
+            if progreso:
+                progreso(dict(contadores))
+        
+        current_app.logger.info(
+            f"Rebalanceo de {class_type.__name__}: {contadores['movidos']} de "
+            f"{contadores['revisados']} objetos movidos"
+        )
+        return contadores
+    
+    def _mover(self, pendientes: List[tuple], origen: str, tenant: Optional[str] = None) -> int:
+        """
+        Copiar objetos a su nodo destino y retirarlos del de origen.
+        
+        Args:
+            pendientes: Lista de (OID en origen, objeto)
+            origen: Nodo donde están ahora
+            tenant: Tenant en cuyo espacio viven
+        
+        Returns:
+            int: Objetos movidos
+        """
+        movidos = 0
+        for oid, obj in pendientes:
+            destino = self._anillo().node_for(sharding.shard_key(obj))
+            # Primero se escribe en el destino: si el proceso se corta, el objeto
+            # queda duplicado (se ignora al unir resultados), nunca perdido
+            obj.__dict__.pop(sirope.Sirope.OID_ID, None)
+            nuevo = self._escribir(obj, destino, tenant)
+            self._actualizar_indices(obj, nuevo, destino, tenant)
+            self._eliminar_indices(oid, origen, directorio=False, tenant=tenant)
+            self._sirope_nodo(origen, tenant).delete(oid)
+            if getattr(obj, 'id', None):
+                self._invalidar(type(obj), str(obj.id), tenant)
+            movidos += 1
+        return movidos
+    
+    def rebalance_directory(self, batch_size: int = 500) -> int:
+        """
+        Mover las entradas del directorio de ids al nodo que les corresponde,
+        en el espacio del tenant activo (cada tenant tiene su directorio).
+        
+        Args:
+            batch_size: Entradas por lote de lectura
+        
+        Returns:
+            int: Entradas movidas
+        """
+        tenant = tenancy.current_tenant()
+        anillo = self._anillo()
+        movidas = 0
+        for nodo in self._nodos():
+            cliente = self._cliente_nodo(nodo, tenant)
+            for obj_id, texto in cliente.hscan_iter(self.IDS_KEY, count=batch_size):
+                obj_id = obj_id.decode('utf-8')
+                destino = anillo.node_for(obj_id)
+                if destino != nodo:
+                    # hsetnx: una entrada más reciente en el destino tiene prioridad
+                    self._cliente_nodo(destino, tenant).hsetnx(self.IDS_KEY, obj_id, texto)
+                    cliente.hdel(self.IDS_KEY, obj_id)
+                    movidas += 1
+        return movidas
+
+    def tenant_usage(self, tenant: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Uso de cada tenant: contadores de operaciones y objetos guardados por clase.
+        
+        Args:
+            tenant: Limitar el resultado a este tenant (por defecto, todos)
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Tenant -> {'operaciones': {...}, 'objetos': {...}}
+        """
+        from app.models.cliente import Cliente
+        from app.models.pedido import Pedido, ItemPedido, Personalizacion
+        from app.models.producto import Producto
+        from app.models.proceso import Proceso
+        
+        clases = [Cliente, Pedido, ItemPedido, Personalizacion, Producto, Proceso]
+        tenancy.usage.flush(self.redis, forzar=True)
+        
+        def contar(_, cliente, __):
+            pipe = cliente.pipeline(transaction=False)
+            for clase in clases:
+                pipe.hlen(full_name_from_obj(clase))
+            return pipe.execute()
+        
+        uso = {}
+        for nombre, operaciones in tenancy.UsageCounters.read(self.redis).items():
+            if tenant and nombre != tenant:
+                continue
+            totales = [
+                sum(valores)
+                for valores in zip(*self._en_todos(contar, None if nombre == '__global__' else nombre))
+            ]
+            uso[nombre] = {
+                'operaciones': operaciones,
+                'objetos': {clase.__name__: total for clase, total in zip(clases, totales)},
+            }
+        return uso
+    
+    @staticmethod
+    def _obj_from_json(class_type: Type, raw) -> Any:
+        """Reconstruir un objeto desde su JSON, igual que hace Sirope al cargar."""
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', 'replace')
+        obj = object.__new__(class_type)
+        datos = JSONDCoder().decode(raw)
+        datos.pop('__class__', None)
+        obj.__dict__ = datos
+        return obj
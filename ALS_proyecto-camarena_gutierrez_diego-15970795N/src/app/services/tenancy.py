@@ -0,0 +1,276 @@
+"""
+Partición del espacio de claves por tenant (tienda).
+
+Los datos de cada tenant viven bajo el prefijo ``t:<tenant>:``: los hashes de
+cada clase, sus contadores de OID, sus índices secundarios y su directorio de
+ids. Así un ``find_all(Pedido)`` de una tienda solo recorre los pedidos de esa
+tienda. El tenant se toma del ``Usuario`` autenticado (``tenant_id``); los
+usuarios viven en el espacio global porque hay que cargarlos antes de saber a
+qué tenant pertenecen. Sin tenant (datos anteriores, scripts) se usa el espacio
+global sin prefijo.
+
+El prefijo se aplica con una vista del cliente Redis que reescribe las claves
+de cada comando, de modo que Sirope y los índices funcionan sin cambios.
+"""
+
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import current_app, has_request_context
+
+from app.services.circuit_breaker import BreakerPipeline, BreakerRedis
+
+
+# Conjunto global con los tenants que han escrito alguna vez
+TENANTS_KEY = 'tenants:__lista__'
+# Hash global con los contadores de uso de un tenant
+USAGE_KEY = 'tenants:{tenant}:uso'
+
+# Comandos cuyo primer argumento es una clave
+_PRIMERA_CLAVE = {
+    'GET', 'SET', 'SETNX', 'SETEX', 'INCR', 'INCRBY', 'DECR', 'EXPIRE', 'PEXPIRE', 'TTL', 'TYPE',
+    'HGET', 'HSET', 'HSETNX', 'HMSET', 'HDEL', 'HEXISTS', 'HGETALL', 'HINCRBY', 'HINCRBYFLOAT',
+    'HKEYS', 'HVALS', 'HLEN', 'HMGET', 'HSCAN', 'HRANDFIELD',
+    'SADD', 'SREM', 'SCARD', 'SMEMBERS', 'SISMEMBER', 'SSCAN',
+    'ZADD', 'ZREM', 'ZCARD', 'ZSCORE', 'ZINCRBY', 'ZRANGE', 'ZREVRANGE', 'ZRANGEBYSCORE',
+    'ZREVRANGEBYSCORE', 'ZRANK', 'ZREMRANGEBYSCORE', 'ZPOPMIN',
+    'LPUSH', 'RPUSH', 'LPOP', 'RPOP', 'LRANGE', 'LLEN', 'LTRIM',
+}
+# Comandos cuyos argumentos son todos claves
+_TODAS_CLAVES = {'DEL', 'UNLINK', 'EXISTS', 'MGET', 'SINTER', 'SUNION', 'SDIFF', 'WATCH'}
+# Comandos sin claves
+_SIN_CLAVES = {'PING', 'INFO', 'TIME', 'UNWATCH'}
+
+
+def prefijar_comando(prefijo: str, args: tuple) -> tuple:
+    """
+    Añadir el prefijo del tenant a las claves de un comando.
+    
+    Args:
+        prefijo: Prefijo del tenant (p. ej. "t:tienda1:")
+        args: Comando y argumentos tal como llegan a ``execute_command``
+    
+    Returns:
+        tuple: Argumentos con las claves prefijadas
+    
+    Raises:
+        ValueError: Si el comando no está clasificado (evita fugas entre tenants)
+    """
+    comando = str(args[0]).upper()
+    if comando in _PRIMERA_CLAVE:
+        return (args[0], f"{prefijo}{_texto(args[1])}") + tuple(args[2:])
+    if comando in _TODAS_CLAVES:
+        return (args[0],) + tuple(f"{prefijo}{_texto(clave)}" for clave in args[1:])
+    if comando in _SIN_CLAVES:
+        return args
+    raise ValueError(f"Comando {comando} no admitido en un espacio de tenant")
+
+
+def _texto(clave) -> str:
+    return clave.decode('utf-8') if isinstance(clave, bytes) else str(clave)
+
+
+class PrefixedPipeline(BreakerPipeline):
+    """Pipeline que prefija las claves de cada comando encolado."""
+    
+    prefijo: str = ''
+    
+    def execute_command(self, *args, **kwargs):
+        return super().execute_command(*prefijar_comando(self.prefijo, args), **kwargs)
+
+
+class PrefixedRedis(BreakerRedis):
+    """
+    Vista de un cliente Redis limitada al espacio de claves de un tenant.
+    Comparte el pool de conexiones y el circuit breaker del cliente base.
+    """
+    
+    def __init__(self, base: BreakerRedis, prefijo: str):
+        """
+        Crear la vista.
+        
+        Args:
+            base: Cliente del nodo
+            prefijo: Prefijo del tenant
+        """
+        super().__init__(connection_pool=base.connection_pool, breaker=base.breaker)
+        self.prefijo = prefijo
+    
+    def execute_command(self, *args, **options):
+        return super().execute_command(*prefijar_comando(self.prefijo, args), **options)
+    
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = PrefixedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.breaker = self.breaker
+        pipe.prefijo = self.prefijo
+        return pipe
+
+
+# Tenant fijado explícitamente (scripts, tareas en segundo plano)
+_SIN_FIJAR = object()
+_tenant_fijado = contextvars.ContextVar('tenant_fijado', default=_SIN_FIJAR)
+# Evita la recursión si resolver el usuario vuelve a pasar por el almacenamiento
+_resolviendo = contextvars.ContextVar('resolviendo_tenant', default=False)
+
+_TENANT_VALIDO = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+@contextmanager
+def tenant_scope(tenant: Optional[str]):
+    """
+    Fijar el tenant activo fuera de una petición (o sustituir el del usuario).
+    
+    Args:
+        tenant: Identificador del tenant (None para el espacio global)
+    """
+    token = _tenant_fijado.set(tenant)
+    try:
+        yield
+    finally:
+        _tenant_fijado.reset(token)
+
+
+def current_tenant() -> Optional[str]:
+    """
+    Tenant de la operación en curso: el fijado con ``tenant_scope`` o, dentro de
+    una petición, el del usuario autenticado (o DEFAULT_TENANT si no tiene).
+    
+    Returns:
+        Optional[str]: Identificador del tenant o None para el espacio global
+    """
+    fijado = _tenant_fijado.get()
+    if fijado is not _SIN_FIJAR:
+        return fijado or None
+    tenant = None
+    if has_request_context() and not _resolviendo.get():
+        from flask_login import current_user
+        token = _resolviendo.set(True)
+        try:
+            if current_user and current_user.is_authenticated:
+                tenant = getattr(current_user, 'tenant_id', None)
+        except Exception:
+            tenant = None
+        finally:
+            _resolviendo.reset(token)
+    return tenant or current_app.config.get('DEFAULT_TENANT') or None
+
+
+def known_tenants(redis_client) -> List[str]:
+    """
+    Tenants que han operado alguna vez (para scripts que recorren todos).
+    
+    Args:
+        redis_client: Cliente del espacio global
+    
+    Returns:
+        List[str]: Identificadores ordenados, sin el espacio global
+    """
+    return sorted(t for t in (m.decode('utf-8') for m in redis_client.smembers(TENANTS_KEY)) if t)
+
+
+def prefijo(tenant: Optional[str]) -> str:
+    """
+    Prefijo de claves de un tenant.
+    
+    Args:
+        tenant: Identificador del tenant o None
+    
+    Returns:
+        str: "t:<tenant>:" o '' para el espacio global
+    
+    Raises:
+        ValueError: Si el identificador no es válido
+    """
+    if not tenant:
+        return ''
+    if not _TENANT_VALIDO.match(tenant):
+        raise ValueError(f"Identificador de tenant no válido: {tenant!r}")
+    return f"t:{tenant}:"
+
+
+class UsageCounters:
+    """
+    Contadores de uso por tenant. Se acumulan en memoria y se vuelcan a Redis
+    con HINCRBY como mucho una vez por intervalo, para no añadir una escritura
+    a cada operación.
+    """
+    
+    def __init__(self, intervalo: float = 1.0):
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._pendientes: Dict[str, Dict[str, int]] = {}
+        self._registrados = set()
+        self._ultimo_volcado = time.monotonic()
+    
+    def record(self, tenant: Optional[str], operacion: str, cantidad: int = 1):
+        """
+        Sumar una operación al tenant.
+        
+        Args:
+            tenant: Tenant (None para el espacio global)
+            operacion: Nombre del contador (reads, writes, scans...)
+            cantidad: Incremento
+        """
+        with self._lock:
+            contadores = self._pendientes.setdefault(tenant or '', {})
+            contadores[operacion] = contadores.get(operacion, 0) + cantidad
+    
+    def flush(self, redis_client, forzar: bool = False):
+        """
+        Volcar los contadores acumulados si ha pasado el intervalo.
+        
+        Args:
+            redis_client: Cliente del espacio global
+            forzar: Volcar aunque no haya pasado el intervalo
+        """
+        with self._lock:
+            if not self._pendientes or (not forzar and time.monotonic() - self._ultimo_volcado < self.intervalo):
+                return
+            pendientes, self._pendientes = self._pendientes, {}
+            nuevos = [t for t in pendientes if t not in self._registrados]
+            self._registrados.update(nuevos)
+            self._ultimo_volcado = time.monotonic()
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            if nuevos:
+                pipe.sadd(TENANTS_KEY, *nuevos)
+            for tenant, contadores in pendientes.items():
+                for operacion, cantidad in contadores.items():
+                    pipe.hincrby(USAGE_KEY.format(tenant=tenant or '__global__'), operacion, cantidad)
+            pipe.execute()
+        except Exception:
+            # Se devuelven para el siguiente volcado
+            with self._lock:
+                self._registrados.difference_update(nuevos)
+                for tenant, contadores in pendientes.items():
+                    actuales = self._pendientes.setdefault(tenant, {})
+                    for operacion, cantidad in contadores.items():
+                        actuales[operacion] = actuales.get(operacion, 0) + cantidad
+    
+    @staticmethod
+    def read(redis_client) -> Dict[str, Dict[str, int]]:
+        """
+        Leer los contadores volcados de todos los tenants.
+        
+        Args:
+            redis_client: Cliente del espacio global
+        
+        Returns:
+            Dict[str, Dict[str, int]]: Tenant -> contador -> valor
+        """
+        tenants = sorted(t.decode('utf-8') for t in redis_client.smembers(TENANTS_KEY))
+        pipe = redis_client.pipeline(transaction=False)
+        for tenant in tenants:
+            pipe.hgetall(USAGE_KEY.format(tenant=tenant or '__global__'))
+        return {
+            tenant or '__global__': {k.decode('utf-8'): int(v) for k, v in datos.items()}
+            for tenant, datos in zip(tenants, pipe.execute())
+        }
+
+
+# Instancia única por proceso
+usage = UsageCounters()
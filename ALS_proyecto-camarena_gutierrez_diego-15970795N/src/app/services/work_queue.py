@@ -0,0 +1,368 @@
+"""
+Cola de trabajo: qué pedido conviene hacer a continuación.
+
+Los pedidos PENDIENTE / EN_PROCESO están en un sorted set por prioridad y
+después por fecha de entrega (la misma puntuación que los lotes de
+producción), así que los siguientes ``n`` se leen con un ZRANGE, sin recorrer
+ni ordenar los pedidos. Se mantiene con cada cambio de estado, prioridad o
+fecha de un pedido (nodo principal, espacio del tenant de los pedidos):
+
+    cola:disponibles    Sorted set de pedidos sin reclamar
+    cola:reclamados     Sorted set de pedidos reclamados (misma puntuación)
+    cola:reclamos       Hash pedido -> estación, desde y hasta cuándo
+    cola:caducan        Sorted set pedido -> fin del reclamo
+    cola:pedido:<id>    Contador de cambios del pedido
+
+Una estación reclama un pedido para trabajar en él: sale de los disponibles
+hasta que lo libera, lo termina (deja de estar abierto) o caduca el reclamo
+(WORK_QUEUE_CLAIM_TTL, renovable reclamándolo de nuevo). Cada operación sobre
+un pedido vigila su contador, así que dos estaciones nunca reclaman el mismo
+pedido y un cambio del pedido no se cruza con un reclamo. Hasta la primera
+lectura no hay nada que actualizar: esta construye la cola (``rebuild``).
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from redis.exceptions import WatchError
+
+from app.services import production_batches
+
+
+# Versión del formato: al cambiarla la cola se reconstruye
+FORMATO = 2
+MARCA = 'cola:formato'
+CAMBIOS = 'cola:cambios'          # Una reconstrucción concurrente con un cambio no se guarda
+DISPONIBLES = 'cola:disponibles'
+RECLAMADOS = 'cola:reclamados'
+RECLAMOS = 'cola:reclamos'
+CADUCAN = 'cola:caducan'
+
+REINTENTOS = 5
+
+
+def _clave_pedido(pedido_id: str) -> str:
+    return f'cola:pedido:{pedido_id}'
+
+
+def _activa() -> bool:
+    return current_app.config.get('WORK_QUEUE_ENABLED', True)
+
+
+def _cliente(storage):
+    """Cliente de la cola (nodo principal, espacio del tenant de los pedidos)."""
+    from app.models.pedido import Pedido
+    return storage._cliente_nodo(storage._nodo_principal(), storage._tenant_de(Pedido))
+
+
+def _texto(valor) -> Optional[str]:
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+def _puntuacion(pedido) -> Optional[int]:
+    """Puntuación de un pedido en la cola (None si no está abierto)."""
+    meta = production_batches.meta(pedido)
+    return production_batches.puntuacion(meta) if meta[0] else None
+
+
+def _entrada(pedido_id: str, puntuacion: float, reclamo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Pedido de la cola con su prioridad y fecha de entrega (de la puntuación)."""
+    rango, entrega = divmod(int(puntuacion), production_batches.PESO_RANGO)
+    entrada = {
+        'pedido_id': pedido_id,
+        'prioridad': production_batches.PRIORIDADES.get(rango),
+        'fecha_entrega': datetime.fromtimestamp(entrega).isoformat(),
+    }
+    if reclamo is not None:
+        entrada.update(reclamo)
+    return entrada
+
+
+def _transaccion(cliente, pedido_id: str, aplicar, construida: bool = True):
+    """
+    Ejecutar una operación sobre un pedido vigilando su contador.
+    
+    ``aplicar(pipe)`` lee en modo inmediato y devuelve ``(resultado,
+    escribir)``, donde ``escribir`` encola las escrituras (o es None). Se
+    reintenta si otra operación tocó el pedido entre la lectura y la escritura.
+    
+    Args:
+        cliente: Cliente de la cola
+        pedido_id: Pedido
+        aplicar: Lectura y preparación de las escrituras
+        construida: Si la cola debe estar construida; si no lo está, solo se
+            anota el cambio (para que una construcción en curso no se guarde)
+    
+    Returns:
+        Resultado de ``aplicar``, o None si no se aplicó
+    """
+    clave = _clave_pedido(pedido_id)
+    with cliente.pipeline() as pipe:
+        for _ in range(REINTENTOS):
+            try:
+                pipe.watch(clave)
+                if construida and _texto(pipe.get(MARCA)) != str(FORMATO):
+                    pipe.unwatch()
+                    cliente.incr(CAMBIOS)
+                    return None
+                resultado, escribir = aplicar(pipe)
+                if escribir is None:
+                    pipe.unwatch()
+                    return resultado
+                pipe.multi()
+                pipe.incr(clave)
+                pipe.incr(CAMBIOS)
+                escribir(pipe)
+                pipe.execute()
+                return resultado
+            except WatchError:
+                continue
+    current_app.logger.warning(f"Cola de trabajo: demasiadas operaciones concurrentes en el pedido {pedido_id}")
+    return None
+
+
+def _fijar(storage, pedido_id: str, puntuacion: Optional[int]):
+    """Poner un pedido en la cola con su puntuación, o quitarlo (None)."""
+    def aplicar(pipe):
+        reclamado = pipe.zscore(RECLAMADOS, pedido_id) is not None
+        
+        def escribir(pipe):
+            if puntuacion is None:
+                pipe.zrem(DISPONIBLES, pedido_id)
+                pipe.zrem(RECLAMADOS, pedido_id)
+                pipe.hdel(RECLAMOS, pedido_id)
+                pipe.zrem(CADUCAN, pedido_id)
+            else:
+                pipe.zadd(RECLAMADOS if reclamado else DISPONIBLES, {pedido_id: puntuacion})
+        return None, escribir
+    
+    _transaccion(_cliente(storage), pedido_id, aplicar)
+
+
+def track(storage, obj):
+    """
+    Actualizar la cola tras guardar un pedido.
+    
+    Args:
+        storage: StorageService con el que se guardó
+        obj: Objeto guardado
+    """
+    from app.models.pedido import Pedido
+    
+    if isinstance(obj, Pedido) and _activa():
+        _fijar(storage, obj.id, _puntuacion(obj))
+
+
+def forget(storage, class_type, obj_id: str):
+    """
+    Quitar de la cola un pedido borrado.
+    
+    Args:
+        storage: StorageService con el que se borró
+        class_type: Clase del objeto
+        obj_id: Id del objeto
+    """
+    from app.models.pedido import Pedido
+    
+    if class_type is Pedido and _activa():
+        _fijar(storage, obj_id, None)
+
+
+def rebuild(storage) -> int:
+    """
+    Reconstruir la cola desde todos los pedidos, conservando los reclamos de
+    los pedidos que siguen abiertos.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        int: Pedidos en la cola
+    """
+    from app.models.pedido import Pedido
+    
+    cliente = _cliente(storage)
+    abiertos: Dict[str, int] = {}
+    for _ in range(REINTENTOS):
+        with cliente.pipeline() as pipe:
+            try:
+                pipe.watch(CAMBIOS)
+                reclamos = {_texto(p) for p in pipe.hkeys(RECLAMOS)}
+                abiertos = {}
+                for pedido in storage.find_all(Pedido):
+                    puntuacion = _puntuacion(pedido)
+                    if puntuacion is not None:
+                        abiertos[pedido.id] = puntuacion
+                
+                pipe.multi()
+                pipe.delete(DISPONIBLES, RECLAMADOS)
+                disponibles = {p: s for p, s in abiertos.items() if p not in reclamos}
+                reclamados = {p: s for p, s in abiertos.items() if p in reclamos}
+                if disponibles:
+                    pipe.zadd(DISPONIBLES, disponibles)
+                if reclamados:
+                    pipe.zadd(RECLAMADOS, reclamados)
+                cerrados = [p for p in reclamos if p not in abiertos]
+                if cerrados:
+                    pipe.hdel(RECLAMOS, *cerrados)
+                    pipe.zrem(CADUCAN, *cerrados)
+                pipe.set(MARCA, FORMATO)
+                pipe.execute()
+                break
+            except WatchError:
+                continue
+    else:
+        current_app.logger.warning("Cola de trabajo reconstruida pero no guardada: cambios concurrentes")
+    return len(abiertos)
+
+
+def _preparar(storage):
+    """Construir la cola si hace falta y liberar los reclamos caducados."""
+    cliente = _cliente(storage)
+    if _texto(cliente.get(MARCA)) != str(FORMATO):
+        rebuild(storage)
+    for pedido_id in cliente.zrangebyscore(CADUCAN, '-inf', time.time()):
+        pedido_id = _texto(pedido_id)
+        if liberar(storage, pedido_id, caducado=True):
+            current_app.logger.info(f"Cola de trabajo: reclamo del pedido {pedido_id} caducado")
+    return cliente
+
+
+def siguientes(storage, n: int = 10) -> List[Dict[str, Any]]:
+    """
+    Los ``n`` pedidos sin reclamar que conviene hacer a continuación.
+    
+    Args:
+        storage: Instancia de StorageService
+        n: Número de pedidos
+    
+    Returns:
+        List[Dict[str, Any]]: ``pedido_id``, ``prioridad`` y ``fecha_entrega``
+        de cada pedido, en orden
+    """
+    if n <= 0:
+        return []
+    cliente = _preparar(storage)
+    return [_entrada(_texto(p), s) for p, s in cliente.zrange(DISPONIBLES, 0, n - 1, withscores=True)]
+
+
+def reclamados(storage) -> List[Dict[str, Any]]:
+    """
+    Pedidos reclamados, en el orden de la cola, con su estación.
+    
+    Args:
+        storage: Instancia de StorageService
+    
+    Returns:
+        List[Dict[str, Any]]: Como ``siguientes``, más ``estacion``, ``desde``
+        y ``hasta``
+    """
+    cliente = _preparar(storage)
+    with cliente.pipeline(transaction=False) as pipe:
+        pipe.zrange(RECLAMADOS, 0, -1, withscores=True)
+        pipe.hgetall(RECLAMOS)
+        pedidos, reclamos = pipe.execute()
+    reclamos = {_texto(k): json.loads(v) for k, v in reclamos.items()}
+    return [_entrada(_texto(p), s, reclamos.get(_texto(p))) for p, s in pedidos]
+
+
+def reclamar(storage, pedido_id: str, estacion: str, ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Reclamar un pedido para una estación. Si ya es suyo, renueva el reclamo.
+    
+    Args:
+        storage: Instancia de StorageService
+        pedido_id: Pedido
+        estacion: Estación u operador que lo reclama
+        ttl: Segundos del reclamo (por defecto WORK_QUEUE_CLAIM_TTL)
+    
+    Returns:
+        Optional[Dict[str, Any]]: El pedido reclamado, o None si no está en
+        la cola o lo tiene otra estación
+    """
+    ttl = ttl or current_app.config.get('WORK_QUEUE_CLAIM_TTL', 1800)
+    cliente = _preparar(storage)
+    
+    def aplicar(pipe):
+        puntuacion = pipe.zscore(DISPONIBLES, pedido_id)
+        if puntuacion is None:
+            reclamo = _texto(pipe.hget(RECLAMOS, pedido_id))
+            if reclamo is None or json.loads(reclamo)['estacion'] != estacion:
+                return None, None
+            puntuacion = pipe.zscore(RECLAMADOS, pedido_id)
+            desde = json.loads(reclamo)['desde']
+        else:
+            desde = time.time()
+        hasta = time.time() + ttl
+        reclamo = {'estacion': estacion, 'desde': desde, 'hasta': hasta}
+        
+        def escribir(pipe):
+            pipe.zrem(DISPONIBLES, pedido_id)
+            pipe.zadd(RECLAMADOS, {pedido_id: puntuacion})
+            pipe.hset(RECLAMOS, pedido_id, json.dumps(reclamo))
+            pipe.zadd(CADUCAN, {pedido_id: hasta})
+        return _entrada(pedido_id, puntuacion, reclamo), escribir
+    
+    return _transaccion(cliente, pedido_id, aplicar)
+
+
+def reclamar_siguiente(storage, estacion: str, ttl: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Reclamar el primer pedido disponible de la cola. Si otra estación se
+    adelanta con uno, se prueba con el siguiente.
+    
+    Args:
+        storage: Instancia de StorageService
+        estacion: Estación u operador que lo reclama
+        ttl: Segundos del reclamo (por defecto WORK_QUEUE_CLAIM_TTL)
+    
+    Returns:
+        Optional[Dict[str, Any]]: El pedido reclamado, o None si la cola está vacía
+    """
+    cliente = _preparar(storage)
+    for _ in range(REINTENTOS):
+        candidatos = [_texto(p) for p in cliente.zrange(DISPONIBLES, 0, 9)]
+        if not candidatos:
+            return None
+        for pedido_id in candidatos:
+            reclamo = reclamar(storage, pedido_id, estacion, ttl)
+            if reclamo is not None:
+                return reclamo
+    current_app.logger.warning(f"Cola de trabajo: {estacion} no pudo reclamar ningún pedido")
+    return None
+
+
+def liberar(storage, pedido_id: str, estacion: Optional[str] = None, caducado: bool = False) -> bool:
+    """
+    Devolver un pedido reclamado a la cola.
+    
+    Args:
+        storage: Instancia de StorageService
+        pedido_id: Pedido
+        estacion: Estación que lo libera (None: cualquiera, p. ej. un administrador)
+        caducado: Solo si su reclamo ya caducó (limpieza de reclamos abandonados)
+    
+    Returns:
+        bool: False si no estaba reclamado (o lo tiene otra estación)
+    """
+    def aplicar(pipe):
+        reclamo = _texto(pipe.hget(RECLAMOS, pedido_id))
+        if reclamo is None:
+            return False, None
+        reclamo = json.loads(reclamo)
+        if (estacion is not None and reclamo['estacion'] != estacion) or (caducado and reclamo['hasta'] > time.time()):
+            return False, None
+        puntuacion = pipe.zscore(RECLAMADOS, pedido_id)
+        
+        def escribir(pipe):
+            pipe.zrem(RECLAMADOS, pedido_id)
+            pipe.hdel(RECLAMOS, pedido_id)
+            pipe.zrem(CADUCAN, pedido_id)
+            if puntuacion is not None:
+                pipe.zadd(DISPONIBLES, {pedido_id: puntuacion})
+        return True, escribir
+    
+    return bool(_transaccion(_cliente(storage), pedido_id, aplicar, construida=False))
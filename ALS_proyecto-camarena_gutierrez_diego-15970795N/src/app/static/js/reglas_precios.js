@@ -0,0 +1,160 @@
+/**
+ * Reglas de precio de los procesos, evaluadas en el navegador.
+ *
+ * El servidor publica en /procesos/api/reglas-precios un paquete versionado
+ * con la configuración de precios de los procesos activos. Se guarda en
+ * localStorage y se revalida con If-None-Match (304 si no cambió), así que
+ * cotizar mientras se edita no hace peticiones. Las fórmulas son las de
+ * TarifaProceso.precio; el servidor vuelve a calcular los precios al guardar.
+ */
+const ReglasPrecios = {
+    URL: '/procesos/api/reglas-precios',
+    CLAVE_LOCAL: 'reglas_precios',
+
+    paquete: null,
+    procesos: [],
+    porId: {},
+    _carga: null,
+
+    /**
+     * Cargar el paquete (una sola petición por página)
+     */
+    cargar: function() {
+        if (!this._carga) {
+            this._carga = this._descargar();
+        }
+        return this._carga;
+    },
+
+    _descargar: async function() {
+        let guardado = null;
+        try {
+            guardado = JSON.parse(localStorage.getItem(this.CLAVE_LOCAL));
+        } catch (error) {
+            guardado = null;
+        }
+
+        const headers = {};
+        if (guardado && guardado.version) {
+            headers['If-None-Match'] = `"${guardado.version}"`;
+        }
+
+        try {
+            const response = await fetch(this.URL, { headers: headers, credentials: 'same-origin' });
+            if (response.status === 304 && guardado) {
+                this._usar(guardado);
+            } else if (response.ok) {
+                const paquete = await response.json();
+                this._usar(paquete);
+                try {
+                    localStorage.setItem(this.CLAVE_LOCAL, JSON.stringify(paquete));
+                } catch (error) {
+                    // Sin localStorage se descarga en cada página
+                }
+            } else if (guardado) {
+                this._usar(guardado);
+            }
+        } catch (error) {
+            console.error('Error cargando reglas de precio:', error);
+            if (guardado) {
+                this._usar(guardado);
+            }
+        }
+        return this.procesos;
+    },
+
+    _usar: function(paquete) {
+        this.paquete = paquete;
+        this.procesos = paquete.procesos.map(fila => {
+            const proceso = {};
+            paquete.campos.forEach((campo, i) => { proceso[campo] = fila[i]; });
+            return proceso;
+        });
+        this.porId = {};
+        this.procesos.forEach(proceso => { this.porId[proceso.id] = proceso; });
+    },
+
+    /**
+     * Proceso por id (null si no está en el paquete)
+     */
+    proceso: function(id) {
+        return this.porId[id] || null;
+    },
+
+    /**
+     * Opciones del proceso: tamaños de bordado o tipos de vinil
+     */
+    opciones: function(proceso) {
+        const formulas = this.paquete.formulas;
+        if (proceso.formula === formulas.bordado) {
+            return Object.keys(proceso.precios_por_tamaño);
+        }
+        if (proceso.formula === formulas.vinil) {
+            return Object.keys(proceso.tipos_vinil);
+        }
+        return [];
+    },
+
+    /**
+     * Si el precio depende del ancho y el alto del diseño
+     */
+    usaMedidas: function(proceso) {
+        const formulas = this.paquete.formulas;
+        return proceso.formula === formulas.por_metro || proceso.formula === formulas.vinil;
+    },
+
+    /**
+     * Precio de referencia para mostrar junto al nombre
+     */
+    precioBase: function(proceso) {
+        const formulas = this.paquete.formulas;
+        if (proceso.formula === formulas.por_metro) {
+            return proceso.precio_por_metro;
+        }
+        if (proceso.formula === formulas.bordado) {
+            return proceso.precio_setup;
+        }
+        return proceso.precio_por_cm2;
+    },
+
+    /**
+     * Cotizar un diseño
+     *
+     * @returns {{metros: number, precio: number, precioUnitario: number}|null}
+     *          null si el proceso no existe
+     */
+    cotizar: function(procesoId, ancho, alto, cantidad, opcion, incluirSetup = true) {
+        const proceso = this.proceso(procesoId);
+        if (!proceso) {
+            return null;
+        }
+        const formulas = this.paquete.formulas;
+        ancho = parseFloat(ancho) || 0;
+        alto = parseFloat(alto) || 0;
+        cantidad = parseInt(cantidad) || 0;
+
+        let metros = 0;
+        let precio = 0;
+        if (proceso.formula === formulas.por_metro) {
+            if (ancho > 0) {
+                const porAncho = Math.max(Math.floor(proceso.ancho_disponible / ancho), 1);
+                metros = (Math.ceil(cantidad / porAncho) * alto) / 100;
+            }
+            precio = metros * proceso.precio_por_metro;
+        } else if (proceso.formula === formulas.bordado) {
+            precio = (proceso.precios_por_tamaño[opcion] || 0) * cantidad;
+            if (incluirSetup) {
+                precio += proceso.precio_setup;
+            }
+        } else if (proceso.formula === formulas.vinil) {
+            const precioCm2 = opcion in proceso.tipos_vinil ? proceso.tipos_vinil[opcion] : proceso.precio_por_cm2;
+            precio = ancho * alto * precioCm2 * cantidad;
+        }
+
+        return {
+            metros: metros,
+            precio: precio,
+            precioUnitario: cantidad > 0 ? precio / cantidad : 0
+        };
+    }
+};
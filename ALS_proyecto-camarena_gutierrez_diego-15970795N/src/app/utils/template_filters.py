@@ -51,15 +51,21 @@ def init_template_filters(app: Flask):
         return safe_value[:length] if safe_value else ""
     
     @app.template_filter('cliente_display')
-    def cliente_display_filter(cliente_id, clientes_dict):
+    def cliente_display_filter(cliente_id, clientes_dict=None):
         """
-        Muestra el nombre del cliente de forma segura.
+        Muestra el nombre del cliente de forma segura. Sin diccionario se usa
+        la tabla de nombres de clientes compartida.
         """
         if not cliente_id:
             return "Cliente desconocido"
             
         safe_cliente_id = safe_id_filter(cliente_id)
         
+        if clientes_dict is None:
+            from app.models.cliente import Cliente
+            from app.services.lookups import lookups
+            clientes_dict = lookups.names(Cliente)
+        
         if safe_cliente_id in clientes_dict:
             return clientes_dict[safe_cliente_id]
         
@@ -18,6 +18,109 @@ class Config:
     REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
     REDIS_DB = int(os.environ.get('REDIS_DB', 0))
     
+    # Timeouts cortos y circuit breaker: con Redis caído las peticiones
+    # fallan o degradan en milisegundos en lugar de bloquearse
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 0.5))
+    REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 0.25))
+    REDIS_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('REDIS_BREAKER_FAILURE_THRESHOLD', 5))
+    REDIS_BREAKER_RESET_TIMEOUT = float(os.environ.get('REDIS_BREAKER_RESET_TIMEOUT', 10))
+    
+    # Conexiones por endpoint y proceso (0: sin tope). Con workers gevent
+    # conviene limitarlas: cada greenlet con un comando en curso usa una.
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 0))
+    REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', 5))
+    
+    # Réplicas de lectura ("host:puerto[/db]" separados por comas). Las lecturas
+    # que toleran desfase se reparten entre ellas; tras una escritura, la sesión
+    # lee del primario durante REDIS_READ_YOUR_WRITES_WINDOW segundos.
+    REDIS_REPLICAS = os.environ.get('REDIS_REPLICAS', '')
+    REDIS_READ_YOUR_WRITES_WINDOW = float(os.environ.get('REDIS_READ_YOUR_WRITES_WINDOW', 5))
+    REDIS_REPLICA_HEALTH_INTERVAL = float(os.environ.get('REDIS_REPLICA_HEALTH_INTERVAL', 1))
+    
+    # Nodos adicionales para repartir los datos ("host:puerto[/db]" separados por
+    # comas). El nodo REDIS_HOST/PORT/DB es siempre el primero del anillo; tras
+    # añadir nodos, ejecutar scripts/rebalancear_shards.py.
+    REDIS_SHARDS = os.environ.get('REDIS_SHARDS', '')
+    
+    # Tenant de los usuarios sin tenant_id. Vacío: espacio de claves global (sin
+    # prefijo), el mismo que usaban los datos anteriores a los tenants.
+    DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', '')
+    
+    # Documento desnormalizado por pedido (detalle, totales e impresión en una
+    # lectura). Desactivado, se construye en cada lectura sin guardarlo.
+    ORDER_VIEW_ENABLED = os.environ.get('ORDER_VIEW_ENABLED', 'true').lower() == 'true'
+    
+    # Demanda de material (metros, cm², piezas) de los pedidos abiertos por
+    # tipo de proceso, actualizada con cada cambio
+    MATERIAL_DEMAND_ENABLED = os.environ.get('MATERIAL_DEMAND_ENABLED', 'true').lower() == 'true'
+    
+    # Lotes de producción (personalizaciones abiertas por proceso, opción y
+    # fecha de entrega), actualizados con cada cambio
+    PRODUCTION_BATCHES_ENABLED = os.environ.get('PRODUCTION_BATCHES_ENABLED', 'true').lower() == 'true'
+    PRODUCTION_BATCHES_LIMIT = int(os.environ.get('PRODUCTION_BATCHES_LIMIT', 50))
+
+    # Cola de trabajo de los pedidos abiertos por prioridad y fecha de entrega.
+    # Segundos que una estación retiene un pedido reclamado sin renovarlo.
+    WORK_QUEUE_ENABLED = os.environ.get('WORK_QUEUE_ENABLED', 'true').lower() == 'true'
+    WORK_QUEUE_CLAIM_TTL = int(os.environ.get('WORK_QUEUE_CLAIM_TTL', 1800))
+
+    # Repreciado de los pedidos abiertos al cambiar los precios de un proceso
+    # o producto: en lotes, en un hilo de fondo (o con scripts/repreciar.py).
+    # El cerrojo de un trabajo caduca si quien lo ejecuta muere sin soltarlo.
+    REPRICING_ENABLED = os.environ.get('REPRICING_ENABLED', 'true').lower() == 'true'
+    REPRICING_BACKGROUND = os.environ.get('REPRICING_BACKGROUND', 'true').lower() == 'true'
+    REPRICING_BATCH_SIZE = int(os.environ.get('REPRICING_BATCH_SIZE', 100))
+    REPRICING_LOCK_TTL = int(os.environ.get('REPRICING_LOCK_TTL', 60))
+    REPRICING_POLL_INTERVAL = float(os.environ.get('REPRICING_POLL_INTERVAL', 30))
+
+    # Caché de objetos en memoria (por proceso) para datos de referencia.
+    # Por clase: segundos de vida de cada entrada y número máximo de entradas.
+    OBJECT_CACHE_ENABLED = os.environ.get('OBJECT_CACHE_ENABLED', 'true').lower() == 'true'
+    OBJECT_CACHE_CLASSES = {
+        'Producto': {'ttl': int(os.environ.get('OBJECT_CACHE_TTL', 300)), 'max_entries': 2000},
+        'Proceso': {'ttl': int(os.environ.get('OBJECT_CACHE_TTL', 300)), 'max_entries': 500},
+    }
+    
+    # Caché de resultados de consultas (listados filtrados), invalidada por un
+    # contador de generación por clase que aumenta con cada escritura
+    QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+    QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 500))
+    
+    # Coalescencia (single-flight) del dashboard, reportes y catálogo: un solo
+    # cálculo por clave entre todas las peticiones y workers. El resultado se
+    # reutiliza SINGLE_FLIGHT_TTL segundos o hasta que cambien sus clases
+    SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_TTL = int(os.environ.get('SINGLE_FLIGHT_TTL', 5))
+    SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', 30))
+    SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 10))
+    
+    # Caché de cotizaciones de la calculadora, compartida entre workers: como
+    # máximo QUOTE_CACHE_MAX_ENTRIES por proceso; un cambio de precios cambia su versión
+    QUOTE_CACHE_ENABLED = os.environ.get('QUOTE_CACHE_ENABLED', 'true').lower() == 'true'
+    QUOTE_CACHE_MAX_ENTRIES = int(os.environ.get('QUOTE_CACHE_MAX_ENTRIES', 1000))
+    QUOTE_CACHE_TTL = int(os.environ.get('QUOTE_CACHE_TTL', 86400))
+    
+    # Acomodo de diseños DTF / sublimación en rollo (pliegos): tiempo máximo de
+    # mejora, separación entre diseños y si se pueden girar 90°
+    NESTING_BUDGET_MS = float(os.environ.get('NESTING_BUDGET_MS', 500))
+    NESTING_MAX_BUDGET_MS = float(os.environ.get('NESTING_MAX_BUDGET_MS', 5000))
+    NESTING_MARGIN_CM = float(os.environ.get('NESTING_MARGIN_CM', 0.5))
+    NESTING_ALLOW_ROTATION = os.environ.get('NESTING_ALLOW_ROTATION', 'true').lower() == 'true'
+
+    # Reindexar al arrancar las clases con datos anteriores a los índices (sin
+    # ello sus consultas recorren la clase entera)
+    INDEX_REBUILD_ON_STARTUP = os.environ.get('INDEX_REBUILD_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Precargar el catálogo de productos y procesos al crear la aplicación (con
+    # GUNICORN_PRELOAD, en el master antes del fork)
+    CATALOG_PRELOAD = os.environ.get(
+        'CATALOG_PRELOAD', os.environ.get('GUNICORN_PRELOAD', 'false')
+    ).lower() == 'true'
+    
+    # Invalidación de la caché entre workers (Redis pub/sub)
+    CACHE_INVALIDATION_ENABLED = os.environ.get('CACHE_INVALIDATION_ENABLED', 'true').lower() == 'true'
+    CACHE_INVALIDATION_CHANNEL = os.environ.get('CACHE_INVALIDATION_CHANNEL', 'textiles:cache:invalidacion')
+    
     @staticmethod
     def init_app(app):
         """Inicialización de la configuración."""
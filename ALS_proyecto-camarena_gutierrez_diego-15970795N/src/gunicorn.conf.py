@@ -0,0 +1,33 @@
+"""
+Configuración de Gunicorn.
+
+Por defecto, 4 workers síncronos (un proceso por petición en curso). Las
+peticiones pasan casi todo su tiempo esperando a Redis, así que con workers
+de hilos o gevent cada proceso atiende muchas a la vez:
+
+    GUNICORN_WORKER_CLASS=gthread GUNICORN_THREADS=8
+    GUNICORN_WORKER_CLASS=gevent  GUNICORN_WORKER_CONNECTIONS=200  (requiere gevent)
+
+Con gevent conviene limitar también REDIS_MAX_CONNECTIONS.
+
+Con GUNICORN_PRELOAD=true la aplicación y el catálogo de productos y procesos
+se cargan una vez en el master y los workers los comparten en copy-on-write.
+"""
+
+import gc
+import os
+
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def pre_fork(server, worker):
+    """Congelar lo cargado en el master antes de crear cada worker."""
+    if preload_app:
+        # Sin esto, las pasadas del GC en los workers escribirían en las
+        # cabeceras de esos objetos y copiarían sus páginas
+        gc.freeze()
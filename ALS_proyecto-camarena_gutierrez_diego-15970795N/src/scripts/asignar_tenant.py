@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Asigna un usuario a un tenant (tienda). A partir de su siguiente petición el
+usuario solo ve y crea datos en el espacio de claves de ese tenant.
+
+Uso:
+    python scripts/asignar_tenant.py <username> <tenant>
+    python scripts/asignar_tenant.py <username> --global
+"""
+
+import sys
+import os
+import argparse
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services import tenancy
+from app.services.storage_service import StorageService
+from app.models.usuario import Usuario
+
+
+def main():
+    """Asignar el tenant."""
+    parser = argparse.ArgumentParser(description='Asignar un usuario a un tenant')
+    parser.add_argument('username', help='Nombre de usuario')
+    parser.add_argument('tenant', nargs='?', help='Identificador del tenant')
+    parser.add_argument('--global', dest='global_', action='store_true',
+                        help='Quitar el tenant (usar DEFAULT_TENANT)')
+    args = parser.parse_args()
+    
+    if not args.tenant and not args.global_:
+        parser.error('Indica un tenant o --global')
+    if args.tenant:
+        try:
+            tenancy.prefijo(args.tenant)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    app = create_app(os.getenv('FLASK_CONFIG', 'default'))
+    
+    with app.app_context():
+        storage = StorageService()
+        usuario = storage.find_first(Usuario, lambda u: u.username == args.username)
+        if not usuario:
+            print(f"❌ No existe el usuario {args.username}")
+            return 1
+        
+        usuario.tenant_id = None if args.global_ else args.tenant
+        storage.save(usuario)
+        print(f"   ✅ {usuario.username} -> {usuario.tenant_id or 'espacio global'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Mide el acomodo en rollo (app.services.nesting) de diseños aleatorios y lo
+compara con los metros de imprimir cada diseño en sus propias filas, con el
+mismo margen (``nesting.acomodo_por_diseño``). Comprueba además que ninguna pieza
+se salga del rollo ni se encime con otra.
+
+Uso:
+    python scripts/benchmark_nesting.py [num_piezas] [presupuesto_ms]
+"""
+
+import os
+import random
+import sys
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.proceso import Proceso, TipoProceso
+from app.services import nesting
+
+
+def generar_piezas(n, semilla=42):
+    """Generar diseños (ancho, alto, cantidad) hasta sumar n piezas."""
+    aleatorio = random.Random(semilla)
+    diseños = []
+    total = 0
+    while total < n:
+        cantidad = min(aleatorio.randint(1, 50), n - total)
+        diseños.append((round(aleatorio.uniform(4, 28), 1), round(aleatorio.uniform(4, 35), 1), cantidad))
+        total += cantidad
+    piezas = [
+        nesting.Pieza((d, copia), ancho, alto, d)
+        for d, (ancho, alto, cantidad) in enumerate(diseños)
+        for copia in range(cantidad)
+    ]
+    return diseños, piezas
+
+
+def verificar(acomodo, margen):
+    """Comprobar que las piezas no se salen del rollo ni se enciman (ni con el margen)."""
+    colocaciones = sorted(acomodo.colocaciones, key=lambda c: c.y)
+    for i, a in enumerate(colocaciones):
+        if a.x < 0 or a.x + a.ancho > acomodo.ancho_rollo + 1e-9:
+            return f"pieza fuera del rollo: {a}"
+        for b in colocaciones[i + 1:]:
+            if b.y >= a.y + a.alto + margen - 1e-9:
+                break
+            if a.x < b.x + b.ancho + margen - 1e-9 and b.x < a.x + a.ancho + margen - 1e-9:
+                return f"piezas encimadas: {a} / {b}"
+    return None
+
+
+def main():
+    """Ejecutar la medición."""
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    presupuesto = float(sys.argv[2]) if len(sys.argv) > 2 else 500
+    margen = 0.5
+    
+    proceso = Proceso(TipoProceso.SUBLIMACION, 'Sublimación')
+    diseños, piezas = generar_piezas(n)
+    sin_agrupar = nesting.acomodo_por_diseño(piezas, proceso.ancho_disponible, margen).metros
+    
+    print(f"📐 {len(piezas):,} piezas ({len(diseños)} diseños), rollo de {proceso.ancho_disponible} cm")
+    acomodo = nesting.empaquetar(piezas, proceso.ancho_disponible, presupuesto, margen)
+    print(f"   Tiempo:          {acomodo.ms:9.1f} ms ({acomodo.intentos} intentos, {acomodo.heuristica})")
+    print(f"   Diseño a diseño: {sin_agrupar:9.2f} m")
+    print(f"   Agrupados:       {acomodo.metros:9.2f} m  (aprovechamiento {acomodo.aprovechamiento:.1%})")
+    
+    error = verificar(acomodo, margen)
+    if error or len(acomodo.colocaciones) != len(piezas):
+        print(f"❌ {error or 'faltan piezas'}")
+        sys.exit(1)
+    print(f"✅ Acomodo válido, ahorro {sin_agrupar - acomodo.metros:.2f} m")
+
+
+if __name__ == '__main__':
+    main()
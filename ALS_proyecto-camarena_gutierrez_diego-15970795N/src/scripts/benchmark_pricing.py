@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compara la cotización diseño a diseño (métodos de Proceso) con la cotización
+por lotes de app.services.pricing sobre diseños aleatorios de los cuatro tipos
+de proceso, y comprueba que ambas dan los mismos precios.
+
+Uso:
+    python scripts/benchmark_pricing.py [num_diseños] [--sin-numpy]
+"""
+
+import os
+import random
+import sys
+import time
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.proceso import Proceso, TipoProceso, TamañoBordado
+from app.services import pricing
+
+
+def generar_diseños(n, procesos, semilla=42):
+    """Generar n diseños (proceso, ancho, alto, cantidad, opción)."""
+    aleatorio = random.Random(semilla)
+    tamaños = [t.value for t in TamañoBordado]
+    diseños = []
+    for _ in range(n):
+        proceso = aleatorio.choice(procesos)
+        tipo = proceso.get_tipo_enum()
+        if tipo == TipoProceso.BORDADO:
+            opcion = aleatorio.choice(tamaños)
+        elif tipo == TipoProceso.VINIL:
+            opcion = aleatorio.choice(list(proceso.tipos_vinil))
+        else:
+            opcion = None
+        diseños.append((
+            proceso,
+            round(aleatorio.uniform(3, 60), 1),
+            round(aleatorio.uniform(3, 60), 1),
+            aleatorio.randint(1, 300),
+            opcion
+        ))
+    return diseños
+
+
+def cotizar_uno_a_uno(diseños):
+    """Precio de cada diseño con los métodos de Proceso."""
+    precios = []
+    for proceso, ancho, alto, cantidad, opcion in diseños:
+        tipo = proceso.get_tipo_enum()
+        if tipo in (TipoProceso.DTF, TipoProceso.SUBLIMACION):
+            precios.append(proceso.calcular_precio_dtf_sublimacion(ancho, alto, cantidad))
+        elif tipo == TipoProceso.BORDADO:
+            precios.append(proceso.calcular_precio_bordado(opcion, cantidad))
+        else:
+            precios.append(proceso.calcular_precio_vinil(ancho, alto, cantidad, opcion))
+    return precios
+
+
+def main():
+    """Ejecutar la comparación."""
+    n = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 100_000
+    if '--sin-numpy' in sys.argv:
+        pricing.HAS_NUMPY = False
+    
+    procesos = [Proceso(tipo, tipo.value.title()) for tipo in TipoProceso]
+    diseños = generar_diseños(n, procesos)
+    columnas = list(zip(*diseños))
+    
+    print(f"📐 {n:,} diseños, NumPy: {'sí' if pricing.HAS_NUMPY else 'no'}")
+    
+    inicio = time.perf_counter()
+    esperados = cotizar_uno_a_uno(diseños)
+    t_uno = time.perf_counter() - inicio
+    print(f"   Uno a uno:  {t_uno * 1000:9.1f} ms")
+    
+    inicio = time.perf_counter()
+    lote = pricing.cotizar_lote(*columnas)
+    t_lote = time.perf_counter() - inicio
+    print(f"   Por lotes:  {t_lote * 1000:9.1f} ms  (x{t_uno / t_lote:.1f})")
+    
+    diferencias = sum(1 for a, b in zip(esperados, lote.precios) if a != float(b))
+    if diferencias:
+        print(f"❌ {diferencias} precios distintos")
+        sys.exit(1)
+    print(f"✅ Mismos precios (total ${sum(esperados):,.2f})")
+
+
+if __name__ == '__main__':
+    main()
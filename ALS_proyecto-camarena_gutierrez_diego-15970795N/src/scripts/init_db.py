@@ -383,6 +383,12 @@ def main():
             init_sample_clients()
             print()
             
+            # Índices y directorio de ids de los datos anteriores a los índices
+            print("🔎 Completando índices...")
+            for clase, total in storage.reindex_pending().items():
+                print(f"   ✅ {clase}: {total} objetos indexados")
+            print()
+
             # Verificar datos
             verify_data()
             print()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Mueve los datos a su nodo tras añadir nodos a REDIS_SHARDS.
+
+Se ejecuta en segundo plano con la aplicación en marcha: recorre cada clase por
+lotes, con una pausa entre lotes, y copia al nodo nuevo los objetos que le
+corresponden antes de borrarlos del anterior. Mientras tanto las lecturas siguen
+funcionando (el directorio de ids se consulta también en el nodo anterior).
+Es idempotente: si se interrumpe, basta con volver a lanzarlo. Recorre el
+espacio global y el de cada tenant conocido.
+
+Uso:
+    REDIS_SHARDS=localhost:6380,localhost:6381 python scripts/rebalancear_shards.py [--lote 200] [--pausa 0.05]
+"""
+
+import sys
+import os
+import argparse
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services import tenancy
+from app.services.storage_service import StorageService
+from app.models.usuario import Usuario
+from app.models.cliente import Cliente
+from app.models.producto import Producto
+from app.models.proceso import Proceso
+from app.models.pedido import Pedido, ItemPedido, Personalizacion
+
+
+def completar_pedido_personalizaciones(storage):
+    """
+    Las personalizaciones anteriores al sharding no guardan el id de su pedido,
+    que es su clave de shard: se toma de su item.
+    """
+    completadas = 0
+    for pers in storage.find_by_condition(Personalizacion, lambda p: not getattr(p, 'pedido_id', None)):
+        item_id = getattr(pers, 'item_pedido_id', None)
+        item = storage.get(ItemPedido, item_id) if item_id else None
+        if item and getattr(item, 'pedido_id', None):
+            pers.pedido_id = item.pedido_id
+            storage.save(pers)  # save lo lleva al nodo de su pedido
+            completadas += 1
+    return completadas
+
+
+def main():
+    """Rebalancear todos los modelos."""
+    parser = argparse.ArgumentParser(description='Rebalancear datos entre nodos Redis')
+    parser.add_argument('--lote', type=int, default=200, help='Objetos por lote')
+    parser.add_argument('--pausa', type=float, default=0.05, help='Segundos entre lotes')
+    args = parser.parse_args()
+    
+    app = create_app(os.getenv('FLASK_CONFIG', 'default'))
+    
+    with app.app_context():
+        storage = StorageService()
+        print(f"🔄 Nodos: {', '.join(storage._nodos())}")
+        
+        for tenant in [None] + tenancy.known_tenants(storage.redis):
+            with tenancy.tenant_scope(tenant):
+                print(f"📦 Espacio {tenant or 'global'}")
+                print(f"   ✅ Personalizaciones completadas con su pedido: {completar_pedido_personalizaciones(storage)}")
+        
+                for modelo in [Usuario, Cliente, Producto, Proceso, Pedido, ItemPedido, Personalizacion]:
+                    if tenant and not modelo.TENANT_SCOPED:
+                        continue
+            
+                    def progreso(contadores, nombre=modelo.__name__):
+                        print(f"      {nombre}: {contadores['movidos']} movidos / {contadores['revisados']} revisados", end='\r')
+        
+                    contadores = storage.rebalance(modelo, batch_size=args.lote, pause=args.pausa, progreso=progreso)
+                    print(f"   ✅ {modelo.__name__}: {contadores['movidos']} movidos de {contadores['revisados']}          ")
+                
+                print(f"   ✅ Entradas de directorio movidas: {storage.rebalance_directory()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Reconstruye el directorio de ids y los índices secundarios de todos los modelos.
+Debe ejecutarse una vez sobre datos creados antes de existir los índices; hasta
+entonces las consultas de app.services.query usan recorridos completos.
+Recorre el espacio global y el de cada tenant conocido.
+"""
+
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services import tenancy
+from app.services.storage_service import StorageService
+from app.models.usuario import Usuario
+from app.models.cliente import Cliente
+from app.models.producto import Producto
+from app.models.proceso import Proceso
+from app.models.pedido import Pedido, ItemPedido, Personalizacion
+
+
+def main():
+    """Reindexar todos los modelos."""
+    app = create_app(os.getenv('FLASK_CONFIG', 'default'))
+    
+    with app.app_context():
+        storage = StorageService()
+        for tenant in [None] + tenancy.known_tenants(storage.redis):
+            with tenancy.tenant_scope(tenant):
+                for modelo in [Usuario, Cliente, Producto, Proceso, Pedido, ItemPedido, Personalizacion]:
+                    if tenant and not modelo.TENANT_SCOPED:
+                        continue
+                    total = storage.reindex(modelo)
+                    print(f"   ✅ {modelo.__name__} [{tenant or 'global'}]: {total} objetos indexados")
+
+
+if __name__ == '__main__':
+    main()
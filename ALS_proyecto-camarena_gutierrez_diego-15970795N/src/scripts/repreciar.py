@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Ejecuta o reanuda los repreciados de pedidos abiertos pendientes en la cola
+(de todos los tenants), por ejemplo tras reiniciar los workers a mitad de un
+trabajo. Con --proceso o --producto encola antes un repreciado nuevo en el
+tenant indicado con --tenant; con --reintentar vuelve a encolar los pedidos
+que un trabajo PARCIAL no pudo repreciar.
+"""
+
+import argparse
+import sys
+import os
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services import repricing, tenancy
+from app.services.storage_service import StorageService
+
+
+def main():
+    """Ejecutar los repreciados pendientes."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    grupo = parser.add_mutually_exclusive_group()
+    grupo.add_argument('--proceso', help='Encolar el repreciado de un proceso')
+    grupo.add_argument('--producto', help='Encolar el repreciado de un producto')
+    grupo.add_argument('--reintentar', metavar='TRABAJO', help='Reencolar los pedidos fallidos de un trabajo')
+    parser.add_argument('--tenant', default=None, help='Tenant del proceso, producto o trabajo')
+    args = parser.parse_args()
+    
+    app = create_app(os.getenv('FLASK_CONFIG', 'default'))
+    # Este proceso ejecuta la cola; no hace falta el hilo de fondo
+    app.config['REPRICING_BACKGROUND'] = False
+    
+    with app.app_context():
+        storage = StorageService()
+        if args.proceso or args.producto:
+            with tenancy.tenant_scope(args.tenant):
+                tipo = repricing.PROCESO if args.proceso else repricing.PRODUCTO
+                trabajo_id = repricing.encolar(storage, tipo, args.proceso or args.producto)
+                print(f"   ✅ Trabajo {trabajo_id} encolado")
+        elif args.reintentar:
+            with tenancy.tenant_scope(args.tenant):
+                if repricing.reintentar(storage, args.reintentar):
+                    print(f"   ✅ Fallidos del trabajo {args.reintentar} reencolados")
+                else:
+                    print(f"   ⚠️  El trabajo {args.reintentar} no existe o no terminó PARCIAL")
+        
+        terminados = repricing.ejecutar_pendientes(storage)
+        print(f"   ✅ {terminados} trabajos terminados")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Comprueba el enrutado de lecturas a réplicas con dos Redis locales:
+
+    redis-server --port 6379
+    redis-server --port 6380 --replicaof 127.0.0.1 6379
+    REDIS_REPLICAS=localhost:6380 python scripts/verificar_replicas.py
+
+Guarda un cliente en el primario y verifica que, dentro de la ventana de
+read-your-writes, la misma sesión lo lee del primario y que, pasada la
+ventana, las lecturas tolerantes van a la réplica.
+"""
+
+import sys
+import os
+import time
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from app.services import replicas
+from app.services.storage_service import StorageService
+from app.models.cliente import Cliente
+
+
+def main():
+    """Ejecutar la comprobación."""
+    app = create_app(os.getenv('FLASK_CONFIG', 'default'))
+    if not app.config.get('REDIS_REPLICAS'):
+        print("❌ Define REDIS_REPLICAS (p. ej. localhost:6380)")
+        return 1
+    
+    with app.test_request_context('/'):
+        primario = StorageService()
+        lectura = StorageService(stale_ok=True)
+        
+        cliente = Cliente(nombre='Réplica', apellido='Prueba', email='replica@example.com')
+        primario.save(cliente)
+        print(f"   ✅ Cliente guardado en el primario: {cliente.id}")
+        
+        antes = dict(replicas.router.stats)
+        encontrado = lectura.load(cliente.id)
+        print(f"   {'✅' if encontrado else '❌'} Lectura tras escribir (primario): "
+              f"read_your_writes={replicas.router.stats['read_your_writes'] - antes['read_your_writes']}")
+        
+        # Simular que la ventana ya pasó y dar tiempo a la replicación
+        from flask import session
+        session.pop(replicas.SESSION_KEY, None)
+        time.sleep(0.2)
+        
+        antes = dict(replicas.router.stats)
+        encontrado = lectura.load(cliente.id)
+        servidas = replicas.router.stats['replica_reads'] - antes['replica_reads']
+        print(f"   {'✅' if encontrado and servidas else '❌'} Lectura desde la réplica: replica_reads={servidas}")
+        
+        primario.delete(cliente.id)
+        print(f"   Estadísticas: {replicas.router.get_stats()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
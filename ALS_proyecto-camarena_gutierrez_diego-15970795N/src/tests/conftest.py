@@ -0,0 +1,128 @@
+"""
+Fixtures comunes de las pruebas.
+
+Redis se sustituye por fakeredis (un servidor en memoria por puerto, así que
+los nodos de ``REDIS_SHARDS`` y las réplicas son independientes). Cada prueba
+trabaja en un tenant propio: todas sus claves llevan un prefijo nuevo y no ve
+los datos ni las cachés de las demás, sin tener que vaciar Redis ni el estado
+de proceso (cachés, catálogo, bus de invalidación) entre pruebas.
+"""
+
+import logging
+import uuid
+from types import SimpleNamespace
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+import redis.asyncio
+
+
+_servidores = {}
+
+
+def _servidor(puerto) -> fakeredis.FakeServer:
+    return _servidores.setdefault(int(puerto or 6379), fakeredis.FakeServer())
+
+
+class _FakeRedis(fakeredis.FakeRedis):
+    def __init__(self, *args, **kwargs):
+        kwargs.pop('host', None)
+        kwargs.setdefault('server', _servidor(kwargs.pop('port', 6379)))
+        super().__init__(*args, **kwargs)
+
+
+class _FakeRedisAsync(fakeredis.aioredis.FakeRedis):
+    def __init__(self, *args, **kwargs):
+        kwargs.pop('host', None)
+        kwargs.pop('socket_timeout', None)
+        kwargs.pop('socket_connect_timeout', None)
+        kwargs.setdefault('server', _servidor(kwargs.pop('port', 6379)))
+        super().__init__(*args, **kwargs)
+
+
+# Antes de importar la aplicación: BreakerRedis hereda de redis.Redis
+redis.Redis = _FakeRedis
+redis.asyncio.Redis = _FakeRedisAsync
+
+
+@pytest.fixture(scope='session')
+def app():
+    """Aplicación de pruebas sobre fakeredis."""
+    from app import create_app
+    
+    app = create_app('testing')
+    app.config['LOGIN_DISABLED'] = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['REPRICING_BACKGROUND'] = False
+    app.logger.setLevel(logging.CRITICAL)
+    return app
+
+
+@pytest.fixture
+def tenant():
+    """Tenant nuevo para aislar los datos de la prueba."""
+    return f"test{uuid.uuid4().hex[:12]}"
+
+
+@pytest.fixture
+def storage(app, tenant):
+    """StorageService dentro de un contexto de aplicación y del tenant de la prueba."""
+    from app.services import tenancy
+    from app.services.storage_service import StorageService
+    
+    with app.app_context(), tenancy.tenant_scope(tenant):
+        yield StorageService()
+
+
+@pytest.fixture
+def client(app, tenant):
+    """Cliente HTTP cuyas peticiones se resuelven en el tenant de la prueba."""
+    app.config['DEFAULT_TENANT'] = tenant
+    yield app.test_client()
+    app.config['DEFAULT_TENANT'] = ''
+
+
+@pytest.fixture
+def catalogo(storage):
+    """Cliente, producto y proceso DTF básicos para crear pedidos."""
+    from app.models.cliente import Cliente
+    from app.models.proceso import Proceso, TipoProceso
+    from app.models.producto import Producto
+    
+    cliente = Cliente(nombre='Ana', email='ana@example.com')
+    producto = Producto('Camiseta', 'camiseta', 10.0)
+    proceso = Proceso(TipoProceso.DTF, 'DTF')
+    for obj in (cliente, producto, proceso):
+        storage.save(obj)
+    return SimpleNamespace(cliente=cliente, producto=producto, proceso=proceso)
+
+
+@pytest.fixture
+def nuevo_pedido(storage, catalogo):
+    """
+    Crear un pedido con líneas (item + personalización). ``prioridad`` y
+    ``estado`` se guardan tal cual, como hacen los formularios.
+    """
+    from app.models.pedido import ItemPedido, Pedido, Personalizacion
+    
+    def crear(prioridad='NORMAL', entrega=None, lineas=1, piezas=2, proceso=None, estado='PENDIENTE',
+              ancho=10.0, alto=10.0):
+        pedido = Pedido(cliente_id=catalogo.cliente.id, fecha_entrega_estimada=entrega)
+        pedido.prioridad = prioridad
+        pedido.estado = estado
+        storage.save(pedido)
+        for _ in range(lineas):
+            item = ItemPedido(catalogo.producto.id, 'M', 'rojo', piezas, 10.0)
+            item.pedido_id = pedido.id
+            storage.save(item)
+            pers = Personalizacion((proceso or catalogo.proceso).id, 5.0, piezas)
+            pers.item_pedido_id = item.id
+            pers.pedido_id = pedido.id
+            pers.ancho = ancho
+            pers.alto = alto
+            storage.save(pers)
+        return pedido
+    
+    return crear
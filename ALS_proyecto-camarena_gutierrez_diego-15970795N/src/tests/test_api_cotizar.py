@@ -0,0 +1,94 @@
+"""API JSON de cotización de diseños con los cuatro tipos de proceso."""
+
+import pytest
+
+from app.models.proceso import Proceso, TamañoBordado, TipoProceso
+from app.routes import procesos as rutas_procesos
+
+
+@pytest.fixture
+def procesos(storage, catalogo):
+    """Un proceso activo de cada tipo (el DTF es el del catálogo)."""
+    creados = {TipoProceso.DTF: catalogo.proceso}
+    for tipo in (TipoProceso.SUBLIMACION, TipoProceso.BORDADO, TipoProceso.VINIL):
+        proceso = Proceso(tipo, tipo.value.title())
+        storage.save(proceso)
+        creados[tipo] = proceso
+    return creados
+
+
+def _cotizar(client, *diseños):
+    return client.post('/procesos/api/cotizar', json={'diseños': list(diseños)})
+
+
+def test_get_cotiza_un_diseño(client, procesos):
+    respuesta = client.get('/procesos/api/cotizar?tipo=dtf&ancho=10&alto=20&cantidad=4')
+    
+    linea = respuesta.get_json()['lineas'][0]
+    # 2 diseños por fila de 27.5 cm, 2 filas de 20 cm = 0.4 m a 200/m
+    assert linea['subtotal'] == pytest.approx(80.0)
+    assert linea['precio_unitario'] == pytest.approx(20.0)
+    assert linea['detalles']['filas'] == 2
+
+
+def test_varios_diseños_de_todos_los_tipos_coinciden_con_proceso(client, procesos):
+    datos = _cotizar(
+        client,
+        {'tipo': 'DTF', 'ancho': 12.5, 'alto': 9, 'cantidad': 7},
+        {'proceso_id': procesos[TipoProceso.SUBLIMACION].id, 'ancho': 25, 'alto': 30, 'cantidad': 5},
+        {'tipo': 'BORDADO', 'tamaño_bordado': 'mediano', 'cantidad': 3},
+        {'tipo': 'VINIL', 'ancho': 10, 'alto': 8, 'cantidad': 2, 'tipo_vinil': 'Glitter'},
+    ).get_json()
+    
+    dtf, sublimacion, bordado, vinil = (procesos[t] for t in TipoProceso)
+    esperados = [
+        dtf.calcular_precio_dtf_sublimacion(12.5, 9, 7),
+        sublimacion.calcular_precio_dtf_sublimacion(25, 30, 5),
+        bordado.calcular_precio_bordado(TamañoBordado.MEDIANO, 3),
+        vinil.calcular_precio_vinil(10, 8, 2, 'Glitter'),
+    ]
+    assert [linea['total'] for linea in datos['lineas']] == pytest.approx(esperados)
+    assert datos['total'] == pytest.approx(sum(esperados))
+    assert datos['errores'] == []
+    assert datos['lineas'][2]['costo_setup'] == bordado.precio_setup
+
+
+def test_el_setup_del_bordado_puede_excluirse(client, procesos):
+    linea = _cotizar(client, {'tipo': 'BORDADO', 'tamaño_bordado': 'PEQUEÑO', 'cantidad': 3,
+                              'incluir_setup': 'false'}).get_json()['lineas'][0]
+    
+    assert (linea['total'], linea['costo_setup']) == (pytest.approx(90.0), None)
+
+
+def test_los_diseños_invalidos_se_informan_por_indice(client, procesos):
+    datos = _cotizar(
+        client,
+        {'tipo': 'SERIGRAFIA', 'cantidad': 1},
+        {'tipo': 'DTF', 'ancho': 10, 'alto': 10, 'cantidad': 2},
+        {'tipo': 'BORDADO', 'tamaño_bordado': 'ENORME', 'cantidad': 1},
+        {'tipo': 'DTF', 'ancho': 10, 'alto': 10, 'cantidad': 0},
+        {'proceso_id': 'no-existe', 'cantidad': 1},
+    ).get_json()
+    
+    assert [linea['indice'] for linea in datos['lineas']] == [1]
+    assert [error['indice'] for error in datos['errores']] == [0, 2, 3, 4]
+
+
+def test_un_proceso_inactivo_no_se_cotiza(client, storage, procesos):
+    vinil = procesos[TipoProceso.VINIL]
+    vinil.is_active = False
+    storage.save(vinil)
+    
+    datos = _cotizar(client, {'tipo': 'VINIL', 'ancho': 10, 'alto': 10, 'cantidad': 1}).get_json()
+    
+    assert datos['lineas'] == [] and len(datos['errores']) == 1
+
+
+def test_peticiones_mal_formadas(client, procesos, monkeypatch):
+    monkeypatch.setattr(rutas_procesos, 'MAX_DISEÑOS_COTIZACION', 2)
+    diseño = {'tipo': 'DTF', 'ancho': 10, 'alto': 10, 'cantidad': 1}
+    
+    assert _cotizar(client).status_code == 400
+    assert _cotizar(client, diseño, diseño, diseño).status_code == 400
+    assert client.post('/procesos/api/cotizar', data='no es json').status_code == 400
+    assert client.post('/procesos/api/cotizar', json=diseño).get_json()['lineas'][0]['total'] == pytest.approx(20.0)
@@ -0,0 +1,89 @@
+"""Lecturas asíncronas del almacenamiento y las vistas JSON que las usan."""
+
+import asyncio
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.models.pedido import Pedido
+from app.models.producto import Producto
+from app.services.async_storage import AsyncStorageService
+
+
+def _leer(operacion):
+    """Ejecutar una operación sobre un AsyncStorageService nuevo, como una vista async."""
+    async def ejecutar():
+        async with AsyncStorageService() as storage_async:
+            return await operacion(storage_async)
+    return asyncio.run(ejecutar())
+
+
+@pytest.fixture
+def clientes(storage):
+    clientes = [Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com') for i in range(4)]
+    for cliente in clientes:
+        storage.save(cliente)
+    return clientes
+
+
+def test_get_y_load_many_leen_lo_mismo_que_el_servicio_sincrono(storage, clientes, catalogo):
+    ids = [c.id for c in clientes]
+    
+    cargados = _leer(lambda s: s.load_many(ids + ['no-existe', catalogo.producto.id], Cliente))
+    
+    assert sorted(cargados) == sorted(ids)
+    assert cargados[ids[2]].email == 'c2@example.com'
+    assert _leer(lambda s: s.get(Producto, catalogo.producto.id)).nombre == 'Camiseta'
+    assert _leer(lambda s: s.get(Cliente, catalogo.producto.id)) is None
+
+
+def test_find_all_y_find_by(storage, clientes):
+    assert sorted(c.id for c in _leer(lambda s: s.find_all(Cliente))) == sorted(
+        c.id for c in storage.find_all(Cliente)
+    )
+    assert [c.id for c in _leer(lambda s: s.find_by(Cliente, email='c1@example.com'))] == [clientes[1].id]
+    assert _leer(lambda s: s.find_by(Cliente, email='nadie@example.com')) == []
+
+
+def test_lecturas_concurrentes_sobre_varios_nodos(app, storage, clientes, monkeypatch):
+    monkeypatch.setitem(app.config, 'REDIS_SHARDS', 'localhost:6393,localhost:6394')
+    nuevos = [Cliente(nombre=f'Nuevo {i}', email=f'n{i}@example.com') for i in range(20)]
+    for cliente in nuevos:
+        storage.save(cliente)
+    
+    async def leer_a_la_vez(s):
+        return await asyncio.gather(s.find_all(Cliente), s.load_many([c.id for c in nuevos], Cliente))
+    
+    todos, cargados = _leer(leer_a_la_vez)
+    
+    assert {c.id for c in todos} == {c.id for c in clientes + nuevos}
+    assert set(cargados) == {c.id for c in nuevos}
+
+
+def test_api_producto_detalle(client, catalogo):
+    respuesta = client.get(f'/pedidos/api/producto/{catalogo.producto.id}')
+    
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['nombre'] == 'Camiseta'
+    assert client.get('/pedidos/api/producto/no-existe').status_code == 404
+
+
+def test_api_pedido_totales(client, storage, nuevo_pedido):
+    pedido = nuevo_pedido(lineas=2, piezas=2)
+    pedido.subtotal, pedido.iva, pedido.total = 60.0, 9.6, 69.6
+    storage.save(pedido)
+    
+    datos = client.get(f'/pedidos/api/pedido/{pedido.id}/totales').get_json()
+    
+    assert (datos['subtotal'], datos['total']) == (pytest.approx(60.0), pytest.approx(69.6))
+    assert client.get('/pedidos/api/pedido/no-existe/totales').status_code == 404
+
+
+def test_ajax_cliente_con_sus_pedidos(client, catalogo, nuevo_pedido):
+    pedido = nuevo_pedido()
+    
+    datos = client.get(f'/clientes/ajax/{catalogo.cliente.id}').get_json()
+    
+    assert datos['cliente']['nombre'] == 'Ana'
+    assert [p['id'] for p in datos['pedidos']] == [pedido.id]
+    assert client.get(f'/clientes/ajax/{catalogo.producto.id}').status_code == 404
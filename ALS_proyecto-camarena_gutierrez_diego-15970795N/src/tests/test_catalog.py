@@ -0,0 +1,91 @@
+"""Catálogo de referencia de productos y procesos, versionado por tenant."""
+
+import pytest
+
+from app.models.producto import Producto
+from app.services import tenancy
+from app.services.catalog import ReferenceCatalog
+
+
+@pytest.fixture
+def catalogo_ref(storage, catalogo):
+    """Catálogo nuevo (sin instantáneas de otras pruebas) sobre el tenant de la prueba."""
+    return ReferenceCatalog()
+
+
+def _instantanea(catalogo_ref, tenant):
+    return catalogo_ref._instantaneas[tenancy.prefijo(tenant)]
+
+
+def test_productos_activos_y_por_id(storage, catalogo, catalogo_ref):
+    inactivo = Producto('Gorra', 'gorra', 5.0)
+    inactivo.is_active = False
+    storage.save(inactivo)
+    
+    assert [p.id for p in catalogo_ref.productos()] == [catalogo.producto.id]
+    assert {p.id for p in catalogo_ref.productos(solo_activos=False)} == {catalogo.producto.id, inactivo.id}
+    assert catalogo_ref.producto(inactivo.id).nombre == 'Gorra'
+    assert catalogo_ref.producto('no-existe') is None
+    assert [p.id for p in catalogo_ref.procesos()] == [catalogo.proceso.id]
+
+
+def test_cada_llamada_recibe_objetos_propios(catalogo, catalogo_ref):
+    catalogo_ref.producto(catalogo.producto.id).nombre = 'Cambiado'
+    
+    assert catalogo_ref.producto(catalogo.producto.id).nombre == 'Camiseta'
+
+
+def test_la_instantanea_es_inmutable(catalogo, catalogo_ref, tenant):
+    catalogo_ref.productos()
+    
+    with pytest.raises(TypeError):
+        _instantanea(catalogo_ref, tenant).productos['otro'] = '{}'
+
+
+def test_se_recarga_solo_cuando_cambia_la_version(storage, catalogo, catalogo_ref):
+    catalogo_ref.productos()
+    catalogo_ref.procesos()
+    assert catalogo_ref.stats['loads'] == 1
+    
+    nuevo = Producto('Sudadera', 'sudadera', 30.0)
+    storage.save(nuevo)
+    
+    assert nuevo.id in {p.id for p in catalogo_ref.productos()}
+    assert catalogo_ref.stats['loads'] == 2
+
+
+def test_la_version_se_comprueba_una_vez_por_peticion(app, catalogo, catalogo_ref):
+    with app.test_request_context():
+        catalogo_ref.productos()
+        catalogo_ref.procesos()
+        catalogo_ref.producto(catalogo.producto.id)
+    
+    assert catalogo_ref.stats['checks'] == 1
+
+
+def test_cada_tenant_tiene_su_catalogo(catalogo, catalogo_ref, tenant):
+    with tenancy.tenant_scope(f'{tenant}otro'):
+        assert catalogo_ref.productos() == []
+    
+    assert [p.id for p in catalogo_ref.productos()] == [catalogo.producto.id]
+
+
+def test_preload_carga_antes_de_la_primera_peticion(app, catalogo, catalogo_ref, tenant):
+    catalogo_ref.preload(app)
+    
+    assert catalogo_ref.stats['preloaded']
+    assert list(_instantanea(catalogo_ref, tenant).productos) == [catalogo.producto.id]
+
+
+def test_tarifa_y_reglas_siguen_la_configuracion_del_proceso(storage, catalogo, catalogo_ref):
+    reglas = catalogo_ref.reglas_precios()
+    assert catalogo_ref.reglas_precios() is reglas
+    assert catalogo_ref.tarifa('no-existe') is None
+    
+    proceso = catalogo.proceso
+    proceso.configurar_precios(precio_por_metro=250.0)
+    storage.save(proceso)
+    
+    tarifa = catalogo_ref.tarifa(proceso.id)
+    assert (tarifa.version, tarifa.precio_por_metro) == (proceso.config_version, 250.0)
+    assert catalogo_ref.reglas_precios() is not reglas
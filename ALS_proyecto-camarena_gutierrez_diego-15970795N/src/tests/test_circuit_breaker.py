@@ -0,0 +1,167 @@
+"""Circuit breaker de Redis: apertura, sondeo semiabierto y cierre."""
+
+import asyncio
+
+import pytest
+import redis
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import (
+    ABIERTO, CERRADO, SEMIABIERTO, CircuitBreaker, RedisUnavailableError
+)
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+    
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', reloj)
+    return reloj
+
+
+def _falla(error):
+    def funcion():
+        raise error
+    return funcion
+
+
+def _abrir(breaker, reloj):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(redis.ConnectionError):
+            breaker.call(_falla(redis.ConnectionError('caído')))
+    assert breaker.state == ABIERTO
+    reloj.ahora += breaker.reset_timeout
+    assert breaker.state == SEMIABIERTO
+
+
+def test_opens_after_threshold_and_rejects(reloj):
+    breaker = CircuitBreaker('prueba', failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        with pytest.raises(redis.TimeoutError):
+            breaker.call(_falla(redis.TimeoutError('lento')))
+    
+    with pytest.raises(RedisUnavailableError):
+        breaker.call(lambda: 'ok')
+    assert breaker.state == ABIERTO
+    assert breaker.get_stats()['rejected'] == 1
+
+
+def test_command_errors_do_not_count_as_failures(reloj):
+    breaker = CircuitBreaker('prueba', failure_threshold=1, reset_timeout=10)
+    with pytest.raises(redis.ResponseError):
+        breaker.call(_falla(redis.ResponseError('WRONGTYPE')))
+    assert breaker.state == CERRADO
+
+
+def test_successful_probe_closes(reloj):
+    breaker = CircuitBreaker('prueba', failure_threshold=2, reset_timeout=10)
+    _abrir(breaker, reloj)
+    
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CERRADO
+
+
+def test_failed_probe_reopens(reloj):
+    breaker = CircuitBreaker('prueba', failure_threshold=2, reset_timeout=10)
+    _abrir(breaker, reloj)
+    
+    with pytest.raises(redis.ConnectionError):
+        breaker.call(_falla(redis.ConnectionError('sigue caído')))
+    assert breaker.state == ABIERTO
+    with pytest.raises(RedisUnavailableError):
+        breaker.call(lambda: 'ok')
+
+
+@pytest.mark.parametrize('error', [redis.ResponseError('ERR'), redis.WatchError('cambió')])
+def test_probe_answered_with_command_error_closes(reloj, error):
+    breaker = CircuitBreaker('prueba', failure_threshold=2, reset_timeout=10)
+    _abrir(breaker, reloj)
+    
+    with pytest.raises(type(error)):
+        breaker.call(_falla(error))
+    
+    assert breaker.state == CERRADO
+    assert [breaker.call(lambda: 'ok') for _ in range(3)] == ['ok'] * 3
+
+
+def test_interrupted_probe_is_released(reloj):
+    class Interrupcion(BaseException):
+        pass
+    
+    breaker = CircuitBreaker('prueba', failure_threshold=2, reset_timeout=10)
+    _abrir(breaker, reloj)
+    
+    with pytest.raises(Interrupcion):
+        breaker.call(_falla(Interrupcion()))
+    
+    # Sin resultado sigue semiabierto, pero admite un nuevo sondeo
+    assert breaker.state == SEMIABIERTO
+    assert breaker.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CERRADO
+
+
+def test_only_one_probe_at_a_time(reloj):
+    breaker = CircuitBreaker('prueba', failure_threshold=1, reset_timeout=10)
+    _abrir(breaker, reloj)
+    
+    def sondeo():
+        # Mientras el sondeo está en curso, el resto se rechaza
+        with pytest.raises(RedisUnavailableError):
+            breaker.call(lambda: 'otro')
+        return 'ok'
+    
+    assert breaker.call(sondeo) == 'ok'
+    assert breaker.state == CERRADO
+
+
+def test_async_probe_answered_with_command_error_closes(app, reloj):
+    from app.services.async_storage import AsyncStorageService, _nombre
+    
+    endpoint = ('breaker-async', 6399, 0)
+    with app.app_context():
+        breaker = circuit_breaker.get_breaker(
+            _nombre(endpoint), app.config['REDIS_BREAKER_FAILURE_THRESHOLD'],
+            app.config['REDIS_BREAKER_RESET_TIMEOUT']
+        )
+        _abrir(breaker, reloj)
+        
+        async def respuesta_con_error():
+            raise redis.ResponseError('ERR')
+        
+        async def ok():
+            return 'ok'
+        
+        with pytest.raises(redis.ResponseError):
+            asyncio.run(AsyncStorageService._protegido(endpoint, respuesta_con_error()))
+        assert breaker.state == CERRADO
+        assert asyncio.run(AsyncStorageService._protegido(endpoint, ok())) == 'ok'
+
+
+def test_async_cancelled_probe_is_released(app, reloj):
+    from app.services.async_storage import AsyncStorageService, _nombre
+    
+    endpoint = ('breaker-async-cancel', 6399, 0)
+    with app.app_context():
+        breaker = circuit_breaker.get_breaker(
+            _nombre(endpoint), app.config['REDIS_BREAKER_FAILURE_THRESHOLD'],
+            app.config['REDIS_BREAKER_RESET_TIMEOUT']
+        )
+        _abrir(breaker, reloj)
+        
+        async def cancelado():
+            raise asyncio.CancelledError()
+        
+        async def ok():
+            return 'ok'
+        
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(AsyncStorageService._protegido(endpoint, cancelado()))
+        assert asyncio.run(AsyncStorageService._protegido(endpoint, ok())) == 'ok'
+        assert breaker.state == CERRADO
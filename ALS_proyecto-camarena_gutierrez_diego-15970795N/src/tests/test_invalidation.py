@@ -0,0 +1,152 @@
+"""Invalidación de la caché de objetos entre workers por pub/sub."""
+
+import uuid
+
+import pytest
+import redis
+
+from app.models.producto import Producto
+from app.services import invalidation, tenancy
+from app.services.cache import ObjectCache
+
+
+class _Registro:
+    """Cliente que anota cada comando y si el lock de publicar estaba tomado al enviarlo."""
+    
+    def __init__(self, bus):
+        self.bus = bus
+        self.comandos = []
+    
+    def pipeline(self, transaction=True):
+        return _PipelineRegistro(self)
+
+
+class _PipelineRegistro:
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.pendientes = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def hincrby(self, clave, campo, cantidad):
+        self.pendientes.append(('hincrby', campo))
+    
+    def publish(self, canal, mensaje):
+        self.pendientes.append(('publish', mensaje))
+    
+    def execute(self):
+        tomado = self.cliente.bus._lock_publicar.locked()
+        self.cliente.comandos.extend((comando, tomado) for comando, _ in self.pendientes)
+        return [1] * len(self.pendientes)
+
+
+@pytest.fixture
+def cache():
+    cache = ObjectCache()
+    cache.configure({'Producto': {'ttl': 60, 'max_entries': 10}})
+    return cache
+
+
+@pytest.fixture
+def bus(cache):
+    return invalidation.InvalidationBus(cache, f'test:invalidacion:{uuid.uuid4().hex}')
+
+
+def _mensajes(pubsub, cuantos):
+    recibidos = []
+    while len(recibidos) < cuantos:
+        mensaje = pubsub.get_message(timeout=1.0)
+        assert mensaje is not None, recibidos
+        if mensaje['type'] == 'message':
+            recibidos.append(mensaje['data'].decode().split('|'))
+    return recibidos
+
+
+def test_publish_many_publica_en_orden_con_secuencias_consecutivas(bus):
+    cliente = redis.Redis()
+    pubsub = cliente.pubsub()
+    pubsub.subscribe(bus.channel)
+    ids = [f'p{uuid.uuid4().hex}' for _ in range(3)]
+    
+    assert bus.publish_many(cliente, 'Producto', ids) == [1, 1, 1]
+    assert bus.publish(cliente, 'Producto', ids[0]) == 2
+    
+    mensajes = _mensajes(pubsub, 4)
+    assert [m[1] for m in mensajes] == ['1', '2', '3', '4']
+    assert [m[3] for m in mensajes] == ids + ids[:1]
+    assert [m[4] for m in mensajes] == ['1', '1', '1', '2']
+    assert {m[0] for m in mensajes} == {bus.origin}
+    assert bus.stats['published'] == 4
+
+
+def test_las_versiones_se_suben_sin_el_lock_de_publicar(bus):
+    cliente = _Registro(bus)
+    
+    bus.publish_many(cliente, 'Producto', ['a', 'b'])
+    
+    assert cliente.comandos == [('hincrby', False), ('hincrby', False), ('publish', True), ('publish', True)]
+    assert not bus._lock_publicar.locked()
+
+
+def test_publicar_no_espera_al_lock_del_listener(bus):
+    with bus._lock:
+        assert bus.publish_many(_Registro(bus), 'Producto', ['a']) == [1]
+
+
+def test_publish_many_sin_ids_no_hace_nada(bus):
+    cliente = _Registro(bus)
+    
+    assert bus.publish_many(cliente, 'Producto', []) == []
+    assert cliente.comandos == []
+
+
+def test_un_mensaje_de_otro_worker_expulsa_el_objeto(bus, cache):
+    cache.put('p1', Producto, '{}')
+    bus.handle(f'{bus.origin}|1|Producto|p1|1')
+    assert cache.get('p1') is not None
+    
+    bus.handle('otro|1|Producto|p1|1')
+    assert cache.get('p1') is None
+    assert bus.stats['evicted'] == 1
+
+
+def test_un_salto_de_secuencia_vacia_la_cache(bus, cache):
+    bus.handle('otro|1|Producto|p1|1')
+    cache.put('p2', Producto, '{}')
+    
+    bus.handle('otro|3|Producto|p1|2')
+    
+    assert cache.get('p2') is None
+    assert (bus.stats['gaps'], bus.stats['flushes']) == (1, 1)
+
+
+def test_un_mensaje_repetido_se_ignora(bus, cache):
+    bus.handle('otro|1|Producto|p1|1')
+    cache.put('p1', Producto, '{}')
+    
+    bus.handle('otro|1|Producto|p1|1')
+    bus.handle('mensaje mal formado')
+    
+    assert cache.get('p1') is not None
+    assert bus.stats['received'] == 2
+
+
+def test_guardar_varios_publica_todos_juntos_con_el_prefijo_del_tenant(storage, tenant, monkeypatch):
+    publicados = []
+    monkeypatch.setattr(invalidation.InvalidationBus, 'publish_many',
+                        lambda self, cliente, clase, ids: publicados.append((clase, list(ids))))
+    productos = [Producto(f'Gorra {i}', 'gorra', 5.0) for i in range(3)]
+    for producto in productos:
+        storage.save(producto)
+    publicados.clear()
+    
+    for producto in productos:
+        producto.precio_base = 6.0
+    storage.save_many(productos)
+    
+    prefijo = tenancy.prefijo(tenant)
+    assert publicados == [('Producto', [prefijo + p.id for p in productos])]
@@ -0,0 +1,81 @@
+"""Tablas id -> nombre y listas de opciones versionadas por clase."""
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.models.proceso import Proceso
+from app.models.producto import Producto
+from app.services import tenancy
+from app.services.lookups import LookupTables
+
+
+@pytest.fixture
+def tablas(storage, catalogo):
+    """Tablas nuevas (sin las de otras pruebas) sobre el tenant de la prueba."""
+    return LookupTables()
+
+
+def test_nombres_y_opciones(storage, catalogo, tablas):
+    baja = Cliente(nombre='Luis', email='luis@example.com')
+    baja.apellido = 'Pérez'
+    baja.is_active = False
+    storage.save(baja)
+    
+    assert tablas.names(Cliente) == {catalogo.cliente.id: 'Ana', baja.id: 'Luis Pérez'}
+    assert tablas.choices(Cliente) == [(catalogo.cliente.id, 'Ana')]
+    assert tablas.choices(Producto) == [(catalogo.producto.id, 'Camiseta')]
+    assert tablas.name(Proceso, catalogo.proceso.id) == 'DTF (DTF)'
+    assert tablas.name(Proceso, 'no-existe', 'desconocido') == 'desconocido'
+
+
+def test_las_opciones_son_una_lista_nueva(catalogo, tablas):
+    tablas.choices(Cliente).append(('x', 'X'))
+    
+    assert tablas.choices(Cliente) == [(catalogo.cliente.id, 'Ana')]
+    with pytest.raises(TypeError):
+        tablas.names(Cliente)['x'] = 'X'
+
+
+def test_se_reconstruye_solo_la_clase_que_cambia(storage, catalogo, tablas):
+    tablas.names(Cliente)
+    tablas.names(Producto)
+    tablas.names(Cliente)
+    assert tablas.stats['builds'] == 2
+    
+    nuevo = Cliente(nombre='Marta', email='marta@example.com')
+    storage.save(nuevo)
+    
+    assert tablas.name(Cliente, nuevo.id) == 'Marta'
+    tablas.names(Producto)
+    assert tablas.stats['builds'] == 3
+
+
+def test_la_generacion_se_comprueba_una_vez_por_peticion(app, catalogo, tablas):
+    with app.test_request_context():
+        for _ in range(3):
+            tablas.choices(Cliente)
+            tablas.names(Cliente)
+    
+    assert tablas.stats['checks'] == 1
+
+
+def test_cada_tenant_tiene_sus_tablas(catalogo, tablas, tenant):
+    with tenancy.tenant_scope(f'{tenant}otro'):
+        assert tablas.choices(Cliente) == []
+    
+    assert tablas.choices(Cliente) == [(catalogo.cliente.id, 'Ana')]
+
+
+def test_el_filtro_cliente_display_usa_la_tabla(app, catalogo):
+    cliente_display = app.jinja_env.filters['cliente_display']
+    
+    with app.test_request_context():
+        assert cliente_display(catalogo.cliente.id) == 'Ana'
+        assert cliente_display('desconocido-1234') == 'Cliente #desconoc'
+
+
+def test_el_formulario_de_pedido_ofrece_los_clientes(client, catalogo):
+    respuesta = client.get('/pedidos/crear/paso1')
+    
+    assert respuesta.status_code == 200
+    assert f'value="{catalogo.cliente.id}"' in respuesta.get_data(as_text=True)
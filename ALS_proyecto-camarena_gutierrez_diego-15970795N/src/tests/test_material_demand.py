@@ -0,0 +1,133 @@
+"""Demanda de material incremental frente a un recálculo completo."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models.pedido import ItemPedido, Personalizacion
+from app.services import material_demand, tenancy
+
+
+def _recontar(storage):
+    """Demanda recalculada desde todos los pedidos, sin guardarla."""
+    return material_demand._por_tipo(material_demand._calcular(storage)[2])
+
+
+def _pers(storage, pedido):
+    return storage.query(Personalizacion).where(pedido_id=pedido.id).all()
+
+
+def test_la_primera_lectura_construye_la_demanda(storage, nuevo_pedido):
+    nuevo_pedido(lineas=2, piezas=3, alto=20.0)
+    nuevo_pedido(estado='COMPLETADO', lineas=3)
+    
+    demanda = material_demand.get(storage)
+    
+    # 3 diseños de 10 x 20 en un rollo de 27.5 cm: 2 filas de 20 cm = 0.4 m por línea
+    assert demanda['DTF'] == {'metros': pytest.approx(0.8), 'cm2': pytest.approx(1200.0),
+                              'piezas': 6, 'personalizaciones': 2}
+    assert demanda['BORDADO']['personalizaciones'] == 0
+    assert material_demand.get(storage) == demanda
+
+
+def test_cada_cambio_mantiene_la_demanda_al_dia(storage, catalogo, nuevo_pedido):
+    abierto = nuevo_pedido(lineas=2)
+    material_demand.get(storage)
+    
+    def comprobar():
+        assert material_demand.get(storage) == _recontar(storage)
+    
+    otro = nuevo_pedido(estado='EN_PROCESO', piezas=5, ancho=30.0)
+    comprobar()
+    
+    pers = _pers(storage, abierto)[0]
+    pers.cantidad, pers.alto = 7, 15.0
+    storage.save(pers)
+    comprobar()
+    
+    abierto.estado = 'COMPLETADO'
+    storage.save(abierto)
+    comprobar()
+    assert material_demand.get(storage)['DTF']['piezas'] == 5
+    
+    abierto.estado = 'PENDIENTE'
+    storage.save(abierto)
+    comprobar()
+    
+    pers.is_active = False
+    storage.save(pers)
+    comprobar()
+    
+    storage.delete(_pers(storage, otro)[0].id)
+    comprobar()
+    
+    catalogo.proceso.ancho_disponible = 55.0
+    storage.save(catalogo.proceso)
+    comprobar()
+    
+    storage.delete(abierto.id)
+    comprobar()
+    assert material_demand.get(storage)['DTF']['personalizaciones'] == 0
+
+
+def test_una_personalizacion_sin_pedido_propio_usa_el_de_su_item(storage, catalogo, nuevo_pedido):
+    pedido = nuevo_pedido()
+    material_demand.get(storage)
+    item = storage.query(ItemPedido).where(pedido_id=pedido.id).first()
+    
+    pers = Personalizacion(catalogo.proceso.id, 5.0, 4)
+    pers.item_pedido_id, pers.ancho, pers.alto = item.id, 10.0, 10.0
+    storage.save(pers)
+    
+    assert material_demand.get(storage) == _recontar(storage)
+    assert material_demand.get(storage)['DTF']['personalizaciones'] == 2
+
+
+def test_los_cambios_concurrentes_no_se_pierden(app, tenant, storage, nuevo_pedido):
+    pedidos = [nuevo_pedido(lineas=2) for _ in range(12)]
+    material_demand.get(storage)
+    
+    def cambiar(i):
+        # Cada pedido recibe a la vez un cambio de estado y uno de cantidad
+        with app.app_context(), tenancy.tenant_scope(tenant):
+            pedido = pedidos[i // 2]
+            if i % 2:
+                pedido.estado = 'CANCELADO' if i % 4 == 1 else 'EN_PROCESO'
+                storage.save(pedido)
+            else:
+                pers = _pers(storage, pedido)[0]
+                pers.cantidad = i + 3
+                storage.save(pers)
+    
+    with ThreadPoolExecutor(8) as ejecutor:
+        list(ejecutor.map(cambiar, range(2 * len(pedidos))))
+    
+    assert material_demand.get(storage) == _recontar(storage)
+    assert material_demand.get(storage)['DTF']['personalizaciones'] == 12
+
+
+def test_otro_formato_obliga_a_reconstruir(storage, nuevo_pedido):
+    nuevo_pedido()
+    material_demand.get(storage)
+    cliente = material_demand._cliente(storage)
+    cliente.hset(material_demand.CLAVE, mapping={material_demand.MARCA_COMPLETO: 0, 'DTF:piezas': 999})
+    
+    assert material_demand.get(storage)['DTF']['piezas'] == 2
+    assert int(cliente.hget(material_demand.CLAVE, 'DTF:piezas')) == 2
+
+
+def test_desactivada_se_calcula_sin_guardar(app, storage, nuevo_pedido, monkeypatch):
+    monkeypatch.setitem(app.config, 'MATERIAL_DEMAND_ENABLED', False)
+    nuevo_pedido(piezas=4)
+    
+    assert material_demand.get(storage)['DTF']['piezas'] == 4
+    assert not material_demand._cliente(storage).exists(material_demand.CLAVE)
+
+
+def test_la_api_devuelve_la_demanda(client, storage, nuevo_pedido):
+    nuevo_pedido(piezas=3)
+    
+    respuesta = client.get('/api/demanda-material')
+    
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['demanda']['DTF']['piezas'] == 3
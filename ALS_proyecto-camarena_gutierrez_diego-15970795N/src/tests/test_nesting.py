@@ -0,0 +1,80 @@
+"""Acomodo de diseños en rollo frente a imprimir cada diseño en sus propias filas."""
+
+import random
+
+import pytest
+
+from app.services import nesting
+
+
+def _encimadas(acomodo, margen):
+    colocaciones = sorted(acomodo.colocaciones, key=lambda c: c.y)
+    for i, a in enumerate(colocaciones):
+        if a.x < 0 or a.x + a.ancho > acomodo.ancho_rollo + 1e-9:
+            return a
+        for b in colocaciones[i + 1:]:
+            if b.y >= a.y + a.alto + margen - 1e-9:
+                break
+            if a.x < b.x + b.ancho + margen - 1e-9 and b.x < a.x + a.ancho + margen - 1e-9:
+                return a, b
+    return None
+
+
+def _piezas(diseños):
+    return [
+        nesting.Pieza((d, copia), ancho, alto, d)
+        for d, (ancho, alto, cantidad) in enumerate(diseños)
+        for copia in range(cantidad)
+    ]
+
+
+@pytest.mark.parametrize('semilla', range(8))
+def test_agrupar_nunca_es_peor_que_diseño_a_diseño(semilla):
+    aleatorio = random.Random(semilla)
+    diseños = [
+        (round(aleatorio.uniform(3, 27), 1), round(aleatorio.uniform(3, 30), 1), aleatorio.randint(1, 12))
+        for _ in range(aleatorio.randint(1, 6))
+    ]
+    piezas = _piezas(diseños)
+    
+    acomodo = nesting.empaquetar(piezas, 27.5, presupuesto_ms=20, margen=0.5)
+    por_diseño = nesting.acomodo_por_diseño(piezas, 27.5, margen=0.5)
+    
+    assert acomodo.metros <= por_diseño.metros
+    assert len(acomodo.colocaciones) == len(por_diseño.colocaciones) == len(piezas)
+    assert _encimadas(acomodo, 0.5) is None
+    assert _encimadas(por_diseño, 0.5) is None
+
+
+def test_acomodo_por_diseño_pone_cada_diseño_en_sus_filas():
+    # 27.5 cm de rollo + 0.5 de margen: caben dos de 10 cm por fila
+    acomodo = nesting.acomodo_por_diseño(_piezas([(10, 10, 3), (10, 10, 1)]), 27.5, margen=0.5)
+    
+    filas = {}
+    for colocacion in acomodo.colocaciones:
+        filas.setdefault(colocacion.ref[0], set()).add(colocacion.y)
+    assert filas == {0: {0.0, 10.5}, 1: {21.0}}
+    assert acomodo.largo_cm == 31.0
+
+
+def test_diseños_sin_lugar_quedan_fuera_de_ambos():
+    piezas = _piezas([(40, 40, 1), (10, 10, 2)])
+    
+    acomodo = nesting.empaquetar(piezas, 27.5, presupuesto_ms=5)
+    por_diseño = nesting.acomodo_por_diseño(piezas, 27.5)
+    
+    assert [p.ref for p in acomodo.sin_colocar] == [p.ref for p in por_diseño.sin_colocar] == [(0, 0)]
+
+
+@pytest.mark.parametrize('piezas', [1, 2, 3, 5])
+def test_planificar_pendientes_no_da_ahorro_negativo(storage, nuevo_pedido, piezas):
+    for _ in range(3):
+        nuevo_pedido(piezas=piezas, ancho=10.0, alto=10.0)
+    
+    planes = nesting.planificar_pendientes(storage, presupuesto_ms=20, margen=0.5)
+    
+    assert len(planes) == 1
+    plan = planes[0]
+    assert plan['piezas'] == 3 * piezas
+    assert plan['ahorro_metros'] >= 0
+    assert plan['metros_sin_agrupar'] == pytest.approx(plan['acomodo'].metros + plan['ahorro_metros'])
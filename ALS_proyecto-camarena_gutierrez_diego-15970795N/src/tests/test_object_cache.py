@@ -0,0 +1,109 @@
+"""Caché de objetos del proceso: LRU, TTL, invalidación y lectura a través de StorageService."""
+
+import time
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.models.producto import Producto
+from app.services import cache as cache_module
+from app.services import tenancy
+from app.services.cache import ObjectCache
+
+
+@pytest.fixture
+def cache():
+    cache = ObjectCache()
+    cache.configure({'Producto': {'ttl': 60, 'max_entries': 2}})
+    return cache
+
+
+@pytest.fixture
+def cache_activa(storage):
+    """Caché del proceso con el listener de invalidación ya suscrito."""
+    cache = storage.cache()
+    limite = time.monotonic() + 5
+    while cache.suspended and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert not cache.suspended
+    return cache
+
+
+def _hits(cache):
+    return cache.stats()['clases']['Producto']['hits']
+
+
+def test_lru_expulsa_la_menos_usada(cache):
+    cache.put('a', Producto, '{"a": 1}')
+    cache.put('b', Producto, '{"b": 1}')
+    assert cache.get('a') == (Producto, '{"a": 1}')
+    
+    cache.put('c', Producto, '{"c": 1}')
+    
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_las_entradas_caducan(cache, monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'monotonic', lambda: ahora[0])
+    cache.put('a', Producto, '{}')
+    
+    ahora[0] += 59
+    assert cache.get('a') is not None
+    ahora[0] += 2
+    assert cache.get('a') is None
+    assert cache.stats()['clases']['Producto']['expirations'] == 1
+
+
+def test_una_invalidacion_concurrente_impide_cachear_lo_leido(cache):
+    token = cache.token()
+    cache.invalidate('a')  # Otro hilo guarda el objeto mientras se lee de Redis
+    
+    cache.put('a', Producto, '{"viejo": 1}', token)
+    
+    assert cache.get('a') is None
+
+
+def test_suspendida_no_sirve_ni_admite_entradas(cache):
+    cache.put('a', Producto, '{}')
+    cache.suspend()
+    
+    cache.put('b', Producto, '{}')
+    assert cache.get('a') is None
+    
+    cache.resume()
+    assert cache.get('a') is not None
+    assert cache.get('b') is None
+
+
+def test_solo_se_cachean_las_clases_configuradas(cache):
+    cache.put('a', Cliente, '{}')
+    
+    assert not cache.caches_class('Cliente')
+    assert cache.get('a') is None
+
+
+def test_load_lee_de_la_cache_y_save_la_invalida(storage, cache_activa):
+    producto = Producto('Sudadera', 'sudadera', 30.0)
+    storage.save(producto)
+    
+    storage.load(producto.id)
+    antes = _hits(cache_activa)
+    assert storage.load(producto.id).precio_base == 30.0
+    assert _hits(cache_activa) == antes + 1
+    
+    producto.precio_base = 35.0
+    storage.save(producto)
+    assert storage.load(producto.id).precio_base == 35.0
+
+
+def test_cada_tenant_tiene_sus_entradas(storage, cache_activa, tenant):
+    producto = Producto('Sudadera', 'sudadera', 30.0)
+    storage.save(producto)
+    storage.load(producto.id)
+    assert cache_activa.get(tenancy.prefijo(tenant) + producto.id) is not None
+    
+    with tenancy.tenant_scope(f'{tenant}otro'):
+        assert storage.load(producto.id) is None
@@ -0,0 +1,141 @@
+"""Vista desnormalizada de pedido: actualización incremental frente a construcción completa."""
+
+import json
+
+import pytest
+
+from app.models.pedido import ItemPedido, Pedido, Personalizacion
+from app.services import order_view
+
+
+def _documento(storage, pedido_id):
+    guardado = storage.client_for(Pedido, pedido_id).hgetall(order_view.clave(pedido_id))
+    return {k.decode(): json.loads(v) if k != order_view.MARCA_COMPLETO.encode() else v.decode()
+            for k, v in guardado.items()}
+
+
+def _construido(storage, pedido_id):
+    campos = order_view._construir(storage, pedido_id)
+    return {k: json.loads(v) if k != order_view.MARCA_COMPLETO else v for k, v in campos.items()}
+
+
+def _items(storage, pedido_id):
+    return storage.query(ItemPedido).where(pedido_id=pedido_id, is_active=True).all()
+
+
+@pytest.fixture
+def pedido(storage, nuevo_pedido):
+    pedido = nuevo_pedido(lineas=2)
+    order_view.get(storage, pedido.id)  # Guarda el documento: desde aquí, incremental
+    assert _documento(storage, pedido.id) == _construido(storage, pedido.id)
+    return pedido
+
+
+def _modificar_item(storage, pedido, catalogo):
+    item = _items(storage, pedido.id)[0]
+    item.cantidad = 7
+    storage.save(item)
+
+
+def _nueva_personalizacion(storage, pedido, catalogo):
+    item = _items(storage, pedido.id)[1]
+    pers = Personalizacion(catalogo.proceso.id, 3.0, 2)
+    pers.item_pedido_id = item.id
+    pers.pedido_id = pedido.id
+    storage.save(pers)
+
+
+def _nuevo_item(storage, pedido, catalogo):
+    item = ItemPedido(catalogo.producto.id, 'L', 'azul', 1, 12.0)
+    item.pedido_id = pedido.id
+    storage.save(item)
+
+
+def _borrar_item(storage, pedido, catalogo):
+    item = _items(storage, pedido.id)[0]
+    item.is_active = False
+    storage.save(item)
+
+
+def _cambiar_pedido(storage, pedido, catalogo):
+    pedido.descripcion = 'Con logo'
+    pedido.prioridad = 'alta'
+    storage.save(pedido)
+
+
+def _cambiar_cliente(storage, pedido, catalogo):
+    catalogo.cliente.nombre = 'Ana María'
+    storage.save(catalogo.cliente)
+
+
+def _cambiar_producto(storage, pedido, catalogo):
+    catalogo.producto.nombre = 'Camiseta premium'
+    storage.save(catalogo.producto)
+
+
+def _cambiar_proceso(storage, pedido, catalogo):
+    catalogo.proceso.nombre = 'DTF textil'
+    storage.save(catalogo.proceso)
+
+
+MUTACIONES = [_modificar_item, _nueva_personalizacion, _nuevo_item, _borrar_item,
+              _cambiar_pedido, _cambiar_cliente, _cambiar_producto, _cambiar_proceso]
+
+
+def test_each_mutation_matches_full_build(storage, catalogo, pedido):
+    for mutacion in MUTACIONES:
+        mutacion(storage, pedido, catalogo)
+        assert _documento(storage, pedido.id) == _construido(storage, pedido.id), mutacion.__name__
+
+
+def test_mutations_within_a_request_match_full_build(app, storage, catalogo, pedido):
+    for mutacion in MUTACIONES:
+        with app.test_request_context('/'):
+            mutacion(storage, pedido, catalogo)
+            mutacion(storage, pedido, catalogo)
+            order_view.flush(storage)
+        assert _documento(storage, pedido.id) == _construido(storage, pedido.id), mutacion.__name__
+
+
+def test_concurrent_change_invalidates_instead_of_writing_stale_data(monkeypatch, storage, catalogo, pedido):
+    original = order_view._subdocumentos
+    
+    def con_cambio_concurrente(storage_, pedido_id, item_ids):
+        campos = original(storage_, pedido_id, item_ids)
+        # Otra petición cambia el pedido después de leer sus datos
+        monkeypatch.setattr(order_view, '_subdocumentos', original)
+        _nuevo_item(storage, pedido, catalogo)
+        return campos
+    
+    monkeypatch.setattr(order_view, '_subdocumentos', con_cambio_concurrente)
+    _modificar_item(storage, pedido, catalogo)
+    
+    # Sin documento, la próxima lectura lo construye entero
+    assert not storage.client_for(Pedido, pedido.id).exists(order_view.clave(pedido.id))
+    vista = order_view.get(storage, pedido.id)
+    assert len(vista['items']) == 3
+    assert _documento(storage, pedido.id) == _construido(storage, pedido.id)
+
+
+def test_concurrent_change_during_rebuild_is_not_saved(monkeypatch, storage, catalogo, nuevo_pedido):
+    pedido = nuevo_pedido()
+    original = order_view._construir
+    
+    def con_cambio_concurrente(storage_, pedido_id):
+        campos = original(storage_, pedido_id)
+        _nuevo_item(storage, pedido, catalogo)
+        return campos
+    
+    monkeypatch.setattr(order_view, '_construir', con_cambio_concurrente)
+    order_view.get(storage, pedido.id)
+    
+    assert not storage.client_for(Pedido, pedido.id).exists(order_view.clave(pedido.id))
+
+
+def test_deleting_order_objects_invalidates(storage, pedido):
+    item = _items(storage, pedido.id)[0]
+    storage.delete(item.id)
+    assert len(order_view.get(storage, pedido.id)['items']) == 1
+    
+    storage.delete(pedido.id)
+    assert order_view.get(storage, pedido.id) is None
@@ -0,0 +1,103 @@
+"""Carga en lote por id y resolución de referencias con un número fijo de viajes a Redis."""
+
+import threading
+
+import pytest
+import redis.connection
+
+from app.models.cliente import Cliente
+from app.models.pedido import ItemPedido
+from app.models.producto import Producto
+from app.services import tenancy
+
+
+@pytest.fixture
+def viajes(monkeypatch):
+    """Contar los envíos a Redis del hilo de la prueba (un pipeline es un envío)."""
+    monkeypatch.setattr(tenancy.usage, 'intervalo', 3600)
+    hilo = threading.get_ident()
+    contador = [0]
+    original = redis.connection.AbstractConnection.send_packed_command
+    
+    def contar(self, *args, **kwargs):
+        if threading.get_ident() == hilo:
+            contador[0] += 1
+        return original(self, *args, **kwargs)
+    
+    monkeypatch.setattr(redis.connection.AbstractConnection, 'send_packed_command', contar)
+    
+    def medir(funcion):
+        antes = contador[0]
+        funcion()
+        return contador[0] - antes
+    
+    return medir
+
+
+def _clientes(storage, cuantos):
+    clientes = [Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com') for i in range(cuantos)]
+    for cliente in clientes:
+        storage.save(cliente)
+    return clientes
+
+
+def _items(storage, cuantos):
+    items = []
+    for i in range(cuantos):
+        producto = Producto(f'Producto {i}', 'camiseta', 10.0)
+        storage.save(producto)
+        item = ItemPedido(producto.id, 'M', 'rojo', 1, 10.0)
+        item.pedido_id = 'pedido'
+        items.append(item)
+    return items
+
+
+def test_load_many_devuelve_los_existentes_de_la_clase(storage, catalogo):
+    clientes = _clientes(storage, 3)
+    ids = [c.id for c in clientes]
+    
+    cargados = storage.load_many(ids + ids[:1] + ['no-existe', '', catalogo.producto.id], Cliente)
+    
+    assert sorted(cargados) == sorted(ids)
+    assert cargados[ids[1]].nombre == 'Cliente 1'
+    assert set(storage.load_many([catalogo.producto.id, ids[0]])) == {catalogo.producto.id, ids[0]}
+
+
+def test_load_many_no_depende_del_numero_de_ids(storage, viajes):
+    pocos = [c.id for c in _clientes(storage, 3)]
+    muchos = [c.id for c in _clientes(storage, 12)]
+    
+    con_pocos = viajes(lambda: storage.load_many(pocos, Cliente))
+    
+    assert 0 < con_pocos == viajes(lambda: storage.load_many(muchos, Cliente))
+
+
+def test_prefetch_asigna_las_referencias(storage, catalogo):
+    items = _items(storage, 2)
+    huerfano = ItemPedido('no-existe', 'M', 'rojo', 1, 10.0)
+    
+    storage.prefetch(items + [huerfano, None], {'producto_id': Producto})
+    
+    assert [item.producto.nombre for item in items] == ['Producto 0', 'Producto 1']
+    assert huerfano.producto is None
+
+
+def test_prefetch_descarta_objetos_de_otra_clase(storage, catalogo):
+    item = ItemPedido(catalogo.cliente.id, 'M', 'rojo', 1, 10.0)
+    
+    storage.prefetch([item], {'producto_id': Producto})
+    
+    assert item.producto is None
+
+
+def test_prefetch_exige_campos_de_id(storage):
+    with pytest.raises(ValueError):
+        storage.prefetch([], {'producto': Producto})
+
+
+def test_prefetch_no_depende_del_numero_de_objetos(storage, viajes):
+    pocos = _items(storage, 2)
+    muchos = _items(storage, 10)
+    
+    assert (viajes(lambda: storage.prefetch(pocos, {'producto_id': Producto}))
+            == viajes(lambda: storage.prefetch(muchos, {'producto_id': Producto})))
@@ -0,0 +1,112 @@
+"""Cotización por lotes frente a las fórmulas de Proceso, diseño a diseño."""
+
+import random
+
+import pytest
+
+from app.models.pedido import ItemPedido, Pedido, Personalizacion
+from app.models.proceso import Proceso, TamañoBordado, TipoProceso
+from app.routes import pedidos as rutas_pedidos
+from app.services import pricing
+
+
+def _procesos():
+    dtf = Proceso(TipoProceso.DTF, 'DTF')
+    sublimacion = Proceso(TipoProceso.SUBLIMACION, 'Sublimación')
+    sublimacion.configurar_precios(precio_por_metro=150.0)
+    bordado = Proceso(TipoProceso.BORDADO, 'Bordado')
+    vinil = Proceso(TipoProceso.VINIL, 'Vinil')
+    vinil.configurar_precios(precio_por_cm2=0.025, tipos_vinil={'Textil': 0.035})
+    return [dtf, sublimacion, bordado, vinil]
+
+
+def _diseños(semilla, n=400):
+    aleatorio = random.Random(semilla)
+    procesos = _procesos()
+    diseños = []
+    for _ in range(n):
+        proceso = aleatorio.choice(procesos)
+        if proceso.tipo == TipoProceso.BORDADO.value:
+            opcion = aleatorio.choice([t.value for t in TamañoBordado] + ['DESCONOCIDO'])
+        elif proceso.tipo == TipoProceso.VINIL.value:
+            opcion = aleatorio.choice(['Textil', 'Glitter', 'Otro'])
+        else:
+            opcion = None
+        diseños.append((proceso, round(aleatorio.uniform(1, 70), 1), round(aleatorio.uniform(1, 40), 1),
+                        aleatorio.randint(1, 60), opcion))
+    return diseños
+
+
+def _esperado(proceso, ancho, alto, cantidad, opcion, incluir_setup=True):
+    """Metros y precio con los métodos de Proceso."""
+    tipo = proceso.get_tipo_enum()
+    if tipo == TipoProceso.BORDADO:
+        tamaño = TamañoBordado(opcion) if opcion in {t.value for t in TamañoBordado} else opcion
+        return 0.0, proceso.calcular_precio_bordado(tamaño, cantidad, incluir_setup)
+    if tipo == TipoProceso.VINIL:
+        return 0.0, proceso.calcular_precio_vinil(ancho, alto, cantidad, opcion)
+    return (proceso.calcular_metros_necesarios(ancho, alto, cantidad),
+            proceso.calcular_precio_dtf_sublimacion(ancho, alto, cantidad))
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def motor(request, monkeypatch):
+    """Cotizar con NumPy y con el bucle de respaldo."""
+    if request.param == 'python':
+        monkeypatch.setattr(pricing, 'HAS_NUMPY', False)
+    elif not pricing.HAS_NUMPY:
+        pytest.skip('NumPy no está instalado')
+    return request.param
+
+
+@pytest.mark.parametrize('semilla', range(3))
+@pytest.mark.parametrize('incluir_setup', [True, False])
+def test_el_lote_coincide_con_proceso(motor, semilla, incluir_setup):
+    diseños = _diseños(semilla)
+    
+    lote = pricing.cotizar_lote(*map(list, zip(*diseños)), incluir_setup=incluir_setup)
+    
+    esperados = [_esperado(*d, incluir_setup=incluir_setup) for d in diseños]
+    assert list(lote.metros) == pytest.approx([m for m, _ in esperados])
+    assert list(lote.precios) == pytest.approx([p for _, p in esperados])
+
+
+def test_la_tarifa_compilada_coincide_con_proceso():
+    for proceso, ancho, alto, cantidad, opcion in _diseños(7, 100):
+        tarifa = pricing.compilar(proceso)
+        metros, precio = _esperado(proceso, ancho, alto, cantidad, opcion)
+        
+        assert tarifa.metros(ancho, alto, cantidad) == pytest.approx(metros)
+        assert tarifa.precio(ancho, alto, cantidad, opcion) == pytest.approx(precio)
+
+
+def test_lote_vacio_y_sin_formula(motor):
+    sin_tipo = Proceso(TipoProceso.DTF, 'Roto')
+    sin_tipo.tipo = 'SERIGRAFIA'
+    
+    assert list(pricing.cotizar_lote([], [], [], []).precios) == []
+    assert list(pricing.cotizar_lote([sin_tipo], [10.0], [10.0], [3]).precios) == [0.0]
+
+
+def test_las_columnas_deben_tener_la_misma_longitud():
+    with pytest.raises(ValueError):
+        pricing.cotizar_lote(_procesos()[:2], [10.0], [10.0, 5.0], [1, 2])
+
+
+def test_calcular_totales_cotiza_las_personalizaciones_sin_precio(storage, catalogo):
+    pedido = Pedido(cliente_id=catalogo.cliente.id)
+    storage.save(pedido)
+    item = ItemPedido(catalogo.producto.id, 'M', 'rojo', 4, 10.0)
+    item.pedido_id = pedido.id
+    storage.save(item)
+    pers = Personalizacion(catalogo.proceso.id, 0.0, 4)
+    pers.item_pedido_id, pers.pedido_id = item.id, pedido.id
+    pers.ancho, pers.alto = 10.0, 20.0
+    storage.save(pers)
+    
+    rutas_pedidos.calcular_totales_pedido(pedido, pedido.id)
+    
+    # DTF: 2 diseños por fila de 27.5 cm, 2 filas de 20 cm = 0.4 m a 200/m
+    assert storage.get(Personalizacion, pers.id).precio_proceso == pytest.approx(20.0)
+    assert storage.get(Personalizacion, pers.id).subtotal == pytest.approx(80.0)
+    assert storage.get(ItemPedido, item.id).subtotal_personalizaciones == pytest.approx(80.0)
@@ -0,0 +1,70 @@
+"""Lotes de producción: agrupación, prioridad y equivalencia con la reconstrucción."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.pedido import PrioridadPedido
+from app.services import production_batches
+
+
+def _resumen(tablero):
+    return [(l['lote'], l['prioridad'], l['lineas'], l['piezas'], sorted(l['pedidos'])) for l in tablero['lotes']]
+
+
+@pytest.mark.parametrize('valor, esperada', [
+    ('urgente', 'URGENTE'), ('alta', 'ALTA'), ('normal', 'NORMAL'),
+    ('URGENTE', 'URGENTE'), (PrioridadPedido.ALTA, 'ALTA'), (None, 'NORMAL'), ('otra', 'NORMAL'),
+])
+def test_rango_prioridad_accepts_form_values(valor, esperada):
+    assert production_batches.PRIORIDADES[production_batches.rango_prioridad(valor)] == esperada
+
+
+def test_form_priority_is_kept(storage, nuevo_pedido):
+    # El formulario de pedidos guarda la prioridad en minúsculas
+    pedido = nuevo_pedido(prioridad='urgente')
+    
+    lotes = production_batches.tablero(storage)['lotes']
+    assert [(l['prioridad'], l['pedidos']) for l in lotes] == [('URGENTE', [pedido.id])]
+
+
+def test_urgent_batch_comes_first(storage, nuevo_pedido):
+    manana = datetime.now() + timedelta(days=1)
+    normal = nuevo_pedido(prioridad='normal', entrega=manana)
+    urgente = nuevo_pedido(prioridad='urgente', entrega=manana + timedelta(days=3))
+    
+    lotes = production_batches.tablero(storage)['lotes']
+    assert [l['pedidos'] for l in lotes] == [[urgente.id], [normal.id]]
+    assert [l['prioridad'] for l in lotes] == ['URGENTE', 'NORMAL']
+
+
+def test_same_process_and_day_share_a_batch(storage, nuevo_pedido):
+    entrega = datetime.now() + timedelta(days=2)
+    a = nuevo_pedido(entrega=entrega, lineas=2, piezas=3)
+    b = nuevo_pedido(prioridad='alta', entrega=entrega, piezas=4)
+    
+    (lote,) = production_batches.tablero(storage)['lotes']
+    assert lote['lineas'] == 3
+    assert lote['piezas'] == 10
+    assert lote['prioridad'] == 'ALTA'
+    assert lote['pedidos'] == [b.id, a.id]
+
+
+def test_incremental_matches_rebuild(storage, nuevo_pedido):
+    entrega = datetime.now() + timedelta(days=2)
+    production_batches.tablero(storage)  # Construye los lotes: desde aquí, incremental
+    a = nuevo_pedido(entrega=entrega, lineas=2)
+    b = nuevo_pedido(prioridad='alta', entrega=entrega + timedelta(days=1))
+    c = nuevo_pedido(prioridad='urgente', entrega=entrega)
+    
+    b.prioridad = 'urgente'
+    storage.save(b)
+    c.estado = 'COMPLETADO'
+    storage.save(c)
+    a.fecha_entrega_estimada = entrega + timedelta(days=5)
+    storage.save(a)
+    
+    incremental = _resumen(production_batches.tablero(storage))
+    production_batches.rebuild(storage)
+    assert incremental == _resumen(production_batches.tablero(storage))
+    assert [l[4] for l in incremental] == [[b.id], [a.id]]
@@ -0,0 +1,121 @@
+"""Planificador de consultas: elección de plan y equivalencia de resultados."""
+
+import pytest
+from sirope.utils import full_name_from_obj
+
+from app.models.cliente import Cliente
+from app.models.pedido import EstadoPedido, Pedido, PrioridadPedido
+from app.services.query import PLAN_ID, PLAN_INDICE, PLAN_SCAN
+
+
+@pytest.fixture
+def pedidos(storage):
+    cliente = Cliente(nombre='Ana', email='ana@example.com')
+    otro = Cliente(nombre='Luis', email='luis@example.com')
+    storage.save(cliente)
+    storage.save(otro)
+    pedidos = []
+    for i in range(30):
+        pedido = Pedido(
+            cliente_id=cliente.id if i % 10 else otro.id,
+            estado=EstadoPedido.EN_PROCESO if i % 7 == 0 else EstadoPedido.PENDIENTE,
+            prioridad=PrioridadPedido.URGENTE if i % 5 == 0 else PrioridadPedido.NORMAL,
+        )
+        storage.save(pedido)
+        pedidos.append(pedido)
+    return {'cliente': cliente, 'otro': otro, 'pedidos': pedidos}
+
+
+def _ids(objetos):
+    return sorted(str(o.id) for o in objetos)
+
+
+def _esperados(pedidos, **criterios):
+    def valor(v):
+        return getattr(v, 'value', v)
+    return sorted(
+        p.id for p in pedidos
+        if all(valor(getattr(p, campo)) == valor(esperado) for campo, esperado in criterios.items())
+    )
+
+
+def test_selective_indexed_filter_uses_index(storage, pedidos):
+    consulta = storage.query(Pedido).where(estado=EstadoPedido.EN_PROCESO)
+    
+    assert consulta.explain()['plan'] == PLAN_INDICE
+    assert _ids(consulta.all()) == _esperados(pedidos['pedidos'], estado=EstadoPedido.EN_PROCESO)
+
+
+def test_unselective_filter_falls_back_to_scan(storage, pedidos):
+    # is_active=True lo cumplen todos: el índice no ahorra lecturas
+    consulta = storage.query(Pedido).where(is_active=True)
+    
+    assert consulta.explain()['plan'] == PLAN_SCAN
+    assert len(consulta.all()) == 30
+
+
+def test_non_indexed_field_uses_scan(storage, pedidos):
+    numero = pedidos['pedidos'][3].numero_pedido
+    consulta = storage.query(Pedido).where(numero_pedido=numero)
+    
+    assert consulta.explain()['plan'] == PLAN_SCAN
+    assert numero in [p.numero_pedido for p in consulta.all()]
+
+
+def test_id_lookup(storage, pedidos):
+    pedido = pedidos['pedidos'][4]
+    consulta = storage.query(Pedido).where(id=pedido.id)
+    
+    assert consulta.explain()['plan'] == PLAN_ID
+    assert _ids(consulta.all()) == [pedido.id]
+
+
+@pytest.mark.parametrize('criterios', [
+    {'estado': EstadoPedido.EN_PROCESO},
+    {'estado': 'PENDIENTE', 'prioridad': PrioridadPedido.URGENTE},
+    {'prioridad': 'URGENTE'},
+])
+def test_index_and_scan_return_same_results(storage, pedidos, criterios):
+    criterios = dict(criterios, cliente_id=pedidos['cliente'].id)
+    por_indice = storage.query(Pedido).where(**criterios)
+    assert por_indice.explain()['plan'] == PLAN_INDICE
+    resultado_indice = _ids(por_indice.all())
+    
+    # Sin la marca de índice completo el planificador no puede usarlo
+    storage.client_for(Pedido, '').delete(storage._index_ready_key(full_name_from_obj(Pedido)))
+    por_scan = storage.query(Pedido).where(**criterios)
+    assert por_scan.explain()['plan'] == PLAN_SCAN
+    
+    assert _ids(por_scan.all()) == resultado_indice
+    assert resultado_indice == _esperados(pedidos['pedidos'], **criterios)
+
+
+def test_in_filter_and_ordering(storage, pedidos):
+    consulta = (
+        storage.query(Pedido)
+        .where(cliente_id__in=[pedidos['otro'].id], estado__in=['PENDIENTE', 'EN_PROCESO'])
+        .order_by('-numero_pedido')
+        .limit(2)
+    )
+    resultado = consulta.all()
+    
+    esperados = sorted(
+        (p for p in pedidos['pedidos'] if p.cliente_id == pedidos['otro'].id),
+        key=lambda p: p.numero_pedido, reverse=True
+    )[:2]
+    assert [p.numero_pedido for p in resultado] == [p.numero_pedido for p in esperados]
+
+
+def test_index_follows_updates(storage, pedidos):
+    pedido = pedidos['pedidos'][1]
+    pedido.estado = EstadoPedido.COMPLETADO
+    storage.save(pedido)
+    
+    assert _ids(storage.query(Pedido).where(estado='COMPLETADO').all()) == [pedido.id]
+    assert pedido.id not in _ids(storage.query(Pedido).where(estado='PENDIENTE').all())
+
+
+def test_fresh_class_is_index_ready_after_first_save(storage):
+    assert storage.index_ready(Pedido)
+    storage.save(Pedido(cliente_id='x'))
+    assert storage.index_ready(Pedido)
@@ -0,0 +1,102 @@
+"""Caché de resultados de consultas invalidada por generaciones de clase."""
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.models.pedido import EstadoPedido, Pedido
+from app.services.query_cache import QueryResultCache
+
+
+@pytest.fixture
+def cache():
+    cache = QueryResultCache()
+    cache.configure(max_entries=2)
+    return cache
+
+
+@pytest.fixture
+def pedidos(storage, catalogo):
+    pedidos = [
+        Pedido(cliente_id=catalogo.cliente.id,
+               estado=EstadoPedido.EN_PROCESO if i % 2 else EstadoPedido.PENDIENTE)
+        for i in range(6)
+    ]
+    for pedido in pedidos:
+        storage.save(pedido)
+    return pedidos
+
+
+def _forma(storage, forma):
+    return dict(storage.results_cache().stats()['formas'].get(forma, {'hits': 0, 'misses': 0, 'stale': 0}))
+
+
+def test_solo_se_sirve_con_la_misma_generacion(cache):
+    cache.put(('a',), 1, ['{}'])
+    
+    assert cache.get(('a',), 'A', 1) == ['{}']
+    assert cache.get(('a',), 'A', 2) is None
+    assert cache.get(('a',), 'A', 1) is None
+    assert cache.stats()['formas']['A'] == {'hits': 1, 'misses': 2, 'stale': 1, 'hit_ratio': 0.3333}
+
+
+def test_un_resultado_antiguo_no_sustituye_a_uno_nuevo(cache):
+    cache.put(('a',), 3, ['nuevo'])
+    cache.put(('a',), 2, ['viejo'])
+    
+    assert cache.get(('a',), 'A', 3) == ['nuevo']
+
+
+def test_lru_con_tope_de_entradas(cache):
+    for clave in 'abc':
+        cache.put((clave,), 0, [])
+    
+    assert cache.get(('a',), 'A', 0) is None
+    assert cache.stats()['evictions'] == 1 and cache.stats()['size'] == 2
+
+
+def test_se_sirve_de_la_cache_mientras_la_clase_no_cambia(storage, pedidos):
+    forma = 'Pedido(estado)'
+    consulta = storage.query(Pedido).where(estado=EstadoPedido.EN_PROCESO).cached()
+    primera = consulta.all()
+    antes = _forma(storage, forma)
+    
+    segunda = consulta.all()
+    
+    assert sorted(p.id for p in segunda) == sorted(p.id for p in primera) == sorted(p.id for p in pedidos[1::2])
+    assert _forma(storage, forma)['hits'] == antes['hits'] + 1
+    assert segunda[0] is not primera[0]
+
+
+def test_una_escritura_de_la_clase_invalida_el_resultado(storage, pedidos):
+    consulta = storage.query(Pedido).where(estado=EstadoPedido.EN_PROCESO).cached()
+    consulta.all()
+    
+    pedidos[0].estado = EstadoPedido.EN_PROCESO
+    storage.save(pedidos[0])
+    
+    assert pedidos[0].id in {p.id for p in consulta.all()}
+
+
+def test_las_escrituras_de_otra_clase_no_invalidan(storage, pedidos, catalogo):
+    consulta = storage.query(Pedido).where(estado=EstadoPedido.PENDIENTE).cached()
+    consulta.all()
+    antes = _forma(storage, 'Pedido(estado)')
+    
+    storage.save(Cliente(nombre='Luis', email='luis@example.com'))
+    consulta.all()
+    
+    assert _forma(storage, 'Pedido(estado)')['hits'] == antes['hits'] + 1
+
+
+def test_filtros_equivalentes_comparten_entrada(storage, pedidos):
+    storage.query(Pedido).where(estado=EstadoPedido.PENDIENTE, cliente_id=pedidos[0].cliente_id).cached().all()
+    antes = _forma(storage, 'Pedido(cliente_id,estado__in)')
+    
+    storage.query(Pedido).where(cliente_id=pedidos[0].cliente_id, estado__in=['PENDIENTE']).cached().all()
+    
+    assert _forma(storage, 'Pedido(cliente_id,estado__in)')['hits'] == antes['hits'] + 1
+
+
+def test_las_lambdas_no_se_cachean(storage):
+    with pytest.raises(ValueError):
+        storage.query(Pedido).where(lambda p: True).cached().all()
@@ -0,0 +1,69 @@
+"""Caché de cotizaciones de la calculadora de procesos fijos."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.routes import procesos
+from app.services import tenancy
+
+
+def _formulario(proceso_id='dtf', ancho=10.0, alto=10.0, cantidad=50):
+    campos = {'proceso_id': proceso_id, 'ancho_diseño': ancho, 'alto_diseño': alto, 'cantidad': cantidad}
+    return SimpleNamespace(**{nombre: SimpleNamespace(data=valor) for nombre, valor in campos.items()})
+
+
+@pytest.fixture
+def cotizaciones(storage, monkeypatch):
+    """Registra cada cotización calculada (las que no salen de la caché)."""
+    calculadas = []
+    original = procesos._cotizar_proceso_fijo
+    
+    def contar(*args):
+        calculadas.append(args[1:])
+        return original(*args)
+    
+    monkeypatch.setattr(procesos, '_cotizar_proceso_fijo', contar)
+    return calculadas
+
+
+def test_la_misma_cotizacion_sale_de_la_cache(cotizaciones):
+    primera = procesos._calcular_precio_proceso_fijo(_formulario())
+    segunda = procesos._calcular_precio_proceso_fijo(_formulario(ancho=10, alto='10'))
+    
+    assert segunda == primera
+    assert cotizaciones == [(10.0, 10.0, 50)]
+    assert primera['total'] == procesos._cotizar_proceso_fijo(procesos.PROCESOS_FIJOS['dtf'], 10.0, 10.0, 50)['total']
+
+
+def test_medidas_cantidad_o_proceso_distintos_no_coinciden(cotizaciones):
+    for formulario in (_formulario(), _formulario(ancho=12.0), _formulario(cantidad=51),
+                       _formulario(proceso_id='sublimacion')):
+        procesos._calcular_precio_proceso_fijo(formulario)
+    
+    assert len(cotizaciones) == 4
+
+
+def test_un_cambio_de_precios_deja_sin_uso_las_cotizaciones(cotizaciones, monkeypatch):
+    procesos._calcular_precio_proceso_fijo(_formulario())
+    monkeypatch.setitem(procesos.PROCESOS_FIJOS, 'dtf', dict(procesos.PROCESOS_FIJOS['dtf'], precio_por_metro=150.0))
+    monkeypatch.setattr(procesos, 'VERSION_PROCESOS_FIJOS', procesos.VERSION_PROCESOS_FIJOS + 1)
+    
+    resultado = procesos._calcular_precio_proceso_fijo(_formulario())
+    
+    assert len(cotizaciones) == 2
+    assert resultado['detalles']['precio_por_metro'] == 150.0
+
+
+def test_cada_tenant_tiene_sus_cotizaciones(cotizaciones):
+    procesos._calcular_precio_proceso_fijo(_formulario())
+    with tenancy.tenant_scope(f'otro{id(cotizaciones)}'):
+        procesos._calcular_precio_proceso_fijo(_formulario())
+    
+    assert len(cotizaciones) == 2
+
+
+def test_sin_medidas_no_se_cotiza(cotizaciones):
+    assert procesos._calcular_precio_proceso_fijo(_formulario(ancho=None)) is None
+    assert procesos._calcular_precio_proceso_fijo(_formulario(proceso_id='bordado')) is None
+    assert cotizaciones == []
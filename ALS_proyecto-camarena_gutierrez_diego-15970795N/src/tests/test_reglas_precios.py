@@ -0,0 +1,110 @@
+"""Paquete de reglas de precio para el navegador: contenido, ETag y fórmulas."""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import pytest
+
+from app.models.proceso import Proceso, TamañoBordado, TipoProceso
+from app.routes import pedidos as rutas_pedidos
+from app.services import pricing
+
+
+URL = '/procesos/api/reglas-precios'
+SCRIPT = os.path.join(os.path.dirname(__file__), '..', 'app', 'static', 'js', 'reglas_precios.js')
+
+
+@pytest.fixture
+def procesos(storage, catalogo):
+    """Un proceso activo de cada tipo y uno inactivo."""
+    creados = [catalogo.proceso]
+    for tipo in (TipoProceso.SUBLIMACION, TipoProceso.BORDADO, TipoProceso.VINIL):
+        proceso = Proceso(tipo, tipo.value.title())
+        storage.save(proceso)
+        creados.append(proceso)
+    inactivo = Proceso(TipoProceso.DTF, 'Retirado')
+    inactivo.is_active = False
+    storage.save(inactivo)
+    return creados
+
+
+def _pedir(app, client, etag=None):
+    """GET del paquete en un contexto de aplicación nuevo, como en producción."""
+    with app.app_context():
+        return client.get(URL, headers={'If-None-Match': etag} if etag else {})
+
+
+def test_el_paquete_publica_los_procesos_activos(client, procesos):
+    respuesta = client.get(URL)
+    paquete = respuesta.get_json()
+    
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] == f'"{paquete["version"]}"'
+    assert paquete['campos'] == list(pricing.CAMPOS_REGLAS)
+    assert sorted(fila[0] for fila in paquete['procesos']) == sorted(p.id for p in procesos)
+
+
+def test_sin_cambios_se_revalida_con_304(app, client, procesos):
+    etag = _pedir(app, client).headers['ETag']
+    
+    respuesta = _pedir(app, client, etag)
+    
+    assert respuesta.status_code == 304
+    assert respuesta.get_data() == b''
+
+
+def test_un_cambio_de_precio_cambia_la_version(app, client, storage, procesos):
+    etag = _pedir(app, client).headers['ETag']
+    dtf = procesos[0]
+    dtf.configurar_precios(precio_por_metro=260.0)
+    storage.save(dtf)
+    
+    respuesta = _pedir(app, client, etag)
+    
+    assert respuesta.status_code == 200
+    assert respuesta.headers['ETag'] != etag
+    fila = next(f for f in respuesta.get_json()['procesos'] if f[0] == dtf.id)
+    assert fila[pricing.CAMPOS_REGLAS.index('precio_por_metro')] == 260.0
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='Node.js no está instalado')
+def test_el_navegador_cotiza_igual_que_el_servidor(client, procesos):
+    paquete = client.get(URL).get_json()
+    aleatorio = random.Random(3)
+    casos = []
+    for _ in range(200):
+        proceso = aleatorio.choice(procesos)
+        opcion = None
+        if proceso.tipo == TipoProceso.BORDADO.value:
+            opcion = aleatorio.choice([t.value for t in TamañoBordado])
+        elif proceso.tipo == TipoProceso.VINIL.value:
+            opcion = aleatorio.choice(['Textil', 'Glitter', 'Otro'])
+        casos.append([proceso.id, round(aleatorio.uniform(1, 70), 1), round(aleatorio.uniform(1, 40), 1),
+                      aleatorio.randint(1, 60), opcion, aleatorio.random() < 0.5])
+    with open(SCRIPT, encoding='utf-8') as f:
+        codigo = f.read() + f"""
+ReglasPrecios._usar({json.dumps(paquete)});
+console.log(JSON.stringify({json.dumps(casos)}.map(c => ReglasPrecios.cotizar(...c).precio)));
+"""
+
+    salida = subprocess.run(['node', '-e', codigo], capture_output=True, text=True, check=True).stdout
+    
+    por_id = {p.id: p for p in procesos}
+    esperados = [
+        pricing.tarifas.obtener(por_id[pid]).precio(ancho, alto, cantidad, opcion, setup)
+        for pid, ancho, alto, cantidad, opcion, setup in casos
+    ]
+    assert json.loads(salida) == pytest.approx(esperados)
+
+
+def test_al_guardar_el_precio_se_calcula_en_el_servidor(app, procesos):
+    bordado = procesos[2]
+    
+    with app.test_request_context():
+        pers = rutas_pedidos.personalizacion_cotizada(bordado.id, 4, opcion='grande')
+    
+    assert pers.tamaño_bordado == 'GRANDE'
+    assert pers.precio_proceso * 4 == pytest.approx(bordado.calcular_precio_bordado(TamañoBordado.GRANDE, 4))
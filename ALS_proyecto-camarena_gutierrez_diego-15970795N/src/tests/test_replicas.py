@@ -0,0 +1,101 @@
+"""Enrutado de lecturas que toleran desfase a réplicas de Redis."""
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.services import replicas
+from app.services.storage_service import StorageService
+
+
+# Cada réplica es otro servidor fake: no recibe las escrituras del primario,
+# como una réplica con retraso
+REPLICAS = 'localhost:6391,localhost:6392'
+
+
+@pytest.fixture
+def con_replicas(app, storage, monkeypatch):
+    """Dos réplicas enlazadas (la salud se comprueba en cada lectura)."""
+    monkeypatch.setitem(app.config, 'REDIS_REPLICAS', REPLICAS)
+    monkeypatch.setitem(app.config, 'REDIS_REPLICA_HEALTH_INTERVAL', 0)
+    clientes = StorageService._clientes_replica()
+    enlace = {cliente.breaker.nombre: 'up' for cliente in clientes}
+    for cliente in clientes:
+        nombre = cliente.breaker.nombre
+        monkeypatch.setattr(cliente, 'info', lambda seccion, nombre=nombre: {
+            'role': 'slave', 'master_link_status': enlace[nombre]
+        })
+    return enlace
+
+
+@pytest.fixture
+def cliente_nuevo(storage):
+    cliente = Cliente(nombre='Beatriz', email='bea@example.com')
+    storage.save(cliente)
+    return cliente
+
+
+def _contadores():
+    return dict(replicas.router.get_stats())
+
+
+def _delta(antes, contador):
+    return replicas.router.get_stats()[contador] - antes[contador]
+
+
+def test_parse_endpoints():
+    assert replicas.parse_endpoints(' redis-a:6380 , redis-b:6381/2,redis-c', 1) == [
+        ('redis-a', 6380, 1), ('redis-b', 6381, 2), ('redis-c', 6379, 1)
+    ]
+    assert replicas.parse_endpoints('') == []
+
+
+def test_las_lecturas_con_desfase_van_a_una_replica(con_replicas, cliente_nuevo):
+    antes = _contadores()
+    
+    assert StorageService(stale_ok=True).find_all(Cliente) == []
+    assert [c.id for c in StorageService().find_all(Cliente)] == [cliente_nuevo.id]
+    assert _delta(antes, 'replica_reads') == 1
+
+
+def test_las_replicas_se_usan_por_turno(con_replicas, monkeypatch):
+    elegidas = []
+    original = replicas.ReplicaRouter.choose
+    
+    def anotar(self, clientes, intervalo_salud=1.0):
+        cliente = original(self, clientes, intervalo_salud)
+        elegidas.append(cliente.breaker.nombre)
+        return cliente
+    
+    monkeypatch.setattr(replicas.ReplicaRouter, 'choose', anotar)
+    for _ in range(4):
+        StorageService(stale_ok=True).find_all(Cliente)
+    
+    assert len(set(elegidas)) == 2
+    assert elegidas[:2] == elegidas[2:]
+
+
+def test_una_replica_desenlazada_se_salta(con_replicas, cliente_nuevo):
+    for nombre in con_replicas:
+        con_replicas[nombre] = 'down'
+    antes = _contadores()
+    
+    assert [c.id for c in StorageService(stale_ok=True).find_all(Cliente)] == [cliente_nuevo.id]
+    assert _delta(antes, 'skipped_unhealthy') == 2
+    assert _delta(antes, 'primary_reads') == 1
+
+
+def test_tras_escribir_la_sesion_lee_del_primario(app, con_replicas, cliente_nuevo):
+    antes = _contadores()
+    with app.test_request_context():
+        replicas.marcar_escritura()
+        assert [c.id for c in StorageService(stale_ok=True).find_all(Cliente)] == [cliente_nuevo.id]
+    
+    assert _delta(antes, 'read_your_writes') == 1
+    assert _delta(antes, 'replica_reads') == 0
+
+
+def test_sin_desfase_no_se_usan_replicas(con_replicas, cliente_nuevo):
+    antes = _contadores()
+    
+    assert [c.id for c in StorageService().find_all(Cliente)] == [cliente_nuevo.id]
+    assert _delta(antes, 'replica_reads') == 0
@@ -0,0 +1,164 @@
+"""Repreciado de pedidos abiertos: reintentos, trabajos parciales y ediciones concurrentes."""
+
+import pytest
+from redis.exceptions import WatchError
+
+from app.models.pedido import ItemPedido, Pedido
+from app.services import order_view, repricing
+
+
+@pytest.fixture
+def precio_nuevo(storage, catalogo):
+    """Sube el precio base del producto del catálogo de 10 a 20."""
+    catalogo.producto.precio_base = 20.0
+    storage.save(catalogo.producto)
+    return 20.0
+
+
+def _repreciar(storage, catalogo):
+    trabajo_id = repricing.encolar(storage, repricing.PRODUCTO, catalogo.producto.id)
+    assert repricing.ejecutar(storage, trabajo_id)
+    return repricing.estado(storage, trabajo_id)
+
+
+def _item(storage, pedido_id):
+    return storage.query(ItemPedido).where(pedido_id=pedido_id, is_active=True).first()
+
+
+def test_repreciar_actualiza_los_pedidos_abiertos(storage, catalogo, nuevo_pedido, precio_nuevo):
+    abiertos = [nuevo_pedido() for _ in range(3)]
+    entregado = nuevo_pedido(estado='ENTREGADO')
+    
+    trabajo = _repreciar(storage, catalogo)
+    
+    assert trabajo['estado'] == repricing.COMPLETADO
+    assert (trabajo['total'], trabajo['actualizados'], trabajo['errores']) == (3, 3, 0)
+    for pedido in abiertos:
+        assert _item(storage, pedido.id).precio_prenda == precio_nuevo
+        assert storage.get(Pedido, pedido.id).subtotal == precio_nuevo * 2 + 5.0 * 2
+    assert _item(storage, entregado.id).precio_prenda == 10.0
+
+
+def test_un_lote_que_falla_se_reintenta(storage, catalogo, nuevo_pedido, precio_nuevo, monkeypatch):
+    pedido = nuevo_pedido()
+    original = repricing._repreciar_lote
+    llamadas = []
+    
+    def falla_una_vez(*args):
+        llamadas.append(args)
+        if len(llamadas) == 1:
+            raise ConnectionError('caída momentánea')
+        return original(*args)
+    
+    monkeypatch.setattr(repricing, '_repreciar_lote', falla_una_vez)
+    trabajo = _repreciar(storage, catalogo)
+    
+    assert len(llamadas) == 2
+    assert trabajo['estado'] == repricing.COMPLETADO
+    assert trabajo['errores'] == 0
+    assert _item(storage, pedido.id).precio_prenda == precio_nuevo
+
+
+def test_un_lote_que_sigue_fallando_deja_el_trabajo_parcial(storage, app, catalogo, nuevo_pedido, precio_nuevo,
+                                                            monkeypatch):
+    pedidos = sorted((nuevo_pedido() for _ in range(3)), key=lambda p: p.id)
+    roto = pedidos[1].id
+    monkeypatch.setitem(app.config, 'REPRICING_BATCH_SIZE', 1)
+    original = repricing._repreciar_lote
+    intentos = []
+    
+    def falla_con_roto(storage, tipo, referencia, lote):
+        if roto in lote:
+            intentos.append(lote)
+            raise ConnectionError('nodo caído')
+        return original(storage, tipo, referencia, lote)
+    
+    monkeypatch.setattr(repricing, '_repreciar_lote', falla_con_roto)
+    trabajo = _repreciar(storage, catalogo)
+    
+    assert len(intentos) == repricing.REINTENTOS
+    assert trabajo['estado'] == repricing.PARCIAL
+    assert trabajo['fallidos'] == [roto]
+    assert (trabajo['actualizados'], trabajo['errores']) == (2, 1)
+    assert _item(storage, roto).precio_prenda == 10.0
+    # Un trabajo parcial está terminado: ejecutarlo otra vez no hace nada
+    assert repricing.ejecutar(storage, trabajo['id'])
+    assert len(intentos) == repricing.REINTENTOS
+    
+    # Arreglado el fallo, se reintentan solo los fallidos
+    monkeypatch.setattr(repricing, '_repreciar_lote', original)
+    assert repricing.reintentar(storage, trabajo['id'])
+    assert repricing.ejecutar(storage, trabajo['id'])
+    trabajo = repricing.estado(storage, trabajo['id'])
+    assert trabajo['estado'] == repricing.COMPLETADO
+    assert (trabajo['total'], trabajo['errores']) == (1, 0)
+    assert _item(storage, roto).precio_prenda == precio_nuevo
+
+
+def test_reintentar_solo_trabajos_parciales(storage, catalogo, nuevo_pedido, precio_nuevo):
+    nuevo_pedido()
+    trabajo = _repreciar(storage, catalogo)
+    
+    assert not repricing.reintentar(storage, trabajo['id'])
+    assert not repricing.reintentar(storage, 'no-existe')
+
+
+def test_una_edicion_concurrente_no_se_pisa(storage, catalogo, nuevo_pedido, precio_nuevo, monkeypatch):
+    pedido = nuevo_pedido()
+    original = repricing._cotizar_lote
+    cotizaciones = []
+    
+    def con_edicion(storage, tipo, referencia, pedido_ids):
+        resultado = original(storage, tipo, referencia, pedido_ids)
+        cotizaciones.append(pedido_ids)
+        if len(cotizaciones) == 1:
+            # Alguien cambia la cantidad entre la lectura y la escritura
+            item = storage.get(ItemPedido, _item(storage, pedido.id).id)
+            item.cantidad = 3
+            storage.save(item)
+        return resultado
+    
+    monkeypatch.setattr(repricing, '_cotizar_lote', con_edicion)
+    trabajo = _repreciar(storage, catalogo)
+    
+    # El pedido se volvió a cargar y cotizar con la cantidad nueva
+    assert cotizaciones == [[pedido.id], [pedido.id]]
+    assert trabajo['estado'] == repricing.COMPLETADO
+    item = _item(storage, pedido.id)
+    assert (item.cantidad, item.precio_prenda, item.subtotal) == (3, precio_nuevo, precio_nuevo * 3)
+    assert storage.get(Pedido, pedido.id).subtotal == precio_nuevo * 3 + 5.0 * 2
+
+
+def test_un_pedido_que_no_deja_de_cambiar_queda_fallido(storage, catalogo, nuevo_pedido, precio_nuevo,
+                                                        monkeypatch):
+    pedido = nuevo_pedido()
+    original = repricing._cotizar_lote
+    
+    def siempre_editado(storage, tipo, referencia, pedido_ids):
+        resultado = original(storage, tipo, referencia, pedido_ids)
+        order_view.invalidate(storage, pedido.id)  # Sube el contador de cambios
+        return resultado
+    
+    monkeypatch.setattr(repricing, '_cotizar_lote', siempre_editado)
+    trabajo = _repreciar(storage, catalogo)
+    
+    assert trabajo['estado'] == repricing.PARCIAL
+    assert trabajo['fallidos'] == [pedido.id]
+    assert _item(storage, pedido.id).precio_prenda == 10.0
+
+
+def test_save_many_vigilado_no_escribe_si_cambio_el_contador(storage, nuevo_pedido):
+    pedido = nuevo_pedido()
+    clave = order_view.clave_cambios(pedido.id)
+    version = storage.client_for(Pedido, pedido.id).get(clave)
+    order_view.invalidate(storage, pedido.id)
+    
+    pedido.subtotal = 999.0
+    with pytest.raises(WatchError):
+        storage.save_many([pedido], si_no_cambian={clave: version})
+    storage.cache().clear()
+    assert storage.get(Pedido, pedido.id).subtotal != 999.0
+    
+    version = storage.client_for(Pedido, pedido.id).get(clave)
+    assert storage.save_many([pedido], si_no_cambian={clave: version}) == 1
+    assert storage.get(Pedido, pedido.id).subtotal == 999.0
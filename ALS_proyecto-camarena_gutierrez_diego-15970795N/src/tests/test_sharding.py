@@ -0,0 +1,112 @@
+"""Reparto de los datos entre varios nodos Redis con hashing consistente."""
+
+import uuid
+
+import pytest
+
+from app.models.cliente import Cliente
+from app.models.pedido import ItemPedido, Pedido, Personalizacion
+from app.services import sharding
+
+
+# Nodos adicionales al principal: otros servidores fake
+SHARDS = 'localhost:6393,localhost:6394'
+
+
+@pytest.fixture
+def shards(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'REDIS_SHARDS', SHARDS)
+
+
+def _nodo(storage, obj_id, tenant):
+    return storage._resolver_oid(obj_id, tenant=tenant)[1]
+
+
+def test_el_anillo_es_estable_y_reparte():
+    anillo = sharding.HashRing(['a', 'b', 'c'])
+    claves = [uuid.uuid4().hex for _ in range(3000)]
+    
+    asignados = [anillo.node_for(c) for c in claves]
+    
+    assert asignados == [sharding.HashRing(['a', 'b', 'c']).node_for(c) for c in claves]
+    for nodo in 'abc':
+        assert 700 < asignados.count(nodo) < 1300
+
+
+def test_añadir_un_nodo_solo_mueve_su_parte():
+    claves = [uuid.uuid4().hex for _ in range(3000)]
+    antes = sharding.HashRing(['a', 'b'])
+    despues = sharding.HashRing(['a', 'b', 'c'])
+    
+    movidas = [c for c in claves if antes.node_for(c) != despues.node_for(c)]
+    
+    assert {despues.node_for(c) for c in movidas} == {'c'}
+    assert len(movidas) < len(claves) * 0.45
+
+
+def test_un_solo_nodo():
+    assert sharding.HashRing(['a']).node_for('cualquiera') == 'a'
+
+
+def test_las_filas_de_un_pedido_usan_su_id_como_clave():
+    item = ItemPedido('producto', 'M', 'rojo', 1, 10.0)
+    item.pedido_id = 'pedido-1'
+    cliente = Cliente(nombre='Ana', email='ana@example.com')
+    
+    assert sharding.shard_key(item) == 'pedido-1'
+    assert sharding.shard_key(cliente) == cliente.id
+
+
+def test_scatter_conserva_el_orden_y_propaga_errores():
+    assert sharding.scatter(lambda n: n * 2, [1, 2, 3]) == [2, 4, 6]
+    
+    def falla(n):
+        if n == 2:
+            raise ConnectionError('nodo caído')
+        return n
+    
+    with pytest.raises(ConnectionError):
+        sharding.scatter(falla, [1, 2, 3])
+
+
+def test_los_objetos_se_reparten_y_se_leen_de_todos_los_nodos(shards, storage, tenant):
+    clientes = [Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com') for i in range(30)]
+    for cliente in clientes:
+        storage.save(cliente)
+    
+    assert len({_nodo(storage, c.id, tenant) for c in clientes}) == 3
+    assert sorted(c.id for c in storage.find_all(Cliente)) == sorted(c.id for c in clientes)
+    assert storage.load(clientes[7].id).nombre == 'Cliente 7'
+    assert [c.id for c in storage.query(Cliente).where(email='c3@example.com').all()] == [clientes[3].id]
+
+
+def test_un_pedido_y_sus_filas_viven_en_el_mismo_nodo(shards, storage, tenant, nuevo_pedido):
+    pedidos = [nuevo_pedido(lineas=2) for _ in range(6)]
+    
+    for pedido in pedidos:
+        nodo = _nodo(storage, pedido.id, tenant)
+        items = storage.query(ItemPedido).where(pedido_id=pedido.id).all()
+        personalizaciones = storage.query(Personalizacion).where(pedido_id=pedido.id).all()
+        assert len(items) == len(personalizaciones) == 2
+        assert {_nodo(storage, o.id, tenant) for o in items + personalizaciones} == {nodo}
+        assert storage._anillo().node_for(pedido.id) == nodo
+
+
+def test_rebalance_mueve_a_su_nodo_lo_guardado_antes_de_los_shards(app, storage, tenant, monkeypatch):
+    clientes = [Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com') for i in range(20)]
+    for cliente in clientes:
+        storage.save(cliente)
+    principal = storage._nodo_principal()
+    assert {_nodo(storage, c.id, tenant) for c in clientes} == {principal}
+    
+    monkeypatch.setitem(app.config, 'REDIS_SHARDS', SHARDS)
+    storage.rebalance_directory()
+    contadores = storage.rebalance(Cliente, pause=0)
+    
+    anillo = storage._anillo()
+    fuera = [c for c in clientes if anillo.node_for(c.id) != principal]
+    assert fuera and contadores['movidos'] == len(fuera)
+    for cliente in clientes:
+        assert _nodo(storage, cliente.id, tenant) == anillo.node_for(cliente.id)
+        assert storage.load(cliente.id).email == cliente.email
+    assert storage.rebalance(Cliente, pause=0)['movidos'] == 0
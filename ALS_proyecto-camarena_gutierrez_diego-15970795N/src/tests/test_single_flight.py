@@ -0,0 +1,139 @@
+"""Coalescencia de cálculos costosos en el proceso y entre workers."""
+
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import redis
+
+from app.models.cliente import Cliente
+from app.models.pedido import Pedido
+from app.services.single_flight import SingleFlight
+
+
+class _RedisCaido:
+    """Cliente cuyos comandos fallan como un Redis inaccesible."""
+    
+    def __getattr__(self, nombre):
+        def fallar(*args, **kwargs):
+            raise redis.ConnectionError('sin conexión')
+        return fallar
+
+
+@pytest.fixture
+def coalescencia():
+    coalescencia = SingleFlight()
+    coalescencia.configure(ttl=5, lock_timeout=5, wait_timeout=2)
+    return coalescencia
+
+
+@pytest.fixture
+def clave():
+    return f'prueba:{uuid.uuid4().hex}'
+
+
+def _calculo_lento(llamadas, segundos=0.2):
+    def calcular():
+        llamadas.append(1)
+        time.sleep(segundos)
+        return {'total': 42}
+    return calcular
+
+
+def test_los_hilos_esperan_al_que_calcula(coalescencia, clave):
+    llamadas = []
+    calcular = _calculo_lento(llamadas)
+    
+    with ThreadPoolExecutor(8) as ejecutor:
+        resultados = list(ejecutor.map(lambda _: coalescencia.do(redis.Redis(), clave, calcular), range(8)))
+    
+    assert len(llamadas) == 1
+    assert resultados == [{'total': 42}] * 8
+    assert len({id(r) for r in resultados}) == 8
+    assert coalescencia.stats()['computed'] == 1
+    assert coalescencia.stats()['coalesced'] + coalescencia.stats()['shared'] == 7
+
+
+def test_otro_worker_reutiliza_el_resultado_publicado(coalescencia, clave):
+    otro_worker = SingleFlight()
+    llamadas = []
+    
+    coalescencia.do(redis.Redis(), clave, _calculo_lento(llamadas, 0))
+    resultado = otro_worker.do(redis.Redis(), clave, _calculo_lento(llamadas, 0))
+    
+    assert resultado == {'total': 42}
+    assert len(llamadas) == 1
+    assert otro_worker.stats()['shared'] == 1
+
+
+def test_sin_lock_se_espera_a_la_publicacion(coalescencia, clave):
+    cliente = redis.Redis()
+    cliente.set(f'sf:{clave}:lock', 'otro-worker', px=5000)
+    
+    def publicar():
+        time.sleep(0.2)
+        cliente.set(f'sf:{clave}', '{"total": 7}')
+        cliente.delete(f'sf:{clave}:lock')
+    
+    threading.Thread(target=publicar).start()
+    llamadas = []
+    
+    assert coalescencia.do(cliente, clave, _calculo_lento(llamadas, 0)) == {'total': 7}
+    assert llamadas == []
+
+
+def test_el_error_del_que_calcula_llega_a_los_que_esperan(coalescencia, clave):
+    def fallar():
+        time.sleep(0.2)
+        raise RuntimeError('cálculo fallido')
+    
+    with ThreadPoolExecutor(4) as ejecutor:
+        futuros = [ejecutor.submit(coalescencia.do, redis.Redis(), clave, fallar) for _ in range(4)]
+        for futuro in futuros:
+            with pytest.raises(RuntimeError):
+                futuro.result()
+
+
+def test_sin_redis_cada_peticion_calcula(app, coalescencia, clave):
+    llamadas = []
+    
+    with app.app_context():
+        resultado = coalescencia.do(_RedisCaido(), clave, _calculo_lento(llamadas, 0))
+    
+    assert resultado == {'total': 42} and len(llamadas) == 1
+    assert coalescencia.stats()['fallbacks'] == 1
+
+
+def test_version_async(coalescencia, clave):
+    llamadas = []
+    
+    async def calcular():
+        llamadas.append(1)
+        await asyncio.sleep(0.2)
+        return [1, 2]
+    
+    async def pedir_a_la_vez():
+        return await asyncio.gather(*(coalescencia.do_async(redis.Redis(), clave, calcular) for _ in range(4)))
+    
+    assert asyncio.run(pedir_a_la_vez()) == [[1, 2]] * 4
+    assert len(llamadas) == 1
+
+
+def test_una_escritura_en_una_clase_de_la_que_depende_recalcula(storage, catalogo):
+    llamadas = []
+    
+    def calcular():
+        llamadas.append(1)
+        return len(storage.find_all(Pedido))
+    
+    assert storage.coalesce('pedidos', calcular, depende_de=(Pedido,)) == 0
+    storage.save(Cliente(nombre='Luis', email='luis@example.com'))
+    assert storage.coalesce('pedidos', calcular, depende_de=(Pedido,)) == 0
+    assert len(llamadas) == 1
+    
+    storage.save(Pedido(cliente_id=catalogo.cliente.id))
+    assert storage.coalesce('pedidos', calcular, depende_de=(Pedido,)) == 1
+    assert len(llamadas) == 2
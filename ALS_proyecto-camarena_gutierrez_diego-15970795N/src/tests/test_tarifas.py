@@ -0,0 +1,100 @@
+"""Tarifas de proceso compiladas e identificadas por su config_version."""
+
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.proceso import Proceso, TamañoBordado, TipoProceso
+from app.routes import procesos as rutas_procesos
+from app.services import pricing
+from app.services.pricing import TarifasCompiladas
+
+
+@pytest.fixture
+def tarifas():
+    return TarifasCompiladas()
+
+
+def _proceso(tipo=TipoProceso.DTF):
+    proceso = Proceso(tipo, str(tipo.value))
+    proceso.id = uuid.uuid4().hex
+    return proceso
+
+
+def _campo(valor):
+    return SimpleNamespace(data=valor)
+
+
+def test_configurar_precios_sube_la_version():
+    proceso = _proceso()
+    version = proceso.config_version
+    
+    proceso.configurar_precios(precio_por_metro=220.0)
+    
+    assert proceso.config_version == version + 1
+
+
+def test_se_compila_una_vez_por_version(tarifas):
+    proceso = _proceso()
+    
+    primera = tarifas.obtener(proceso)
+    assert tarifas.obtener(proceso) is primera
+    assert tarifas.buscar(proceso.id, proceso.config_version) is primera
+    assert tarifas.stats['compiled'] == 1
+    
+    proceso.configurar_precios(precio_por_metro=220.0)
+    nueva = tarifas.obtener(proceso)
+    
+    assert (nueva.version, nueva.precio_por_metro) == (proceso.config_version, 220.0)
+    assert tarifas.buscar(proceso.id, primera.version) is None
+    assert tarifas.stats['compiled'] == 2
+
+
+def test_una_version_antigua_no_sustituye_a_la_nueva(tarifas):
+    proceso = _proceso()
+    proceso.configurar_precios(precio_por_metro=220.0)
+    tarifas.obtener(proceso)
+    
+    # Otro hilo compila una copia leída antes del cambio
+    viejo = _proceso()
+    viejo.id = proceso.id
+    assert tarifas.obtener(viejo).precio_por_metro == 200.0
+    
+    assert tarifas.buscar(proceso.id, proceso.config_version).precio_por_metro == 220.0
+
+
+def test_la_tarifa_es_inmutable(tarifas):
+    tarifa = tarifas.obtener(_proceso(TipoProceso.BORDADO))
+    
+    with pytest.raises(AttributeError):
+        tarifa.precio_setup = 0.0
+    with pytest.raises(TypeError):
+        tarifa.precios_por_tamaño['PEQUEÑO'] = 0.0
+    assert tarifas.obtener(tarifa) is tarifa
+
+
+def test_cotizar_no_recompila_una_version_conocida(monkeypatch):
+    proceso = _proceso()
+    pricing.tarifas.obtener(proceso)
+    
+    def no_compilar(_):
+        raise AssertionError('tarifa recompilada')
+    
+    monkeypatch.setattr(pricing, 'compilar', no_compilar)
+    assert list(pricing.cotizar_lote([proceso] * 3, [10.0] * 3, [10.0] * 3, [2] * 3).precios) == [20.0] * 3
+
+
+def test_el_formulario_de_procesos_sube_la_version():
+    bordado = _proceso(TipoProceso.BORDADO)
+    version = bordado.config_version
+    formulario = SimpleNamespace(
+        precio_setup=_campo(60.0), precio_pequeño=_campo(35.0), precio_mediano=_campo(55.0),
+        precio_grande=_campo(85.0), precio_extra_grande=_campo(125.0)
+    )
+    
+    rutas_procesos._actualizar_configuracion_proceso(bordado, formulario)
+    
+    tarifa = pricing.tarifas.obtener(bordado)
+    assert bordado.config_version == version + 1
+    assert tarifa.precio(0, 0, 2, TamañoBordado.PEQUEÑO) == 60.0 + 2 * 35.0
@@ -0,0 +1,79 @@
+"""Partición del espacio de claves por tenant."""
+
+import pytest
+from flask_login import login_user
+
+from app.models.cliente import Cliente
+from app.models.usuario import Usuario
+from app.services import tenancy
+
+
+def test_prefijar_comando_reescribe_solo_las_claves():
+    assert tenancy.prefijar_comando('t:a:', ('HGET', 'clase', 'campo')) == ('HGET', 't:a:clase', 'campo')
+    assert tenancy.prefijar_comando('t:a:', ('MGET', b'x', 'y')) == ('MGET', 't:a:x', 't:a:y')
+    assert tenancy.prefijar_comando('t:a:', ('PING',)) == ('PING',)
+
+
+def test_un_comando_sin_clasificar_se_rechaza():
+    with pytest.raises(ValueError):
+        tenancy.prefijar_comando('t:a:', ('RENAME', 'x', 'y'))
+
+
+def test_prefijo_valida_el_identificador():
+    assert tenancy.prefijo('tienda_1') == 't:tienda_1:'
+    assert tenancy.prefijo(None) == ''
+    with pytest.raises(ValueError):
+        tenancy.prefijo('tienda:1')
+
+
+def test_cada_tenant_ve_solo_sus_datos(storage, tenant):
+    cliente = Cliente(nombre='Ana', email='ana@example.com')
+    storage.save(cliente)
+    
+    with tenancy.tenant_scope(f'{tenant}otro'):
+        assert storage.find_all(Cliente) == []
+        assert storage.load(cliente.id) is None
+        assert storage.query(Cliente).where(email='ana@example.com').all() == []
+    assert [c.id for c in storage.find_all(Cliente)] == [cliente.id]
+
+
+def test_las_claves_del_tenant_llevan_su_prefijo(storage, tenant):
+    storage.save(Cliente(nombre='Ana', email='ana@example.com'))
+    
+    claves = [c.decode() for c in storage.redis.keys(f'{tenancy.prefijo(tenant)}*')]
+    
+    assert claves and all(c.startswith(f't:{tenant}:') for c in claves)
+
+
+def test_los_usuarios_viven_en_el_espacio_global(storage, tenant):
+    usuario = Usuario(f'u{tenant}', f'{tenant}@example.com', 'secreto', tenant_id=tenant)
+    storage.save(usuario)
+    
+    with tenancy.tenant_scope(f'{tenant}otro'):
+        assert storage.load(usuario.id).tenant_id == tenant
+    with tenancy.tenant_scope(None):
+        assert storage.load(usuario.id).username == f'u{tenant}'
+
+
+def test_current_tenant_usa_el_del_usuario_o_el_de_la_configuracion(app, tenant, monkeypatch):
+    monkeypatch.setitem(app.config, 'DEFAULT_TENANT', 'por_defecto')
+    usuario = Usuario('ana', 'ana@example.com', 'secreto', tenant_id=tenant)
+    
+    with app.test_request_context():
+        assert tenancy.current_tenant() == 'por_defecto'
+        login_user(usuario)
+        assert tenancy.current_tenant() == tenant
+        with tenancy.tenant_scope(None):
+            assert tenancy.current_tenant() is None
+
+
+def test_tenant_usage_cuenta_los_objetos_de_cada_tenant(storage, tenant):
+    for i in range(3):
+        storage.save(Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com'))
+    
+    uso = storage.tenant_usage(tenant)
+    
+    assert list(uso) == [tenant]
+    assert uso[tenant]['objetos']['Cliente'] == 3
+    assert uso[tenant]['operaciones']
+    assert tenant in tenancy.known_tenants(storage.redis)
@@ -0,0 +1,85 @@
+"""Guardado sin modificar los objetos y StorageService compartido entre hilos."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import sirope
+
+from app.models.cliente import Cliente
+from app.models.pedido import EstadoPedido, Pedido, PrioridadPedido
+from app.models.usuario import Usuario
+from app.services import tenancy
+from app.services.storage_service import StorageService
+
+
+def _en_hilos(app, tenant, funcion, veces, hilos=8):
+    """Ejecutar ``funcion(i)`` en varios hilos, cada uno con su contexto de aplicación y tenant."""
+    def ejecutar(i):
+        with app.app_context(), tenancy.tenant_scope(tenant):
+            return funcion(i)
+    with ThreadPoolExecutor(hilos) as ejecutor:
+        return list(ejecutor.map(ejecutar, range(veces)))
+
+
+def _pedido():
+    pedido = Pedido(cliente_id='cliente')
+    pedido.prioridad = PrioridadPedido.ALTA
+    return pedido
+
+
+def test_serialize_no_modifica_el_objeto():
+    pedido = _pedido()
+    
+    datos = pedido.serialize()
+    
+    assert (datos['estado'], datos['prioridad']) == ('PENDIENTE', 'ALTA')
+    assert (pedido.estado, pedido.prioridad) == (EstadoPedido.PENDIENTE, PrioridadPedido.ALTA)
+
+
+def test_guardar_no_cambia_los_enums_del_objeto(storage):
+    pedido = _pedido()
+    
+    storage.save(pedido)
+    
+    assert (pedido.estado, pedido.prioridad) == (EstadoPedido.PENDIENTE, PrioridadPedido.ALTA)
+    assert storage.get(Pedido, pedido.id).prioridad == PrioridadPedido.ALTA.value
+
+
+def test_lo_guardado_se_lee_con_sirope(storage, tenant):
+    usuario = Usuario(f'u{tenant}', f'{tenant}@example.com', 'secreto')
+    storage.save(usuario)
+    
+    oid = storage._resolver_oid(usuario.id, tenant=None)[0]
+    cargado = sirope.Sirope(storage.redis).load(oid)
+    
+    assert (cargado.id, cargado.username) == (usuario.id, usuario.username)
+
+
+def test_un_objeto_compartido_se_guarda_desde_varios_hilos(app, storage, tenant):
+    pedido = _pedido()
+    storage.save(pedido)
+    compartido = StorageService()
+    vistos = []
+    
+    def guardar(i):
+        compartido.save(pedido)
+        vistos.append(pedido.estado)
+    
+    _en_hilos(app, tenant, guardar, 200)
+    
+    assert set(vistos) == {EstadoPedido.PENDIENTE}
+    assert [p.id for p in storage.find_all(Pedido)] == [pedido.id]
+
+
+def test_los_objetos_nuevos_de_varios_hilos_reciben_oids_distintos(app, storage, tenant):
+    compartido = StorageService()
+    
+    def crear(i):
+        cliente = Cliente(nombre=f'Cliente {i}', email=f'c{i}@example.com')
+        compartido.save(cliente)
+        return cliente.id
+    
+    ids = _en_hilos(app, tenant, crear, 100)
+    
+    oids = {storage._resolver_oid(obj_id, tenant=tenant)[0].num for obj_id in ids}
+    assert len(oids) == 100
+    assert sorted(c.id for c in storage.find_all(Cliente)) == sorted(ids)
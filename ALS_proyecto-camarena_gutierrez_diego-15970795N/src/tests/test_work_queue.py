@@ -0,0 +1,84 @@
+"""Cola de trabajo: orden por prioridad y fecha, reclamos y liberación."""
+
+from datetime import datetime, timedelta
+
+from app.services import work_queue
+
+
+def _ids(entradas):
+    return [e['pedido_id'] for e in entradas]
+
+
+def test_form_urgent_order_comes_before_normal(storage, nuevo_pedido):
+    manana = datetime.now() + timedelta(days=1)
+    normal = nuevo_pedido(prioridad='normal', entrega=manana)
+    # Más tarde y con la prioridad tal como la guarda el formulario
+    urgente = nuevo_pedido(prioridad='urgente', entrega=manana + timedelta(days=5))
+    alta = nuevo_pedido(prioridad='alta', entrega=manana + timedelta(days=5))
+    
+    siguientes = work_queue.siguientes(storage)
+    assert _ids(siguientes) == [urgente.id, alta.id, normal.id]
+    assert [e['prioridad'] for e in siguientes] == ['URGENTE', 'ALTA', 'NORMAL']
+
+
+def test_api_lists_form_priorities(client, storage, nuevo_pedido):
+    normal = nuevo_pedido(prioridad='normal')
+    urgente = nuevo_pedido(prioridad='urgente')
+    
+    respuesta = client.get('/pedidos/api/cola')
+    assert respuesta.status_code == 200
+    siguientes = respuesta.get_json()['siguientes']
+    assert [(e['pedido_id'], e['prioridad']) for e in siguientes] == [(urgente.id, 'URGENTE'), (normal.id, 'NORMAL')]
+
+
+def test_ties_break_by_delivery_date(storage, nuevo_pedido):
+    hoy = datetime.now()
+    tarde = nuevo_pedido(entrega=hoy + timedelta(days=4))
+    pronto = nuevo_pedido(entrega=hoy + timedelta(days=1))
+    
+    assert _ids(work_queue.siguientes(storage)) == [pronto.id, tarde.id]
+
+
+def test_priority_change_reorders(storage, nuevo_pedido):
+    a = nuevo_pedido(prioridad='normal')
+    b = nuevo_pedido(prioridad='normal', entrega=datetime.now() + timedelta(days=9))
+    work_queue.siguientes(storage)  # Construye la cola: desde aquí, incremental
+    
+    b.prioridad = 'urgente'
+    storage.save(b)
+    assert _ids(work_queue.siguientes(storage)) == [b.id, a.id]
+    
+    b.estado = 'COMPLETADO'
+    storage.save(b)
+    assert _ids(work_queue.siguientes(storage)) == [a.id]
+
+
+def test_claim_next_and_release(storage, nuevo_pedido):
+    urgente = nuevo_pedido(prioridad='urgente')
+    normal = nuevo_pedido(prioridad='normal')
+    
+    reclamo = work_queue.reclamar_siguiente(storage, 'estacion-1')
+    assert reclamo['pedido_id'] == urgente.id
+    assert _ids(work_queue.siguientes(storage)) == [normal.id]
+    assert _ids(work_queue.reclamados(storage)) == [urgente.id]
+    
+    # Otra estación no puede reclamarlo ni liberarlo
+    assert work_queue.reclamar(storage, urgente.id, 'estacion-2') is None
+    assert not work_queue.liberar(storage, urgente.id, 'estacion-2')
+    
+    assert work_queue.liberar(storage, urgente.id, 'estacion-1')
+    assert _ids(work_queue.siguientes(storage)) == [urgente.id, normal.id]
+
+
+def test_incremental_matches_rebuild(storage, nuevo_pedido):
+    work_queue.siguientes(storage)
+    pedidos = [nuevo_pedido(prioridad=p, entrega=datetime.now() + timedelta(days=d))
+               for p, d in (('normal', 3), ('alta', 5), ('urgente', 8), ('normal', 1))]
+    pedidos[0].prioridad = 'alta'
+    storage.save(pedidos[0])
+    pedidos[2].estado = 'CANCELADO'
+    storage.save(pedidos[2])
+    
+    incremental = work_queue.siguientes(storage)
+    work_queue.rebuild(storage)
+    assert incremental == work_queue.siguientes(storage)